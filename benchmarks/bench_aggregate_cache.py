@@ -0,0 +1,105 @@
+"""
+Кэш агрегатов: переключение day/month/day в таблице расходов по категориям
+и сводка бюджета без кэша (кэш сбрасывается перед каждым вызовом) и с кэшем,
+а также стоимость правки расхода с повторным чтением агрегатов
+
+Запуск:
+    python -m benchmarks.bench_aggregate_cache --rows 200000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from bookkeeper.models.sqlalchemy_models import BudgetTable, CategoryTable, \
+    ExpenseTable
+from bookkeeper.repository.aggregate_cache import get_aggregate_cache
+from bookkeeper.repository.migrations import prepare_database
+from bookkeeper.repository.my_orm import bulk_insert_values, update_by_pk
+from bookkeeper.repository.periods import get_budget_summary, get_day_expenses_by_cat, \
+    get_month_expenses_by_cat
+
+CATEGORIES = 20
+
+
+def timed(call: Callable[[], Any], repeat: int) -> float:
+    """
+    Медиана времени вызова call, мс
+    """
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def main() -> None:
+    """
+    Точка входа
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        session_factory = sessionmaker(engine)
+        prepare_database(engine, session_factory)
+        bulk_insert_values(CategoryTable,
+                           [{"name": f"cat{i}"} for i in range(CATEGORIES)],
+                           session_factory)
+        update_by_pk(BudgetTable, 1, {"budget": 1000}, session_factory)
+        now = datetime.now()
+        step = timedelta(days=args.days) / args.rows
+        bulk_insert_values(ExpenseTable,
+                           ((now - step * i, float(i % 1000), i % CATEGORIES + 1, "")
+                            for i in range(args.rows)),
+                           session_factory,
+                           columns=("expense_date", "amount", "cat_id", "comment"),
+                           returning=False)
+        cache = get_aggregate_cache(session_factory)
+
+        def toggle() -> None:
+            get_day_expenses_by_cat(session_factory)
+            get_month_expenses_by_cat(session_factory)
+            get_day_expenses_by_cat(session_factory)
+            get_budget_summary(session_factory)
+
+        def cold() -> None:
+            cache.invalidate()
+            toggle()
+
+        rnd = random.Random(0)
+
+        def edit() -> None:
+            # Правка старого расхода (вне окон) и свежего (в окнах day и month)
+            pk = rnd.choice((rnd.randrange(args.rows // 2, args.rows),
+                             rnd.randrange(1, 100)))
+            update_by_pk(ExpenseTable, pk, {"amount": float(rnd.randrange(1000))},
+                         session_factory)
+            toggle()
+
+        cold_ms = timed(cold, args.repeat)
+        toggle()
+        warm_ms = timed(toggle, args.repeat)
+        edit_ms = timed(edit, args.repeat)
+        print(f"day/month/day + budget, no cache: {cold_ms:.3f} ms")
+        print(f"day/month/day + budget, cached:   {warm_ms:.3f} ms "
+              f"({cold_ms / warm_ms:.0f}x)")
+        print(f"edit + day/month/day + budget:    {edit_ms:.3f} ms")
+        print(cache.stats())
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
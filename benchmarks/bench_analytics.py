@@ -0,0 +1,141 @@
+"""
+Аналитика на массивах NumPy (get_analytics) против запросов к SQLite:
+сумма и суммы по категориям за случайные периоды, гистограмма по месяцам,
+сводная таблица категория x месяц, обновление массивов после записи
+и холодный запуск из файла-кэша столбцов
+
+Запуск:
+    python -m benchmarks.bench_analytics --rows 1000000 --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker, Session
+
+from bookkeeper.models.sqlalchemy_models import CategoryTable, ExpenseTable
+from bookkeeper.repository.analytics import get_analytics, save_analytics
+from bookkeeper.repository.migrations import prepare_database
+from bookkeeper.repository.my_orm import bulk_insert_values, insert_values, unit_of_work
+from bookkeeper.repository.periods import get_period_expenses, \
+    get_period_expenses_by_cat
+
+CATEGORIES = 20
+START = datetime(2020, 1, 1)
+MONTH = func.strftime("%Y-%m", ExpenseTable.expense_date)
+
+
+def fill(session_factory: sessionmaker[Session], rows: int) -> None:
+    """
+    Расходы с шагом в 2 минуты начиная с START
+    """
+    bulk_insert_values(CategoryTable, [{"name": f"cat{i}"} for i in range(CATEGORIES)],
+                       session_factory)
+    bulk_insert_values(ExpenseTable,
+                       ((START + timedelta(minutes=2 * i), float(i % 1000),
+                         i % CATEGORIES + 1, "") for i in range(rows)),
+                       session_factory,
+                       columns=("expense_date", "amount", "cat_id", "comment"),
+                       returning=False)
+
+
+def timed(call: Callable[..., Any], calls: list[tuple[Any, ...]]) -> float:
+    """
+    Медиана времени вызова call(*arguments) для каждого набора аргументов, мс
+    """
+    times = []
+    for arguments in calls:
+        started = time.perf_counter()
+        call(*arguments)
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def main() -> None:
+    """
+    Точка входа
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        session_factory = sessionmaker(engine)
+        prepare_database(engine, session_factory)
+        fill(session_factory, args.rows)
+        last = START + timedelta(minutes=2 * args.rows)
+
+        started = time.perf_counter()
+        analytics = get_analytics(session_factory)
+        elapsed = time.perf_counter() - started
+        size = sum(array.nbytes for array in (analytics.ids, analytics.minutes,
+                                              analytics.cat_ids, analytics.amounts))
+        print(f"load {len(analytics.ids)} rows: {elapsed:.2f} s, "
+              f"{size / 2 ** 20:.1f} MiB")
+
+        rnd = random.Random(0)
+        periods = []
+        for _ in range(args.queries):
+            start = START + (last - START) * rnd.random()
+            periods.append((start, start + timedelta(days=rnd.randrange(1, 120),
+                                                     minutes=rnd.randrange(1440))))
+
+        def sql_histogram() -> Any:
+            with unit_of_work(session_factory) as session:
+                return session.execute(select(MONTH, func.sum(ExpenseTable.amount))
+                                       .group_by(MONTH)).all()
+
+        def sql_pivot() -> Any:
+            with unit_of_work(session_factory) as session:
+                return session.execute(
+                    select(ExpenseTable.cat_id, MONTH, func.sum(ExpenseTable.amount))
+                    .group_by(ExpenseTable.cat_id, MONTH)).all()
+
+        def refresh_after_insert() -> Any:
+            insert_values(ExpenseTable, {"expense_date": START, "amount": 1.0,
+                                         "cat_id": 1, "comment": ""}, session_factory)
+            return get_analytics(session_factory)
+
+        with_factory = [(*period, session_factory) for period in periods]
+        cases = [
+            ("total", get_period_expenses, analytics.total, with_factory, periods),
+            ("by category", get_period_expenses_by_cat, analytics.by_category,
+             with_factory, periods),
+            ("month histogram", sql_histogram,
+             lambda: analytics.histogram(freq="month"), [()] * 3, [()] * 3),
+            ("category x month", sql_pivot, analytics.pivot, [()] * 3, [()] * 3),
+        ]
+        print(f"{'query':>18} {'sql ms':>10} {'numpy ms':>10} {'speedup':>8}")
+        for name, sql, numpy, sql_calls, numpy_calls in cases:
+            sql_ms = timed(sql, sql_calls)
+            numpy_ms = timed(numpy, numpy_calls)
+            print(f"{name:>18} {sql_ms:>10.3f} {numpy_ms:>10.3f} "
+                  f"{sql_ms / numpy_ms:>8.0f}")
+        print(f"insert + refresh: {timed(refresh_after_insert, [()] * 20):.2f} ms")
+
+        cache_path = os.path.join(tmp, "bench.db.columns")
+        save_analytics(session_factory, cache_path)
+        for delta in (0, 1000):
+            if delta:
+                bulk_insert_values(ExpenseTable,
+                                   [(last, 1.0, 1, "")] * delta, sessionmaker(engine),
+                                   columns=("expense_date", "amount", "cat_id",
+                                            "comment"), returning=False)
+            started = time.perf_counter()
+            restarted = get_analytics(sessionmaker(engine), cache_path)
+            print(f"cold start from cache, {delta} new rows: "
+                  f"{time.perf_counter() - started:.3f} s "
+                  f"(mapped: {restarted.mapped})")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
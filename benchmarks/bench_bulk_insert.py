@@ -0,0 +1,88 @@
+"""
+Сравнение скорости вставки расходов: цикл insert_values против bulk_insert_values
+
+Запуск:
+    python -m benchmarks.bench_bulk_insert --sizes 10000,100000,1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Iterator
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, Session
+
+from bookkeeper.models.sqlalchemy_models import CategoryTable, ExpenseTable
+from bookkeeper.repository.my_orm import create_tables, insert_values, \
+    bulk_insert_values
+
+
+def expense_rows(size: int) -> Iterator[dict[str, object]]:
+    """
+    Генератор тестовых расходов
+    """
+    start = datetime(2020, 1, 1)
+    for i in range(size):
+        yield {
+            "expense_date": start + timedelta(minutes=i),
+            "cat_id": 1,
+            "amount": i % 1000,
+            "comment": "bench",
+        }
+
+
+def run(size: int, insert: Callable[[int, sessionmaker[Session]], None]) -> float:
+    """
+    Время вставки size строк функцией insert в новую БД, секунды
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        create_tables(engine)
+        session_factory = sessionmaker(engine)
+        insert_values(CategoryTable, {"name": "bench"}, session_factory)
+        started = time.perf_counter()
+        insert(size, session_factory)
+        elapsed = time.perf_counter() - started
+        engine.dispose()
+    return elapsed
+
+
+def insert_loop(size: int, session_factory: sessionmaker[Session]) -> None:
+    """
+    Вставка по одной строке (старый путь)
+    """
+    for row in expense_rows(size):
+        insert_values(ExpenseTable, row, session_factory)
+
+
+def insert_bulk(size: int, session_factory: sessionmaker[Session]) -> None:
+    """
+    Пакетная вставка
+    """
+    bulk_insert_values(ExpenseTable, expense_rows(size), session_factory)
+
+
+def main() -> None:
+    """
+    Точка входа
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--loop-max", type=int, default=10000,
+                        help="не запускать цикл insert_values на больших объёмах")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'loop, s':>10} {'bulk, s':>10} {'speedup':>8}")
+    for size in map(int, args.sizes.split(",")):
+        bulk = run(size, insert_bulk)
+        if size <= args.loop_max:
+            loop = run(size, insert_loop)
+            print(f"{size:>10} {loop:>10.2f} {bulk:>10.2f} {loop / bulk:>8.1f}")
+        else:
+            print(f"{size:>10} {'-':>10} {bulk:>10.2f} {'-':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Схема версии 4 (дата текстом, сумма float) против версии 5 (секунды от
+начала эпохи и копейки в INTEGER): размер строки и индексов, суммы
+за период, чтение строк через sqlalchemy и время миграции
+
+Запуск:
+    python -m benchmarks.bench_compact_storage --rows 1000000
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, Table, \
+    create_engine, select
+from sqlalchemy.engine.base import Engine
+
+from bookkeeper.models.sqlalchemy_models import ExpenseTable, EPOCH, SECOND
+from bookkeeper.repository.migrations import migrate
+
+START = datetime(2020, 1, 1)
+CATEGORIES = 20
+# Схема версии 4 (как её создавала прежняя модель)
+V4_SCHEMA = (
+    "CREATE TABLE category_table (id INTEGER NOT NULL PRIMARY KEY, "
+    "name VARCHAR(50) NOT NULL, parent INTEGER)",
+    "CREATE INDEX ix_category_table_name ON category_table (name)",
+    "CREATE TABLE expense_table (id INTEGER NOT NULL PRIMARY KEY, "
+    "expense_date DATETIME NOT NULL, "
+    "cat_id INTEGER NOT NULL REFERENCES category_table (id) ON DELETE CASCADE, "
+    "amount FLOAT NOT NULL, comment VARCHAR(200) NOT NULL, "
+    "added_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL, "
+    "updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL)",
+    "CREATE INDEX ix_expense_date_cat_amount "
+    "ON expense_table (expense_date, cat_id, amount)",
+    "CREATE INDEX ix_expense_cat_date ON expense_table (cat_id, expense_date)",
+    "CREATE INDEX ix_expense_date ON expense_table (expense_date)",
+    "CREATE INDEX ix_expense_updated_at ON expense_table (updated_at)",
+    "CREATE TABLE budget (id INTEGER NOT NULL PRIMARY KEY, period VARCHAR(50) NOT NULL, "
+    "budget FLOAT NOT NULL, amount FLOAT NOT NULL)",
+    "CREATE TABLE daily_category_totals (day DATE NOT NULL, cat_id INTEGER NOT NULL, "
+    "total FLOAT NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (day, cat_id)) "
+    "WITHOUT ROWID",
+)
+V4_EXPENSES = Table("expense_table", MetaData(), Column("id", Integer, primary_key=True),
+                    Column("expense_date", DateTime), Column("cat_id", Integer),
+                    Column("amount", Float))
+
+
+def make_v4(path: str, rows: int) -> None:
+    """
+    БД версии 4 с rows расходами с шагом в 2 минуты
+    """
+    connection = sqlite3.connect(path)
+    for statement in V4_SCHEMA:
+        connection.execute(statement)
+    connection.executemany("INSERT INTO category_table (name) VALUES (?)",
+                           [(f"cat{i}",) for i in range(CATEGORIES)])
+    connection.executemany(
+        "INSERT INTO expense_table (expense_date, cat_id, amount, comment) "
+        "VALUES (?, ?, ?, '')",
+        ((str(START + timedelta(minutes=2 * i)) + ".000000",
+          i % CATEGORIES + 1, (i % 100000) / 100) for i in range(rows)))
+    connection.execute(
+        "INSERT INTO daily_category_totals SELECT date(expense_date), cat_id, "
+        "sum(amount), count(*) FROM expense_table GROUP BY 1, 2")
+    connection.execute("PRAGMA user_version = 4")
+    connection.commit()
+    connection.close()
+
+
+def sizes(path: str) -> dict[str, int]:
+    """
+    Размер таблицы расходов и её индексов в байтах (виртуальная таблица dbstat)
+    """
+    connection = sqlite3.connect(path)
+    result = dict(connection.execute(
+        "SELECT name, sum(pgsize) FROM dbstat WHERE name IN "
+        "(SELECT name FROM sqlite_schema WHERE tbl_name = 'expense_table') "
+        "GROUP BY name").fetchall())
+    connection.close()
+    return result
+
+
+def timed(call: Callable[..., Any], calls: list[tuple[Any, ...]]) -> float:
+    """
+    Медиана времени вызова call(*arguments) для каждого набора аргументов, мс
+    """
+    times = []
+    for arguments in calls:
+        started = time.perf_counter()
+        call(*arguments)
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def aggregates(path: str, periods: list[tuple[datetime, datetime]],
+               to_db: Callable[[datetime], Any]) -> tuple[float, float]:
+    """
+    Медианы времени сумм за период и сумм по категориям за период, мс
+    """
+    connection = sqlite3.connect(path)
+    total = "SELECT sum(amount) FROM expense_table WHERE expense_date BETWEEN ? AND ?"
+    by_cat = ("SELECT cat_id, sum(amount) FROM expense_table "
+              "WHERE expense_date BETWEEN ? AND ? GROUP BY cat_id")
+    bounds = [(to_db(start), to_db(end)) for start, end in periods]
+    result = (timed(lambda *args: connection.execute(total, args).fetchall(), bounds),
+              timed(lambda *args: connection.execute(by_cat, args).fetchall(), bounds))
+    connection.close()
+    return result
+
+
+def scans(path: str, day: str, seconds: str) -> tuple[float, float]:
+    """
+    Время полных проходов, мс: свёртка по дням (как fill_daily_totals)
+    и чтение (id, секунды, cat_id, сумма) в порядке дат (как загрузка аналитики)
+    """
+    connection = sqlite3.connect(path)
+    rollup = (f"SELECT {day}, cat_id, sum(amount), count(*) FROM expense_table "
+              "GROUP BY 1, 2")
+    load = (f"SELECT id, {seconds}, cat_id, amount FROM expense_table "
+            "ORDER BY expense_date")
+    result = (timed(lambda: connection.execute(rollup).fetchall(), [()] * 3),
+              timed(lambda: connection.execute(load).fetchall(), [()] * 3))
+    connection.close()
+    return result
+
+
+def read_rows(engine: Engine, table: Any, limit: int) -> float:
+    """
+    Строк в секунду при чтении через sqlalchemy с преобразованием типов
+    """
+    query = select(table.c.id, table.c.expense_date, table.c.cat_id,
+                   table.c.amount).limit(limit)
+    with engine.connect() as connection:
+        started = time.perf_counter()
+        count = len(connection.execute(query).all())
+    return count / (time.perf_counter() - started)
+
+
+def main() -> None:
+    """
+    Точка входа
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    span = timedelta(minutes=2 * args.rows)
+    periods = []
+    for _ in range(args.queries):
+        start = START + span * rnd.random()
+        periods.append((start, start + timedelta(days=rnd.randrange(1, 90))))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        v4 = os.path.join(tmp, "v4.db")
+        v5 = os.path.join(tmp, "v5.db")
+        make_v4(v4, args.rows)
+        shutil.copy(v4, v5)
+        engine = create_engine(f"sqlite:///{v5}")
+        started = time.perf_counter()
+        migrate(engine)
+        print(f"migration of {args.rows} rows: {time.perf_counter() - started:.1f} s")
+        engine.dispose()
+
+        before, after = sizes(v4), sizes(v5)
+        print(f"{'object':>28} {'v4 B/row':>9} {'v5 B/row':>9}")
+        for name in sorted(before):
+            print(f"{name:>28} {before[name] / args.rows:>9.1f} "
+                  f"{after[name] / args.rows:>9.1f}")
+        print(f"{'total':>28} {sum(before.values()) / args.rows:>9.1f} "
+              f"{sum(after.values()) / args.rows:>9.1f}")
+
+        old = aggregates(v4, periods, lambda moment: f"{moment}.000000") + \
+            scans(v4, "date(expense_date)",
+                  "CAST(strftime('%s', expense_date) AS INTEGER)")
+        new = aggregates(v5, periods, lambda moment: (moment - EPOCH) // SECOND) + \
+            scans(v5, "date(expense_date, 'unixepoch')", "expense_date")
+        print(f"{'query':>28} {'v4 ms':>9} {'v5 ms':>9} {'speedup':>8}")
+        for name, old_ms, new_ms in zip(("period sum", "period by category",
+                                         "rollup by day (full)",
+                                         "analytics load (full)"), old, new):
+            print(f"{name:>28} {old_ms:>9.3f} {new_ms:>9.3f} {old_ms / new_ms:>8.1f}")
+
+        limit = min(args.rows, 200000)
+        old_engine = create_engine(f"sqlite:///{v4}")
+        new_engine = create_engine(f"sqlite:///{v5}")
+        old_rate = read_rows(old_engine, V4_EXPENSES, limit)
+        new_rate = read_rows(new_engine, ExpenseTable.__table__, limit)
+        print(f"{'read rows/s':>28} {old_rate:>9.0f} {new_rate:>9.0f} "
+              f"{new_rate / old_rate:>8.1f}")
+        old_engine.dispose()
+        new_engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
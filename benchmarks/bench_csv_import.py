@@ -0,0 +1,74 @@
+"""
+Скорость потокового импорта расходов из CSV (import_csv)
+
+Запуск:
+    python -m benchmarks.bench_csv_import --rows 1000000 --workers 0,2
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from bookkeeper.repository.category_tree import commit_category_tree
+from bookkeeper.repository.csv_import import CSV_COLUMNS, import_csv
+from bookkeeper.repository.migrations import prepare_database
+
+CATEGORIES = ("food", "car", "home")
+
+
+def write_csv(path: str, rows: int) -> None:
+    """
+    Тестовый файл: даты в формате приложения, каждая сотая строка с ошибкой
+    """
+    start = datetime(2020, 1, 1)
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        file.write(",".join(CSV_COLUMNS) + "\n")
+        for i in range(rows):
+            expense_date = (start + timedelta(minutes=i)).strftime("%d-%m-%Y %H:%M")
+            amount = "bad" if i % 100 == 99 else f"{i % 1000}.5"
+            file.write(f"{expense_date},{amount},{CATEGORIES[i % 3]},bank\n")
+
+
+def run(path: str, workers: int, chunk_size: int) -> tuple[float, int, int]:
+    """
+    Импорт файла path в новую БД: (секунды, вставлено, отклонено)
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        session_factory = sessionmaker(engine)
+        prepare_database(engine, session_factory)
+        commit_category_tree([(name, None) for name in CATEGORIES], session_factory)
+        started = time.perf_counter()
+        with open(path, encoding="utf-8", newline="") as file:
+            result = import_csv(file, session_factory, chunk_size, workers)
+        elapsed = time.perf_counter() - started
+        engine.dispose()
+    return elapsed, result.imported, len(result.rejects)
+
+
+def main() -> None:
+    """
+    Точка входа
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--workers", default="0,2")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "expenses.csv")
+        write_csv(path, args.rows)
+        print(f"{'workers':>8} {'s':>8} {'rows/min':>12} {'rejected':>9}")
+        for workers in map(int, args.workers.split(",")):
+            elapsed, imported, rejected = run(path, workers, args.chunk_size)
+            print(f"{workers:>8} {elapsed:>8.2f} {imported / elapsed * 60:>12.0f} "
+                  f"{rejected:>9}")
+
+
+if __name__ == "__main__":
+    main()
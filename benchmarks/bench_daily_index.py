@@ -0,0 +1,98 @@
+"""
+Суммы за произвольные периоды по индексу сумм по дням (деревья Фенвика,
+get_period_total) против запроса к свёртке daily_category_totals
+(get_period_expenses) при разной длине периода, и стоимость изменения
+расхода вместе с обновлением индекса
+
+Запуск:
+    python -m benchmarks.bench_daily_index --rows 200000 --days 3650
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from bookkeeper.models.sqlalchemy_models import CategoryTable, ExpenseTable
+from bookkeeper.repository.daily_index import get_daily_index, get_period_total
+from bookkeeper.repository.migrations import prepare_database
+from bookkeeper.repository.my_orm import bulk_insert_values, update_by_pk
+from bookkeeper.repository.periods import get_period_expenses
+
+CATEGORIES = 20
+START = datetime(2015, 1, 1)
+
+
+def timed(call: Callable[..., Any], calls: list[tuple[Any, ...]]) -> float:
+    """
+    Медиана времени вызова call(*arguments) для каждого набора аргументов, мс
+    """
+    times = []
+    for arguments in calls:
+        started = time.perf_counter()
+        call(*arguments)
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def update_and_refresh(pk: int, amount: float, session_factory: Any) -> None:
+    """
+    Изменить расход и привести индекс в соответствие с БД
+    """
+    update_by_pk(ExpenseTable, pk, {"amount": amount}, session_factory)
+    get_daily_index(session_factory)
+
+
+def main() -> None:
+    """
+    Точка входа
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--days", type=int, default=3650)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        session_factory = sessionmaker(engine)
+        prepare_database(engine, session_factory)
+        bulk_insert_values(CategoryTable,
+                           [{"name": f"cat{i}"} for i in range(CATEGORIES)],
+                           session_factory)
+        step = timedelta(days=args.days) / args.rows
+        bulk_insert_values(ExpenseTable,
+                           ((START + step * i, float(i % 1000), i % CATEGORIES + 1, "")
+                            for i in range(args.rows)),
+                           session_factory,
+                           columns=("expense_date", "amount", "cat_id", "comment"),
+                           returning=False)
+        timed(get_daily_index, [(session_factory,)])
+
+        rnd = random.Random(0)
+        print(f"{'days':>6} {'rollup ms':>10} {'index ms':>10} {'speedup':>8}")
+        for length in (7, 30, 90, 365, args.days):
+            calls = []
+            for _ in range(args.queries):
+                start = START + timedelta(days=rnd.randrange(max(args.days - length, 1)),
+                                          minutes=rnd.randrange(1440))
+                calls.append((start, start + timedelta(days=length), session_factory))
+            sql_ms = timed(get_period_expenses, calls)
+            index_ms = timed(get_period_total, calls)
+            print(f"{length:>6} {sql_ms:>10.3f} {index_ms:>10.3f} "
+                  f"{sql_ms / index_ms:>8.1f}")
+
+        updates = [(rnd.randrange(1, args.rows + 1), float(rnd.randrange(1000)),
+                    session_factory) for _ in range(args.queries)]
+        print(f"update + index refresh: {timed(update_and_refresh, updates):.3f} ms")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
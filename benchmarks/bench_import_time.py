@@ -0,0 +1,162 @@
+"""
+Время холодного импорта точек входа bookkeeper по данным python -X importtime.
+Каждая точка входа импортируется в новом процессе несколько раз, берётся медиана.
+Проверки:
+    - время импорта не превышает базовое (import_time_baseline.json)
+      больше чем на допуск;
+    - точки входа без GUI не загружают PySide6.
+
+Запуск:
+    python -m benchmarks.bench_import_time               # отчёт и проверка
+    python -m benchmarks.bench_import_time --update      # записать базовое время
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import NamedTuple, Optional
+
+# Точка входа -> загружает ли она GUI
+ENTRY_POINTS = {
+    "bookkeeper.main_file": True,
+    "bookkeeper.presenter": True,
+    "bookkeeper.view.app_interface": True,
+    "bookkeeper.cli": False,
+    "bookkeeper.repository.rollup": False,
+    "bookkeeper.repository.migrations": False,
+    "bookkeeper.utils": False,
+}
+GUI_PACKAGES = ("PySide6", "shiboken6")
+BASELINE = os.path.join(os.path.dirname(__file__), "import_time_baseline.json")
+MARKER = "--bookkeeper-import--"
+
+
+class ImportProfile(NamedTuple):
+    """
+    Результат импорта точки входа
+    Attributes:
+    -----------
+    total_ms: float
+        Суммарное время импорта всех загруженных модулей, мс
+    own_ms: float
+        Время импорта модулей bookkeeper без зависимостей, мс
+    modules: dict[str, float]
+        Собственное время импорта каждого загруженного модуля, мс
+    """
+    total_ms: float
+    own_ms: float
+    modules: dict[str, float]
+
+
+def parse_importtime(output: str) -> dict[str, float]:
+    """
+    Собственное время импорта модулей (мс) из вывода python -X importtime.
+    Учитываются только строки после метки MARKER, если она есть:
+    модули, загруженные при старте интерпретатора, не считаются
+    """
+    lines = output.splitlines()
+    if MARKER in lines:
+        lines = lines[lines.index(MARKER) + 1:]
+    modules: dict[str, float] = {}
+    for line in lines:
+        if not line.startswith("import time:"):
+            continue
+        self_us, _, name = line[len("import time:"):].split("|", 2)
+        if self_us.strip().isdigit():
+            modules[name.strip()] = int(self_us) / 1000
+    return modules
+
+
+def profile_import(module: str) -> ImportProfile:
+    """
+    Импортировать module в новом процессе и разобрать вывод -X importtime
+    """
+    code = f"import sys; sys.stderr.write({MARKER!r} + '\\n'); import {module}"
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                             capture_output=True, text=True, check=True,
+                             env={**os.environ, "QT_QPA_PLATFORM": "offscreen"})
+    modules = parse_importtime(process.stderr)
+    own = sum(ms for name, ms in modules.items()
+              if name.split(".")[0] == "bookkeeper")
+    return ImportProfile(sum(modules.values()), own, modules)
+
+
+def measure(module: str, repeat: int) -> ImportProfile:
+    """
+    Медиана repeat холодных импортов module.
+    Первый запуск не учитывается: он может компилировать .pyc
+    """
+    profile_import(module)
+    runs = [profile_import(module) for _ in range(repeat)]
+    return ImportProfile(statistics.median(run.total_ms for run in runs),
+                         statistics.median(run.own_ms for run in runs),
+                         runs[-1].modules)
+
+
+def check(module: str, profile: ImportProfile, gui: bool,
+          baseline: Optional[float], tolerance: float) -> list[str]:
+    """
+    Нарушения для точки входа: регрессия времени импорта
+    и загрузка GUI точкой входа без GUI
+    """
+    errors = []
+    if baseline is not None and profile.total_ms > baseline * (1 + tolerance):
+        errors.append(f"{module}: {profile.total_ms:.1f} ms, "
+                      f"baseline {baseline:.1f} ms (+{tolerance:.0%} allowed)")
+    if not gui:
+        loaded = sorted(name for name in profile.modules
+                        if name.split(".")[0] in GUI_PACKAGES)
+        if loaded:
+            errors.append(f"{module}: imports GUI modules {', '.join(loaded[:3])}")
+    return errors
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Точка входа
+    """
+    parser = argparse.ArgumentParser(description="bookkeeper import time")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="допустимый рост времени импорта относительно базового")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--update", action="store_true",
+                        help="записать измеренное время как базовое")
+    parser.add_argument("--top", type=int, default=5,
+                        help="сколько самых медленных модулей показать")
+    args = parser.parse_args(argv)
+
+    baseline: dict[str, float] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+
+    errors = []
+    results = {}
+    print(f"{'entry point':<36} {'total, ms':>10} {'own, ms':>8} {'baseline':>9}")
+    for module, gui in ENTRY_POINTS.items():
+        profile = results[module] = measure(module, args.repeat)
+        limit = baseline.get(module)
+        print(f"{module:<36} {profile.total_ms:>10.1f} {profile.own_ms:>8.1f} "
+              f"{limit if limit is not None else '-':>9}")
+        slowest = sorted(profile.modules.items(), key=lambda item: -item[1])
+        for name, ms in slowest[:args.top]:
+            print(f"    {name:<32} {ms:>10.1f}")
+        if not args.update:
+            errors.extend(check(module, profile, gui, limit, args.tolerance))
+
+    if args.update:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump({module: round(profile.total_ms, 1)
+                       for module, profile in results.items()}, file, indent=4)
+            file.write("\n")
+        return 0
+    for error in errors:
+        print(error)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Сравнение профилей хранения SQLite (repository.engine.PROFILES) и настроек
+SQLAlchemy по умолчанию: пакетная вставка, вставка по одной строке
+(транзакция на строку, как в приложении) и запросы сумм за периоды
+
+Запуск:
+    python -m benchmarks.bench_storage_profiles --rows 200000 --single 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.engine.base import Engine
+from sqlalchemy.orm import sessionmaker, Session
+
+from bookkeeper.models.sqlalchemy_models import CategoryTable, ExpenseTable
+from bookkeeper.repository.engine import PROFILES, create_bookkeeper_engine
+from bookkeeper.repository.migrations import prepare_database
+from bookkeeper.repository.my_orm import bulk_insert_values, insert_values, unit_of_work
+from bookkeeper.repository.periods import get_period_expenses, \
+    get_period_expenses_by_cat
+
+START = datetime(2020, 1, 1)
+CATEGORIES = 20
+
+
+def make_engine(path: str, profile: Optional[str]) -> Engine:
+    """
+    Движок с профилем profile (None - create_engine без настроек)
+    """
+    if profile is None:
+        return create_engine(f"sqlite:///{path}")
+    return create_bookkeeper_engine(f"sqlite:///{path}", profile)
+
+
+def insert_rows(session_factory: sessionmaker[Session], rows: int, single: int
+                ) -> tuple[float, float]:
+    """
+    Строк в секунду при пакетной вставке rows строк и при вставке single
+    строк по одной
+    """
+    started = time.perf_counter()
+    bulk_insert_values(ExpenseTable,
+                       ((START + timedelta(minutes=i), float(i % 1000),
+                         i % CATEGORIES + 1, "") for i in range(rows)),
+                       session_factory,
+                       columns=("expense_date", "amount", "cat_id", "comment"),
+                       returning=False)
+    bulk = rows / (time.perf_counter() - started)
+    started = time.perf_counter()
+    for i in range(single):
+        insert_values(ExpenseTable, {"expense_date": START + timedelta(seconds=i),
+                                     "amount": 1.0, "cat_id": 1, "comment": ""},
+                      session_factory)
+    return bulk, single / (time.perf_counter() - started)
+
+
+def aggregate_ms(session_factory: sessionmaker[Session], rows: int,
+                 queries: int) -> tuple[float, float]:
+    """
+    Медианы времени, мс: суммы по категориям за случайный период
+    и полный проход по таблице расходов
+    """
+    rnd = random.Random(0)
+    periods = []
+    for _ in range(queries):
+        start = START + timedelta(minutes=rnd.randrange(rows))
+        periods.append((start, start + timedelta(days=rnd.randrange(1, 120))))
+    times = []
+    for start, end in periods:
+        started = time.perf_counter()
+        get_period_expenses_by_cat(start, end, session_factory)
+        get_period_expenses(start, end, session_factory)
+        times.append((time.perf_counter() - started) * 1000)
+    scans = []
+    for _ in range(5):
+        started = time.perf_counter()
+        with unit_of_work(session_factory) as session:
+            session.execute(select(func.sum(ExpenseTable.amount))).scalar()
+        scans.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), statistics.median(scans)
+
+
+def main() -> None:
+    """
+    Точка входа
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--single", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'profile':>20} {'bulk rows/s':>12} {'single rows/s':>14} "
+          f"{'period ms':>10} {'scan ms':>8}")
+    for profile in [None, *PROFILES]:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            # Данные пишет профиль строки, кроме профиля только для чтения
+            writer = "bulk-load" if profile == "read-only analytics" else profile
+            engine = make_engine(path, writer)
+            session_factory = sessionmaker(engine)
+            prepare_database(engine, session_factory)
+            bulk_insert_values(CategoryTable,
+                               [{"name": f"cat{i}"} for i in range(CATEGORIES)],
+                               session_factory)
+            bulk, single = insert_rows(session_factory, args.rows, args.single)
+            engine.dispose()
+
+            engine = make_engine(path, profile)
+            period, scan = aggregate_ms(sessionmaker(engine), args.rows, args.queries)
+            engine.dispose()
+        written = "-" if writer != profile else f"{bulk:>12.0f}"
+        single_written = "-" if writer != profile else f"{single:>14.0f}"
+        print(f"{profile or 'sqlalchemy default':>20} {written:>12} "
+              f"{single_written:>14} {period:>10.3f} {scan:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Синхронизация с изменениями другого процесса: sync_expenses после правки
+нескольких расходов вторым подключением к тому же файлу БД в сравнении
+с полным перечитыванием get_expenses_data, для журналов разного размера
+
+Запуск:
+    python -m benchmarks.bench_sync --rows 200000 --changes 10
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from bookkeeper.models.sqlalchemy_models import CategoryTable, ExpenseTable
+from bookkeeper.repository.daily_index import get_daily_index
+from bookkeeper.repository.migrations import prepare_database
+from bookkeeper.repository.my_orm import bulk_insert_values, update_by_pk, delete_by_pk
+from bookkeeper.repository.periods import get_day_expenses_by_cat, \
+    get_month_expenses_by_cat
+from bookkeeper.repository.paging import get_expenses_data
+from bookkeeper.repository.sync import get_change_tracker, sync_expenses
+
+CATEGORIES = 20
+
+
+def timed(call: Callable[[], Any], repeat: int) -> float:
+    """
+    Медиана времени вызова call, мс
+    """
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def main() -> None:
+    """
+    Точка входа
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--changes", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine, other_engine = create_engine(url), create_engine(url)
+        session_factory, other = sessionmaker(engine), sessionmaker(other_engine)
+        prepare_database(engine, session_factory)
+        bulk_insert_values(CategoryTable,
+                           [{"name": f"cat{i}"} for i in range(CATEGORIES)],
+                           session_factory)
+        now = datetime.now()
+        step = timedelta(days=365) / args.rows
+        bulk_insert_values(ExpenseTable,
+                           ((now - step * i, float(i % 1000), i % CATEGORIES + 1, "")
+                            for i in range(args.rows)),
+                           session_factory,
+                           columns=("expense_date", "amount", "cat_id", "comment"),
+                           returning=False)
+        get_change_tracker(session_factory)
+        get_daily_index(session_factory)
+        rnd = random.Random(0)
+
+        def external_edits() -> None:
+            for _ in range(args.changes):
+                pk = rnd.randrange(1, args.rows)
+                if rnd.random() < 0.2:
+                    delete_by_pk(ExpenseTable, pk, other)
+                else:
+                    update_by_pk(ExpenseTable, pk, {"amount": float(rnd.randrange(1000))},
+                                 other)
+
+        def sync() -> None:
+            external_edits()
+            sync_expenses(session_factory)
+            get_daily_index(session_factory)
+            get_day_expenses_by_cat(session_factory)
+            get_month_expenses_by_cat(session_factory)
+
+        def reload() -> None:
+            external_edits()
+            get_expenses_data(session_factory)
+
+        edits_ms = timed(external_edits, args.repeat)
+        sync_ms = timed(sync, args.repeat) - edits_ms
+        reload_ms = timed(reload, args.repeat) - edits_ms
+        print(f"{args.rows} rows, {args.changes} external changes")
+        print(f"sync_expenses + caches: {sync_ms:.3f} ms")
+        print(f"full reload:            {reload_ms:.3f} ms")
+        engine.dispose()
+        other_engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
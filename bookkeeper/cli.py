@@ -0,0 +1,383 @@
+"""
+Консольный интерфейс для пакетной работы с БД без GUI.
+Модуль не импортирует Qt.
+
+Запуск:
+    bookkeeper add 12.5 food --date "01-02-2024 10:00" --comment lunch
+    bookkeeper import expenses.csv --rejects rejects.csv
+    bookkeeper export expenses.jsonl --format jsonl --category food
+    bookkeeper summary
+    bookkeeper by-cat --period week
+    bookkeeper stats --start 2024-01-01 --freq month
+    bookkeeper categories tree.txt --rename car=transport
+    bookkeeper budget --day 1000 --month 30000
+    bookkeeper snapshot ledger/ --incremental
+"""
+from __future__ import annotations
+import argparse
+import csv
+import importlib
+import sys
+from contextlib import nullcontext
+from datetime import datetime
+from types import ModuleType
+from typing import Optional
+
+from sqlalchemy import make_url
+from sqlalchemy.orm import sessionmaker, Session
+
+from bookkeeper.config import DSN, BULK_CHUNK_SIZE, COLUMN_CACHE_SUFFIX
+from bookkeeper.models.sqlalchemy_models import ExpenseTable, BudgetTable
+from bookkeeper.repository.category_tree import commit_category_tree
+from bookkeeper.repository.csv_import import CSV_COLUMNS, parse_date, parse_amount, \
+    import_csv
+from bookkeeper.repository.engine import PROFILES, create_bookkeeper_engine
+from bookkeeper.repository.export import EXPORT_COLUMNS, FORMATS, export_expenses
+from bookkeeper.repository.migrations import prepare_database
+from bookkeeper.repository.snapshot import write_snapshot
+from bookkeeper.repository.my_orm import unit_of_work, bulk_insert_values, update_by_pk, \
+    get_category_pk_by_name, get_categories
+from bookkeeper.repository.periods import get_budget_summary, \
+    get_period_expenses_by_cat, period_window
+from bookkeeper.utils import read_tree, read_categories, budget_data_transform
+
+DATE_FORMAT = '%d-%m-%Y %H:%M'
+PERIODS = ("day", "week", "month")
+# Формат начала периода гистограммы stats
+PERIOD_FORMATS = {"day": "%Y-%m-%d", "week": "%Y-%m-%d", "month": "%Y-%m"}
+
+
+def _category_pk(name: str, session_factory: sessionmaker[Session]) -> int:
+    """
+    id категории по названию. ValueError, если категории нет
+    """
+    try:
+        return get_category_pk_by_name(name, session_factory)
+    except KeyError:
+        raise ValueError(f"Unknown category {name}") from None
+
+
+def add_expense(expense_date: datetime, amount: float, category: str, comment: str,
+                session_factory: sessionmaker[Session]) -> int:
+    """
+    Добавить расход
+    Attributes:
+    -----------
+    expense_date: datetime
+        Дата расхода
+    amount: float
+        Сумма
+    category: str
+        Название категории
+    comment: str
+        Комментарий
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        int - id нового расхода
+    """
+    with unit_of_work(session_factory):
+        values = {
+            "expense_date": expense_date,
+            "amount": amount,
+            "cat_id": _category_pk(category, session_factory),
+            "comment": comment,
+        }
+        return bulk_insert_values(ExpenseTable, [values], session_factory)[0]
+
+
+def set_budget(budget: dict[str, float], session_factory: sessionmaker[Session]) -> None:
+    """
+    Задать бюджет на периоды
+    Attributes:
+    -----------
+    budget: dict[str, float]
+        {период (day, week, month): бюджет}
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        None
+    """
+    with unit_of_work(session_factory):
+        for row in get_budget_summary(session_factory):
+            if row.period in budget:
+                update_by_pk(BudgetTable, row.id, {"budget": budget[row.period]},
+                             session_factory)
+
+
+def _run_add(args: argparse.Namespace, session_factory: sessionmaker[Session]) -> None:
+    """
+    Добавить расход
+    """
+    pk = add_expense(args.date or datetime.now(), args.amount, args.category,
+                     args.comment, session_factory)
+    print(f"added expense {pk}")
+
+
+def _run_import(args: argparse.Namespace,
+                session_factory: sessionmaker[Session]) -> None:
+    """
+    Импортировать расходы из CSV-файла, отклонённые строки вывести в stderr
+    или в файл args.rejects
+    """
+    with open(args.file, encoding="utf-8", newline="") as file:
+        if args.strict:
+            with unit_of_work(session_factory):
+                result = import_csv(file, session_factory, args.chunk_size,
+                                    args.workers, strict=True)
+        else:
+            result = import_csv(file, session_factory, args.chunk_size, args.workers)
+    if result.rejects:
+        with open(args.rejects, "w", encoding="utf-8", newline="") \
+                if args.rejects else nullcontext(sys.stderr) as out:
+            writer = csv.writer(out, lineterminator="\n")
+            writer.writerow(("line", "error"))
+            writer.writerows(result.rejects)
+    print(f"imported {result.imported} rows, rejected {len(result.rejects)}")
+
+
+def _run_export(args: argparse.Namespace,
+                session_factory: sessionmaker[Session]) -> None:
+    """
+    Выгрузить расходы в CSV-файл или в stdout
+    """
+    try:
+        count = export_expenses(args.file, session_factory, args.format, args.columns,
+                                args.start, args.end, args.category)
+    finally:
+        if args.file is not sys.stdout:
+            args.file.close()
+    print(f"exported {count} rows", file=sys.stderr)
+
+
+def _run_summary(_: argparse.Namespace,
+                 session_factory: sessionmaker[Session]) -> None:
+    """
+    Вывести бюджет и расходы за день, неделю и месяц
+    """
+    rows = get_budget_summary(session_factory)
+    print(f"{'period':<8} {'budget':>12} {'spent':>12} {'left':>12}")
+    for row, (budget, spent, left) in zip(rows, budget_data_transform(rows)):
+        print(f"{row.period:<8} {budget:>12.2f} {spent:>12.2f} {left:>12.2f}")
+
+
+def _run_by_category(args: argparse.Namespace,
+                     session_factory: sessionmaker[Session]) -> None:
+    """
+    Вывести расходы по категориям за период, по убыванию суммы
+    """
+    start, end = period_window(args.period)
+    rows = [tuple(row) for row in get_period_expenses_by_cat(
+        args.start or start, args.end or end, session_factory)]
+    for name, total in sorted(rows, key=lambda row: -row[1]):
+        print(f"{name:<30} {total:>12.2f}")
+
+
+def _analytics() -> ModuleType:
+    """
+    Модуль аналитики. ImportError с подсказкой, если numpy не установлен
+    """
+    try:
+        return importlib.import_module("bookkeeper.repository.analytics")
+    except ImportError as error:
+        raise ImportError("Expense statistics need numpy: "
+                          "pip install 'pybookkeeper[analytics]'") from error
+
+
+def column_cache_path(dsn: str) -> Optional[str]:
+    """
+    Файл-кэш столбцов аналитики рядом с файлом БД SQLite
+    (None - БД в памяти или не SQLite)
+    """
+    url = make_url(dsn)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return f"{url.database}{COLUMN_CACHE_SUFFIX}"
+
+
+def _run_stats(args: argparse.Namespace,
+               session_factory: sessionmaker[Session]) -> None:
+    """
+    Вывести сумму расходов за период, суммы по категориям (по убыванию)
+    и по дням, неделям или месяцам. Считается аналитикой на массивах NumPy:
+    столбцы отображаются из файла-кэша рядом с БД, из БД дочитываются
+    только изменения после его записи, обновлённый кэш сохраняется
+    """
+    cache_path = None if args.no_column_cache else column_cache_path(args.dsn)
+    analytics = _analytics().get_analytics(session_factory, cache_path)
+    names = {category.id: category.name for category in get_categories(session_factory)}
+    print(f"{'total':<30} {analytics.total(args.start, args.end):>12.2f}")
+    by_category = analytics.by_category(args.start, args.end)
+    for cat_id, total in sorted(by_category.items(), key=lambda item: -item[1]):
+        print(f"{names.get(cat_id, str(cat_id)):<30} {total:>12.2f}")
+    histogram = analytics.histogram(args.start, args.end, args.freq)
+    for period, total in zip(histogram.periods, histogram.totals.tolist()):
+        print(f"{period.strftime(PERIOD_FORMATS[args.freq]):<30} {total:>12.2f}")
+
+
+def _rename(text: str) -> tuple[str, str]:
+    """
+    Переименование категории OLD=NEW
+    """
+    old_name, sep, new_name = text.partition("=")
+    if not sep or not old_name.strip() or not new_name.strip():
+        raise ValueError(f"Rename {text} should be OLD=NEW")
+    return old_name.strip(), new_name.strip()
+
+
+def _run_categories(args: argparse.Namespace,
+                    session_factory: sessionmaker[Session]) -> None:
+    """
+    Вывести дерево категорий или заменить его деревом из файла
+    """
+    if args.file is None:
+        print(read_categories(get_categories(session_factory)), end="")
+        return
+    with args.file:
+        tree = read_tree(args.file)
+    diff = commit_category_tree(tree, session_factory, dict(args.rename))
+    print(f"{len(diff.inserts)} added, {len(diff.renames)} renamed, "
+          f"{len(diff.reparents)} moved, {len(diff.deletes)} deleted")
+
+
+def _run_snapshot(args: argparse.Namespace,
+                  session_factory: sessionmaker[Session]) -> None:
+    """
+    Записать снимок расходов в Parquet
+    """
+    result = write_snapshot(args.directory, session_factory, args.incremental,
+                            args.row_group_size)
+    print(f"{result.part or 'no new part'}: {result.rows} rows, "
+          f"watermark {result.watermark}")
+
+
+def _run_budget(args: argparse.Namespace,
+                session_factory: sessionmaker[Session]) -> None:
+    """
+    Задать бюджет и вывести сводку
+    """
+    set_budget({period: getattr(args, period) for period in PERIODS
+                if getattr(args, period) is not None}, session_factory)
+    _run_summary(args, session_factory)
+
+
+def _stats_arguments(stats: argparse.ArgumentParser) -> None:
+    """
+    Аргументы команды stats
+    """
+    stats.add_argument("--start", type=parse_date, default=None)
+    stats.add_argument("--end", type=parse_date, default=None)
+    stats.add_argument("--freq", choices=PERIODS, default="month")
+    stats.add_argument("--no-column-cache", action="store_true",
+                       help=f"do not map or write <database>{COLUMN_CACHE_SUFFIX}")
+    stats.set_defaults(run=_run_stats)
+
+
+def _parser() -> argparse.ArgumentParser:
+    """
+    Разбор аргументов командной строки
+    """
+    parser = argparse.ArgumentParser(prog="bookkeeper",
+                                     description="bookkeeper without GUI")
+    parser.add_argument("--dsn", default=DSN)
+    parser.add_argument("--storage-profile", choices=PROFILES, default=None,
+                        help="SQLite settings, default from "
+                             "BOOKKEEPER_STORAGE_PROFILE or the config")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="add an expense")
+    add.add_argument("amount", type=parse_amount)
+    add.add_argument("category")
+    add.add_argument("--date", type=parse_date, default=None,
+                     help=f"{DATE_FORMAT.replace('%', '%%')} or ISO, default now")
+    add.add_argument("--comment", default="")
+    add.set_defaults(run=_run_add)
+
+    import_ = commands.add_parser("import", help="import expenses from CSV")
+    import_.add_argument("file")
+    import_.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE)
+    import_.add_argument("--workers", type=int, default=0,
+                         help="processes for parsing rows, 0 - parse in place")
+    import_.add_argument("--strict", action="store_true",
+                         help="stop at the first bad row and import nothing")
+    import_.add_argument("--rejects", default=None,
+                         help="write rejected rows to this CSV instead of stderr")
+    import_.set_defaults(run=_run_import)
+
+    export = commands.add_parser("export", help="export expenses to CSV or JSONL")
+    export.add_argument("file", nargs="?", default="-",
+                        type=argparse.FileType("w", encoding="utf-8"))
+    export.add_argument("--format", choices=FORMATS, default="csv")
+    export.add_argument("--columns", type=lambda text: text.split(","),
+                        default=CSV_COLUMNS,
+                        help=f"comma separated, from {', '.join(EXPORT_COLUMNS)}")
+    export.add_argument("--start", type=parse_date, default=None)
+    export.add_argument("--end", type=parse_date, default=None)
+    export.add_argument("--category", default=None,
+                        help="export only this category and its subcategories")
+    export.set_defaults(run=_run_export)
+
+    summary = commands.add_parser("summary", help="budget and expenses per period")
+    summary.set_defaults(run=_run_summary)
+
+    by_cat = commands.add_parser("by-cat", help="expenses by category")
+    by_cat.add_argument("--period", choices=PERIODS, default="month")
+    by_cat.add_argument("--start", type=parse_date, default=None)
+    by_cat.add_argument("--end", type=parse_date, default=None)
+    by_cat.set_defaults(run=_run_by_category)
+
+    _stats_arguments(commands.add_parser(
+        "stats", help="expense totals by category and period (needs numpy)"))
+
+    categories = commands.add_parser(
+        "categories", help="print the category tree or replace it from a file")
+    categories.add_argument("file", nargs="?", default=None,
+                            type=argparse.FileType("r", encoding="utf-8"))
+    categories.add_argument("--rename", type=_rename, action="append", default=[],
+                            metavar="OLD=NEW",
+                            help="keep the id and expenses of a renamed category")
+    categories.set_defaults(run=_run_categories)
+
+    snapshot = commands.add_parser("snapshot",
+                                   help="write a Parquet snapshot (needs pyarrow)")
+    snapshot.add_argument("directory")
+    snapshot.add_argument("--incremental", action="store_true",
+                          help="append expenses changed since the last snapshot")
+    snapshot.add_argument("--row-group-size", type=int, default=BULK_CHUNK_SIZE)
+    snapshot.set_defaults(run=_run_snapshot)
+
+    budget = commands.add_parser("budget", help="set budgets")
+    for period in PERIODS:
+        budget.add_argument(f"--{period}", type=parse_amount, default=None)
+    budget.set_defaults(run=_run_budget)
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Точка входа командной строки
+    """
+    args = _parser().parse_args(argv)
+    try:
+        engine = create_bookkeeper_engine(args.dsn, args.storage_profile)
+    except ValueError as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    session_factory = sessionmaker(engine)
+    try:
+        prepare_database(engine, session_factory)
+        args.run(args, session_factory)
+    except (ValueError, IndentationError, OSError, ImportError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    finally:
+        engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,4 +3,18 @@
 """
 DSN = 'sqlite:///sqlalchemy_db.db'
 DSN_TEST = 'sqlite:///sqlalchemy_test_db.db'
+# Профиль хранения SQLite (см. repository.engine.PROFILES), переопределяется
+# переменной окружения BOOKKEEPER_STORAGE_PROFILE
+STORAGE_PROFILE = 'interactive'
+# Файл-кэш столбцов аналитики рядом с файлом БД: путь к БД + COLUMN_CACHE_SUFFIX
+# (см. repository.column_cache, команда bookkeeper stats)
+COLUMN_CACHE_SUFFIX = '.columns'
 NOT_STATED_NAME = 'Not stated'
+BULK_CHUNK_SIZE = 10000
+# Наибольшее число результатов в кэше агрегатов (repository.aggregate_cache)
+AGGREGATE_CACHE_SIZE = 64
+# Сколько последних изменений расходов хранит журнал expense_changes
+# (см. repository.sync.prune_change_log)
+CHANGE_LOG_SIZE = 100000
+# Период проверки изменений БД другими процессами в приложении, мс
+SYNC_INTERVAL = 2000
@@ -0,0 +1,179 @@
+"""
+Модуль фонового выполнения запросов к БД.
+Все обращения к репозиторию из GUI выполняются в отдельном потоке,
+результаты передаются обработчикам в потоке GUI.
+"""
+from __future__ import annotations
+# pylint: disable = no-name-in-module
+
+from queue import SimpleQueue
+from threading import Thread
+from typing import Any, Callable, Hashable, Optional, TYPE_CHECKING
+
+from PySide6.QtCore import QCoreApplication, QEventLoop, QObject, Qt, Signal
+
+from bookkeeper.repository.my_orm import unit_of_work
+
+if TYPE_CHECKING:
+    from sqlalchemy.orm import sessionmaker, Session
+
+
+class DbJob:
+    """
+    Задание для потока БД
+    Attributes:
+    -----------
+    func: Callable[[], Any]
+        Функция, выполняемая в потоке БД в одной транзакции
+    on_done: Optional[Callable[[Any], None]]
+        Вызывается в потоке GUI с результатом func
+    on_error: Optional[Callable[[Exception], None]]
+        Вызывается в потоке GUI, если func выбросила исключение
+    key: Optional[Hashable]
+        Ключ отмены: новое задание с тем же ключом отменяет предыдущее
+    cancelled: bool
+        Задание отменено: оно не выполняется, если ещё не начато,
+        и его результат не доставляется
+    """
+
+    def __init__(self, func: Callable[[], Any],
+                 on_done: Optional[Callable[[Any], None]],
+                 on_error: Optional[Callable[[Exception], None]],
+                 key: Optional[Hashable]) -> None:
+        self.func = func
+        self.on_done = on_done
+        self.on_error = on_error
+        self.key = key
+        self.cancelled = False
+        self.result: Any = None
+        self.error: Optional[Exception] = None
+
+
+class DbWorker(QObject):
+    """
+    Выполнение запросов к БД вне потока GUI.
+    Задания выполняются одним потоком строго в порядке submit, поэтому
+    запись, отправленная раньше чтения, всегда видна этому чтению.
+    Каждое задание выполняется в своей транзакции (unit_of_work).
+    Поток БД передаёт выполненное задание сигналом _finished: очередное
+    соединение вызывает _deliver в потоке GUI, когда до него дойдёт цикл
+    событий. Обработчики результатов вызываются в порядке submit.
+    Задания с ключом можно отменять: новое задание с тем же ключом
+    отменяет предыдущее, если его результат ещё не доставлен.
+    Записи отправляются без ключа и не отменяются
+
+    Сигналы:
+        failed - ошибка задания, у которого нет on_error
+    """
+
+    failed = Signal(object)
+    # Задание выполнено или снято с очереди отменённым (из потока БД)
+    _finished = Signal(object)
+
+    def __init__(self, session_factory: sessionmaker[Session]) -> None:
+        """
+        Attributes:
+        -----------
+        session_factory:  sessionmaker[Session]
+            Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+        """
+        super().__init__()
+        self.session_factory = session_factory
+        self._jobs: "SimpleQueue[Optional[DbJob]]" = SimpleQueue()
+        self._latest: dict[Hashable, DbJob] = {}
+        self._pending = 0
+        self._finished.connect(self._deliver, Qt.ConnectionType.QueuedConnection)
+        self._thread = Thread(target=self._run, name="bookkeeper-db", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        """
+        Цикл потока БД. Завершается, получив None.
+        Отменённые задания не выполняются, но тоже передаются в поток GUI
+        """
+        while (job := self._jobs.get()) is not None:
+            if not job.cancelled:
+                try:
+                    with unit_of_work(self.session_factory):
+                        job.result = job.func()
+                except Exception as error:  # pylint: disable=broad-exception-caught
+                    job.error = error
+            self._finished.emit(job)
+
+    def submit(self, func: Callable[[], Any],
+               on_done: Optional[Callable[[Any], None]] = None,
+               key: Optional[Hashable] = None,
+               on_error: Optional[Callable[[Exception], None]] = None) -> DbJob:
+        """
+        Поставить задание в очередь
+        Attributes:
+        -----------
+        func: Callable[[], Any]
+            Функция, выполняемая в потоке БД
+        on_done: Optional[Callable[[Any], None]]
+            Обработчик результата, вызывается в потоке GUI
+        key: Optional[Hashable]
+            Ключ отмены устаревших заданий
+        on_error: Optional[Callable[[Exception], None]]
+            Обработчик ошибки, вызывается в потоке GUI
+
+        Returns:
+        --------
+            DbJob
+        """
+        job = DbJob(func, on_done, on_error, key)
+        if key is not None:
+            self.cancel(key)
+            self._latest[key] = job
+        self._pending += 1
+        self._jobs.put(job)
+        return job
+
+    def cancel(self, key: Hashable) -> None:
+        """
+        Отменить задание с ключом key, если его результат ещё не доставлен
+        """
+        job = self._latest.pop(key, None)
+        if job is not None:
+            job.cancelled = True
+
+    def pending(self) -> int:
+        """
+        Количество заданий, результат которых ещё не доставлен
+        (включая отменённые, ещё не снятые с очереди)
+        """
+        return self._pending
+
+    def wait(self) -> None:
+        """
+        Дождаться выполнения всех заданий, в том числе поставленных
+        обработчиками результатов, и передать результаты обработчикам.
+        Пока задания выполняются, обрабатываются события потока GUI
+        """
+        while self._pending:
+            QCoreApplication.processEvents(
+                QEventLoop.ProcessEventsFlag.WaitForMoreEvents)
+
+    def _deliver(self, job: DbJob) -> None:
+        """
+        Передать результат задания обработчику
+        """
+        self._pending -= 1
+        if job.key is not None and self._latest.get(job.key) is job:
+            del self._latest[job.key]
+        if job.cancelled:
+            return
+        if job.error is not None:
+            if job.on_error is not None:
+                job.on_error(job.error)
+            else:
+                self.failed.emit(job.error)
+        elif job.on_done is not None:
+            job.on_done(job.result)
+
+    def stop(self) -> None:
+        """
+        Выполнить уже поставленные задания и остановить поток БД
+        """
+        self._jobs.put(None)
+        self._thread.join()
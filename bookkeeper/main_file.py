@@ -3,41 +3,35 @@
 """
 # pylint: disable = no-name-in-module
 
+import logging
 import sys
-import os
 
 from PySide6.QtWidgets import QApplication
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from bookkeeper.models.sqlalchemy_models import BudgetTable
 from bookkeeper.presenter import Presenter
 from bookkeeper.config import DSN
-from bookkeeper.repository.my_orm import create_tables, insert_values
+from bookkeeper.db_worker import DbWorker
+from bookkeeper.repository.engine import create_bookkeeper_engine
+from bookkeeper.repository.migrations import prepare_database
+from bookkeeper.repository.sync import get_change_tracker
+from bookkeeper.startup import StartupMetrics
 
 if __name__ == "__main__":
+    metrics = StartupMetrics()
+    logging.basicConfig(level=logging.INFO, format="%(name)s: %(message)s")
     app = QApplication(sys.argv)
-    engine = create_engine(DSN)
+    engine = create_bookkeeper_engine(DSN)
     session_factory = sessionmaker(engine)
-    if not os.path.exists("sqlalchemy_db.db"):
-        create_tables(engine)
-        insert_values(BudgetTable, {
-            "period": "day",
-            "amount": 0,
-            "budget": 0
-        }, session_factory)
-        insert_values(BudgetTable, {
-            "period": "week",
-            "amount": 0,
-            "budget": 0
-        }, session_factory)
-        insert_values(BudgetTable, {
-            "period": "month",
-            "amount": 0,
-            "budget": 0
-        }, session_factory)
-    presenter: Presenter = Presenter(session_factory)
+    worker = DbWorker(session_factory)
+    # Первое задание потока БД: все следующие запросы видят готовую схему
+    worker.submit(lambda: prepare_database(engine, session_factory))
+    # Отметка журнала изменений - до загрузки кэшей (см. repository.sync)
+    worker.submit(lambda: get_change_tracker(session_factory))
+    presenter: Presenter = Presenter(session_factory, worker, metrics)
     presenter.main_window.show()
     app.exec()
+    worker.wait()
+    worker.stop()
 else:
     pass
@@ -5,11 +5,102 @@
 # pylint: disable=unnecessary-pass
 # pylint: disable=not-callable
 
-from datetime import datetime
-from typing import Annotated, TypeVar
+import math
+from datetime import datetime, date, timedelta, timezone
+from typing import Annotated, Any, Callable, Optional, TypeVar, Union
 
 from sqlalchemy.orm import Mapped, mapped_column, DeclarativeBase
-from sqlalchemy import func, ForeignKey
+from sqlalchemy import func, ForeignKey, Index, DDL, event, BigInteger, Date, \
+    TypeDecorator, literal_column
+from sqlalchemy.engine.interfaces import Dialect
+
+EPOCH = datetime(1970, 1, 1)
+SECOND = timedelta(seconds=1)
+# Копеек в единице валюты
+CENTS = 100
+# Наибольшая сумма по модулю: число копеек точно представимо во float
+# (меньше 2 ** 53), суммы тысяч расходов помещаются в INTEGER SQLite
+MAX_AMOUNT = 10 ** 13
+
+
+def _from_cents(value: Optional[int]) -> Optional[float]:
+    return None if value is None else value / CENTS
+
+
+def _from_epoch(value: Optional[int]) -> Optional[datetime]:
+    return None if value is None else EPOCH + timedelta(seconds=value)
+
+
+class Cents(TypeDecorator[float]):
+    """
+    Денежная сумма: целое число копеек в БД, float в приложении.
+    Суммы с точностью до копейки преобразуются без потерь, суммирование
+    в SQL выполняется над целыми числами без ошибки округления.
+    ValueError для сумм больше MAX_AMOUNT по модулю и не конечных
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value: Union[float, str, None],
+                           dialect: Dialect) -> Optional[int]:
+        if value is None:
+            return None
+        amount = float(value)
+        if not math.isfinite(amount) or abs(amount) > MAX_AMOUNT:
+            raise ValueError(f"Amount {value} is out of range")
+        return round(amount * CENTS)
+
+    def process_literal_param(self, value: Union[float, str, None],
+                              dialect: Dialect) -> str:
+        return str(self.process_bind_param(value, dialect))
+
+    def process_result_value(self, value: Optional[int],
+                             dialect: Dialect) -> Optional[float]:
+        return _from_cents(value)
+
+    def result_processor(self, dialect: Dialect, coltype: object
+                         ) -> Callable[[Optional[int]], Optional[float]]:
+        # Без обёртки TypeDecorator: функция вызывается для каждой строки
+        return _from_cents
+
+    @property
+    def python_type(self) -> type[Any]:
+        return float
+
+
+class EpochSeconds(TypeDecorator[datetime]):
+    """
+    Дата и время: целое число секунд от начала эпохи в БД (без часового
+    пояса, как и datetime приложения), datetime в приложении.
+    Доли секунды отбрасываются, datetime с часовым поясом приводится к UTC
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[datetime],
+                           dialect: Dialect) -> Optional[int]:
+        if value is None:
+            return None
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return (value - EPOCH) // SECOND
+
+    def process_literal_param(self, value: Optional[datetime],
+                              dialect: Dialect) -> str:
+        return str(self.process_bind_param(value, dialect))
+
+    def process_result_value(self, value: Optional[int],
+                             dialect: Dialect) -> Optional[datetime]:
+        return _from_epoch(value)
+
+    def result_processor(self, dialect: Dialect, coltype: object
+                         ) -> Callable[[Optional[int]], Optional[datetime]]:
+        return _from_epoch
+
+    @property
+    def python_type(self) -> type[Any]:
+        return datetime
+
 
 pk = Annotated[int, mapped_column(primary_key=True)]
 CreatedAt = Annotated[datetime, mapped_column(server_default=func.now())]
@@ -42,7 +133,7 @@ class CategoryTable(Base):
     __tablename__ = "category_table"
 
     id: Mapped[pk]
-    name: Mapped[Str50]
+    name: Mapped[Str50] = mapped_column(index=True)
     parent: Mapped[int] = mapped_column(nullable=True)
 
 
@@ -54,25 +145,39 @@ class ExpenseTable(Base):
     id: pk
         Primary Key
     expanse_date: datetime.datetime
-        Дата покупки
+        Дата покупки (в БД - секунды от начала эпохи, см. EpochSeconds)
     cat_id: int
         Primary Key таблицы категории расходов
     amount: float
-        Сумма покупки
+        Сумма покупки (в БД - копейки, см. Cents)
     added_at: UpdatedAt
         Дата добавления строки в БД
     updated_at: CreatedAt
         Дата обновления строки в БД
+
+    Индексы:
+        ix_expense_date_cat_amount - покрывающий индекс для сумм за период
+            (в том числе по категориям)
+        ix_expense_cat_date - расходы категории за период, поиск по cat_id
+        ix_expense_date - постраничное чтение в порядке (expense_date, id)
+        ix_expense_updated_at - расходы, изменённые после отметки
+            (сверка файла-кэша аналитики)
     """
     __tablename__ = "expense_table"
+    __table_args__ = (
+        Index("ix_expense_date_cat_amount", "expense_date", "cat_id", "amount"),
+        Index("ix_expense_cat_date", "cat_id", "expense_date"),
+        Index("ix_expense_date", "expense_date"),
+        Index("ix_expense_updated_at", "updated_at"),
+    )
 
     id: Mapped[pk]
-    expense_date: Mapped[datetime]
+    expense_date: Mapped[datetime] = mapped_column(EpochSeconds)
     cat_id: Mapped[int] = mapped_column(
         ForeignKey("category_table.id", ondelete="CASCADE")
     )
 
-    amount: Mapped[float]
+    amount: Mapped[float] = mapped_column(Cents)
     comment: Mapped[Str200]
     added_at: Mapped[CreatedAt]
     updated_at: Mapped[UpdatedAt]
@@ -87,8 +192,11 @@ class BudgetTable(Base):
         Primary Key
     period: Str50
         Период
-    amount: float
+    budget: float
         Лимит расходов за период
+    amount: float
+        Сумма расходов за период. Не обновляется приложением:
+        актуальные суммы считает get_budget_summary
     """
 
     __tablename__ = "budget"
@@ -97,3 +205,117 @@ class BudgetTable(Base):
     period: Mapped[Str50]
     budget: Mapped[float]
     amount: Mapped[float]
+
+
+class DailyCategoryTotals(Base):
+    """
+    Свёртка расходов по дням и категориям.
+    Заполняется триггерами на expense_table (см. ROLLUP_TRIGGERS),
+    пересобирается функцией bookkeeper.repository.rollup.rebuild_daily_totals
+    Attributes:
+    ----------
+    day: datetime.date
+        День
+    cat_id: int
+        Primary Key категории
+    total: float
+        Сумма расходов категории за день (в БД - копейки, см. Cents)
+    count: int
+        Количество расходов категории за день
+    """
+
+    __tablename__ = "daily_category_totals"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    day: Mapped[date] = mapped_column(primary_key=True)
+    cat_id: Mapped[int] = mapped_column(primary_key=True)
+    total: Mapped[float] = mapped_column(Cents)
+    count: Mapped[int]
+
+
+class ExpenseChange(Base):
+    """
+    Журнал изменений расходов. Заполняется триггерами на expense_table
+    (см. CHANGE_LOG_TRIGGERS) при любой записи, в том числе другим процессом,
+    и читается функциями bookkeeper.repository.sync
+    Attributes:
+    ----------
+    seq: int
+        Номер изменения. AUTOINCREMENT: номера растут и не используются
+        повторно после очистки журнала
+    expense_id: int
+        Primary Key изменённого расхода
+    deleted: bool
+        Расход удалён (запись-надгробие)
+    old_date: Optional[datetime.datetime]
+        Дата расхода до изменения (None - расход вставлен)
+    """
+
+    __tablename__ = "expense_changes"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq: Mapped[int] = mapped_column(primary_key=True)
+    expense_id: Mapped[int]
+    deleted: Mapped[bool]
+    old_date: Mapped[Optional[datetime]] = mapped_column(EpochSeconds, nullable=True)
+
+
+# День расхода (дата в формате YYYY-MM-DD, как DailyCategoryTotals.day)
+EXPENSE_DAY = func.date(ExpenseTable.expense_date, literal_column("'unixepoch'"),
+                        type_=Date)
+
+_ADD_TOTALS = """
+    INSERT INTO daily_category_totals (day, cat_id, total, count)
+    VALUES ({new_day}, NEW.cat_id, NEW.amount, 1)
+    ON CONFLICT (day, cat_id) DO UPDATE
+    SET total = total + excluded.total, count = count + 1;
+"""
+_SUBTRACT_TOTALS = """
+    UPDATE daily_category_totals
+    SET total = total - OLD.amount, count = count - 1
+    WHERE day = {old_day} AND cat_id = OLD.cat_id;
+    DELETE FROM daily_category_totals
+    WHERE day = {old_day} AND cat_id = OLD.cat_id AND count = 0;
+"""
+
+
+def rollup_triggers(day: str) -> list[str]:
+    """
+    Триггеры свёртки daily_category_totals на expense_table.
+    day - SQL-выражение дня расхода строки {row} (NEW или OLD)
+    """
+    add = _ADD_TOTALS.format(new_day=day.format(row="NEW"))
+    subtract = _SUBTRACT_TOTALS.format(old_day=day.format(row="OLD"))
+    return [
+        "CREATE TRIGGER IF NOT EXISTS expense_insert_totals "
+        "AFTER INSERT ON expense_table "
+        f"BEGIN {add} END",
+        "CREATE TRIGGER IF NOT EXISTS expense_delete_totals "
+        "AFTER DELETE ON expense_table "
+        f"BEGIN {subtract} END",
+        "CREATE TRIGGER IF NOT EXISTS expense_update_totals "
+        "AFTER UPDATE OF expense_date, cat_id, amount ON expense_table "
+        f"BEGIN {subtract} {add} END",
+    ]
+
+
+ROLLUP_TRIGGERS = rollup_triggers("date({row}.expense_date, 'unixepoch')")
+
+CHANGE_LOG_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS expense_insert_log "
+    "AFTER INSERT ON expense_table BEGIN "
+    "INSERT INTO expense_changes (expense_id, deleted, old_date) "
+    "VALUES (NEW.id, 0, NULL); END",
+    "CREATE TRIGGER IF NOT EXISTS expense_update_log "
+    "AFTER UPDATE ON expense_table BEGIN "
+    "INSERT INTO expense_changes (expense_id, deleted, old_date) "
+    "VALUES (NEW.id, 0, OLD.expense_date); END",
+    "CREATE TRIGGER IF NOT EXISTS expense_delete_log "
+    "AFTER DELETE ON expense_table BEGIN "
+    "INSERT INTO expense_changes (expense_id, deleted, old_date) "
+    "VALUES (OLD.id, 1, OLD.expense_date); END",
+]
+
+for _trigger in ROLLUP_TRIGGERS + CHANGE_LOG_TRIGGERS:
+    event.listen(Base.metadata, "after_create",
+                 DDL(_trigger).execute_if(dialect="sqlite"))
@@ -4,25 +4,150 @@
 from __future__ import annotations
 # pylint: disable = no-name-in-module
 
-from typing import List, Union, Any, Sequence
+import logging
+from typing import List, Union, Any, Sequence, Optional, Callable, Iterable, \
+    NamedTuple, TYPE_CHECKING
 from datetime import datetime
 
-from PySide6.QtWidgets import QMenu, QMessageBox, QHeaderView
-from PySide6.QtCore import Qt, QModelIndex
+from PySide6.QtWidgets import QMenu, QMessageBox, QHeaderView, QWidget, QApplication
+from PySide6.QtCore import Qt, QModelIndex, QPersistentModelIndex, QObject, QEvent, \
+    QTimer
 from PySide6.QtGui import QCursor
-from sqlalchemy import Row
-from sqlalchemy.orm import sessionmaker, Session
-
-from bookkeeper.view.app_interface import MainWindow, ExpenseTableModel
+from bookkeeper.view.app_interface import MainWindow, ExpenseTableModel, \
+    ExpenseKey, ExpenseRows
 from bookkeeper.view.app_interface import BudgetModel, CatExpenseModel
-from bookkeeper.utils import read_tree, budget_data_transform
-from bookkeeper.config import NOT_STATED_NAME
+from bookkeeper.utils import read_tree, read_categories, budget_data_transform
+from bookkeeper.db_worker import DbWorker
+from bookkeeper.startup import StartupMetrics
+
+from bookkeeper.repository.my_orm import get_category_pk_by_name, bulk_insert_values, \
+    update_by_pk, delete_by_pks, get_categories
+from bookkeeper.repository.periods import get_month_expenses_by_cat, \
+    get_day_expenses_by_cat, period_window
+from bookkeeper.repository.paging import get_expenses_page, get_expense_row
+from bookkeeper.repository.events import ChangeEvent, subscribe
+from bookkeeper.repository.sync import ExpenseDelta, get_change_tracker, sync_expenses
+from bookkeeper.repository.daily_index import get_indexed_budget_summary
+from bookkeeper.repository.category_tree import commit_category_tree
+from bookkeeper.models.sqlalchemy_models import ExpenseTable, BudgetTable, \
+    CategoryTable, MAX_AMOUNT
+from bookkeeper.config import SYNC_INTERVAL
+
+if TYPE_CHECKING:
+    from sqlalchemy import Row
+    from sqlalchemy.orm import sessionmaker, Session
+    from bookkeeper.repository.daily_index import BudgetSummary
+
+logger = logging.getLogger(__name__)
+
+EXPENSES = ExpenseTable.__tablename__
+# Поля расходов, от которых зависят суммы бюджета (категория - нет)
+BUDGET_COLUMNS = ("expense_date", "amount")
+# Поля расходов, от которых зависят суммы по категориям
+CAT_EXPENSE_COLUMNS = ("expense_date", "amount", "cat_id")
+
+
+class Refresh(NamedTuple):
+    """
+    Данные окна, которые нужно перечитать после изменений
+    Attributes:
+    -----------
+    budget: bool
+        Таблица бюджета (суммы за день, неделю и месяц)
+    cat_expenses: bool
+        Таблица расходов по категориям за показанный период
+    rows: bool
+        Все строки таблицы расходов (изменены названия категорий
+        или неизвестные строки)
+    """
+    budget: bool = False
+    cat_expenses: bool = False
+    rows: bool = False
+
+
+class Summary(NamedTuple):
+    """
+    Данные вкладки Budget, перечитанные после изменений (None - не менялись)
+    Attributes:
+    -----------
+    budget: Optional[Sequence[BudgetSummary]]
+        Данные таблицы бюджета
+    cat_period: str
+        Период таблицы расходов по категориям (day или month)
+    cat_expenses: Optional[Sequence[Row[Any]]]
+        Данные таблицы расходов по категориям
+    rows: bool
+        Нужно ли перечитать строки таблицы расходов
+    """
+    budget: Optional[Sequence[BudgetSummary]]
+    cat_period: str
+    cat_expenses: Optional[Sequence[Row[Any]]]
+    rows: bool
+
 
-from bookkeeper.repository.my_orm import delete_all, get_all, get_by_pk,\
-    get_category_pk_by_name, get_week_expenses, get_month_expenses,\
-    get_month_expenses_by_cat, get_day_expenses_by_cat, get_day_expenses,\
-    get_expenses_data, insert_values, update_by_pk, delete_by_pk
-from bookkeeper.models.sqlalchemy_models import ExpenseTable, BudgetTable, CategoryTable
+def plan_refresh(events: Iterable[ChangeEvent], cat_period: str,
+                 now: Optional[datetime] = None) -> Refresh:
+    """
+    Какие данные окна могли измениться из-за событий events
+    Attributes:
+    -----------
+    events: Iterable[ChangeEvent]
+        События изменений репозитория
+    cat_period: str
+        Период, показанный в таблице расходов по категориям
+    now: Optional[datetime]
+        Текущий момент, по умолчанию datetime.now()
+
+    Returns:
+    --------
+        Refresh
+    """
+    if now is None:
+        now = datetime.now()
+    # Окна периодов заканчиваются не позже конца текущего дня
+    budget_days = (period_window("month", now)[0].date(), now.date())
+    cat_days = (period_window(cat_period, now)[0].date(), now.date())
+    budget = cat_expenses = rows = False
+    for event in events:
+        if event.affects(BudgetTable.__tablename__):
+            budget = True
+        if event.affects(CategoryTable.__tablename__, ("name",)):
+            cat_expenses = rows = True
+        if event.affects(EXPENSES, BUDGET_COLUMNS) and event.affects_days(*budget_days):
+            budget = True
+        if event.affects(EXPENSES, CAT_EXPENSE_COLUMNS) \
+                and event.affects_days(*cat_days):
+            cat_expenses = True
+        if event.affects(EXPENSES) and event.pks is None:
+            rows = True
+    return Refresh(budget, cat_expenses, rows)
+
+
+class FirstPaintFilter(QObject):
+    """
+    Фильтр событий приложения, вызывающий on_paint при первой отрисовке
+    любого виджета окна window. После этого фильтр снимается
+    """
+
+    def __init__(self, window: QWidget, on_paint: Callable[[], None]) -> None:
+        super().__init__(window)
+        self._window = window
+        self._on_paint = on_paint
+        app = QApplication.instance()
+        if app is not None:
+            app.installEventFilter(self)
+
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        """
+        Родительский метод фильтра событий
+        """
+        if event.type() == QEvent.Type.Paint and isinstance(watched, QWidget) \
+                and watched.window() is self._window:
+            app = QApplication.instance()
+            if app is not None:
+                app.removeEventFilter(self)
+            self._on_paint()
+        return False
 
 
 class Presenter:
@@ -33,41 +158,69 @@ class Presenter:
 
     Attributes:
     ----------
-    expense_data:
-        данные в таблице на листе Expenses.
-        Сюда записываются отредактированные пользователем ячейки
+    expense_model:
+        модель таблицы на листе Expenses.
+        Читает расходы из БД страницами, в ней хранятся
+        отредактированные пользователем ячейки
         Затем строки расходов сохранятся в репозиторий
-        Реализован только для возможности редактирования таблицы как в Excel
+    category_data:
+        список категорий, показанный в окне
     main_window:
         окно приложения
     session_factory:
-        !!!!!
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+    worker:
+        поток БД. Действия пользователя выполняют запросы к БД в нём,
+        окно обновляется, когда приходит результат
+    sync_timer:
+        таймер проверки изменений БД другими процессами (см. sync)
     """
 
-    def __init__(self, session_factory: sessionmaker[Session]) -> None:
+    def __init__(self, session_factory: sessionmaker[Session],
+                 worker: Optional[DbWorker] = None,
+                 metrics: Optional[StartupMetrics] = None) -> None:
         """
-        Инициализация
+        Инициализация.
+        Окно создаётся сразу с пустыми таблицами, данные вкладок читаются
+        в потоке БД в порядке важности: первая страница расходов, бюджет,
+        категории, расходы за день по категориям
 
         Attributes:
         -----------
         session_factory:
             Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+        worker:
+            Поток БД. Если не задан, создаётся новый
+        metrics:
+            Замер времени запуска. Если не задан, отсчёт идёт от создания Presenter
 
         Returns:
         --------
             None
         """
         self.session_factory = session_factory
-        self.expense_data = self.expense_data_init()
-        budget_data = self.budget_data_init()
-        data = budget_data_transform(budget_data)
-        self.main_window = MainWindow(self.expense_data, data)
-        self.main_window.category.text_box.setText(
-            read_categories(self.category_data_init())
-        )
-
-        self.main_window.set_line_category(self.category_data_init())
-        self.day_expense_by_cat()
+        self.worker = worker if worker is not None else DbWorker(session_factory)
+        self.worker.failed.connect(self.show_error)
+        self.metrics = metrics if metrics is not None else StartupMetrics()
+        self.category_data: list[CategoryTable] = []
+        # Период таблицы расходов по категориям и события изменений репозитория
+        # с последнего чтения (поступают в потоке БД)
+        self.cat_period = "day"
+        self.changes: list[ChangeEvent] = []
+        subscribe(session_factory, self.changes.append)
+        # Отметка журнала изменений ставится до первого чтения данных окна
+        self.worker.submit(lambda: get_change_tracker(session_factory))
+        self._syncing = False
+
+        self.expense_model = self.expense_data_init()
+        self.expense_model.modelReset.connect(lambda: self.metrics.mark("expenses"))
+        self.main_window = MainWindow(self.expense_model)
+        self.main_window.budget.table_cat_expenses.setModel(CatExpenseModel([['', '']]))
+        self.main_window.category.text_box.setPlaceholderText("Loading categories...")
+        self.set_categories_enabled(False)
+        self._first_paint = FirstPaintFilter(self.main_window,
+                                             lambda: self.metrics.mark("first_paint"))
+        self.metrics.mark("window")
         self.main_window.budget.table_cat_expenses.horizontalHeader(). \
             setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
 
@@ -94,48 +247,79 @@ class Presenter:
             clicked.connect(self.day_expense_by_cat)
         self.main_window.budget.cat_month_expense_button. \
             clicked.connect(self.month_expense_by_cat)
+        self.sync_timer = QTimer(self.main_window)
+        self.sync_timer.setInterval(SYNC_INTERVAL)
+        self.sync_timer.timeout.connect(self.sync)
+        self.sync_timer.start()
+        self.hydrate()
 
-    def expense_data_init(self) -> list[list[str]]:
+    def hydrate(self) -> None:
         """
-        Метод для инициализации данных таблицы расходов(вкладка Expenses)
+        Запрашивает данные вкладок Budget и Category list после создания окна.
+        Когда приходят последние из них, окно готово к работе (interactive)
 
         Returns:
         --------
-            list[list[str]]
+            None
         """
-        data = get_expenses_data(self.session_factory)
-        data_to_expense_table = [[row.id, row.expense_date.strftime("%d-%m-%Y %H:%M"),
-                                  row.amount, row.name, row.comment] for row in data]
+        def show_budget(budget_data: Sequence[BudgetSummary]) -> None:
+            self.show_budget(budget_data)
+            self.metrics.mark("budget")
+
+        def show_categories(category_data: list[CategoryTable]) -> None:
+            self.show_categories(category_data)
+            self.metrics.mark("categories")
+
+        def show_cat_expenses(data: Sequence[Row[Any]]) -> None:
+            self.show_cat_expenses(data, "day")
+            self.metrics.mark("interactive")
 
-        if len(data_to_expense_table) == 0:
-            now = datetime.now().strftime('%d-%m-%Y %H:%M')
-            data_to_expense_table = [
-                ['0', now, '1500', 'food', 'Example!!']
-            ]
-        return data_to_expense_table
+        self.worker.submit(self.budget_data_init, show_budget)
+        self.worker.submit(self.category_data_init, show_categories)
+        self.worker.submit(lambda: get_day_expenses_by_cat(self.session_factory),
+                           show_cat_expenses)
 
-    def budget_data_init(self) -> List[BudgetTable]:
+    def expense_data_init(self) -> ExpenseTableModel:
         """
-        Метод для инициализации данных таблицы бюджета (вкладка Budget)
-        Обновляет поле amount
+        Метод для инициализации модели таблицы расходов(вкладка Expenses)
+        Сразу запрашивается только первая страница расходов
 
         Returns:
         --------
-            List[BudgetTable]
+            ExpenseTableModel
         """
-        day_expenses_new = get_day_expenses(self.session_factory)
-        update_by_pk(BudgetTable, 1, {"amount": day_expenses_new}, self.session_factory)
+        now = datetime.now().strftime('%d-%m-%Y %H:%M')
+        return ExpenseTableModel(
+            self.fetch_expenses_page,
+            example=['0', now, '1500', 'food', 'Example!!']
+        )
 
-        week_expenses_new = get_week_expenses(self.session_factory)
-        update_by_pk(BudgetTable, 2, {"amount": week_expenses_new}, self.session_factory)
+    def fetch_expenses_page(self, after: Optional[ExpenseKey],
+                            until: Optional[ExpenseKey],
+                            limit: Optional[int],
+                            deliver: Callable[[ExpenseRows], None]) -> None:
+        """
+        Прочитать страницу таблицы расходов в потоке БД, см. ExpenseTableModel
+
+        Returns:
+        --------
+            None
+        """
+        self.worker.submit(
+            lambda: get_expenses_page(self.session_factory, after, until, limit),
+            deliver
+        )
 
-        month_expenses_new = get_month_expenses(self.session_factory)
-        update_by_pk(BudgetTable, 3, {"amount": month_expenses_new}, self.session_factory)
+    def budget_data_init(self) -> Sequence[BudgetSummary]:
+        """
+        Метод для инициализации данных таблицы бюджета (вкладка Budget)
+        Расходы за день, неделю и месяц считаются по индексу сумм по дням
 
-        day_budget_new = get_by_pk(BudgetTable, 1, self.session_factory)
-        week_budget_new = get_by_pk(BudgetTable, 2, self.session_factory)
-        month_budget_new = get_by_pk(BudgetTable, 3, self.session_factory)
-        return [day_budget_new, week_budget_new, month_budget_new]
+        Returns:
+        --------
+            Sequence[BudgetSummary]
+        """
+        return get_indexed_budget_summary(self.session_factory)
 
     def category_data_init(self) -> list[CategoryTable]:
         """
@@ -145,8 +329,126 @@ class Presenter:
         --------
             list[CategoryTable]
         """
-        res: list[CategoryTable] = get_all(CategoryTable, self.session_factory)
-        return res
+        return get_categories(self.session_factory)
+
+    def read_summary(self) -> Summary:
+        """
+        Читает данные таблиц бюджета и расходов по категориям, которые могли
+        измениться (по событиям изменений с последнего вызова, см. plan_refresh).
+        Выполняется в потоке БД в конце действий, изменяющих данные
+
+        Returns:
+        --------
+            Summary
+        """
+        events = self.changes[:]
+        del self.changes[:len(events)]
+        period = self.cat_period
+        refresh = plan_refresh(events, period)
+        read_cat_expenses = get_day_expenses_by_cat if period == "day" \
+            else get_month_expenses_by_cat
+        return Summary(
+            self.budget_data_init() if refresh.budget else None, period,
+            read_cat_expenses(self.session_factory) if refresh.cat_expenses else None,
+            refresh.rows)
+
+    def show_summary(self, summary: Summary) -> None:
+        """
+        Показывает данные, прочитанные read_summary
+
+        Returns:
+        --------
+            None
+        """
+        if summary.budget is not None:
+            self.show_budget(summary.budget)
+        if summary.cat_expenses is not None:
+            self.show_cat_expenses(summary.cat_expenses, summary.cat_period)
+        if summary.rows:
+            # Строки таблицы расходов перечитываются только видимые
+            self.expense_model.invalidate_pages()
+
+    def sync(self) -> None:
+        """
+        Дочитывает изменения расходов, сделанные другими процессами
+        (CLI, импорт), и показывает их (см. sync_expenses).
+        Вызывается по таймеру. Пока результат предыдущей проверки
+        не получен, новая не запрашивается
+
+        Returns:
+        --------
+            None
+        """
+        if self._syncing:
+            return
+        self._syncing = True
+
+        def job() -> tuple[ExpenseDelta, Summary]:
+            return sync_expenses(self.session_factory), self.read_summary()
+
+        def done(result: tuple[ExpenseDelta, Summary]) -> None:
+            self._syncing = False
+            delta, summary = result
+            if delta.reload:
+                self.expense_model.reload()
+            elif delta.ids:
+                self.expense_model.apply_changes(delta.rows, delta.old_keys)
+            self.show_summary(summary)
+
+        def failed(error: Exception) -> None:
+            # Фоновая проверка не показывает окно ошибки при каждом срабатывании
+            self._syncing = False
+            logger.warning("sync failed: %s", error)
+
+        self.worker.submit(job, done, on_error=failed)
+
+    def show_budget(self, budget_data: Sequence[BudgetSummary]) -> None:
+        """
+        Передача данных в таблицу бюджета (вкладка Budget)
+
+        Returns:
+        --------
+            None
+        """
+        budget_model = BudgetModel(budget_data_transform(budget_data))
+        self.main_window.budget.table_budget.setModel(budget_model)
+
+    def show_categories(self, category_data: list[CategoryTable]) -> None:
+        """
+        Показывает список категорий во вкладке Category list и
+        в выпадающем списке вкладки Expenses
+
+        Returns:
+        --------
+            None
+        """
+        self.category_data = category_data
+        self.main_window.category.text_box.setText(read_categories(category_data))
+        self.main_window.set_line_category(category_data)
+        self.set_categories_enabled(True)
+
+    def set_categories_enabled(self, enabled: bool) -> None:
+        """
+        Включает кнопки, которым нужен список категорий.
+        Пока категории не загружены, изменить их или добавить расход нельзя
+
+        Returns:
+        --------
+            None
+        """
+        self.main_window.category.edit_button.setEnabled(enabled)
+        self.main_window.category.text_box.setReadOnly(not enabled)
+        self.main_window.expense.add_button.setEnabled(enabled)
+
+    def show_error(self, error: Exception) -> None:
+        """
+        Сообщение об ошибке запроса к БД
+
+        Returns:
+        --------
+            None
+        """
+        QMessageBox.critical(self.main_window, 'Error', str(error))
 
     def day_expense_by_cat(self) -> None:
         """
@@ -158,22 +460,10 @@ class Presenter:
         --------
             None
         """
-        data: Union[Sequence[Row[Any]], List[List[str]]] = get_day_expenses_by_cat(
-            self.session_factory
-        )
-
-        if len(data) == 0:
-            data = [
-                ['No expenses today ', '0']
-            ]
-        model = CatExpenseModel(data)
-        self.main_window.budget.table_cat_expenses.setModel(model)
-
-        self.main_window.budget.cat_day_expense_button.setStyleSheet(
-            'QPushButton {background-color: darkGray; color: black;}'
-        )
-        self.main_window.budget.cat_month_expense_button.setStyleSheet(
-            'QPushButton {background-color: white; color: black;}'
+        self.worker.submit(
+            lambda: get_day_expenses_by_cat(self.session_factory),
+            lambda data: self.show_cat_expenses(data, "day"),
+            key="cat_expenses"
         )
 
     def month_expense_by_cat(self) -> None:
@@ -185,23 +475,52 @@ class Presenter:
         --------
             None
         """
-        data: Union[Sequence[Row[Any]], List[List[str]]] = get_month_expenses_by_cat(
-            self.session_factory
+        self.worker.submit(
+            lambda: get_month_expenses_by_cat(self.session_factory),
+            lambda data: self.show_cat_expenses(data, "month"),
+            key="cat_expenses"
         )
 
-        if len(data) == 0:
-            data = [
-                ['No expenses ', '0']
-            ]
-        model = CatExpenseModel(data)
-        self.main_window.budget.table_cat_expenses.setModel(model)
+    def show_cat_expenses(self,
+                          data: Union[Sequence[Row[Any]], List[List[str]]],
+                          period: str) -> None:
+        """
+        Показывает расходы по категориям за день или месяц (period)
+        в таблице расходы по категориям(вкладка Budget)
 
-        self.main_window.budget.cat_month_expense_button.setStyleSheet(
-            'QPushButton {background-color: darkGray; color: black;}'
-        )
-        self.main_window.budget.cat_day_expense_button.setStyleSheet(
-            'QPushButton {background-color white: green; color: black;}'
-        )
+        Returns:
+        --------
+            None
+        """
+        self.cat_period = period
+        if period == "day":
+            if len(data) == 0:
+                data = [
+                    ['No expenses today ', '0']
+                ]
+            model = CatExpenseModel(data)
+            self.main_window.budget.table_cat_expenses.setModel(model)
+
+            self.main_window.budget.cat_day_expense_button.setStyleSheet(
+                'QPushButton {background-color: darkGray; color: black;}'
+            )
+            self.main_window.budget.cat_month_expense_button.setStyleSheet(
+                'QPushButton {background-color: white; color: black;}'
+            )
+        else:
+            if len(data) == 0:
+                data = [
+                    ['No expenses ', '0']
+                ]
+            model = CatExpenseModel(data)
+            self.main_window.budget.table_cat_expenses.setModel(model)
+
+            self.main_window.budget.cat_month_expense_button.setStyleSheet(
+                'QPushButton {background-color: darkGray; color: black;}'
+            )
+            self.main_window.budget.cat_day_expense_button.setStyleSheet(
+                'QPushButton {background-color white: green; color: black;}'
+            )
 
     def change_budget(self) -> None:
         """
@@ -233,61 +552,22 @@ class Presenter:
             "period": "month",
             "budget": month_budget
         }
-        update_by_pk(BudgetTable, 1, day_budget_update, self.session_factory)
-        update_by_pk(BudgetTable, 2, week_budget_update, self.session_factory)
-        update_by_pk(BudgetTable, 3, month_budget_update, self.session_factory)
-
-        budget_data = self.budget_data_init()
-        data = budget_data_transform(budget_data)
-        budget_model = BudgetModel(data)
-        self.main_window.budget.table_budget.setModel(budget_model)
-        return None
-
-    def update_expense_cat(self, update_cat: dict[int, int],
-                           update_none: list[int]) -> None:
-        """
-        Обновляет id категории в репозитории расходов:
-        У всех расходов с cat_id == old_cat_pk, category меняется на new_cat_pk
 
-        на вход словарь с заменами {old_cat_id: new_cat_id}
-        создаём словарь {old_cat_id: [id]} строчки, которые нужно заменить
-
-        Attributes:
-        -----------
-            update_cat: dict[int, int] - словарь с заменами
-            update_none: list[int] - список категорий, котрые будут None
+        def job() -> Summary:
+            update_by_pk(BudgetTable, 1, day_budget_update, self.session_factory)
+            update_by_pk(BudgetTable, 2, week_budget_update, self.session_factory)
+            update_by_pk(BudgetTable, 3, month_budget_update, self.session_factory)
+            return self.read_summary()
 
-        Returns:
-        --------
-            None
-        """
-        data: list[ExpenseTable] = get_all(ExpenseTable, self.session_factory)
-        for none_id in update_none:
-            for row in data:
-                if row.cat_id == none_id:
-                    values = {
-                        "cat_id": 1
-                    }
-                    update_by_pk(ExpenseTable, row.id, values, self.session_factory)
-
-        update_expense_row: dict[int, Any] = {}
-        for key in update_cat:
-            update_expense_row[key] = []
-            for row in get_all(ExpenseTable, self.session_factory):
-                if row.cat_id == key:
-                    update_expense_row[key].append(row.id)
-
-        for key in update_cat:
-            for expense_id in update_expense_row[key]:
-                values = {
-                    "cat_id": update_cat[key]
-                }
-                update_by_pk(ExpenseTable, expense_id, values, self.session_factory)
+        self.worker.submit(job, self.show_summary)
+        return None
 
     def commit_categories(self) -> None:
         """
         Меняет список категорий:
         Активируется при нажатии кнопки "commit changes" во вкладке Category list
+        В БД записываются только отличия нового дерева от сохранённого,
+        расходы удалённых категорий переносятся в категорию Not stated
 
         Returns:
         --------
@@ -299,50 +579,21 @@ class Presenter:
         have_same_categories = same_categories_check(self.main_window, data)
         if not have_same_categories:
             self.main_window.category.text_box.setText(
-                read_categories(self.category_data_init())
+                read_categories(self.category_data)
             )
             return None
+        tree = read_tree(data)
+
+        def job() -> tuple[list[CategoryTable], Summary]:
+            commit_category_tree(tree, self.session_factory)
+            return self.category_data_init(), self.read_summary()
+
+        def done(result: tuple[list[CategoryTable], Summary]) -> None:
+            self.category_data, summary = result
+            self.main_window.set_line_category(self.category_data)
+            self.show_summary(summary)
 
-        old_data = self.category_data_init()
-        delete_all(CategoryTable, self.session_factory)
-        insert_values(CategoryTable, {"name": NOT_STATED_NAME, "parent": None},
-                      self.session_factory,
-                      )
-
-        for row in read_tree(data):
-            if row[1] is None:
-                insert_values(CategoryTable, {"name": row[0]}, self.session_factory)
-            else:
-                parent_pk = get_category_pk_by_name(row[1],
-                                                    self.session_factory)
-                values = {
-                    "name": row[0],
-                    "parent": parent_pk
-                }
-                insert_values(CategoryTable, values, self.session_factory)
-        update_data: list[CategoryTable] = get_all(CategoryTable, self.session_factory)
-
-        updated_cat_id = {}
-        update_to_none = []
-        for old_cat_row in old_data:
-            has_same = False
-            for new_cat_row in update_data:
-                if new_cat_row.name == 'Not stated':
-                    continue
-                if old_cat_row.name == new_cat_row.name:
-                    has_same = True
-                    updated_cat_id[old_cat_row.id] = new_cat_row.id
-            if not has_same:
-                update_to_none.append(old_cat_row.id)
-
-        self.update_expense_cat(updated_cat_id, update_to_none)
-        self.main_window.set_line_category(self.category_data_init())
-
-        self.expense_data = self.expense_data_init()
-        expense_model = ExpenseTableModel(self.expense_data)
-        self.main_window.expense.expense_table.setModel(expense_model)
-
-        self.day_expense_by_cat()
+        self.worker.submit(job, done)
         return None
 
     def table_menu(self) -> None:
@@ -380,20 +631,29 @@ class Presenter:
             Список индексов из таблицы, которые нужно удалить
         """
         rows = set(index.row() for index in indexes)
-        for row in rows:
-            del_pk = int(self.expense_data[row][0])
-            delete_by_pk(ExpenseTable, del_pk, self.session_factory)
+        # Пока читаются строки и выполняется удаление, строки могут сдвинуться
+        removed = [QPersistentModelIndex(self.expense_model.index(row, 0))
+                   for row in rows]
 
-        self.expense_data = self.expense_data_init()
-        expense_model = ExpenseTableModel(self.expense_data)
-        self.main_window.expense.expense_table.setModel(expense_model)
+        def delete(found: dict[int, Sequence[Any]]) -> None:
+            if not found:
+                return
+            del_pks = [values[0] for values in found.values()]
 
-        budget_data = self.budget_data_init()
-        data = budget_data_transform(budget_data)
-        budget_model = BudgetModel(data)
-        self.main_window.budget.table_budget.setModel(budget_model)
+            def job() -> Summary:
+                delete_by_pks(ExpenseTable, del_pks, self.session_factory)
+                return self.read_summary()
+
+            def done(summary: Summary) -> None:
+                self.expense_model.remove_rows(
+                    [index.row() for index in removed if index.isValid()]
+                )
+                self.show_summary(summary)
 
-        self.day_expense_by_cat()
+            self.worker.submit(job, done)
+
+        # Страницы выделенных строк могут быть вытеснены из памяти модели
+        self.expense_model.fetch_rows(rows, delete)
 
     def update_cell(self,
                     indexes: list[QModelIndex]
@@ -402,41 +662,79 @@ class Presenter:
         Обновление выделенных ячеек.
         Срабатывае при нажатии кнопки "Update cell". См table_menu
         """
+        rows = list(index.row() for index in indexes)
+        columns = list(index.column() for index in indexes)
+        if not self.expense_model.loaded_rows():
+            # Строка-пример
+            check_correct_update(self.main_window, columns[0],
+                                 self.expense_model.row_values(0), self.category_data)
+            return
+        # Строки могут переместиться (при изменении даты), поэтому
+        # запоминаются постоянные индексы
+        persistent = {row: QPersistentModelIndex(self.expense_model.index(row, 0))
+                      for row in set(rows)}
+        self.expense_model.fetch_rows(
+            persistent, lambda found: self._update_rows(found, persistent,
+                                                        zip(rows, columns))
+        )
+
+    def _update_rows(self, found: dict[int, Sequence[Any]],
+                     persistent: dict[int, QPersistentModelIndex],
+                     cells: Iterable[tuple[int, int]]) -> None:
+        """
+        Сохранить правки ячеек cells (строка, столбец) таблицы расходов.
+        found - строки БД выделенных строк таблицы, см. update_cell
+        """
         mapper = {1: "expense_date",
                   2: "amount",
                   3: "cat_id",
                   4: "comment"}
-        rows = list(index.row() for index in indexes)
-        columns = list(index.column() for index in indexes)
-        for row, col in zip(rows, columns):
+        changed = {values[0]: persistent[row] for row, values in found.items()}
+        updates: list[tuple[int, dict[str, Any]]] = []
+        for row, col in cells:
+            if row not in found:
+                continue
             update_values: dict[str, Any] = {}
+            row_values = self.expense_model.display_values(found[row])
             if check_correct_update(
                     self.main_window,
-                    row, col,
-                    self.expense_data,
-                    self.category_data_init()
+                    col,
+                    row_values,
+                    self.category_data
             ):
-                update_values[mapper[col]] = self.expense_data[row][col]
+                update_values[mapper[col]] = row_values[col]
                 if col == 1:
                     update_values[mapper[col]] = datetime.strptime(
-                        self.expense_data[row][col], "%d-%m-%Y %H:%M"
+                        row_values[col], "%d-%m-%Y %H:%M"
                     )
-                if col == 3:
-                    update_values["cat_id"] = int(get_category_pk_by_name(
-                        update_values["cat_id"], self.session_factory))
-                update_pk = int(self.expense_data[row][0])
-                update_by_pk(ExpenseTable, update_pk, update_values, self.session_factory)
-
-        self.expense_data = self.expense_data_init()
-        expense_model = ExpenseTableModel(self.expense_data)
-        self.main_window.expense.expense_table.setModel(expense_model)
-
-        budget_data = self.budget_data_init()
-        data = budget_data_transform(budget_data)
-        budget_model = BudgetModel(data)
-        self.main_window.budget.table_budget.setModel(budget_model)
+                updates.append((found[row][0], update_values))
+        self._save_updates(updates, changed)
 
-        self.day_expense_by_cat()
+    def _save_updates(self, updates: list[tuple[int, dict[str, Any]]],
+                      changed: dict[int, QPersistentModelIndex]) -> None:
+        """
+        Записать правки updates (pk, значения) в БД и обновить строки changed
+        (pk: индекс строки таблицы)
+        """
+        def job() -> tuple[dict[int, Optional[Row[Any]]], Summary]:
+            for update_pk, values in updates:
+                if "cat_id" in values:
+                    values["cat_id"] = int(get_category_pk_by_name(
+                        values["cat_id"], self.session_factory))
+                update_by_pk(ExpenseTable, update_pk, values, self.session_factory)
+            # Перечитываются и строки с отклонёнными правками,
+            # чтобы вернуть в них сохранённые значения
+            return {pk: get_expense_row(pk, self.session_factory)
+                    for pk in changed}, self.read_summary()
+
+        def done(result: tuple[dict[int, Optional[Row[Any]]], Summary]) -> None:
+            new_rows, summary = result
+            for pk, index in changed.items():
+                if index.isValid():
+                    self.expense_model.update_row(index.row(), new_rows[pk])
+            self.show_summary(summary)
+
+        self.worker.submit(job, done)
 
     def add_expense_row(self) -> None:
         """
@@ -452,72 +750,28 @@ class Presenter:
         if not date_right_input(self.main_window, text_date):
             return None
         date = datetime.strptime(text_date, '%d-%m-%Y %H:%M')
-        cat_id = get_category_pk_by_name(category, self.session_factory)
-
-        values = {
-            "cat_id": cat_id,
-            "amount": amount,
-            "comment": comment,
-            "expense_date": date,
-        }
-        insert_values(ExpenseTable, values, self.session_factory)
-
-        self.expense_data = self.expense_data_init()
-
-        expense_model = ExpenseTableModel(self.expense_data)
-        self.main_window.expense.expense_table.setModel(expense_model)
-
-        budget_data = self.budget_data_init()
-        data = budget_data_transform(budget_data)
-        budget_model = BudgetModel(data)
-        self.main_window.budget.table_budget.setModel(budget_model)
-        self.day_expense_by_cat()
 
+        def job() -> tuple[Optional[Row[Any]], Summary]:
+            cat_id = get_category_pk_by_name(category, self.session_factory)
+            values = {
+                "cat_id": cat_id,
+                "amount": amount,
+                "comment": comment,
+                "expense_date": date,
+            }
+            pk = bulk_insert_values(ExpenseTable, [values], self.session_factory)[0]
+            return get_expense_row(pk, self.session_factory), self.read_summary()
+
+        def done(result: tuple[Optional[Row[Any]], Summary]) -> None:
+            new_row, summary = result
+            if new_row is not None:
+                self.expense_model.insert_row(new_row)
+            self.show_summary(summary)
+
+        self.worker.submit(job, done)
         return None
 
 
-def get_subcategories(cat: CategoryTable, category_data: list[CategoryTable]
-                      ) -> list[CategoryTable]:
-    """
-    Получить список подкатегорий
-    """
-    sub_cat_pk = [data.id for data in category_data if cat.id == data.parent]
-    sub_cat = [x for x in category_data if x.id in sub_cat_pk]
-    return sub_cat
-
-
-def print_sub_cat(sub_cat: CategoryTable,
-                  space_num: int,
-                  category_data: list[CategoryTable]) -> str:
-    """
-    формирует строку в виде дерева из подкатегорий
-    """
-    cat_string = space_num * '\t' + f'{sub_cat.name} \n'
-    sub_sub_cat = get_subcategories(sub_cat, category_data)
-    for sub in sub_sub_cat:
-        cat_string += print_sub_cat(sub, space_num + 1, category_data)
-    return cat_string
-
-
-def read_categories(category_data: list[CategoryTable]) -> str:
-    """
-    Формирует строку в виде дерева из списка категорий
-    """
-    cat_string = ''
-    not_stated = 'Not stated'
-    for cat in category_data:
-        if cat.name == not_stated:
-            continue
-        if cat.parent is None:
-            cat_string += f'{cat.name} \n'
-            space_num = 1
-            for sub_cat in get_subcategories(cat, category_data):
-                cat_string += print_sub_cat(sub_cat, space_num, category_data)
-        else:
-            continue
-    return cat_string
-
-
 def date_right_input(main_window: MainWindow, date: str) -> bool:
     """
     Проверка на правильное заполнение поля %date
@@ -535,7 +789,7 @@ def amount_right_input(main_window: MainWindow, amount: str) -> bool:
     """
     Проверка на оправилньное заполнение поля amount:
         type(amount) is float
-        amount >= 0
+        0 <= amount <= MAX_AMOUNT
     """
     try:
         float(amount)
@@ -547,6 +801,10 @@ def amount_right_input(main_window: MainWindow, amount: str) -> bool:
         error_message = f"Amount {amount} should be positive"
         QMessageBox.critical(main_window, 'Error', error_message)
         return False
+    if not float(amount) <= MAX_AMOUNT:
+        error_message = f"Amount {amount} should not exceed {MAX_AMOUNT}"
+        QMessageBox.critical(main_window, 'Error', error_message)
+        return False
     return True
 
 
@@ -584,8 +842,8 @@ def category_right_input(
 
 
 def check_correct_update(main_window: MainWindow,
-                         row: int, col: int,
-                         expense_data: list[list[str]],
+                         col: int,
+                         row_values: list[str],
                          category_data: list[CategoryTable]) -> bool:
     """
     Проверка на правильное обновление ячеек в таблице расходов:
@@ -593,11 +851,11 @@ def check_correct_update(main_window: MainWindow,
         првильное заполнение amount,
         правильное заполнение category
     """
-    if expense_data[row][0] == '0':
+    if row_values[0] == '0':
         error_message = "It is an example! Try App by yourself :)"
         QMessageBox.critical(main_window, 'Error', error_message)
         return False
-    new_data_cell = expense_data[row][col]
+    new_data_cell = row_values[col]
     if col == 1:
         return date_right_input(main_window, new_data_cell)
     if col == 2:
@@ -0,0 +1,304 @@
+"""
+Кэш агрегатов расходов в памяти процесса (суммы за день, неделю и месяц,
+суммы по категориям, сводка бюджета).
+Ключ записи - (запрос, окна периодов, день расчёта), вытеснение - LRU.
+
+Функции записи my_orm сбрасывают только записи, на которые запись могла
+повлиять: изменение расхода - записи, окна которых содержат прежнюю или
+новую дату расхода; изменение категорий - суммы по категориям (в них
+названия); изменение бюджета - сводки бюджета. Откат транзакции и записи
+без известных id сбрасывают весь кэш. Записи в обход my_orm (например,
+другим процессом) кэш получает из журнала изменений при sync_expenses
+(см. bookkeeper.repository.sync).
+
+Окна week и month заканчиваются текущим моментом и сдвигаются вместе
+с ним. Запись кэша такого окна действует, пока в окно не вошёл и из него
+не вышел ни один расход (expiry_for_windows), и не дольше конца дня расчёта:
+в полночь весь кэш сбрасывается.
+"""
+from __future__ import annotations
+import sys
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import date, datetime, time
+from typing import Any, Collection, Hashable, Iterable, NamedTuple, Optional
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import func, select
+from sqlalchemy.engine.row import Row
+from sqlalchemy.orm import sessionmaker, Session
+
+from bookkeeper.config import AGGREGATE_CACHE_SIZE, BULK_CHUNK_SIZE
+from bookkeeper.models.sqlalchemy_models import ExpenseTable
+
+# Больше ожидающих id - кэш сбрасывается целиком
+MAX_PENDING = BULK_CHUNK_SIZE
+# Значение get, если записи нет (None - допустимый результат запроса)
+MISSING = object()
+
+
+class CacheEntry(NamedTuple):
+    """
+    Запись кэша агрегатов
+    Attributes:
+    -----------
+    value: Any
+        Результат запроса
+    covers: tuple[datetime, datetime]
+        Даты расходов, от которых может зависеть результат
+    expires: Optional[datetime]
+        Момент, с которого результат устарел из-за сдвига окна
+        (None - до конца дня расчёта)
+    tables: frozenset[str]
+        Таблицы кроме expense_table, от которых зависит результат
+    size: int
+        Оценка занимаемой памяти, байт
+    """
+    value: Any
+    covers: tuple[datetime, datetime]
+    expires: Optional[datetime]
+    tables: frozenset[str]
+    size: int
+
+
+def _size_of(value: Any) -> int:
+    """
+    Оценка памяти, занятой результатом запроса (вместе с элементами строк)
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple, Row)):
+        size += sum(_size_of(item) for item in value)
+    return size
+
+
+class AggregateCache:
+    """
+    LRU-кэш результатов агрегатных запросов
+    Attributes:
+    -----------
+    maxsize: int
+        Наибольшее число записей
+    hits: int
+        Количество обращений, обслуженных из кэша
+    misses: int
+        Количество обращений, потребовавших запроса к БД
+    evictions: int
+        Количество записей, вытесненных по LRU
+    invalidations: int
+        Количество записей, сброшенных из-за записи в БД, сдвига окна
+        или смены дня
+    """
+
+    def __init__(self, maxsize: int = AGGREGATE_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._day: Optional[date] = None
+        self._bytes = 0
+        # id расходов, записанных после последнего обращения
+        self._pending: set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def pending(self) -> bool:
+        """
+        Есть ли записанные расходы, даты которых ещё не прочитаны
+        """
+        return bool(self._pending)
+
+    def get(self, key: Hashable, now: datetime) -> Any:
+        """
+        Результат запроса key на момент now или MISSING
+        """
+        self._roll_over(now.date())
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires is not None and now >= entry.expires:
+            self._drop(key)
+            self.invalidations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def put(self, key: Hashable, value: Any, start: datetime, now: datetime,
+            expires: Optional[datetime] = None, tables: Collection[str] = ()) -> None:
+        """
+        Сохранить результат запроса key, посчитанный в момент now
+        по расходам начиная с start
+        """
+        self._roll_over(now.date())
+        if key in self._entries:
+            self._drop(key)
+        entry = CacheEntry(value, (start, datetime.combine(now.date(), time.max)),
+                           expires, frozenset(tables), _size_of(value))
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while len(self._entries) > self.maxsize:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key: Hashable) -> None:
+        self._bytes -= self._entries.pop(key).size
+
+    def _roll_over(self, day: date) -> None:
+        """
+        Сбросить кэш при смене дня расчёта
+        """
+        if day != self._day:
+            self.invalidate()
+            self._day = day
+
+    def invalidate(self) -> None:
+        """
+        Сбросить кэш. Следующие обращения выполнят запросы заново
+        """
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._pending.clear()
+        self._bytes = 0
+
+    def table_changed(self, table: str) -> None:
+        """
+        Сбросить записи, зависящие от таблицы table (кроме expense_table)
+        """
+        for key in [key for key, entry in self._entries.items() if table in entry.tables]:
+            self._drop(key)
+            self.invalidations += 1
+
+    def expenses_changing(self, session: Session, pks: Collection[int]) -> None:
+        """
+        Обработчик перед изменением или удалением расходов pks:
+        сбросить записи, окна которых содержат прежние даты расходов
+        """
+        if self._entries:
+            self._evict_dates(_expense_dates(session, pks))
+
+    def expenses_changed(self, pks: Optional[Collection[int]]) -> None:
+        """
+        Обработчик записи расходов pks (None - могли измениться любые расходы).
+        Даты записанных расходов читаются при следующем обращении
+        """
+        if pks is None or len(self._pending) + len(pks) > MAX_PENDING:
+            self.invalidate()
+        elif self._entries:
+            self._pending.update(pks)
+
+    def apply_pending(self, session: Session) -> None:
+        """
+        Сбросить записи, окна которых содержат даты записанных расходов
+        """
+        pending, self._pending = self._pending, set()
+        if self._entries:
+            self._evict_dates(_expense_dates(session, pending))
+
+    def dates_changed(self, dates: list[datetime]) -> None:
+        """
+        Обработчик изменений, прочитанных из журнала (см. sync.sync_expenses):
+        сбросить записи, окна которых содержат прежние или новые даты расходов
+        """
+        self._evict_dates(dates)
+
+    def _evict_dates(self, dates: list[datetime]) -> None:
+        """
+        Сбросить записи, окна которых содержат хотя бы одну из дат
+        """
+        if not dates:
+            return
+        dates.sort()
+        for key, entry in list(self._entries.items()):
+            first, last = entry.covers
+            position = bisect_left(dates, first)
+            if position < len(dates) and dates[position] <= last:
+                self._drop(key)
+                self.invalidations += 1
+
+    def stats(self) -> dict[str, float]:
+        """
+        Счётчики кэша, доля попаданий и оценка занятой памяти
+        """
+        requests = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_ratio": self.hits / requests if requests else 0.0,
+                "evictions": self.evictions, "invalidations": self.invalidations,
+                "size": len(self._entries), "maxsize": self.maxsize,
+                "bytes": self._bytes}
+
+
+def _expense_dates(session: Session, pks: Iterable[int]) -> list[datetime]:
+    """
+    Даты расходов pks (порциями по BULK_CHUNK_SIZE id)
+    """
+    pks = list(pks)
+    dates: list[datetime] = []
+    for i in range(0, len(pks), BULK_CHUNK_SIZE):
+        dates.extend(session.execute(
+            select(ExpenseTable.expense_date)
+            .where(ExpenseTable.id.in_(pks[i:i + BULK_CHUNK_SIZE]))).scalars())
+    return dates
+
+
+def expiry_for_windows(session: Session, windows: Iterable[tuple[datetime, datetime]],
+                       now: datetime) -> Optional[datetime]:
+    """
+    Момент, до которого не меняется набор расходов в окнах, заканчивающихся
+    текущим моментом now: окно [start, now] сдвигается вместе со временем,
+    в него входит ближайший расход после now и выходит первый расход
+    не раньше start. Окна, заканчивающиеся не в now, не сдвигаются
+    Attributes:
+    -----------
+    session: Session
+        Сессия, в которой посчитан результат
+    windows: Iterable[tuple[datetime, datetime]]
+        Окна периодов (начало, конец)
+    now: datetime
+        Момент расчёта
+
+    Returns:
+    --------
+        Optional[datetime] - None, если набор расходов не изменится
+    """
+    date_column = ExpenseTable.expense_date
+    bounds: list[Any] = []
+    for start, end in windows:
+        if end == now:
+            bounds.append((start, select(func.min(date_column))
+                           .where(date_column >= start).scalar_subquery()))
+    if not bounds:
+        return None
+    columns = [select(func.min(date_column)).where(date_column > now).scalar_subquery()]
+    columns += [first for _, first in bounds]
+    entering, *leaving = session.execute(select(*columns)).one()
+    shifts = [] if entering is None else [entering - now]
+    shifts += [first - start for (start, _), first in zip(bounds, leaving)
+               if first is not None]
+    return now + min(shifts) if shifts else None
+
+
+_caches: WeakKeyDictionary[sessionmaker[Session], AggregateCache] = \
+    WeakKeyDictionary()
+
+
+def get_aggregate_cache(session_factory: sessionmaker[Session]) -> AggregateCache:
+    """
+    Кэш агрегатов БД, с которой работает фабрика сессий session_factory
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        AggregateCache
+    """
+    cache = _caches.get(session_factory)
+    if cache is None:
+        cache = _caches[session_factory] = AggregateCache()
+    return cache
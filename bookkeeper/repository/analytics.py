@@ -0,0 +1,540 @@
+"""
+Аналитика расходов в памяти на массивах NumPy.
+Расходы загружаются из БД один раз в компактные массивы, упорядоченные
+по дате: минуты от начала эпохи (int64), cat_id (int32), сумма (float64)
+и id (int64) - 28 байт на расход. Суммы за произвольный период,
+по категориям, гистограммы по дням, неделям и месяцам и сводная таблица
+категория x период считаются векторно (searchsorted, bincount) без запросов к БД.
+
+Функции записи my_orm сообщают id записанных расходов (watch_expenses):
+перед следующим запросом из БД перечитываются только они. Записи в обход
+my_orm (например, другим процессом) аналитика получает из журнала изменений
+при sync_expenses (см. bookkeeper.repository.sync). Точность дат - минута.
+
+Массивы можно сохранить в файл-кэш рядом с БД (см. column_cache): при
+следующем запуске они отображаются в память, а из БД дочитываются только
+расходы, изменённые после сохранённой отметки.
+Требует необязательный пакет numpy.
+"""
+from __future__ import annotations
+import logging
+from datetime import datetime, timedelta
+from typing import Any, NamedTuple, Optional, Collection
+from weakref import WeakKeyDictionary
+
+import numpy as np
+from sqlalchemy import Select, func, or_, select
+from sqlalchemy.orm import sessionmaker, Session
+
+from bookkeeper.config import BULK_CHUNK_SIZE
+from bookkeeper.models.sqlalchemy_models import ExpenseTable, DailyCategoryTotals, \
+    CENTS
+from bookkeeper.repository.column_cache import ColumnCache, read_column_cache, \
+    write_column_cache
+from bookkeeper.repository.migrations import get_schema_version
+from bookkeeper.repository.my_orm import unit_of_work, watch_expenses
+from bookkeeper.repository.pending import PendingExpenses
+from bookkeeper.repository.sync import ExpenseDelta, watch_sync
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+MINUTE = timedelta(minutes=1)
+MINUTES_PER_DAY = 24 * 60
+FREQUENCIES = ("day", "week", "month")
+
+# Строка загрузки: id, секунды от начала эпохи, cat_id, сумма
+_ROW = np.dtype([("id", np.int64), ("seconds", np.int64),
+                 ("cat_id", np.int32), ("amount", np.float64)])
+
+
+class Histogram(NamedTuple):
+    """
+    Суммы расходов по периодам
+    Attributes:
+    -----------
+    periods: list[datetime]
+        Начала периодов подряд, включая периоды без расходов
+    totals: np.ndarray
+        Суммы (float64) в порядке periods
+    """
+    periods: list[datetime]
+    totals: np.ndarray
+
+
+class Pivot(NamedTuple):
+    """
+    Сводная таблица расходов категория x период
+    Attributes:
+    -----------
+    cat_ids: np.ndarray
+        id категорий с расходами за период, по возрастанию
+    periods: list[datetime]
+        Начала периодов подряд
+    totals: np.ndarray
+        Суммы, форма (len(cat_ids), len(periods))
+    """
+    cat_ids: np.ndarray
+    periods: list[datetime]
+    totals: np.ndarray
+
+
+def to_minutes(moment: datetime) -> int:
+    """
+    Минуты от начала эпохи (с округлением вниз)
+    """
+    return (moment - EPOCH) // MINUTE
+
+
+def _buckets(minutes: np.ndarray, freq: str) -> np.ndarray:
+    """
+    Номера периодов freq от начала эпохи. Недели начинаются с понедельника
+    """
+    days = minutes // MINUTES_PER_DAY
+    if freq == "day":
+        return days
+    if freq == "week":
+        # 1970-01-01 - четверг
+        return (days + 3) // 7
+    if freq == "month":
+        return minutes.astype("datetime64[m]").astype("datetime64[M]").astype(np.int64)
+    raise ValueError(f"Unknown frequency {freq}")
+
+
+def _bucket_start(bucket: int, freq: str) -> datetime:
+    """
+    Начало периода с номером bucket
+    """
+    if freq == "day":
+        return EPOCH + timedelta(days=bucket)
+    if freq == "week":
+        return EPOCH + timedelta(days=7 * bucket - 3)
+    return datetime(1970 + bucket // 12, bucket % 12 + 1, 1)
+
+
+def _rows_query() -> Select[Any]:
+    """
+    Запрос строк загрузки (id, секунды от начала эпохи, cat_id, сумма
+    в копейках) - значения столбцов в том виде, в котором они хранятся
+    """
+    columns: tuple[Any, ...] = (ExpenseTable.id, ExpenseTable.expense_date,
+                                ExpenseTable.cat_id, ExpenseTable.amount)
+    return select(*columns)
+
+
+def _now(session: Session) -> str:
+    """
+    Текущая секунда БД в формате SQLite datetime (как CURRENT_TIMESTAMP)
+    """
+    now: str = session.execute(select(func.datetime("now"))).scalar_one()
+    return now
+
+
+def _fetch(session: Session, query: Select[Any]) -> np.ndarray:
+    """
+    Выполнить запрос курсором DBAPI и собрать строки в массив _ROW.
+    Объекты Row sqlalchemy не создаются: на миллионе строк это втрое быстрее.
+    Суммы переводятся из копеек
+    """
+    sql = str(query.compile(session.get_bind(), compile_kwargs={"literal_binds": True}))
+    cursor = session.connection().connection.cursor()
+    parts = []
+    try:
+        cursor.execute(sql)
+        while rows := cursor.fetchmany(BULK_CHUNK_SIZE):
+            parts.append(np.array(rows, dtype=_ROW))
+    finally:
+        cursor.close()
+    result = np.concatenate(parts) if parts else np.empty(0, dtype=_ROW)
+    result["amount"] /= CENTS
+    return result
+
+
+class ExpenseAnalytics:
+    """
+    Массивы расходов, упорядоченные по дате.
+    Не потокобезопасен: используется в потоке, который работает с БД
+    Attributes:
+    -----------
+    minutes: np.ndarray
+        Даты расходов в минутах от начала эпохи (int64), по возрастанию
+    cat_ids: np.ndarray
+        Категории (int32)
+    amounts: np.ndarray
+        Суммы (float64)
+    ids: np.ndarray
+        id расходов (int64)
+    watermark: Optional[str]
+        Отметка последней сверки с БД: расходы, изменённые раньше этой
+        секунды, загружены (формат SQLite datetime)
+    max_id: int
+        Наибольший id расхода на момент отметки
+    loads: int
+        Количество полных загрузок
+    updates: int
+        Количество частичных обновлений
+    """
+
+    def __init__(self) -> None:
+        self.minutes = np.empty(0, dtype=np.int64)
+        self.cat_ids = np.empty(0, dtype=np.int32)
+        self.amounts = np.empty(0, dtype=np.float64)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.watermark: Optional[str] = None
+        self.max_id = 0
+        self.loads = 0
+        self.updates = 0
+        self._pending = PendingExpenses()
+        self._catch_up = False
+        self._mapped = False
+
+    @property
+    def fresh(self) -> bool:
+        """
+        Соответствуют ли массивы записям в БД
+        """
+        return not (self._pending.stale or self._catch_up or self._pending)
+
+    @property
+    def mapped(self) -> bool:
+        """
+        Массивы - неизменённые представления файла-кэша
+        """
+        return self._mapped
+
+    def invalidate(self) -> None:
+        """
+        Загрузить массивы заново при следующем refresh
+        """
+        self._pending.invalidate()
+        self._catch_up = False
+
+    def restore(self, cache: ColumnCache) -> None:
+        """
+        Принять массивы из файла-кэша. Следующий refresh перечитает расходы,
+        изменённые после отметки кэша (updated_at) или добавленные после
+        него (id > max_id)
+        """
+        self.ids, self.minutes = cache.ids, cache.minutes
+        self.cat_ids, self.amounts = cache.cat_ids, cache.amounts
+        self.watermark, self.max_id = cache.watermark, cache.max_id
+        self._pending.stale = False
+        self._pending.clear()
+        self._catch_up = True
+        self._mapped = True
+
+    def column_cache(self) -> ColumnCache:
+        """
+        Массивы и отметка для записи в файл-кэш
+        """
+        assert self.watermark is not None
+        return ColumnCache(self.ids, self.minutes, self.cat_ids, self.amounts,
+                           self.max_id, self.watermark)
+
+    def matches(self, session: Session) -> bool:
+        """
+        Совпадают ли количество и общая сумма расходов с БД.
+        Проверка после сверки с кэшем: ловит удаления в обход my_orm
+        и подменённую БД. Общая сумма читается из свёртки daily_category_totals
+        """
+        count = session.execute(select(func.count()).select_from(ExpenseTable)) \
+            .scalar_one()
+        total = session.execute(
+            select(func.coalesce(func.sum(DailyCategoryTotals.total), 0))).scalar_one()
+        return bool(count == len(self.ids)
+                    and np.isclose(total, self.amounts.sum(), rtol=1e-9, atol=1e-6))
+
+    def expenses_changed(self, pks: Optional[Collection[int]]) -> None:
+        """
+        Обработчик записи расходов (см. my_orm.watch_expenses)
+        """
+        self._pending.add(pks)
+
+    def expenses_synced(self, session: Session,  # pylint: disable=unused-argument
+                        delta: ExpenseDelta) -> None:
+        """
+        Обработчик изменений из журнала (см. sync.watch_sync)
+        """
+        self.expenses_changed(None if delta.reload else delta.ids)
+
+    def refresh(self, session: Session) -> None:
+        """
+        Привести массивы в соответствие с БД: перечитать изменённые расходы
+        или, если массивы сброшены, загрузить все
+        """
+        if self._pending.stale:
+            self.watermark = _now(session)
+            # Порядок дат - по покрывающему индексу, без сортировки в памяти
+            self._set(_fetch(session, _rows_query().order_by(ExpenseTable.expense_date)))
+            self._mapped = False
+            self.loads += 1
+        elif not self.fresh:
+            watermark = _now(session) if self._catch_up else None
+            if self._update(session):
+                self._mapped = False
+            if watermark is not None:
+                self.watermark = watermark
+            self.updates += 1
+        if len(self.ids):
+            self.max_id = max(self.max_id, int(self.ids.max()))
+        self._pending.stale = False
+        self._pending.clear()
+        self._catch_up = False
+
+    def _set(self, rows: np.ndarray) -> None:
+        """
+        Заменить массивы строками rows, упорядоченными по дате.
+        Поля копируются в непрерывные массивы
+        """
+        self.ids = np.ascontiguousarray(rows["id"])
+        self.minutes = rows["seconds"] // 60
+        self.cat_ids = np.ascontiguousarray(rows["cat_id"])
+        self.amounts = np.ascontiguousarray(rows["amount"])
+
+    def _update(self, session: Session) -> bool:
+        """
+        Удалить из массивов изменённые расходы и вставить их текущие версии.
+        False, если массивы не изменились
+        """
+        conditions = self._pending.conditions()
+        if self._catch_up:
+            # Без datetime(): сравнение строк столбца использует индекс
+            conditions.append(ExpenseTable.updated_at >= self.watermark)
+            conditions.append(ExpenseTable.id > self.max_id)
+        # Без ORDER BY: SQLite объединяет поиски по индексам условий (MULTI-INDEX OR),
+        # а немногие строки сортируются здесь
+        rows = _fetch(session, _rows_query().where(or_(*conditions))) \
+            if conditions else np.empty(0, dtype=_ROW)
+        rows = rows[np.argsort(rows["seconds"], kind="stable")]
+        dirty = self._pending.ids
+        if not self._pending and self._unchanged(rows):
+            return False
+        keep = ~np.isin(self.ids, np.concatenate(
+            (rows["id"], np.fromiter(dirty, np.int64, len(dirty)))))
+        for pks in self._pending.ranges:
+            keep &= (self.ids < pks.start) | (self.ids >= pks.stop)
+        minutes = rows["seconds"] // 60
+        kept = self.minutes[keep]
+        at = np.searchsorted(kept, minutes, side="right")
+        self.ids = np.insert(self.ids[keep], at, rows["id"])
+        self.minutes = np.insert(kept, at, minutes)
+        self.cat_ids = np.insert(self.cat_ids[keep], at, rows["cat_id"])
+        self.amounts = np.insert(self.amounts[keep], at, rows["amount"])
+        return True
+
+    def _unchanged(self, rows: np.ndarray) -> bool:
+        """
+        Все строки rows уже есть в массивах с теми же значениями
+        (сверка с кэшем перечитывает расходы из секунды его отметки)
+        """
+        present = np.isin(self.ids, rows["id"])
+        if np.count_nonzero(present) != len(rows):
+            return False
+        order = np.argsort(self.ids[present])
+        rows = np.sort(rows, order="id")
+        return bool(np.array_equal(self.ids[present][order], rows["id"])
+                    and np.array_equal(self.minutes[present][order],
+                                       rows["seconds"] // 60)
+                    and np.array_equal(self.cat_ids[present][order], rows["cat_id"])
+                    and np.array_equal(self.amounts[present][order], rows["amount"]))
+
+    def _slice(self, start: Optional[datetime], end: Optional[datetime]) -> slice:
+        """
+        Позиции расходов за период [start, end] (None - без границы)
+        """
+        low = 0 if start is None else \
+            int(np.searchsorted(self.minutes, to_minutes(start), side="left"))
+        high = len(self.minutes) if end is None else \
+            int(np.searchsorted(self.minutes, to_minutes(end), side="right"))
+        return slice(low, high)
+
+    def total(self, start: Optional[datetime] = None,
+              end: Optional[datetime] = None) -> float:
+        """
+        Сумма расходов за период [start, end]
+        Attributes:
+        -----------
+        start: Optional[datetime]
+            Начало периода (None - с первого расхода)
+        end: Optional[datetime]
+            Конец периода, включительно (None - до последнего расхода)
+
+        Returns:
+        --------
+            float
+        """
+        return float(self.amounts[self._slice(start, end)].sum())
+
+    def by_category(self, start: Optional[datetime] = None,
+                    end: Optional[datetime] = None) -> dict[int, float]:
+        """
+        Суммы расходов за период [start, end] по категориям
+        Attributes:
+        -----------
+        start: Optional[datetime]
+            Начало периода (None - с первого расхода)
+        end: Optional[datetime]
+            Конец периода, включительно (None - до последнего расхода)
+
+        Returns:
+        --------
+            dict[int, float] - {cat_id: сумма} категорий с расходами
+        """
+        period = self._slice(start, end)
+        cat_ids = self.cat_ids[period]
+        totals = np.bincount(cat_ids, weights=self.amounts[period])
+        present = np.flatnonzero(np.bincount(cat_ids))
+        return dict(zip(present.tolist(), totals[present].tolist()))
+
+    def _bucket_bounds(self, buckets: np.ndarray, start: Optional[datetime],
+                       end: Optional[datetime], freq: str) -> tuple[int, int]:
+        """
+        Номера первого и последнего периода отчёта
+        """
+        if start is not None:
+            first = int(_buckets(np.array([to_minutes(start)]), freq)[0])
+        else:
+            first = int(buckets[0]) if len(buckets) else 0
+        if end is not None:
+            last = int(_buckets(np.array([to_minutes(end)]), freq)[0])
+        else:
+            last = int(buckets[-1]) if len(buckets) else first - 1
+        return first, last
+
+    def histogram(self, start: Optional[datetime] = None,
+                  end: Optional[datetime] = None, freq: str = "day") -> Histogram:
+        """
+        Суммы расходов за период [start, end] по дням, неделям или месяцам
+        Attributes:
+        -----------
+        start: Optional[datetime]
+            Начало периода (None - с первого расхода)
+        end: Optional[datetime]
+            Конец периода, включительно (None - до последнего расхода)
+        freq: str
+            Шаг: day, week или month
+
+        Returns:
+        --------
+            Histogram
+        """
+        period = self._slice(start, end)
+        buckets = _buckets(self.minutes[period], freq)
+        first, last = self._bucket_bounds(buckets, start, end, freq)
+        size = max(last - first + 1, 0)
+        totals = np.bincount(buckets - first, weights=self.amounts[period],
+                             minlength=size)
+        return Histogram([_bucket_start(bucket, freq)
+                          for bucket in range(first, last + 1)], totals)
+
+    def pivot(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+              freq: str = "month") -> Pivot:
+        """
+        Сводная таблица расходов за период [start, end]: категория x период
+        Attributes:
+        -----------
+        start: Optional[datetime]
+            Начало периода (None - с первого расхода)
+        end: Optional[datetime]
+            Конец периода, включительно (None - до последнего расхода)
+        freq: str
+            Шаг: day, week или month
+
+        Returns:
+        --------
+            Pivot
+        """
+        period = self._slice(start, end)
+        buckets = _buckets(self.minutes[period], freq)
+        first, last = self._bucket_bounds(buckets, start, end, freq)
+        size = max(last - first + 1, 0)
+        cat_ids, rows = np.unique(self.cat_ids[period], return_inverse=True)
+        totals = np.bincount(rows * size + (buckets - first),
+                             weights=self.amounts[period],
+                             minlength=len(cat_ids) * size)
+        return Pivot(cat_ids,
+                     [_bucket_start(bucket, freq) for bucket in range(first, last + 1)],
+                     totals.reshape(len(cat_ids), size))
+
+
+_engines: WeakKeyDictionary[sessionmaker[Session], ExpenseAnalytics] = \
+    WeakKeyDictionary()
+
+
+def _open_cache(analytics: ExpenseAnalytics, cache_path: str,
+                session: Session) -> None:
+    """
+    Загрузить массивы из файла-кэша и дочитать изменения из БД.
+    Устаревший или не совпадающий с БД кэш заменяется полной загрузкой
+    """
+    version = get_schema_version(session.connection())
+    cache = read_column_cache(cache_path, version)
+    if cache is not None:
+        analytics.restore(cache)
+        analytics.refresh(session)
+        if not analytics.matches(session):
+            logger.warning("column cache %s does not match the database", cache_path)
+            analytics.invalidate()
+    analytics.refresh(session)
+    if not analytics.mapped:
+        write_column_cache(cache_path, analytics.column_cache(), version)
+
+
+def get_analytics(session_factory: sessionmaker[Session],
+                  cache_path: Optional[str] = None) -> ExpenseAnalytics:
+    """
+    Аналитика расходов БД, с которой работает фабрика сессий session_factory.
+    Первый вызов загружает все расходы (из файла-кэша cache_path, если он
+    есть и не устарел), следующие перечитывают только расходы, записанные
+    после предыдущего вызова
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+    cache_path: Optional[str]
+        Файл-кэш столбцов (используется только первым вызовом)
+
+    Returns:
+    --------
+        ExpenseAnalytics
+    """
+    analytics = _engines.get(session_factory)
+    if analytics is None:
+        analytics = _engines[session_factory] = ExpenseAnalytics()
+        watch_expenses(session_factory, analytics.expenses_changed)
+        watch_sync(session_factory, analytics.expenses_synced)
+        if cache_path is not None:
+            with unit_of_work(session_factory) as session:
+                _open_cache(analytics, cache_path, session)
+    if not analytics.fresh:
+        with unit_of_work(session_factory) as session:
+            analytics.refresh(session)
+    return analytics
+
+
+def save_analytics(session_factory: sessionmaker[Session], cache_path: str) -> bool:
+    """
+    Сохранить массивы аналитики в файл-кэш (например, при выходе из приложения).
+    Файл не перезаписывается, если аналитика не загружалась или массивы
+    не менялись после загрузки из него
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+    cache_path: str
+        Файл-кэш столбцов
+
+    Returns:
+    --------
+        bool - записан ли файл
+    """
+    analytics = _engines.get(session_factory)
+    if analytics is None:
+        return False
+    with unit_of_work(session_factory) as session:
+        analytics.refresh(session)
+        if analytics.mapped:
+            return False
+        write_column_cache(cache_path, analytics.column_cache(),
+                           get_schema_version(session.connection()))
+    return True
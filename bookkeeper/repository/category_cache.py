@@ -0,0 +1,116 @@
+"""
+Кэш категорий в памяти процесса.
+Загружается одним запросом и сбрасывается функциями записи my_orm
+при любом изменении category_table.
+"""
+from __future__ import annotations
+from typing import Optional
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker, Session
+
+from bookkeeper.models.sqlalchemy_models import CategoryTable
+
+
+class CategoryCache:
+    """
+    Словари категорий
+    Attributes:
+    -----------
+    hits: int
+        Количество обращений, обслуженных из кэша
+    misses: int
+        Количество обращений, потребовавших загрузки из БД
+    """
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self._by_id: Optional[dict[int, CategoryTable]] = None
+        self._by_name: dict[str, int] = {}
+        self._children: dict[Optional[int], list[CategoryTable]] = {}
+
+    @property
+    def loaded(self) -> bool:
+        """
+        Загружены ли категории
+        """
+        return self._by_id is not None
+
+    def load(self, session: Session) -> None:
+        """
+        Загрузить все категории одним запросом.
+        Строки хранятся как объекты CategoryTable, не привязанные к сессии
+        """
+        query = select(CategoryTable.id, CategoryTable.name, CategoryTable.parent) \
+            .order_by(CategoryTable.id)
+        self._by_id = {}
+        self._by_name = {}
+        self._children = {}
+        for pk, name, parent in session.execute(query):
+            category = CategoryTable(id=pk, name=name, parent=parent)
+            self._by_id[pk] = category
+            self._by_name[name] = pk
+            self._children.setdefault(parent, []).append(category)
+
+    def invalidate(self) -> None:
+        """
+        Сбросить кэш. Следующее обращение загрузит категории заново
+        """
+        self._by_id = None
+
+    def pk_by_name(self, name: str) -> int:
+        """
+        id категории по названию. KeyError, если категории нет
+        """
+        return self._by_name[name]
+
+    def get(self, pk: int) -> Optional[CategoryTable]:
+        """
+        Категория по id
+        """
+        assert self._by_id is not None
+        return self._by_id.get(pk)
+
+    def children(self, parent: Optional[int]) -> list[CategoryTable]:
+        """
+        Подкатегории категории parent (None - категории верхнего уровня)
+        """
+        return list(self._children.get(parent, []))
+
+    def all(self) -> list[CategoryTable]:
+        """
+        Все категории в порядке id
+        """
+        assert self._by_id is not None
+        return list(self._by_id.values())
+
+    def stats(self) -> dict[str, int]:
+        """
+        Счётчики попаданий и промахов
+        """
+        return {"hits": self.hits, "misses": self.misses,
+                "size": len(self._by_id) if self._by_id is not None else 0}
+
+
+_caches: WeakKeyDictionary[sessionmaker[Session], CategoryCache] = \
+    WeakKeyDictionary()
+
+
+def get_category_cache(session_factory: sessionmaker[Session]) -> CategoryCache:
+    """
+    Кэш категорий БД, с которой работает фабрика сессий session_factory
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        CategoryCache
+    """
+    cache = _caches.get(session_factory)
+    if cache is None:
+        cache = _caches[session_factory] = CategoryCache()
+    return cache
@@ -0,0 +1,172 @@
+"""
+Модуль сравнения дерева категорий с сохранённым в БД.
+Вычисляет набор изменений (вставки, переименования, переносы, удаления)
+и применяет его одной транзакцией, не меняя id сохранившихся категорий.
+Расходы переносятся только из удалённых категорий.
+"""
+from __future__ import annotations
+from typing import Mapping, NamedTuple, Optional, Sequence, Union
+
+from sqlalchemy.orm import sessionmaker, Session
+
+from bookkeeper.config import NOT_STATED_NAME
+from bookkeeper.models.sqlalchemy_models import CategoryTable
+from bookkeeper.repository.my_orm import unit_of_work, get_categories, \
+    get_category_pk_by_name, bulk_insert_values, insert_values, update_by_pk, \
+    delete_by_pks, remap_expense_categories
+
+# Ссылка на категорию: id сохранённой категории или название новой
+CategoryRef = Union[int, str]
+
+
+class CategoryTreeDiff(NamedTuple):
+    """
+    Изменения дерева категорий
+    Attributes:
+    -----------
+    inserts: list[tuple[str, Optional[CategoryRef]]]
+        Новые категории (название, родитель) в порядке топологической сортировки
+    renames: dict[int, str]
+        Переименования {id: новое название}
+    reparents: dict[int, Optional[CategoryRef]]
+        Переносы {id: новый родитель}
+    deletes: list[int]
+        id удаляемых категорий
+    """
+    inserts: list[tuple[str, Optional[CategoryRef]]]
+    renames: dict[int, str]
+    reparents: dict[int, Optional[CategoryRef]]
+    deletes: list[int]
+
+    def is_empty(self) -> bool:
+        """
+        Нет ли изменений
+        """
+        return not (self.inserts or self.renames or self.reparents or self.deletes)
+
+
+def diff_category_tree(stored: Sequence[CategoryTable],
+                       tree: Sequence[tuple[str, Optional[str]]],
+                       renames: Optional[Mapping[str, str]] = None
+                       ) -> CategoryTreeDiff:
+    """
+    Сравнить сохранённые категории с деревом из read_tree.
+    Категории сопоставляются по названию: сохранённая категория, которой
+    нет в дереве, удаляется, новое название вставляется. Переименование
+    задаётся только явно (renames): старое название должно исчезнуть
+    из дерева, а нового не должно быть среди сохранённых категорий.
+    Категория NOT_STATED_NAME никогда не удаляется и не переименовывается
+    Attributes:
+    -----------
+    stored: Sequence[CategoryTable]
+        Сохранённые категории в порядке id
+    tree: Sequence[tuple[str, Optional[str]]]
+        Пары "потомок-родитель" (см. read_tree)
+    renames: Optional[Mapping[str, str]]
+        Переименования {старое название: новое}
+
+    Returns:
+    --------
+        CategoryTreeDiff
+    """
+    new_names = {name for name, _ in tree}
+    by_name = {cat.name: cat for cat in stored}
+    for old_name, new_name in (renames or {}).items():
+        if old_name in by_name and old_name not in new_names \
+                and new_name not in by_name and old_name != NOT_STATED_NAME:
+            by_name[new_name] = by_name.pop(old_name)
+
+    refs: dict[str, CategoryRef] = {}
+    diff = CategoryTreeDiff([], {}, {}, [])
+    for name, parent_name in tree:
+        parent = None if parent_name is None else refs[parent_name]
+        if name not in by_name:
+            refs[name] = name
+            diff.inserts.append((name, parent))
+            continue
+        cat = by_name[name]
+        refs[name] = cat.id
+        if cat.name != name:
+            diff.renames[cat.id] = name
+        if cat.parent != parent:
+            diff.reparents[cat.id] = parent
+
+    used = set(refs.values())
+    diff.deletes.extend(cat.id for cat in stored
+                        if cat.id not in used and cat.name != NOT_STATED_NAME)
+    return diff
+
+
+def apply_category_diff(diff: CategoryTreeDiff,
+                        session_factory: sessionmaker[Session]) -> None:
+    """
+    Применить изменения дерева категорий одной транзакцией.
+    Расходы удалённых категорий переносятся в категорию NOT_STATED_NAME
+    (она должна существовать), остальные расходы не изменяются
+    Attributes:
+    -----------
+    diff: CategoryTreeDiff
+        Изменения, см. diff_category_tree
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        None
+    """
+    with unit_of_work(session_factory):
+        new_pks: dict[str, int] = {}
+
+        def resolve(ref: Optional[CategoryRef]) -> Optional[int]:
+            return new_pks[ref] if isinstance(ref, str) else ref
+
+        # Новые категории вставляются пакетами: сначала те, чей родитель уже
+        # есть в БД, затем их потомки и т.д.
+        pending = list(diff.inserts)
+        while pending:
+            wave = [(name, parent) for name, parent in pending
+                    if not isinstance(parent, str) or parent in new_pks]
+            pks = bulk_insert_values(CategoryTable, [
+                {"name": name, "parent": resolve(parent)} for name, parent in wave
+            ], session_factory)
+            new_pks.update(zip((name for name, _ in wave), pks))
+            pending = [row for row in pending if row[0] not in new_pks]
+
+        for pk, name in diff.renames.items():
+            update_by_pk(CategoryTable, pk, {"name": name}, session_factory)
+        for pk, parent in diff.reparents.items():
+            update_by_pk(CategoryTable, pk, {"parent": resolve(parent)},
+                         session_factory)
+        if diff.deletes:
+            not_stated = get_category_pk_by_name(NOT_STATED_NAME, session_factory)
+            delete_by_pks(CategoryTable, diff.deletes, session_factory)
+            remap_expense_categories({pk: not_stated for pk in diff.deletes},
+                                     session_factory)
+
+
+def commit_category_tree(tree: Sequence[tuple[str, Optional[str]]],
+                         session_factory: sessionmaker[Session],
+                         renames: Optional[Mapping[str, str]] = None
+                         ) -> CategoryTreeDiff:
+    """
+    Привести категории в БД к дереву tree (см. read_tree) одной транзакцией
+    Attributes:
+    -----------
+    tree: Sequence[tuple[str, Optional[str]]]
+        Пары "потомок-родитель"
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+    renames: Optional[Mapping[str, str]]
+        Переименования {старое название: новое} (см. diff_category_tree)
+
+    Returns:
+    --------
+        CategoryTreeDiff - применённые изменения
+    """
+    with unit_of_work(session_factory):
+        stored = get_categories(session_factory)
+        if not any(cat.name == NOT_STATED_NAME for cat in stored):
+            insert_values(CategoryTable, {"name": NOT_STATED_NAME}, session_factory)
+        diff = diff_category_tree(stored, tree, renames)
+        apply_category_diff(diff, session_factory)
+    return diff
@@ -0,0 +1,148 @@
+"""
+Файл-кэш столбцов аналитики рядом с БД (например, sqlalchemy_db.db.columns).
+Хранит массивы ExpenseAnalytics и отметку, на момент которой они совпадали
+с БД. При запуске файл отображается в память (mmap) без копирования,
+из БД дочитываются только расходы, изменённые после отметки.
+
+Формат (little-endian): заголовок HEADER, затем подряд столбцы
+id (int64), minutes (int64), cat_id (int32, с выравниванием до 8 байт),
+amount (float64). В заголовке - версия формата, версия схемы БД
+(PRAGMA user_version), количество строк, наибольший id и отметка updated_at
+на момент загрузки, CRC32 столбцов. Файл с другой версией, неверным
+размером или контрольной суммой считается устаревшим.
+"""
+import logging
+import mmap
+import os
+import struct
+import zlib
+from typing import Any, NamedTuple, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"BKCOLS\0\0"
+FORMAT_VERSION = 1
+# magic, версия формата, версия схемы, строк, max id, отметка, crc32 столбцов
+HEADER = struct.Struct("<8sIIqq32sI4x")
+COLUMNS: tuple[tuple[str, np.dtype[Any]], ...] = (
+    ("ids", np.dtype("<i8")), ("minutes", np.dtype("<i8")),
+    ("cat_ids", np.dtype("<i4")), ("amounts", np.dtype("<f8")))
+
+
+class ColumnCache(NamedTuple):
+    """
+    Содержимое файла-кэша
+    Attributes:
+    -----------
+    ids: np.ndarray
+        id расходов (int64)
+    minutes: np.ndarray
+        Даты расходов в минутах от начала эпохи (int64), по возрастанию
+    cat_ids: np.ndarray
+        Категории (int32)
+    amounts: np.ndarray
+        Суммы (float64)
+    max_id: int
+        Наибольший id расхода на момент отметки
+    watermark: str
+        Отметка: расходы с updated_at раньше этой секунды (формат SQLite
+        datetime) совпадают с БД
+    """
+    ids: np.ndarray
+    minutes: np.ndarray
+    cat_ids: np.ndarray
+    amounts: np.ndarray
+    max_id: int
+    watermark: str
+
+
+def _offsets(rows: int) -> list[int]:
+    """
+    Смещения столбцов в файле (каждый выровнен до 8 байт)
+    """
+    offsets = []
+    offset = HEADER.size
+    for _, dtype in COLUMNS:
+        offsets.append(offset)
+        offset += -(-rows * dtype.itemsize // 8) * 8
+    return offsets + [offset]
+
+
+def write_column_cache(path: str, cache: ColumnCache, schema_version: int) -> None:
+    """
+    Атомарно записать файл-кэш (через временный файл и os.replace)
+    Attributes:
+    -----------
+    path: str
+        Путь к файлу
+    cache: ColumnCache
+        Столбцы и отметка
+    schema_version: int
+        Версия схемы БД
+
+    Returns:
+    --------
+        None
+    """
+    rows = len(cache.ids)
+    offsets = _offsets(rows)
+    crc = 0
+    with open(path + ".tmp", "wb") as file:
+        file.write(bytes(HEADER.size))
+        for column, (name, dtype) in enumerate(COLUMNS):
+            data = np.ascontiguousarray(getattr(cache, name), dtype=dtype).tobytes()
+            data += bytes(offsets[column + 1] - offsets[column] - len(data))
+            crc = zlib.crc32(data, crc)
+            file.write(data)
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, schema_version, rows,
+                               cache.max_id, cache.watermark.encode("ascii"), crc))
+    os.replace(path + ".tmp", path)
+
+
+def read_column_cache(path: str, schema_version: int) -> Optional[ColumnCache]:
+    """
+    Отобразить файл-кэш в память. Массивы ColumnCache - представления
+    только для чтения поверх отображения, данные не копируются.
+    None, если файла нет или он устарел/повреждён (причина пишется в лог)
+    Attributes:
+    -----------
+    path: str
+        Путь к файлу
+    schema_version: int
+        Текущая версия схемы БД
+
+    Returns:
+    --------
+        Optional[ColumnCache]
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size < HEADER.size:
+            logger.warning("column cache %s is truncated", path)
+            return None
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, schema, rows, max_id, watermark, crc = \
+        HEADER.unpack_from(mapping)
+    offsets = _offsets(rows)
+    problem = None
+    if magic != MAGIC or version != FORMAT_VERSION or schema != schema_version:
+        problem = "has another version"
+    elif len(mapping) != offsets[-1]:
+        problem = "has wrong size"
+    else:
+        with memoryview(mapping) as view:
+            if zlib.crc32(view[HEADER.size:]) != crc:
+                problem = "is corrupt"
+    if problem is not None:
+        logger.warning("column cache %s %s", path, problem)
+        mapping.close()
+        return None
+    ids, minutes, cat_ids, amounts = (
+        np.frombuffer(mapping, dtype=dtype, count=rows, offset=offset)
+        for (_, dtype), offset in zip(COLUMNS, offsets))
+    return ColumnCache(ids, minutes, cat_ids, amounts, max_id,
+                       watermark.rstrip(b"\0").decode("ascii"))
@@ -0,0 +1,245 @@
+"""
+Потоковый импорт расходов из CSV.
+Файл читается порциями по chunk_size строк, поэтому память не зависит от размера
+файла. Порции разбираются и проверяются (дата, сумма) в текущем процессе или
+в пуле процессов, названия категорий сопоставляются с кэшем категорий,
+каждая порция вставляется пакетом в своей транзакции. Строки с ошибками
+не прерывают импорт и возвращаются с номерами строк файла.
+"""
+from __future__ import annotations
+import csv
+import math
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, NamedTuple, Optional, Sequence, Callable
+
+from sqlalchemy.orm import sessionmaker, Session
+
+from bookkeeper.config import BULK_CHUNK_SIZE
+from bookkeeper.models.sqlalchemy_models import ExpenseTable, MAX_AMOUNT
+from bookkeeper.repository.my_orm import unit_of_work, bulk_insert_values, \
+    get_categories
+
+# Столбцы CSV-файлов импорта и экспорта, comment необязателен
+CSV_COLUMNS = ("expense_date", "amount", "category", "comment")
+INSERT_COLUMNS = ("expense_date", "amount", "cat_id", "comment")
+
+# Строка файла: (номер строки, поля)
+RawRow = tuple[int, list[str]]
+# Разобранная строка: (номер строки, дата, сумма, категория, комментарий)
+ParsedRow = tuple[int, datetime, float, str, str]
+
+
+class ImportReject(NamedTuple):
+    """
+    Отклонённая строка файла
+    Attributes:
+    -----------
+    line: int
+        Номер строки файла (заголовок - строка 1)
+    error: str
+        Причина
+    """
+    line: int
+    error: str
+
+
+class ImportResult(NamedTuple):
+    """
+    Итог импорта
+    Attributes:
+    -----------
+    imported: int
+        Количество вставленных расходов
+    rejects: list[ImportReject]
+        Отклонённые строки в порядке файла
+    """
+    imported: int
+    rejects: list[ImportReject]
+
+
+def parse_date(text: str) -> datetime:
+    """
+    Дата в формате приложения (%d-%m-%Y %H:%M) или ISO 8601.
+    Формат приложения переставляется в ISO и разбирается datetime.fromisoformat:
+    это в разы быстрее strptime. Дата со смещением (Z, +03:00) приводится
+    к UTC без часового пояса. ValueError, если формат не подходит
+    """
+    iso = text
+    if len(text) == 16 and text[2] == text[5] == "-":
+        iso = f"{text[6:10]}-{text[3:5]}-{text[:2]}{text[10:]}"
+    try:
+        parsed = datetime.fromisoformat(iso)
+    except ValueError:
+        raise ValueError(f"Date {text} is incorrect") from None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_amount(text: str) -> float:
+    """
+    Неотрицательная сумма. ValueError, если text не число, число < 0
+    или больше MAX_AMOUNT
+    """
+    try:
+        amount = float(text)
+    except ValueError:
+        raise ValueError(f"Amount {text} should be a number") from None
+    if not math.isfinite(amount) or amount < 0:
+        raise ValueError(f"Amount {text} should be positive")
+    if amount > MAX_AMOUNT:
+        raise ValueError(f"Amount {text} should not exceed {MAX_AMOUNT}")
+    return amount
+
+
+def parse_chunk(chunk: Sequence[RawRow], positions: Sequence[Optional[int]]
+                ) -> tuple[list[ParsedRow], list[ImportReject]]:
+    """
+    Разобрать порцию строк файла. Функция не обращается к БД
+    и может выполняться в другом процессе
+    Attributes:
+    -----------
+    chunk: Sequence[RawRow]
+        Строки файла (номер строки, поля)
+    positions: Sequence[Optional[int]]
+        Номера полей столбцов CSV_COLUMNS (None - столбца нет)
+
+    Returns:
+    --------
+        tuple[list[ParsedRow], list[ImportReject]]
+    """
+    date_at, amount_at, category_at, comment_at = positions
+    assert date_at is not None and amount_at is not None and category_at is not None
+    width = max(position for position in positions if position is not None) + 1
+    parsed: list[ParsedRow] = []
+    rejects: list[ImportReject] = []
+    for line, fields in chunk:
+        if len(fields) < width:
+            rejects.append(ImportReject(line, f"expected {width} fields, "
+                                              f"got {len(fields)}"))
+            continue
+        try:
+            parsed.append((line, parse_date(fields[date_at]),
+                           parse_amount(fields[amount_at]), fields[category_at],
+                           fields[comment_at] if comment_at is not None else ""))
+        except ValueError as error:
+            rejects.append(ImportReject(line, str(error)))
+    return parsed, rejects
+
+
+def read_chunks(lines: Iterable[str], chunk_size: int
+                ) -> tuple[list[Optional[int]], Iterator[list[RawRow]]]:
+    """
+    Прочитать заголовок и вернуть номера полей столбцов CSV_COLUMNS
+    и генератор порций строк файла. ValueError, если нет обязательного столбца
+    """
+    reader = csv.reader(lines)
+    header = [name.strip() for name in next(reader, [])]
+    positions = [header.index(name) if name in header else None
+                 for name in CSV_COLUMNS]
+    missing = [name for name, position in zip(CSV_COLUMNS[:3], positions)
+               if position is None]
+    if missing:
+        raise ValueError(f"missing columns: {', '.join(missing)}")
+
+    def chunks() -> Iterator[list[RawRow]]:
+        chunk: list[RawRow] = []
+        for fields in reader:
+            if fields:
+                chunk.append((reader.line_num, fields))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+    return positions, chunks()
+
+
+def _parsed_chunks(chunks: Iterator[list[RawRow]], positions: list[Optional[int]],
+                   executor: Optional[Executor], prefetch: int
+                   ) -> Iterator[tuple[list[ParsedRow], list[ImportReject]]]:
+    """
+    Разобранные порции в порядке файла. С пулом процессов одновременно
+    разбирается не больше prefetch порций
+    """
+    if executor is None:
+        for chunk in chunks:
+            yield parse_chunk(chunk, positions)
+        return
+    futures: deque[Future[tuple[list[ParsedRow], list[ImportReject]]]] = deque()
+    for chunk in chunks:
+        futures.append(executor.submit(parse_chunk, chunk, positions))
+        if len(futures) >= prefetch:
+            yield futures.popleft().result()
+    while futures:
+        yield futures.popleft().result()
+
+
+def import_csv(lines: Iterable[str], session_factory: sessionmaker[Session],
+               chunk_size: int = BULK_CHUNK_SIZE, workers: int = 0,
+               strict: bool = False,
+               on_chunk: Optional[Callable[[int, int], None]] = None
+               ) -> ImportResult:
+    """
+    Импортировать расходы из CSV со столбцами CSV_COLUMNS (с заголовком).
+    Каждая порция вставляется в своей транзакции; если import_csv вызвана
+    внутри unit_of_work, весь импорт выполняется в транзакции вызывающего
+    Attributes:
+    -----------
+    lines: Iterable[str]
+        Строки CSV-файла (файл, открытый с newline="")
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+    chunk_size: int
+        Количество строк в порции
+    workers: int
+        Количество процессов для разбора строк, 0 - разбор в текущем процессе
+    strict: bool
+        Прервать импорт на первой ошибке: ValueError с номером строки,
+        весь импорт выполняется одной транзакцией и отменяется
+    on_chunk: Optional[Callable[[int, int], None]]
+        Вызывается после каждой порции с числом вставленных
+        и отклонённых строк с начала импорта
+
+    Returns:
+    --------
+        ImportResult
+    """
+    positions, chunks = read_chunks(lines, chunk_size)
+    categories = {cat.name: cat.id for cat in get_categories(session_factory)}
+    imported = 0
+    rejects: list[ImportReject] = []
+    executor = ProcessPoolExecutor(workers) if workers > 0 else None
+    try:
+        with unit_of_work(session_factory) if strict else nullcontext():
+            for parsed, chunk_rejects in _parsed_chunks(chunks, positions, executor,
+                                                        2 * workers):
+                rows = []
+                for line, expense_date, amount, category, comment in parsed:
+                    cat_id = categories.get(category)
+                    if cat_id is None:
+                        chunk_rejects.append(
+                            ImportReject(line, f"Unknown category {category}"))
+                    else:
+                        rows.append((expense_date, amount, cat_id, comment))
+                if chunk_rejects:
+                    chunk_rejects.sort()
+                    if strict:
+                        reject = chunk_rejects[0]
+                        raise ValueError(f"line {reject.line}: {reject.error}")
+                    rejects.extend(chunk_rejects)
+                if rows:
+                    bulk_insert_values(ExpenseTable, rows, session_factory,
+                                       columns=INSERT_COLUMNS, chunk_size=chunk_size,
+                                       returning=False)
+                    imported += len(rows)
+                if on_chunk is not None:
+                    on_chunk(imported, len(rejects))
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return ImportResult(imported, rejects)
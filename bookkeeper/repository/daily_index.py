@@ -0,0 +1,502 @@
+"""
+Индекс сумм расходов по дням в памяти: деревья Фенвика над суммами за день -
+общими и по каждой категории. Сумма за любой диапазон дней и изменение
+суммы за день стоят O(log n), где n - число дней между первым и последним
+расходом, независимо от числа расходов и длины диапазона. Индекс строится
+по свёртке daily_category_totals (строк - дни x категории, а не расходы).
+
+Функции записи my_orm сообщают индексу об изменениях (watch_expenses):
+перед изменением или удалением расхода по id его прежняя сумма вычитается,
+после записи текущие значения записанных расходов прибавляются при следующем
+обращении к индексу. Остальные изменения (delete_all, remap_expense_categories,
+откат транзакции) сбрасывают индекс, и он строится заново по свёртке.
+Записи в обход my_orm (например, другим процессом) индекс получает
+из журнала изменений при sync_expenses: суммы затронутых дней
+перечитываются из свёртки (см. bookkeeper.repository.sync).
+
+Суммы за периоды с неполными крайними днями (get_period_total,
+get_indexed_budget_summary) складываются из индекса за полные дни
+и запроса к expense_table за неполные.
+
+Деревья хранят целые копейки, как столбцы Cents в БД: суммы любых
+диапазонов точны и совпадают с суммами SQL (get_budget_summary).
+В денежные единицы суммы переводятся один раз - при чтении.
+"""
+from __future__ import annotations
+from datetime import date, datetime
+from typing import Any, Collection, Iterable, NamedTuple, Optional
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import BigInteger, ColumnElement, func, or_, select, type_coerce
+from sqlalchemy.orm import sessionmaker, Session
+
+from bookkeeper.models.sqlalchemy_models import BudgetTable, DailyCategoryTotals, \
+    ExpenseTable, EXPENSE_DAY, CENTS
+from bookkeeper.repository.my_orm import unit_of_work, watch_expenses
+from bookkeeper.repository.periods import period_window, split_period, cached_aggregate
+from bookkeeper.repository.pending import PendingExpenses
+from bookkeeper.repository.sync import ExpenseDelta, watch_sync
+
+PERIODS = ("day", "week", "month")
+# Суммы в копейках, как они хранятся в БД (без преобразования Cents во float)
+_TOTAL_CENTS = type_coerce(DailyCategoryTotals.total, BigInteger)
+_AMOUNT_CENTS = type_coerce(ExpenseTable.amount, BigInteger)
+
+
+class FenwickTree:
+    """
+    Дерево Фенвика (двоичное индексированное дерево) над списком целых чисел:
+    прибавление к элементу, сумма префикса и диапазона за O(log n),
+    построение за O(n)
+    Attributes:
+    -----------
+    values: Iterable[int]
+        Начальные значения элементов
+    """
+
+    def __init__(self, values: Iterable[int] = ()) -> None:
+        # Узел i (с 1) хранит сумму элементов [i - (i & -i), i)
+        tree = [0]
+        tree.extend(values)
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def __len__(self) -> int:
+        return len(self._tree) - 1
+
+    def add(self, index: int, delta: int) -> None:
+        """
+        Прибавить delta к элементу index
+        """
+        tree = self._tree
+        i = index + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def append(self, value: int) -> None:
+        """
+        Добавить элемент в конец за O(log n)
+        """
+        i = len(self._tree)
+        self._tree.append(value + self.prefix(i - 1) - self.prefix(i - (i & -i)))
+
+    def prefix(self, end: int) -> int:
+        """
+        Сумма элементов [0, end)
+        """
+        tree = self._tree
+        i = min(end, len(tree) - 1)
+        total = 0
+        while i > 0:
+            total += tree[i]
+            i &= i - 1
+        return total
+
+    def range_sum(self, first: int, last: int) -> int:
+        """
+        Сумма элементов [first, last] включительно. Индексы за пределами
+        дерева не учитываются
+        """
+        first = max(first, 0)
+        if first > last:
+            return 0
+        return self.prefix(last + 1) - self.prefix(first)
+
+    def values(self) -> list[int]:
+        """
+        Значения элементов (обратное построение, O(n))
+        """
+        values = self._tree[1:]
+        for i in range(len(values), 0, -1):
+            parent = i + (i & -i)
+            if parent <= len(values):
+                values[parent - 1] -= values[i - 1]
+        return values
+
+
+class DailyTotalsIndex:
+    """
+    Суммы расходов по дням, общие и по категориям, в деревьях Фенвика.
+    Элемент деревьев - сумма за день в копейках, дни начиная с origin
+    Attributes:
+    -----------
+    origin: Optional[date]
+        Первый день индекса (None - индекс пуст)
+    loads: int
+        Сколько раз индекс строился по свёртке
+    updates: int
+        Сколько раз в индекс дочитывались записанные расходы
+    """
+
+    def __init__(self) -> None:
+        self.origin: Optional[date] = None
+        self.loads = 0
+        self.updates = 0
+        self._overall = FenwickTree()
+        self._categories: dict[int, FenwickTree] = {}
+        self._pending = PendingExpenses()
+
+    @property
+    def fresh(self) -> bool:
+        """
+        Соответствует ли индекс записям в БД
+        """
+        return not (self._pending.stale or self._pending)
+
+    def invalidate(self) -> None:
+        """
+        Построить индекс заново при следующем refresh
+        """
+        self._pending.invalidate()
+
+    def expenses_changing(self, session: Session, pks: Collection[int]) -> None:
+        """
+        Обработчик перед изменением или удалением расходов
+        (см. my_orm.watch_expenses): вычесть их прежние суммы
+        """
+        if self._pending.stale:
+            return
+        if len(pks) > self._pending.limit:
+            self.invalidate()
+            return
+        # Ожидающие расходы сначала учитываются, иначе вычитать нечего
+        self._apply_pending(session)
+        self._apply(session, [ExpenseTable.id.in_(sorted(pks))], -1)
+
+    def expenses_changed(self, pks: Optional[Collection[int]]) -> None:
+        """
+        Обработчик записи расходов (см. my_orm.watch_expenses)
+        """
+        self._pending.add(pks)
+
+    def expenses_synced(self, session: Session, delta: ExpenseDelta) -> None:
+        """
+        Обработчик изменений из журнала (см. sync.watch_sync): суммы дней,
+        затронутых изменениями, заменяются суммами из свёртки
+        """
+        if delta.reload:
+            self.invalidate()
+            return
+        if self._pending.stale:
+            return
+        days = sorted(delta.days())
+        if len(days) > self._pending.limit:
+            self.invalidate()
+            return
+        # Ожидающие расходы сначала учитываются, иначе они попадут в суммы дважды
+        self.refresh(session)
+        totals: dict[date, dict[int, int]] = {day: {} for day in days}
+        for day, cat_id, total in session.execute(
+                select(DailyCategoryTotals.day, DailyCategoryTotals.cat_id, _TOTAL_CENTS)
+                .where(DailyCategoryTotals.day.in_(days))):
+            totals[day][cat_id] = total
+        for day, day_totals in totals.items():
+            for cat_id in set(self._categories) | set(day_totals):
+                change = day_totals.get(cat_id, 0) - self.total_cents(day, day, cat_id)
+                if change:
+                    self.add(day, cat_id, change)
+
+    def refresh(self, session: Session) -> None:
+        """
+        Привести индекс в соответствие с БД: прибавить записанные расходы
+        или, если индекс сброшен, построить его по свёртке
+        """
+        if self._pending.stale:
+            self._load(session)
+            self.loads += 1
+        elif not self.fresh:
+            self._apply_pending(session)
+            self.updates += 1
+        self._pending.stale = False
+
+    def _load(self, session: Session) -> None:
+        """
+        Построить деревья по свёртке daily_category_totals
+        """
+        rows = session.execute(
+            select(DailyCategoryTotals.day, DailyCategoryTotals.cat_id, _TOTAL_CENTS)
+            .order_by(DailyCategoryTotals.day)).all()
+        self.origin = rows[0].day if rows else None
+        origin = rows[0].day.toordinal() if rows else 0
+        days = rows[-1].day.toordinal() - origin + 1 if rows else 0
+        overall = [0] * days
+        categories: dict[int, list[int]] = {}
+        for day, cat_id, total in rows:
+            position = day.toordinal() - origin
+            overall[position] += total
+            if cat_id not in categories:
+                categories[cat_id] = [0] * days
+            categories[cat_id][position] += total
+        self._overall = FenwickTree(overall)
+        self._categories = {cat_id: FenwickTree(values)
+                            for cat_id, values in categories.items()}
+        self._pending.clear()
+
+    def _apply_pending(self, session: Session) -> None:
+        """
+        Прибавить текущие значения записанных расходов
+        """
+        conditions = self._pending.conditions()
+        self._pending.clear()
+        if conditions:
+            self._apply(session, conditions, 1)
+
+    def _apply(self, session: Session, conditions: list[ColumnElement[bool]],
+               sign: int) -> None:
+        """
+        Прибавить к индексу суммы расходов, подходящих под одно из условий,
+        умноженные на sign
+        """
+        query = (select(EXPENSE_DAY, ExpenseTable.cat_id, _AMOUNT_CENTS)
+                 .where(or_(*conditions)))
+        for day, cat_id, amount in session.execute(query):
+            self.add(day, cat_id, sign * amount)
+
+    def _position(self, day: date) -> int:
+        """
+        Номер элемента дня в деревьях. День раньше origin сдвигает
+        все деревья (O(n)), день позже последнего добавляется в конец
+        """
+        if self.origin is None:
+            self.origin = day
+        shift = self.origin.toordinal() - day.toordinal()
+        if shift > 0:
+            self.origin = day
+            self._overall = FenwickTree([0] * shift + self._overall.values())
+            self._categories = {
+                cat_id: FenwickTree([0] * shift + tree.values())
+                for cat_id, tree in self._categories.items()}
+        return day.toordinal() - self.origin.toordinal()
+
+    def add(self, day: date, cat_id: int, delta: int) -> None:
+        """
+        Прибавить delta к сумме дня day (общей и категории cat_id)
+        Attributes:
+        -----------
+        day: date
+            День
+        cat_id: int
+            Primary Key категории
+        delta: int
+            Изменение суммы, копейки
+
+        Returns:
+        --------
+            None
+        """
+        position = self._position(day)
+        tree = self._categories.get(cat_id)
+        if tree is None:
+            tree = self._categories[cat_id] = FenwickTree([0] * (position + 1))
+        for target in (self._overall, tree):
+            while len(target) <= position:
+                target.append(0)
+            target.add(position, delta)
+
+    def total_cents(self, first: date, last: date,
+                    cat_id: Optional[int] = None) -> int:
+        """
+        Сумма расходов за дни [first, last] включительно в копейках, O(log n)
+        Attributes:
+        -----------
+        first: date
+            Первый день
+        last: date
+            Последний день
+        cat_id: Optional[int]
+            Primary Key категории (None - все категории)
+
+        Returns:
+        --------
+            int
+        """
+        tree = self._overall if cat_id is None else self._categories.get(cat_id)
+        if tree is None or self.origin is None:
+            return 0
+        origin = self.origin.toordinal()
+        return tree.range_sum(first.toordinal() - origin, last.toordinal() - origin)
+
+    def total(self, first: date, last: date, cat_id: Optional[int] = None) -> float:
+        """
+        Сумма расходов за дни [first, last] включительно (см. total_cents)
+        """
+        return self.total_cents(first, last, cat_id) / CENTS
+
+    def by_category_cents(self, first: date, last: date) -> dict[int, int]:
+        """
+        Суммы расходов в копейках по категориям за дни [first, last]
+        включительно: {cat_id: сумма}, включая категории без расходов за эти дни
+        """
+        return {cat_id: self.total_cents(first, last, cat_id)
+                for cat_id in self._categories}
+
+    def by_category(self, first: date, last: date) -> dict[int, float]:
+        """
+        Суммы расходов по категориям за дни [first, last] включительно
+        (см. by_category_cents)
+        """
+        return {cat_id: total / CENTS
+                for cat_id, total in self.by_category_cents(first, last).items()}
+
+
+class BudgetSummary(NamedTuple):
+    """
+    Строка бюджета с суммой расходов за период (см. budget_data_transform)
+    Attributes:
+    -----------
+    id: int
+        Primary Key строки бюджета
+    period: str
+        Период: day, week или month
+    budget: Optional[float]
+        Бюджет на период
+    amount: float
+        Сумма расходов за период
+    """
+    id: int
+    period: str
+    budget: Optional[float]
+    amount: float
+
+
+_indexes: WeakKeyDictionary[sessionmaker[Session], DailyTotalsIndex] = \
+    WeakKeyDictionary()
+
+
+def get_daily_index(session_factory: sessionmaker[Session]) -> DailyTotalsIndex:
+    """
+    Индекс сумм по дням БД, с которой работает фабрика сессий session_factory.
+    Первый вызов строит индекс по свёртке, следующие дочитывают только
+    расходы, записанные после предыдущего вызова
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        DailyTotalsIndex
+    """
+    index = _indexes.get(session_factory)
+    if index is None:
+        index = _indexes[session_factory] = DailyTotalsIndex()
+        watch_expenses(session_factory, index.expenses_changed, index.expenses_changing)
+        watch_sync(session_factory, index.expenses_synced)
+    if not index.fresh:
+        with unit_of_work(session_factory) as session:
+            index.refresh(session)
+    return index
+
+
+def _edge_totals(session: Session, raw_bounds: list[tuple[datetime, datetime]]
+                 ) -> list[Any]:
+    """
+    Суммы расходов в копейках по категориям за неполные крайние дни периода
+    """
+    if not raw_bounds:
+        return []
+    query = (select(ExpenseTable.cat_id, func.sum(_AMOUNT_CENTS))
+             .where(or_(*(ExpenseTable.expense_date.between(*bounds)
+                          for bounds in raw_bounds)))
+             .group_by(ExpenseTable.cat_id))
+    return list(session.execute(query).all())
+
+
+def get_period_total(start: datetime, end: datetime,
+                     session_factory: sessionmaker[Session],
+                     cat_id: Optional[int] = None) -> float:
+    """
+    Получить сумму расходов за период [start, end] по индексу сумм по дням.
+    Стоимость - O(log n) для полных дней и запрос по индексу дат
+    для неполных крайних дней
+    Attributes:
+    -----------
+    start: datetime
+        Начало периода
+    end: datetime
+        Конец периода (включительно)
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+    cat_id: Optional[int]
+        Primary Key категории (None - все категории)
+
+    Returns:
+    --------
+        float
+    """
+    raw_bounds, first_full, last_full = split_period(start, end)
+    with unit_of_work(session_factory) as session:
+        total = get_daily_index(session_factory).total_cents(first_full, last_full,
+                                                             cat_id)
+        for edge_cat_id, amount in _edge_totals(session, raw_bounds):
+            if cat_id is None or edge_cat_id == cat_id:
+                total += amount
+    return total / CENTS
+
+
+def get_period_totals_by_cat(start: datetime, end: datetime,
+                             session_factory: sessionmaker[Session]
+                             ) -> dict[int, float]:
+    """
+    Получить суммы расходов по категориям за период [start, end]
+    по индексу сумм по дням
+    Attributes:
+    -----------
+    start: datetime
+        Начало периода
+    end: datetime
+        Конец периода (включительно)
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        dict[int, float] - {cat_id: сумма} для категорий в индексе
+    """
+    raw_bounds, first_full, last_full = split_period(start, end)
+    with unit_of_work(session_factory) as session:
+        totals = get_daily_index(session_factory).by_category_cents(first_full,
+                                                                    last_full)
+        for cat_id, amount in _edge_totals(session, raw_bounds):
+            totals[cat_id] = totals.get(cat_id, 0) + amount
+    return {cat_id: total / CENTS for cat_id, total in totals.items()}
+
+
+def get_indexed_budget_summary(session_factory: sessionmaker[Session]
+                               ) -> list[BudgetSummary]:
+    """
+    Получить бюджет и сумму расходов за день, неделю и месяц по индексу
+    сумм по дням (то же, что periods.get_budget_summary, без сканирования
+    свёртки за период). Результат берётся из кэша агрегатов
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        list[BudgetSummary] - строки в порядке id
+    """
+    return cached_aggregate("indexed_budget", PERIODS,
+                            lambda now: _indexed_budget_summary(now, session_factory),
+                            session_factory, (BudgetTable.__tablename__,))
+
+
+def _indexed_budget_summary(now: datetime, session_factory: sessionmaker[Session]
+                            ) -> list[BudgetSummary]:
+    """
+    Бюджет и суммы расходов за периоды на момент now по индексу сумм по дням
+    """
+    with unit_of_work(session_factory) as session:
+        budgets = session.execute(
+            select(BudgetTable.id, BudgetTable.period, BudgetTable.budget)
+            .order_by(BudgetTable.id)).all()
+        return [BudgetSummary(pk, period, budget,
+                              get_period_total(*period_window(period, now),
+                                               session_factory)
+                              if period in PERIODS else 0.0)
+                for pk, period, budget in budgets]
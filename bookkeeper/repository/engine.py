@@ -0,0 +1,143 @@
+"""
+Фабрика движков SQLAlchemy с профилями хранения SQLite.
+Профиль - набор PRAGMA, которые выполняются на каждом новом соединении
+(событие connect): режим журнала, synchronous, размер кэша страниц,
+размер отображения файла в память, temp_store и busy_timeout.
+
+Профиль выбирается аргументом create_bookkeeper_engine, переменной
+окружения BOOKKEEPER_STORAGE_PROFILE или config.STORAGE_PROFILE
+(в этом порядке).
+
+Транзакции начинает сам движок (BEGIN по событию begin), а не драйвер
+pysqlite: драйвер открывает транзакцию только перед INSERT/UPDATE/DELETE
+и выполняет CREATE/ALTER/DROP до неё без транзакции, так что их нельзя
+было бы откатить (см. migrations.migrate).
+"""
+import os
+from typing import Any, NamedTuple, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine.base import Connection, Engine
+
+from bookkeeper.config import STORAGE_PROFILE
+
+PROFILE_ENV = "BOOKKEEPER_STORAGE_PROFILE"
+
+
+class StorageProfile(NamedTuple):
+    """
+    Настройки соединения SQLite
+    Attributes:
+    -----------
+    journal_mode: str
+        PRAGMA journal_mode (WAL - читатели не блокируют писателя)
+    synchronous: str
+        PRAGMA synchronous (NORMAL в режиме WAL не теряет целостность,
+        OFF - теряет последние транзакции при сбое ОС)
+    cache_size: int
+        PRAGMA cache_size, отрицательное значение - в КиБ
+    mmap_size: int
+        PRAGMA mmap_size, байт (0 - чтение через read())
+    temp_store: str
+        PRAGMA temp_store для временных таблиц и сортировок
+    busy_timeout: int
+        PRAGMA busy_timeout, мс ожидания блокировки другим соединением
+    query_only: bool
+        PRAGMA query_only - запрет записи через соединение
+    """
+    journal_mode: str
+    synchronous: str
+    cache_size: int
+    mmap_size: int
+    temp_store: str
+    busy_timeout: int
+    query_only: bool = False
+
+    def pragmas(self) -> list[str]:
+        """
+        Команды PRAGMA профиля
+        """
+        return [f"PRAGMA journal_mode = {self.journal_mode}",
+                f"PRAGMA synchronous = {self.synchronous}",
+                f"PRAGMA cache_size = {self.cache_size}",
+                f"PRAGMA mmap_size = {self.mmap_size}",
+                f"PRAGMA temp_store = {self.temp_store}",
+                f"PRAGMA busy_timeout = {self.busy_timeout}",
+                f"PRAGMA query_only = {int(self.query_only)}"]
+
+
+PROFILES = {
+    # Приложение: короткие транзакции, чтение во время записи
+    "interactive": StorageProfile("WAL", "NORMAL", -16 * 1024, 256 * 2 ** 20,
+                                  "MEMORY", 5000),
+    # Импорт: большие транзакции без fsync, большой кэш для вставок в индексы
+    "bulk-load": StorageProfile("WAL", "OFF", -256 * 1024, 256 * 2 ** 20,
+                                "MEMORY", 30000),
+    # Отчёты и аналитика: только чтение, весь файл отображён в память
+    "read-only analytics": StorageProfile("WAL", "NORMAL", -64 * 1024, 2 ** 30,
+                                          "MEMORY", 5000, query_only=True),
+}
+
+
+def storage_profile(name: Optional[str] = None) -> StorageProfile:
+    """
+    Найти профиль хранения по имени
+    Attributes:
+    -----------
+    name: Optional[str]
+        Имя профиля (None - из BOOKKEEPER_STORAGE_PROFILE или
+        config.STORAGE_PROFILE)
+
+    Returns:
+    --------
+        StorageProfile
+    """
+    if name is None:
+        name = os.environ.get(PROFILE_ENV) or STORAGE_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown storage profile {name!r}, "
+                         f"expected one of {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+
+def create_bookkeeper_engine(dsn: str, profile: Optional[str] = None,
+                             **kwargs: Any) -> Engine:
+    """
+    Создать движок SQLAlchemy, применяющий профиль хранения к каждому
+    соединению SQLite и начинающий транзакции явным BEGIN (DDL
+    откатывается вместе с транзакцией). Для других СУБД движок
+    не настраивается
+    Attributes:
+    -----------
+    dsn: str
+        Строка подключения
+    profile: Optional[str]
+        Имя профиля из PROFILES (None - из окружения или конфигурации)
+    kwargs: Any
+        Аргументы create_engine
+
+    Returns:
+    --------
+        Engine
+    """
+    engine = create_engine(dsn, **kwargs)
+    if engine.dialect.name != "sqlite":
+        return engine
+    pragmas = storage_profile(profile).pragmas()
+
+    @event.listens_for(engine, "connect")
+    def apply_profile(dbapi_connection: Any, _: Any) -> None:
+        # Драйвер не начинает транзакции сам, см. begin_transaction
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def begin_transaction(connection: Connection) -> None:
+        connection.exec_driver_sql("BEGIN")
+
+    return engine
@@ -0,0 +1,116 @@
+"""
+Шина событий изменения данных репозитория.
+Функции записи my_orm публикуют ChangeEvent для каждой записи в таблицу:
+какие строки изменены, какие поля, прежние и новые категории расходов
+и дни, суммы за которые могли измениться. Подписчики (например Presenter)
+по событию решают, какие данные нужно перечитать.
+
+События публикуются сразу после выполнения запроса, в потоке записи
+и до фиксации транзакции. Откат транзакции публикует событие ROLLBACK:
+после него подписчик должен считать изменёнными любые данные.
+Подробности (категории, дни) читаются из БД только при наличии подписчиков.
+"""
+from __future__ import annotations
+from datetime import date
+from typing import Callable, Collection, NamedTuple, Optional
+from weakref import WeakKeyDictionary
+
+from sqlalchemy.orm import sessionmaker, Session
+
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+ROLLBACK = "rollback"
+# Поля расходов, от которых зависят суммы за периоды и по категориям
+AGGREGATE_COLUMNS = frozenset({"expense_date", "amount", "cat_id"})
+
+
+class ChangeEvent(NamedTuple):
+    """
+    Изменение данных в таблице
+    Attributes:
+    -----------
+    table: Optional[str]
+        Название таблицы (None - любая таблица, для ROLLBACK)
+    kind: str
+        INSERT, UPDATE, DELETE или ROLLBACK
+    pks: Optional[tuple[int, ...]]
+        id записанных строк (None - могли измениться любые строки)
+    columns: Optional[frozenset[str]]
+        Изменённые поля (None - строки целиком: вставка или удаление)
+    old_cat_ids: frozenset[int]
+        Категории расходов до изменения
+    new_cat_ids: frozenset[int]
+        Категории расходов после изменения
+    days: Optional[frozenset[date]]
+        Дни расходов до и после изменения (None - неизвестны,
+        пусто для других таблиц)
+    rowcount: Optional[int]
+        Количество записанных строк (None - неизвестно)
+    """
+    table: Optional[str]
+    kind: str
+    pks: Optional[tuple[int, ...]] = None
+    columns: Optional[frozenset[str]] = None
+    old_cat_ids: frozenset[int] = frozenset()
+    new_cat_ids: frozenset[int] = frozenset()
+    days: Optional[frozenset[date]] = None
+    rowcount: Optional[int] = None
+
+    def affects(self, table: str, columns: Optional[Collection[str]] = None) -> bool:
+        """
+        Могло ли изменение затронуть поля columns таблицы table
+        (None - любые поля)
+        """
+        if self.table is not None and self.table != table:
+            return False
+        return columns is None or self.columns is None \
+            or not self.columns.isdisjoint(columns)
+
+    def affects_days(self, first: date, last: date) -> bool:
+        """
+        Могло ли изменение затронуть расходы за дни [first, last]
+        """
+        # pylint: disable-next=not-an-iterable
+        return self.days is None or any(first <= day <= last for day in self.days)
+
+
+ChangeHandler = Callable[[ChangeEvent], None]
+_subscribers: WeakKeyDictionary[sessionmaker[Session], list[ChangeHandler]] = \
+    WeakKeyDictionary()
+
+
+def subscribe(session_factory: sessionmaker[Session],
+              handler: ChangeHandler) -> Callable[[], None]:
+    """
+    Вызывать handler для каждого события изменения данных БД,
+    с которой работает фабрика сессий session_factory
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+    handler: ChangeHandler
+        Подписчик
+
+    Returns:
+    --------
+        Callable[[], None] - отмена подписки
+    """
+    handlers = _subscribers.setdefault(session_factory, [])
+    handlers.append(handler)
+    return lambda: handlers.remove(handler)
+
+
+def has_subscribers(session_factory: sessionmaker[Session]) -> bool:
+    """
+    Есть ли подписчики у событий БД фабрики сессий session_factory
+    """
+    return bool(_subscribers.get(session_factory))
+
+
+def publish(session_factory: sessionmaker[Session], event: ChangeEvent) -> None:
+    """
+    Передать событие event подписчикам
+    """
+    for handler in list(_subscribers.get(session_factory, ())):
+        handler(event)
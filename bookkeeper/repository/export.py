@@ -0,0 +1,202 @@
+"""
+Потоковая выгрузка расходов в CSV и JSON Lines.
+Расходы читаются курсором порциями по batch_size (yield_per) и сразу
+записываются в файл, поэтому память не зависит от количества расходов.
+
+Выгрузка читает в собственной сессии, не зарегистрированной в unit_of_work:
+генератор приостанавливается между порциями, и вызовы репозитория,
+сделанные в это время, не должны попадать в транзакцию выгрузки.
+"""
+from __future__ import annotations
+import csv
+import json
+from datetime import datetime
+from typing import Any, Generator, Iterable, Optional, Sequence, TextIO, Union
+
+from sqlalchemy import Result, Row, select
+from sqlalchemy.orm import sessionmaker, Session
+
+from bookkeeper.config import BULK_CHUNK_SIZE
+from bookkeeper.models.sqlalchemy_models import ExpenseTable, CategoryTable
+from bookkeeper.repository.csv_import import CSV_COLUMNS
+from bookkeeper.repository.my_orm import get_categories
+
+# Столбцы, доступные для выгрузки
+EXPORT_COLUMNS = {
+    "id": ExpenseTable.id,
+    "expense_date": ExpenseTable.expense_date,
+    "amount": ExpenseTable.amount,
+    "cat_id": ExpenseTable.cat_id,
+    "category": CategoryTable.name,
+    "comment": ExpenseTable.comment,
+}
+FORMATS = ("csv", "jsonl")
+
+
+def category_subtree(category: Union[int, str],
+                     session_factory: sessionmaker[Session]) -> list[int]:
+    """
+    id категории и всех её подкатегорий (по кэшу категорий).
+    ValueError, если категории нет
+    Attributes:
+    -----------
+    category: Union[int, str]
+        id или название категории
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        list[int]
+    """
+    children: dict[Optional[int], list[int]] = {}
+    roots = []
+    for cat in get_categories(session_factory):
+        children.setdefault(cat.parent, []).append(cat.id)
+        if category in (cat.id, cat.name):
+            roots.append(cat.id)
+    if not roots:
+        raise ValueError(f"Unknown category {category}")
+    result = []
+    while roots:
+        pk = roots.pop()
+        result.append(pk)
+        roots.extend(children.get(pk, []))
+    return result
+
+
+def stream_expenses(session_factory: sessionmaker[Session],
+                    columns: Sequence[str] = CSV_COLUMNS,
+                    start: Optional[datetime] = None, end: Optional[datetime] = None,
+                    category: Union[int, str, None] = None,
+                    batch_size: int = BULK_CHUNK_SIZE
+                    ) -> Generator[Row[Any], None, None]:
+    """
+    Расходы в порядке дат, прочитанные курсором порциями по batch_size.
+    Чтение идёт в отдельной транзакции (не в транзакции unit_of_work
+    вызывающего), она открыта, пока генератор не исчерпан или не закрыт
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+    columns: Sequence[str]
+        Выгружаемые столбцы из EXPORT_COLUMNS
+    start: Optional[datetime]
+        Начало периода (включительно)
+    end: Optional[datetime]
+        Конец периода (включительно)
+    category: Union[int, str, None]
+        id или название категории: выгружаются расходы категории и всех её
+        подкатегорий
+    batch_size: int
+        Количество строк, читаемых из курсора за раз
+
+    Returns:
+    --------
+        Generator[Row[Any], None, None] - строки со столбцами columns
+    """
+    unknown = [name for name in columns if name not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"unknown columns: {', '.join(unknown)}")
+    query = select(*(EXPORT_COLUMNS[name].label(name) for name in columns)) \
+        .select_from(ExpenseTable)
+    if "category" in columns:
+        query = query.join(CategoryTable, CategoryTable.id == ExpenseTable.cat_id)
+    if start is not None:
+        query = query.where(ExpenseTable.expense_date >= start)
+    if end is not None:
+        query = query.where(ExpenseTable.expense_date <= end)
+    if category is not None:
+        query = query.where(ExpenseTable.cat_id.in_(
+            category_subtree(category, session_factory)))
+    query = query.order_by(ExpenseTable.expense_date, ExpenseTable.id) \
+        .execution_options(yield_per=batch_size)
+    with session_factory() as session, session.begin():
+        result: Result[Any] = session.execute(query)
+        yield from result
+
+
+def _json_value(value: Any) -> Any:
+    """
+    Значение поля для json.dumps
+    """
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def write_expenses(rows: Iterable[Row[Any]], file: TextIO, columns: Sequence[str],
+                   fmt: str = "csv") -> int:
+    """
+    Записать строки в файл в формате fmt (csv - с заголовком, jsonl - объект
+    на строку)
+    Attributes:
+    -----------
+    rows: Iterable[Row[Any]]
+        Строки со столбцами columns (см. stream_expenses)
+    file: TextIO
+        Файл для записи
+    columns: Sequence[str]
+        Названия столбцов
+    fmt: str
+        Формат: csv или jsonl
+
+    Returns:
+    --------
+        int - количество записанных строк
+    """
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(value.isoformat(sep=" ") if isinstance(value, datetime)
+                            else value for value in row)
+            count += 1
+    elif fmt == "jsonl":
+        for row in rows:
+            file.write(json.dumps(dict(zip(columns, map(_json_value, row))),
+                                  ensure_ascii=False))
+            file.write("\n")
+            count += 1
+    else:
+        raise ValueError(f"Unknown format {fmt}")
+    return count
+
+
+def export_expenses(file: TextIO, session_factory: sessionmaker[Session],
+                    fmt: str = "csv", columns: Sequence[str] = CSV_COLUMNS,
+                    start: Optional[datetime] = None, end: Optional[datetime] = None,
+                    category: Union[int, str, None] = None,
+                    batch_size: int = BULK_CHUNK_SIZE) -> int:
+    """
+    Выгрузить расходы в файл (см. stream_expenses и write_expenses).
+    Выгрузка в CSV со столбцами по умолчанию читается import_csv
+    Attributes:
+    -----------
+    file: TextIO
+        Файл для записи
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+    fmt: str
+        Формат: csv или jsonl
+    columns: Sequence[str]
+        Выгружаемые столбцы из EXPORT_COLUMNS
+    start: Optional[datetime]
+        Начало периода (включительно)
+    end: Optional[datetime]
+        Конец периода (включительно)
+    category: Union[int, str, None]
+        id или название категории
+    batch_size: int
+        Количество строк, читаемых из курсора за раз
+
+    Returns:
+    --------
+        int - количество выгруженных расходов
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt}")
+    rows = stream_expenses(session_factory, columns, start, end, category, batch_size)
+    try:
+        return write_expenses(rows, file, columns, fmt)
+    finally:
+        rows.close()
@@ -0,0 +1,197 @@
+"""
+Модуль миграций схемы БД.
+Версия схемы хранится в PRAGMA user_version. Каждый шаг из MIGRATIONS
+переводит схему с версии i на версию i + 1 и должен быть идемпотентным.
+"""
+from __future__ import annotations
+from typing import Callable
+
+from sqlalchemy import Integer, func, inspect, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.engine.base import Engine
+from sqlalchemy.orm import sessionmaker, Session
+
+from bookkeeper.models.sqlalchemy_models import Base, CategoryTable, ExpenseTable, \
+    DailyCategoryTotals, BudgetTable, ExpenseChange, ROLLUP_TRIGGERS, \
+    CHANGE_LOG_TRIGGERS, CENTS, rollup_triggers
+from bookkeeper.repository.my_orm import unit_of_work, bulk_insert_values
+from bookkeeper.repository.rollup import fill_daily_totals
+from bookkeeper.repository.sync import prune_change_log
+
+
+def _add_indexes(connection: Connection) -> None:
+    """
+    Версия 1: индексы expense_table по дате и категории, индекс названий категорий
+    """
+    for name in (ExpenseTable.__tablename__, CategoryTable.__tablename__):
+        for index in Base.metadata.tables[name].indexes:
+            index.create(connection, checkfirst=True)
+
+
+# Триггеры свёртки версий 2-4: даты расходов хранились текстом
+_TEXT_DATE_TRIGGERS = rollup_triggers("date({row}.expense_date)")
+_TRIGGER_NAMES = ("expense_insert_totals", "expense_delete_totals",
+                  "expense_update_totals")
+
+
+def _add_daily_totals(connection: Connection) -> None:
+    """
+    Версия 2: свёртка daily_category_totals, её триггеры и начальное заполнение
+    """
+    table = Base.metadata.tables[DailyCategoryTotals.__tablename__]
+    table.create(connection, checkfirst=True)
+    for trigger in _TEXT_DATE_TRIGGERS:
+        connection.exec_driver_sql(trigger)
+    fill_daily_totals(connection, func.date(ExpenseTable.expense_date))
+
+
+def _add_keyset_index(connection: Connection) -> None:
+    """
+    Версия 3: индекс expense_table по дате для постраничного чтения
+    """
+    for index in Base.metadata.tables[ExpenseTable.__tablename__].indexes:
+        if index.name == "ix_expense_date":
+            index.create(connection, checkfirst=True)
+
+
+def _add_updated_at_index(connection: Connection) -> None:
+    """
+    Версия 4: индекс expense_table по updated_at для сверки кэша аналитики
+    """
+    for index in Base.metadata.tables[ExpenseTable.__tablename__].indexes:
+        if index.name == "ix_expense_updated_at":
+            index.create(connection, checkfirst=True)
+
+
+# Прежняя expense_table на время переноса строк в версию 5
+_OLD_EXPENSES = "expense_table_v4"
+
+
+def _compact_storage(connection: Connection) -> None:
+    """
+    Версия 5: суммы расходов и свёртки - целые копейки, даты расходов -
+    целые секунды от начала эпохи (см. Cents, EpochSeconds).
+    SQLite не меняет тип столбца, поэтому expense_table пересоздаётся:
+    старая таблица переименовывается в expense_table_v4, строки
+    переносятся одним INSERT ... SELECT с преобразованием, свёртка
+    строится заново.
+    На движке create_bookkeeper_engine шаг целиком откатывается вместе
+    с транзакцией migrate. Драйвер pysqlite без этой настройки фиксирует
+    переименование сразу, поэтому оставшаяся после сбоя expense_table_v4
+    считается источником строк: перенос начинается заново из неё
+    """
+    if not inspect(connection).has_table(_OLD_EXPENSES):
+        columns = {column["name"]: column["type"] for column in
+                   inspect(connection).get_columns(ExpenseTable.__tablename__)}
+        if isinstance(columns["expense_date"], Integer):
+            return
+        for trigger in _TRIGGER_NAMES:
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+        for index in inspect(connection).get_indexes(ExpenseTable.__tablename__):
+            connection.exec_driver_sql(f"DROP INDEX IF EXISTS {index['name']}")
+        connection.exec_driver_sql(
+            f"ALTER TABLE expense_table RENAME TO {_OLD_EXPENSES}")
+    for model in (ExpenseTable, DailyCategoryTotals):
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {model.__tablename__}")
+        Base.metadata.tables[model.__tablename__].create(connection)
+    connection.exec_driver_sql(
+        "INSERT INTO expense_table "
+        "(id, expense_date, cat_id, amount, comment, added_at, updated_at) "
+        "SELECT id, CAST(strftime('%s', expense_date) AS INTEGER), cat_id, "
+        f"CAST(round(amount * {CENTS}) AS INTEGER), comment, added_at, updated_at "
+        f"FROM {_OLD_EXPENSES}")
+    connection.exec_driver_sql(f"DROP TABLE {_OLD_EXPENSES}")
+    for trigger in ROLLUP_TRIGGERS:
+        connection.exec_driver_sql(trigger)
+    fill_daily_totals(connection)
+
+
+def _add_change_log(connection: Connection) -> None:
+    """
+    Версия 6: журнал изменений расходов expense_changes и его триггеры.
+    Изменения, сделанные до миграции, в журнал не попадают
+    """
+    Base.metadata.tables[ExpenseChange.__tablename__].create(connection, checkfirst=True)
+    for trigger in CHANGE_LOG_TRIGGERS:
+        connection.exec_driver_sql(trigger)
+
+
+MIGRATIONS: list[Callable[[Connection], None]] = [
+    _add_indexes,
+    _add_daily_totals,
+    _add_keyset_index,
+    _add_updated_at_index,
+    _compact_storage,
+    _add_change_log,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(connection: Connection) -> int:
+    """
+    Получить версию схемы БД
+    Attributes:
+    -----------
+    connection: Connection
+        Соединение с БД
+
+    Returns:
+    --------
+        int
+    """
+    version: int = connection.exec_driver_sql("PRAGMA user_version").scalar_one()
+    return version
+
+
+def migrate(engine: Engine) -> None:
+    """
+    Создать таблицы в новой БД или обновить схему существующей БД
+    до версии SCHEMA_VERSION. Шаги выполняются в одной транзакции:
+    на движке create_bookkeeper_engine сбой любого шага оставляет
+    прежнюю схему и данные
+    Attributes:
+    -----------
+    engine: Engine
+        Движок для работы с БД через sqlalchemy
+
+    Returns:
+    --------
+        None
+    """
+    with engine.begin() as connection:
+        version = get_schema_version(connection)
+        inspector = inspect(connection)
+        if inspector.has_table(ExpenseTable.__tablename__) \
+                or inspector.has_table(_OLD_EXPENSES):
+            for step in MIGRATIONS[version:]:
+                step(connection)
+        Base.metadata.create_all(connection)
+        # Актуальная БД не записывается (её можно открыть только для чтения)
+        if version != SCHEMA_VERSION:
+            connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def prepare_database(engine: Engine, session_factory: sessionmaker[Session]) -> None:
+    """
+    Подготовить БД к работе приложения: обновить схему (см. migrate),
+    сократить журнал изменений расходов (см. prune_change_log)
+    и, если бюджет ещё не задан, создать строки бюджета на день, неделю и месяц
+    Attributes:
+    -----------
+    engine: Engine
+        Движок для работы с БД через sqlalchemy
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        None
+    """
+    migrate(engine)
+    prune_change_log(session_factory)
+    with unit_of_work(session_factory) as session:
+        if session.execute(select(BudgetTable.id).limit(1)).first() is None:
+            bulk_insert_values(BudgetTable, [
+                {"period": period, "amount": 0, "budget": 0}
+                for period in ("day", "week", "month")
+            ], session_factory)
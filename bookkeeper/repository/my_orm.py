@@ -1,19 +1,229 @@
 """
-Модуль описывающий взаимодействие с БД
+Модуль описывающий взаимодействие с БД: единица работы, запись в таблицы
+с оповещением кэшей и подписчиков событий, категории.
+Суммы за периоды - в periods, строки таблицы расходов - в paging
 """
 from __future__ import annotations
-from datetime import datetime, time, timedelta
-from typing import Union, Sequence, Any, Optional, Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime
+from typing import Union, Sequence, Any, Optional, Mapping, Iterator, Iterable, \
+    Callable, Collection, cast
+from weakref import WeakKeyDictionary
 
 from sqlalchemy import select, delete, update, insert
-from sqlalchemy import func
+from sqlalchemy import func, case, CursorResult
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.engine.base import Engine
-from sqlalchemy.engine.row import Row
+from sqlalchemy.exc import StatementError
 from sqlalchemy.orm.decl_api import DeclarativeAttributeIntercept
 
-from bookkeeper.models.sqlalchemy_models import CategoryTable, ExpenseTable,\
-    Basetype, Base
+from bookkeeper.models.sqlalchemy_models import CategoryTable, ExpenseTable, \
+    BudgetTable, Basetype, Base, EXPENSE_DAY
+from bookkeeper.repository.category_cache import get_category_cache, CategoryCache
+from bookkeeper.repository.aggregate_cache import get_aggregate_cache
+from bookkeeper.repository.events import ChangeEvent, AGGREGATE_COLUMNS, INSERT, \
+    UPDATE, DELETE, ROLLBACK, has_subscribers, publish
+from bookkeeper.config import BULK_CHUNK_SIZE
+
+# Сессии открытых единиц работы: фабрика сессий -> сессия
+_active_sessions: ContextVar[Mapping[sessionmaker[Session], Session]] = \
+    ContextVar("_active_sessions", default={})
+
+# Обработчик записи расходов: получает id изменённых, вставленных
+# или удалённых расходов (None - могли измениться любые расходы)
+ExpenseWatcher = Callable[[Optional[Collection[int]]], None]
+_expense_watchers: WeakKeyDictionary[sessionmaker[Session], list[ExpenseWatcher]] = \
+    WeakKeyDictionary()
+# Обработчик перед изменением или удалением расходов: получает сессию записи
+# и id расходов, пока в ней видны их прежние значения
+ExpenseBeforeWatcher = Callable[[Session, Collection[int]], None]
+_expense_before_watchers: WeakKeyDictionary[sessionmaker[Session],
+                                            list[ExpenseBeforeWatcher]] = \
+    WeakKeyDictionary()
+# День и категория расхода (None - неизвестны) для событий изменений
+ExpenseImage = tuple[Optional[date], Optional[int]]
+
+
+@contextmanager
+def unit_of_work(session_factory: sessionmaker[Session]) -> Iterator[Session]:
+    """
+    Единица работы (одна транзакция на несколько вызовов репозитория).
+    Все функции модуля, вызванные внутри блока with с той же фабрикой сессий,
+    используют одну сессию и одно соединение. Commit выполняется один раз
+    при выходе из блока, при исключении выполняется rollback.
+    Вложенные блоки присоединяются к внешнему.
+    ValueError преобразования значения в запрос (например, сумма вне
+    диапазона Cents) передаётся вызывающему без обёртки StatementError.
+
+    Пример:
+        with unit_of_work(session_factory):
+            insert_values(ExpenseTable, values, session_factory)
+            get_day_expenses(session_factory)
+
+    Attributes:
+    -----------
+    session_factory: sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        Iterator[Session]
+    """
+    active = _active_sessions.get()
+    if session_factory in active:
+        yield active[session_factory]
+        return
+    with session_factory(expire_on_commit=False) as session:
+        token = _active_sessions.set({**active, session_factory: session})
+        try:
+            with session.begin():
+                yield session
+        except StatementError as error:
+            _after_rollback(session_factory)
+            if isinstance(error.orig, ValueError):
+                raise error.orig from error
+            raise
+        except BaseException:
+            _after_rollback(session_factory)
+            raise
+        finally:
+            _active_sessions.reset(token)
+
+
+def watch_expenses(session_factory: sessionmaker[Session],
+                   watcher: ExpenseWatcher,
+                   before: Optional[ExpenseBeforeWatcher] = None) -> None:
+    """
+    Вызывать watcher при каждой записи в expense_table через функции модуля
+    и после отката транзакции (с None). before, если задан, вызывается
+    перед изменением и удалением расходов по id (update_by_pk, delete_by_pk,
+    delete_by_pks) - в той же сессии, до выполнения запроса
+    Attributes:
+    -----------
+    session_factory: sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+    watcher: ExpenseWatcher
+        Обработчик
+    before: Optional[ExpenseBeforeWatcher]
+        Обработчик перед записью
+
+    Returns:
+    --------
+        None
+    """
+    _expense_watchers.setdefault(session_factory, []).append(watcher)
+    if before is not None:
+        _expense_before_watchers.setdefault(session_factory, []).append(before)
+
+
+def _day(value: Any) -> Optional[date]:
+    """
+    День расхода по значению поля expense_date (None - не дата)
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    return value if isinstance(value, date) else None
+
+
+def _expense_images(session: Session, pks: Collection[int]) -> list[ExpenseImage]:
+    """
+    Дни и категории расходов pks
+    """
+    pks = list(pks)
+    images: list[ExpenseImage] = []
+    for i in range(0, len(pks), BULK_CHUNK_SIZE):
+        images.extend(session.execute(
+            select(EXPENSE_DAY, ExpenseTable.cat_id)
+            .where(ExpenseTable.id.in_(pks[i:i + BULK_CHUNK_SIZE]))).all())
+    return images
+
+
+def _updated_images(old: Iterable[ExpenseImage],
+                    new_values: Mapping[str, Any]) -> list[ExpenseImage]:
+    """
+    Дни и категории расходов old после изменения полей new_values
+    """
+    return [(_day(new_values["expense_date"]) if "expense_date" in new_values else day,
+             cast(Optional[int], new_values.get("cat_id", cat_id)))
+            for day, cat_id in old]
+
+
+def _notify_before_write(model_class: DeclarativeAttributeIntercept,
+                         session_factory: sessionmaker[Session],
+                         session: Session, pks: Collection[int],
+                         columns: Optional[Collection[str]] = None
+                         ) -> list[ExpenseImage]:
+    """
+    Сообщить наблюдателям расходов о предстоящем изменении полей columns
+    строк pks (None - строки удаляются).
+    Возвращает дни и категории расходов до изменения, если на события
+    изменений есть подписчики
+    """
+    if model_class is not ExpenseTable:
+        return []
+    if columns is None or not AGGREGATE_COLUMNS.isdisjoint(columns):
+        get_aggregate_cache(session_factory).expenses_changing(session, pks)
+    for watcher in _expense_before_watchers.get(session_factory, ()):
+        watcher(session, pks)
+    if not has_subscribers(session_factory):
+        return []
+    return _expense_images(session, pks)
+
+
+def _notify_write(model_class: DeclarativeAttributeIntercept,
+                  session_factory: sessionmaker[Session],
+                  pks: Optional[Collection[int]] = None,
+                  kind: str = UPDATE, *,
+                  columns: Optional[Collection[str]] = None,
+                  old: Iterable[ExpenseImage] = (),
+                  new: Iterable[ExpenseImage] = (),
+                  rowcount: Optional[int] = None) -> None:
+    """
+    Сообщить кэшам репозитория и подписчикам событий о записи в таблицу
+    model_class.
+    pks - id записанных строк (None - неизвестны), kind - вид записи,
+    columns - изменённые поля (None - строки целиком), old и new - дни
+    и категории расходов до и после записи, rowcount - количество
+    записанных строк
+    """
+    if model_class is CategoryTable:
+        get_category_cache(session_factory).invalidate()
+        get_aggregate_cache(session_factory).table_changed(CategoryTable.__tablename__)
+    elif model_class is BudgetTable:
+        get_aggregate_cache(session_factory).table_changed(BudgetTable.__tablename__)
+    elif model_class is ExpenseTable:
+        if columns is None or not AGGREGATE_COLUMNS.isdisjoint(columns):
+            get_aggregate_cache(session_factory).expenses_changed(pks)
+        for watcher in _expense_watchers.get(session_factory, ()):
+            watcher(pks)
+    if not has_subscribers(session_factory):
+        return
+    images = [*old, *new]
+    days: Optional[frozenset[date]] = frozenset()
+    if model_class is ExpenseTable and \
+            (pks is None or any(day is None for day, _ in images)):
+        days = None
+    elif model_class is ExpenseTable:
+        days = frozenset(cast(date, day) for day, _ in images)
+    publish(session_factory, ChangeEvent(
+        getattr(model_class, "__tablename__"), kind,
+        None if pks is None else tuple(pks),
+        None if columns is None else frozenset(columns),
+        frozenset(cat_id for _, cat_id in old if cat_id is not None),
+        frozenset(cat_id for _, cat_id in new if cat_id is not None),
+        days, rowcount))
+
+
+def _after_rollback(session_factory: sessionmaker[Session]) -> None:
+    """
+    Сбросить кэши после отката: они могли загрузить незафиксированные данные
+    """
+    get_category_cache(session_factory).invalidate()
+    get_aggregate_cache(session_factory).invalidate()
+    for watcher in _expense_watchers.get(session_factory, ()):
+        watcher(None)
+    publish(session_factory, ChangeEvent(None, ROLLBACK))
 
 
 def create_tables(engine: Engine) -> None:
@@ -61,10 +271,10 @@ def delete_all(model_class: DeclarativeAttributeIntercept,
     --------
         None
     """
-    with session_factory() as session:
+    with unit_of_work(session_factory) as session:
         query = delete(model_class)
-        session.execute(query)
-        session.commit()
+        result = cast(CursorResult[Any], session.execute(query))
+        _notify_write(model_class, session_factory, kind=DELETE, rowcount=result.rowcount)
 
 
 def get_by_pk(model_class: DeclarativeAttributeIntercept,
@@ -86,7 +296,7 @@ def get_by_pk(model_class: DeclarativeAttributeIntercept,
     --------
         Optional[DeclarativeAttributeIntercept]:
     """
-    with session_factory() as session:
+    with unit_of_work(session_factory) as session:
         res = session.get(model_class, pk)
     return res
 
@@ -106,7 +316,7 @@ def get_all(model_class: DeclarativeAttributeIntercept,
     --------
         list[Basetype]
     """
-    with session_factory() as session:
+    with unit_of_work(session_factory) as session:
         query = select(model_class)
         res = session.execute(query).all()
     result = [row[0] for row in res]
@@ -131,10 +341,39 @@ def delete_by_pk(model_class: DeclarativeAttributeIntercept,
     --------
         None
     """
-    with session_factory() as session:
+    with unit_of_work(session_factory) as session:
+        old = _notify_before_write(model_class, session_factory, session, [pk])
         query = delete(model_class).where(model_class.id == pk)
-        session.execute(query)
-        session.commit()
+        result = cast(CursorResult[Any], session.execute(query))
+        _notify_write(model_class, session_factory, [pk], DELETE, old=old,
+                      rowcount=result.rowcount)
+
+
+def delete_by_pks(model_class: DeclarativeAttributeIntercept,
+                  pks: Iterable[int],
+                  session_factory: sessionmaker[Session]) -> None:
+    """
+    Удалить записи в таблице model_class по списку Primary Key одним запросом
+    Attributes:
+    -----------
+    model_class:  DeclarativeAttributeIntercept
+        Модель таблицы
+    pks: Iterable[int]
+        id записей
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        None
+    """
+    pks = list(pks)
+    with unit_of_work(session_factory) as session:
+        old = _notify_before_write(model_class, session_factory, session, pks)
+        query = delete(model_class).where(model_class.id.in_(pks))
+        result = cast(CursorResult[Any], session.execute(query))
+        _notify_write(model_class, session_factory, pks, DELETE, old=old,
+                      rowcount=result.rowcount)
 
 
 def update_by_pk(model_class: DeclarativeAttributeIntercept,
@@ -160,10 +399,14 @@ def update_by_pk(model_class: DeclarativeAttributeIntercept,
     --------
         None
     """
-    with session_factory() as session:
+    with unit_of_work(session_factory) as session:
+        old = _notify_before_write(model_class, session_factory, session, [pk],
+                                   new_values)
         query = update(model_class).where(model_class.id == pk).values(**new_values)
-        session.execute(query)
-        session.commit()
+        result = cast(CursorResult[Any], session.execute(query))
+        _notify_write(model_class, session_factory, [pk], UPDATE, columns=new_values,
+                      old=old, new=_updated_images(old, new_values),
+                      rowcount=result.rowcount)
 
 
 def insert_values(model_class: DeclarativeAttributeIntercept,
@@ -186,131 +429,180 @@ def insert_values(model_class: DeclarativeAttributeIntercept,
     --------
         None
     """
-    with session_factory() as session:
+    with unit_of_work(session_factory) as session:
         query = insert(model_class).values(**values)
-        session.execute(query)
-        session.commit()
+        inserted = cast(CursorResult[Any], session.execute(query)).inserted_primary_key
+        _notify_write(model_class, session_factory,
+                      list(inserted) if inserted else None, INSERT,
+                      new=[(_day(values.get("expense_date")), values.get("cat_id"))],
+                      rowcount=1)
 
 
-def get_day_expenses(session_factory: sessionmaker[Session]) -> Union[int, float]:
+def _is_watched(model_class: DeclarativeAttributeIntercept,
+                session_factory: sessionmaker[Session]) -> bool:
     """
-    Получить сумму расходов за текущий день
-    Attributes:
-    -----------
-    session_factory:  sessionmaker[Session]
-        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
-
-    Returns:
-    --------
-        Union[int, float]
-    """
-    start_of_day = datetime.combine(datetime.now(), time.min)
-    end_of_day = datetime.combine(datetime.now(), time.max)
-    with session_factory() as session:
-        query = (select(func.sum(ExpenseTable.amount).label("day_expenses"))
-                 .filter(ExpenseTable.expense_date.between(start_of_day, end_of_day)))
-        res: Union[int, float] = session.execute(query).scalar()
-        if res is None:
-            res = 0
-    return res
+    Следят ли за записью в таблицу model_class наблюдатели расходов
+    или подписчики событий
+    """
+    return model_class is ExpenseTable and bool(_expense_watchers.get(session_factory)
+                                                or has_subscribers(session_factory))
 
 
-def get_week_expenses(session_factory: sessionmaker[Session]) -> Union[int, float]:
+def _join_ids(parts: Sequence[Sequence[int]]) -> Sequence[int]:
     """
-    Получить сумму расходов за последнюю неделю
-    Attributes:
-    -----------
-    session_factory:  sessionmaker[Session]
-        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
-
-    Returns:
-    --------
-        Union[int, float]
-    """
-    now = datetime.now()
-    end = now
-    start = end - timedelta(days=7)
-    with session_factory() as session:
-        query = (select(func.sum(ExpenseTable.amount).label("week_expenses"))
-                 .filter(ExpenseTable.expense_date.between(start, end)))
-        res: Union[int, float] = session.execute(query).scalar()
-        if res is None:
-            res = 0
-    return res
+    Объединить id пакетов bulk_insert_values: диапазоны подряд - в один диапазон
+    """
+    if all(isinstance(part, range) for part in parts):
+        if all(prev[-1] + 1 == part[0] for prev, part in zip(parts, parts[1:])):
+            return range(parts[0][0], parts[-1][-1] + 1) if parts else range(0)
+    return [pk for part in parts for pk in part]
 
 
-def get_month_expenses(session_factory: sessionmaker[Session]) -> Union[int, float]:
+def _as_mapping(row: Union[Mapping[str, Any], Sequence[Any]],
+                columns: Optional[Sequence[str]]) -> Mapping[str, Any]:
     """
-    Получить сумму расходов за последний месяц
-    Attributes:
-    -----------
-    session_factory:  sessionmaker[Session]
-        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
-
-    Returns:
-    --------
-        Union[int, float]
-    """
-    end = datetime.now()
-    start = end - timedelta(days=30)
-    with session_factory() as session:
-        query = (select(func.sum(ExpenseTable.amount).label("month_expenses"))
-                 .filter(ExpenseTable.expense_date.between(start, end)))
-        res: Union[int, float] = session.execute(query).scalar()
-        if res is None:
-            res = 0
-    return res
+    Запись bulk_insert_values в виде словаря {поле: значение}
+    """
+    if isinstance(row, Mapping):
+        return row
+    if columns is None:
+        raise ValueError("columns are required for tuple rows")
+    return dict(zip(columns, row))
 
 
-def get_expenses_data(session_factory: sessionmaker[Session]) -> Sequence[Row[Any]]:
+def _insert_chunk(session: Session, table: Any, chunk: list[Mapping[str, Any]],
+                  track: bool) -> Sequence[int]:
     """
-    Получить данные из БД для отображения в приложении
+    Вставить пакет записей bulk_insert_values. Возвращает id вставленных
+    записей (пустой диапазон, если track ложно и id в пакете не заданы)
+    """
+    query = insert(table)
+    if any("id" in row for row in chunk):
+        ids: Sequence[int] = session.execute(
+            query.returning(table.c.id, sort_by_parameter_order=True), chunk
+        ).scalars().all()
+        return ids
+    session.execute(query, chunk)
+    if not track:
+        return range(0)
+    last_id = session.execute(select(func.max(table.c.id))).scalar_one()
+    return range(last_id - len(chunk) + 1, last_id + 1)
+
+
+def bulk_insert_values(model_class: DeclarativeAttributeIntercept,
+                       rows: Iterable[Union[Mapping[str, Any], Sequence[Any]]],
+                       session_factory: sessionmaker[Session],
+                       columns: Optional[Sequence[str]] = None, *,
+                       chunk_size: int = BULK_CHUNK_SIZE,
+                       returning: bool = True) -> list[int]:
+    """
+    Вставить много записей в таблицу model_class одной транзакцией.
+    Строки читаются из rows порциями по chunk_size и передаются в SQLite
+    пакетом (executemany), поэтому rows может быть генератором
     Attributes:
     -----------
+    model_class: DeclarativeAttributeIntercept
+        Модель таблицы
+    rows: Iterable[Union[Mapping[str, Any], Sequence[Any]]]
+        Записи: словари {поле: значение} или кортежи значений в порядке columns
     session_factory:  sessionmaker[Session]
         Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+    columns: Optional[Sequence[str]]
+        Названия полей для записей-кортежей
+    chunk_size: int
+        Количество записей в одном пакете
+    returning: bool
+        Вернуть id вставленных записей
+
+    Пакет без явных id вставляется одним executemany без RETURNING, id его
+    записей - диапазон, заканчивающийся на max(id) после вставки: SQLite
+    выдаёт rowid подряд, а после первой вставки транзакция держит блокировку
+    записи. Пакет с явными id вставляется через INSERT ... RETURNING
 
     Returns:
     --------
-        Sequence[Row[Any]]
+        list[int] - id вставленных записей в порядке rows
+        (пустой список, если returning=False)
     """
-    with session_factory() as session:
-        query = select(ExpenseTable.id, ExpenseTable.expense_date, ExpenseTable.amount,
-                       CategoryTable.name, ExpenseTable.comment).join(CategoryTable)
-        res: Sequence[Row[Any]] = session.execute(query).all()
-    return res
-
-
-def get_day_expenses_by_cat(session_factory: sessionmaker[Session]
-                            ) -> Sequence[Row[Any]]:
+    table = model_class.__table__
+    # id нужны и наблюдателям расходов, если они есть
+    track = returning or _is_watched(model_class, session_factory)
+    parts: list[Sequence[int]] = []
+    chunk: list[Mapping[str, Any]] = []
+    inserted = 0
+    with unit_of_work(session_factory) as session:
+        # Дни и категории вставленных расходов для событий изменений
+        images: Optional[list[ExpenseImage]] = \
+            [] if model_class is ExpenseTable and has_subscribers(session_factory) \
+            else None
+        for row in rows:
+            row = _as_mapping(row, columns)
+            if images is not None:
+                images.append((_day(row.get("expense_date")), row.get("cat_id")))
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                parts.append(_insert_chunk(session, table, chunk, track))
+                inserted += len(chunk)
+                chunk = []
+        if chunk:
+            parts.append(_insert_chunk(session, table, chunk, track))
+            inserted += len(chunk)
+        pks = _join_ids(parts) if track else None
+        _notify_write(model_class, session_factory, pks, INSERT, new=images or (),
+                      rowcount=inserted)
+    return list(pks) if returning and pks is not None else []
+
+
+def remap_expense_categories(mapping: Mapping[int, int],
+                             session_factory: sessionmaker[Session]) -> int:
     """
-    Получить расходы по категориям за текущий день
+    Заменить категории расходов одним запросом
+    UPDATE expense_table SET cat_id = CASE cat_id WHEN old THEN new ... END.
+    Все замены применяются одновременно: {1: 2, 2: 1} меняет категории местами
     Attributes:
     -----------
+    mapping: Mapping[int, int]
+        Словарь замен {старый cat_id: новый cat_id}
     session_factory:  sessionmaker[Session]
         Фабрика генерирующая сессию для подключения к БД через sqlalchemy
 
     Returns:
     --------
-        Sequence[Row[Any]]
+        int - количество изменённых расходов
     """
-
-    start = datetime.combine(datetime.now(), time.min)
-    end = datetime.combine(datetime.now(), time.max)
-
-    with session_factory() as session:
-        query = (select(CategoryTable.name, func.sum(ExpenseTable.amount))
-                 .join(CategoryTable)
-                 .where(ExpenseTable.expense_date.between(start, end))
-                 .group_by(CategoryTable.name))
-        res: Sequence[Row[Any]] = session.execute(query).all()
-    return res
+    changes = {old: new for old, new in mapping.items() if old != new}
+    if not changes:
+        return 0
+    table = ExpenseTable.__table__
+    with unit_of_work(session_factory) as session:
+        query = (update(table)
+                 .where(table.c.cat_id.in_(list(changes)))
+                 .values(cat_id=case(changes, value=table.c.cat_id)))
+        rowcount: int = session.execute(query).rowcount
+        _notify_write(ExpenseTable, session_factory, columns=("cat_id",),
+                      old=[(None, old) for old in changes],
+                      new=[(None, new) for new in changes.values()],
+                      rowcount=rowcount)
+    return rowcount
+
+
+def _loaded_category_cache(session_factory: sessionmaker[Session]) -> CategoryCache:
+    """
+    Кэш категорий, загруженный из БД при первом обращении
+    """
+    cache = get_category_cache(session_factory)
+    if cache.loaded:
+        cache.hits += 1
+    else:
+        cache.misses += 1
+        with unit_of_work(session_factory) as session:
+            cache.load(session)
+    return cache
 
 
-def get_month_expenses_by_cat(session_factory: sessionmaker[Session]
-                              ) -> Sequence[Row[Any]]:
+def get_categories(session_factory: sessionmaker[Session]) -> list[CategoryTable]:
     """
-    Получить расходы по категориям за текущий месяц
+    Получить список всех категорий в порядке id (из кэша категорий)
     Attributes:
     -----------
     session_factory:  sessionmaker[Session]
@@ -318,24 +610,15 @@ def get_month_expenses_by_cat(session_factory: sessionmaker[Session]
 
     Returns:
     --------
-        Sequence[Row[Any]]
+        list[CategoryTable]
     """
-    end = datetime.now()
-    start = end - timedelta(days=30)
-
-    with session_factory() as session:
-        query = (select(CategoryTable.name, func.sum(ExpenseTable.amount))
-                 .join(CategoryTable)
-                 .where(ExpenseTable.expense_date.between(start, end))
-                 .group_by(CategoryTable.name))
-        res: Sequence[Row[Any]] = session.execute(query).all()
-
-    return res
+    return _loaded_category_cache(session_factory).all()
 
 
 def get_category_pk_by_name(name: str, session_factory: sessionmaker[Session]) -> int:
     """
-    Получить id категории по её названию
+    Получить id категории по её названию (из кэша категорий).
+    KeyError, если категории нет
     Attributes:
     -----------
     name: str
@@ -347,8 +630,4 @@ def get_category_pk_by_name(name: str, session_factory: sessionmaker[Session]) -
     --------
         int
     """
-    with session_factory() as session:
-        query = select(CategoryTable.id).where(CategoryTable.name == name)
-        res: Row[Any] = session.execute(query).first()
-    result_pk: int = res[0]
-    return result_pk
+    return _loaded_category_cache(session_factory).pk_by_name(name)
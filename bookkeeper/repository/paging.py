@@ -0,0 +1,132 @@
+"""
+Чтение строк таблицы расходов для отображения в приложении:
+все строки, строки по id и страницы по ключу (expense_date, id).
+"""
+from __future__ import annotations
+from datetime import datetime
+from typing import Sequence, Any, Optional, Iterable
+
+from sqlalchemy import select, tuple_, Select
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.engine.row import Row
+
+from bookkeeper.models.sqlalchemy_models import CategoryTable, ExpenseTable
+from bookkeeper.repository.my_orm import unit_of_work
+from bookkeeper.config import BULK_CHUNK_SIZE
+
+
+def get_expenses_data(session_factory: sessionmaker[Session]) -> Sequence[Row[Any]]:
+    """
+    Получить данные из БД для отображения в приложении
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        Sequence[Row[Any]]
+    """
+    with unit_of_work(session_factory) as session:
+        query = select(ExpenseTable.id, ExpenseTable.expense_date, ExpenseTable.amount,
+                       CategoryTable.name, ExpenseTable.comment).join(CategoryTable)
+        res: Sequence[Row[Any]] = session.execute(query).all()
+    return res
+
+
+def _expense_rows_query() -> Select[Any]:
+    """
+    Запрос строк таблицы расходов (id, expense_date, amount, name, comment)
+    """
+    columns: tuple[Any, ...] = (ExpenseTable.id, ExpenseTable.expense_date,
+                                ExpenseTable.amount, CategoryTable.name,
+                                ExpenseTable.comment)
+    return select(*columns).join(CategoryTable)
+
+
+def get_expense_row(pk: int,
+                    session_factory: sessionmaker[Session]) -> Optional[Row[Any]]:
+    """
+    Получить одну строку таблицы расходов по Primary Key (pk)
+    Attributes:
+    -----------
+    pk: int
+        id расхода
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        Optional[Row[Any]] - строка (id, expense_date, amount, name, comment)
+        или None, если расхода нет
+    """
+    with unit_of_work(session_factory) as session:
+        res: Optional[Row[Any]] = session.execute(
+            _expense_rows_query().where(ExpenseTable.id == pk)
+        ).one_or_none()
+    return res
+
+
+def get_expense_rows(pks: Iterable[int],
+                     session_factory: sessionmaker[Session]) -> list[Row[Any]]:
+    """
+    Получить строки таблицы расходов по списку Primary Key
+    (порциями по BULK_CHUNK_SIZE id)
+    Attributes:
+    -----------
+    pks: Iterable[int]
+        id расходов
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        list[Row[Any]] - строки (id, expense_date, amount, name, comment)
+        существующих расходов в порядке (expense_date, id)
+    """
+    pks = sorted(pks)
+    rows: list[Row[Any]] = []
+    with unit_of_work(session_factory) as session:
+        for i in range(0, len(pks), BULK_CHUNK_SIZE):
+            rows.extend(session.execute(
+                _expense_rows_query()
+                .where(ExpenseTable.id.in_(pks[i:i + BULK_CHUNK_SIZE]))).all())
+    rows.sort(key=lambda row: (row.expense_date, row.id))
+    return rows
+
+
+def get_expenses_page(session_factory: sessionmaker[Session],
+                      after: Optional[tuple[datetime, int]] = None,
+                      until: Optional[tuple[datetime, int]] = None,
+                      limit: Optional[int] = None) -> Sequence[Row[Any]]:
+    """
+    Получить страницу данных для таблицы расходов в порядке (expense_date, id).
+    Страница выбирается по ключу (keyset pagination), а не по смещению,
+    поэтому стоимость запроса не зависит от номера страницы
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+    after: Optional[tuple[datetime, int]]
+        Ключ (expense_date, id), после которого начинается страница (не включая)
+    until: Optional[tuple[datetime, int]]
+        Ключ (expense_date, id), которым заканчивается страница (включая)
+    limit: Optional[int]
+        Максимальное количество строк
+
+    Returns:
+    --------
+        Sequence[Row[Any]] - строки (id, expense_date, amount, name, comment)
+    """
+    key = tuple_(ExpenseTable.expense_date, ExpenseTable.id)
+    query = _expense_rows_query().order_by(ExpenseTable.expense_date, ExpenseTable.id)
+    # Обычный кортеж: значения ключа приводятся к типам столбцов (EpochSeconds)
+    if after is not None:
+        query = query.where(key > tuple(after))
+    if until is not None:
+        query = query.where(key <= tuple(until))
+    if limit is not None:
+        query = query.limit(limit)
+    with unit_of_work(session_factory) as session:
+        res: Sequence[Row[Any]] = session.execute(query).all()
+    return res
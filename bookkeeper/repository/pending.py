@@ -0,0 +1,83 @@
+"""
+Учёт записанных расходов для кэшей в памяти (индекс сумм по дням,
+аналитика): функции записи my_orm сообщают id записанных расходов
+(watch_expenses), кэш перечитывает их из БД при следующем обращении.
+Запись с неизвестными id или слишком много записанных расходов
+помечают кэш устаревшим: он строится заново целиком.
+"""
+from typing import Collection, Optional
+
+from sqlalchemy import ColumnElement
+
+from bookkeeper.config import BULK_CHUNK_SIZE
+from bookkeeper.models.sqlalchemy_models import ExpenseTable
+
+
+class PendingExpenses:
+    """
+    Расходы, записанные после последнего обновления кэша: отдельные id
+    и диапазоны id вставок (bulk_insert_values сообщает их диапазоном)
+    Attributes:
+    -----------
+    limit: int
+        Больше ожидающих расходов - кэш устаревает
+    stale: bool
+        Кэш нужно построить заново
+    ids: set[int]
+        Отдельные id записанных расходов
+    ranges: list[range]
+        Диапазоны id вставленных расходов
+    """
+
+    def __init__(self, limit: int = BULK_CHUNK_SIZE) -> None:
+        self.limit = limit
+        self.stale = True
+        self.ids: set[int] = set()
+        self.ranges: list[range] = []
+
+    def __len__(self) -> int:
+        """
+        Количество ожидающих расходов
+        """
+        return len(self.ids) + sum(map(len, self.ranges))
+
+    def clear(self) -> None:
+        """
+        Забыть ожидающие расходы (кэш обновлён)
+        """
+        self.ids.clear()
+        self.ranges.clear()
+
+    def invalidate(self) -> None:
+        """
+        Пометить кэш устаревшим
+        """
+        self.stale = True
+        self.clear()
+
+    def add(self, pks: Optional[Collection[int]]) -> None:
+        """
+        Обработчик записи расходов (см. my_orm.watch_expenses):
+        запомнить pks (None - могли измениться любые расходы)
+        """
+        if pks is None:
+            self.invalidate()
+        elif not self.stale:
+            if isinstance(pks, range):
+                self.ranges.append(pks)
+            else:
+                self.ids.update(pks)
+            if len(self) > self.limit:
+                self.invalidate()
+
+    def conditions(self) -> list[ColumnElement[bool]]:
+        """
+        Условия на expense_table, под одно из которых подходят
+        ожидающие расходы (пустой список, если их нет)
+        """
+        conditions: list[ColumnElement[bool]] = [
+            ExpenseTable.id.between(pks.start, pks.stop - 1)
+            for pks in self.ranges if pks]
+        if self.ids:
+            conditions.append(ExpenseTable.id.in_(sorted(self.ids)))
+        return conditions
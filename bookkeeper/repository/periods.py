@@ -0,0 +1,339 @@
+"""
+Суммы расходов за периоды отчёта (день, неделя, месяц) и бюджет.
+Полные дни периода читаются из свёртки daily_category_totals (см. rollup),
+неполные крайние дни - из expense_table; результаты за периоды отчёта
+берутся из кэша агрегатов (aggregate_cache).
+"""
+from __future__ import annotations
+from datetime import date, datetime, time, timedelta
+from typing import Union, Sequence, Any, Optional, Callable, Collection, TypeVar, cast
+
+from sqlalchemy import select, union_all, literal, func, Select
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.engine.row import Row
+
+from bookkeeper.models.sqlalchemy_models import CategoryTable, ExpenseTable, \
+    BudgetTable, DailyCategoryTotals
+from bookkeeper.repository.aggregate_cache import get_aggregate_cache, \
+    expiry_for_windows, MISSING
+from bookkeeper.repository.my_orm import unit_of_work
+
+T = TypeVar("T")
+
+
+def period_window(period: str, now: Optional[datetime] = None
+                  ) -> tuple[datetime, datetime]:
+    """
+    Границы периода отчёта: day - текущий день целиком,
+    week - последние 7 дней, month - последние 30 дней до текущего момента
+    Attributes:
+    -----------
+    period: str
+        Период: day, week или month
+    now: Optional[datetime]
+        Текущий момент, по умолчанию datetime.now()
+
+    Returns:
+    --------
+        tuple[datetime, datetime] - начало и конец периода включительно
+    """
+    if now is None:
+        now = datetime.now()
+    if period == "day":
+        return datetime.combine(now, time.min), datetime.combine(now, time.max)
+    if period == "week":
+        return now - timedelta(days=7), now
+    if period == "month":
+        return now - timedelta(days=30), now
+    raise ValueError(f"Unknown period {period}")
+
+
+def split_period(start: datetime, end: datetime
+                 ) -> tuple[list[tuple[datetime, datetime]], date, date]:
+    """
+    Разбить период [start, end] на полные дни и неполные крайние дни
+    Attributes:
+    -----------
+    start: datetime
+        Начало периода
+    end: datetime
+        Конец периода (включительно)
+
+    Returns:
+    --------
+        tuple[list[tuple[datetime, datetime]], date, date] - границы неполных
+        дней и первый и последний полные дни (полных дней нет,
+        если первый позже последнего)
+    """
+    first_full = start.date()
+    if start.time() != time.min:
+        first_full += timedelta(days=1)
+    last_full = end.date()
+    if end.time() != time.max:
+        last_full -= timedelta(days=1)
+
+    raw_bounds = []
+    if first_full > last_full:
+        raw_bounds.append((start, end))
+    else:
+        if start.date() < first_full:
+            raw_bounds.append((start, datetime.combine(start.date(), time.max)))
+        if end.date() > last_full:
+            raw_bounds.append((datetime.combine(end.date(), time.min), end))
+    return raw_bounds, first_full, last_full
+
+
+def _period_parts(start: datetime, end: datetime, *columns: Any) -> list[Select[Any]]:
+    """
+    Запросы со столбцами (*columns, cat_id, amount), которые вместе дают все
+    расходы за период [start, end]: полные дни читаются из свёртки
+    daily_category_totals, неполные крайние дни - из expense_table.
+    Стоимость зависит от числа дней в периоде, а не от числа расходов
+    """
+    raw_bounds, first_full, last_full = split_period(start, end)
+    parts: list[Select[Any]] = [
+        select(*columns, ExpenseTable.cat_id.label("cat_id"),
+               ExpenseTable.amount.label("amount"))
+        .where(ExpenseTable.expense_date.between(*bounds))
+        for bounds in raw_bounds
+    ]
+    if first_full <= last_full:
+        parts.append(
+            select(*columns, DailyCategoryTotals.cat_id.label("cat_id"),
+                   DailyCategoryTotals.total.label("amount"))
+            .where(DailyCategoryTotals.day.between(first_full, last_full))
+        )
+    return parts
+
+
+def cached_aggregate(query: str, periods: Sequence[str],
+                     compute: Callable[[datetime], T],
+                     session_factory: sessionmaker[Session],
+                     tables: Collection[str] = ()) -> T:
+    """
+    Результат агрегатного запроса за периоды отчёта из кэша агрегатов
+    (aggregate_cache). Ключ - (query, periods, текущий день), при промахе
+    вызывается compute(now), где now - текущий момент
+    Attributes:
+    -----------
+    query: str
+        Название запроса
+    periods: Sequence[str]
+        Периоды отчёта (см. period_window), за которые считается результат
+    compute: Callable[[datetime], T]
+        Запрос к БД за периоды на момент now
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+    tables: Collection[str]
+        Таблицы кроме expense_table, от которых зависит результат
+
+    Returns:
+    --------
+        T
+    """
+    now = datetime.now()
+    cache = get_aggregate_cache(session_factory)
+    if cache.pending:
+        with unit_of_work(session_factory) as session:
+            cache.apply_pending(session)
+    key = (query, tuple(periods), now.date())
+    value = cache.get(key, now)
+    if value is not MISSING:
+        return cast(T, value)
+    windows = [period_window(period, now) for period in periods]
+    with unit_of_work(session_factory) as session:
+        result = compute(now)
+        expires = expiry_for_windows(session, windows, now)
+    cache.put(key, result, min(start for start, _ in windows), now, expires, tables)
+    return result
+
+
+def get_period_expenses(start: datetime, end: datetime,
+                        session_factory: sessionmaker[Session]) -> Union[int, float]:
+    """
+    Получить сумму расходов за период [start, end]
+    Attributes:
+    -----------
+    start: datetime
+        Начало периода
+    end: datetime
+        Конец периода (включительно)
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        Union[int, float]
+    """
+    source = union_all(*_period_parts(start, end)).subquery()
+    with unit_of_work(session_factory) as session:
+        query = select(func.sum(source.c.amount))
+        res: Union[int, float] = session.execute(query).scalar()
+        if res is None:
+            res = 0
+    return res
+
+
+def get_period_expenses_by_cat(start: datetime, end: datetime,
+                               session_factory: sessionmaker[Session]
+                               ) -> Sequence[Row[Any]]:
+    """
+    Получить расходы по категориям за период [start, end]
+    Attributes:
+    -----------
+    start: datetime
+        Начало периода
+    end: datetime
+        Конец периода (включительно)
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        Sequence[Row[Any]] - строки (название категории, сумма)
+    """
+    source = union_all(*_period_parts(start, end)).subquery()
+    with unit_of_work(session_factory) as session:
+        query = (select(CategoryTable.name, func.sum(source.c.amount))
+                 .select_from(source)
+                 .join(CategoryTable, CategoryTable.id == source.c.cat_id)
+                 .group_by(CategoryTable.name))
+        res: Sequence[Row[Any]] = session.execute(query).all()
+    return res
+
+
+def get_day_expenses(session_factory: sessionmaker[Session]) -> Union[int, float]:
+    """
+    Получить сумму расходов за текущий день (из кэша агрегатов)
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        Union[int, float]
+    """
+    return cached_aggregate(
+        "total", ("day",),
+        lambda now: get_period_expenses(*period_window("day", now), session_factory),
+        session_factory)
+
+
+def get_week_expenses(session_factory: sessionmaker[Session]) -> Union[int, float]:
+    """
+    Получить сумму расходов за последнюю неделю (из кэша агрегатов)
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        Union[int, float]
+    """
+    return cached_aggregate(
+        "total", ("week",),
+        lambda now: get_period_expenses(*period_window("week", now), session_factory),
+        session_factory)
+
+
+def get_month_expenses(session_factory: sessionmaker[Session]) -> Union[int, float]:
+    """
+    Получить сумму расходов за последний месяц (из кэша агрегатов)
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        Union[int, float]
+    """
+    return cached_aggregate(
+        "total", ("month",),
+        lambda now: get_period_expenses(*period_window("month", now), session_factory),
+        session_factory)
+
+
+def get_budget_summary(session_factory: sessionmaker[Session]) -> Sequence[Row[Any]]:
+    """
+    Получить бюджет и сумму расходов за день, неделю и месяц одним запросом.
+    Суммы за три периода считаются по свёртке daily_category_totals
+    (и крайним неполным дням), поле BudgetTable.amount не используется.
+    Результат можно передать в budget_data_transform, он берётся из кэша
+    агрегатов
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        Sequence[Row[Any]] - строки (id, period, budget, amount) в порядке id
+    """
+    return cached_aggregate("budget", ("day", "week", "month"),
+                            lambda now: _budget_summary(now, session_factory),
+                            session_factory, (BudgetTable.__tablename__,))
+
+
+def _budget_summary(now: datetime,
+                    session_factory: sessionmaker[Session]) -> Sequence[Row[Any]]:
+    """
+    Бюджет и суммы расходов за периоды на момент now (см. get_budget_summary)
+    """
+    parts = []
+    for period in ("day", "week", "month"):
+        parts += _period_parts(*period_window(period, now),
+                               literal(period).label("period"))
+    source = union_all(*parts).subquery()
+    totals = (select(source.c.period, func.sum(source.c.amount).label("amount"))
+              .group_by(source.c.period)
+              .subquery())
+    with unit_of_work(session_factory) as session:
+        query = (select(BudgetTable.id, BudgetTable.period, BudgetTable.budget,
+                        func.coalesce(totals.c.amount, 0).label("amount"))
+                 .outerjoin(totals, totals.c.period == BudgetTable.period)
+                 .order_by(BudgetTable.id))
+        res: Sequence[Row[Any]] = session.execute(query).all()
+    return res
+
+
+def get_day_expenses_by_cat(session_factory: sessionmaker[Session]
+                            ) -> Sequence[Row[Any]]:
+    """
+    Получить расходы по категориям за текущий день (из кэша агрегатов)
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        Sequence[Row[Any]]
+    """
+    return cached_aggregate(
+        "by_cat", ("day",),
+        lambda now: get_period_expenses_by_cat(*period_window("day", now),
+                                               session_factory),
+        session_factory, (CategoryTable.__tablename__,))
+
+
+def get_month_expenses_by_cat(session_factory: sessionmaker[Session]
+                              ) -> Sequence[Row[Any]]:
+    """
+    Получить расходы по категориям за текущий месяц (из кэша агрегатов)
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        Sequence[Row[Any]]
+    """
+    return cached_aggregate(
+        "by_cat", ("month",),
+        lambda now: get_period_expenses_by_cat(*period_window("month", now),
+                                               session_factory),
+        session_factory, (CategoryTable.__tablename__,))
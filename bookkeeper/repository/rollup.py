@@ -0,0 +1,140 @@
+"""
+Модуль обслуживания свёртки daily_category_totals:
+пересборка по таблице расходов и проверка согласованности.
+
+Запуск из командной строки:
+    python -m bookkeeper.repository.rollup rebuild
+    python -m bookkeeper.repository.rollup check
+"""
+from __future__ import annotations
+import argparse
+import math
+import sys
+from datetime import date
+from typing import Any, Union, NamedTuple, Optional
+
+from sqlalchemy import ColumnElement, select, delete, insert, func
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import sessionmaker, Session
+
+from bookkeeper.config import DSN
+from bookkeeper.models.sqlalchemy_models import ExpenseTable, DailyCategoryTotals, \
+    EXPENSE_DAY
+from bookkeeper.repository.engine import create_bookkeeper_engine
+from bookkeeper.repository.my_orm import unit_of_work
+
+
+class RollupMismatch(NamedTuple):
+    """
+    Расхождение свёртки с таблицей расходов за день по категории.
+    None - строки нет в свёртке (rollup_*) или в таблице расходов (expense_*)
+    """
+    day: date
+    cat_id: int
+    rollup_total: Optional[float]
+    expense_total: Optional[float]
+    rollup_count: Optional[int]
+    expense_count: Optional[int]
+
+
+def fill_daily_totals(connection: Union[Connection, Session],
+                      day: ColumnElement[Any] = EXPENSE_DAY) -> None:
+    """
+    Заполнить свёртку заново по таблице расходов в текущей транзакции
+    Attributes:
+    -----------
+    connection: Union[Connection, Session]
+        Соединение или сессия
+    day: ColumnElement[Any]
+        Выражение дня расхода (другое - только для миграций старых схем)
+
+    Returns:
+    --------
+        None
+    """
+    connection.execute(delete(DailyCategoryTotals))
+    aggregate = (select(day, ExpenseTable.cat_id, func.sum(ExpenseTable.amount),
+                        func.count())
+                 .group_by(day, ExpenseTable.cat_id))
+    connection.execute(insert(DailyCategoryTotals).from_select(
+        ["day", "cat_id", "total", "count"], aggregate
+    ))
+
+
+def rebuild_daily_totals(session_factory: sessionmaker[Session]) -> None:
+    """
+    Пересобрать свёртку daily_category_totals по таблице расходов
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        None
+    """
+    with unit_of_work(session_factory) as session:
+        fill_daily_totals(session)
+
+
+def check_daily_totals(session_factory: sessionmaker[Session]
+                       ) -> list[RollupMismatch]:
+    """
+    Сравнить свёртку с суммами, посчитанными по таблице расходов
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        list[RollupMismatch] - пустой список, если свёртка согласована
+    """
+    with unit_of_work(session_factory) as session:
+        expenses = {
+            (row[0], row[1]): (row[2], row[3])
+            for row in session.execute(
+                select(EXPENSE_DAY, ExpenseTable.cat_id, func.sum(ExpenseTable.amount),
+                       func.count()).group_by(EXPENSE_DAY, ExpenseTable.cat_id)
+            )
+        }
+        rollup = {
+            (row.day, row.cat_id): (row.total, row.count)
+            for row in session.execute(select(DailyCategoryTotals))
+            .scalars()
+        }
+    result = []
+    for key in sorted(expenses.keys() | rollup.keys()):
+        rollup_total, rollup_count = rollup.get(key, (None, None))
+        expense_total, expense_count = expenses.get(key, (None, None))
+        if rollup_count == expense_count and rollup_total is not None \
+                and expense_total is not None \
+                and math.isclose(rollup_total, expense_total, abs_tol=1e-6):
+            continue
+        result.append(RollupMismatch(key[0], key[1], rollup_total, expense_total,
+                                     rollup_count, expense_count))
+    return result
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Точка входа командной строки
+    """
+    parser = argparse.ArgumentParser(description="daily_category_totals maintenance")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--dsn", default=DSN)
+    args = parser.parse_args(argv)
+
+    session_factory = sessionmaker(create_bookkeeper_engine(args.dsn))
+    if args.command == "rebuild":
+        rebuild_daily_totals(session_factory)
+        return 0
+    mismatches = check_daily_totals(session_factory)
+    for mismatch in mismatches:
+        print(mismatch)
+    print(f"{len(mismatches)} mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+Колоночный снимок расходов в формате Parquet для внешней аналитики
+(pandas, DuckDB). Требует необязательный пакет pyarrow, который
+импортируется только при создании снимка.
+
+Снимок - каталог с файлами part-NNNNN.parquet и манифестом _manifest.json.
+Полный снимок заменяет все части одной. Инкрементальный снимок дописывает
+новую часть с расходами, у которых updated_at больше отметки предыдущего
+снимка. Изменённый расход попадает в несколько частей: актуальна строка
+с наибольшим updated_at. Удаления инкрементальным снимком не переносятся.
+"""
+from __future__ import annotations
+import importlib
+import json
+import os
+from datetime import datetime
+from typing import Any, NamedTuple, Optional
+
+from sqlalchemy import Select, String, UnaryExpression, func, literal, select
+from sqlalchemy.sql.operators import custom_op
+from sqlalchemy.orm import sessionmaker, Session
+
+from bookkeeper.config import BULK_CHUNK_SIZE
+from bookkeeper.models.sqlalchemy_models import ExpenseTable, CategoryTable
+from bookkeeper.repository.my_orm import unit_of_work
+
+MANIFEST = "_manifest.json"
+PATH_SEPARATOR = " / "
+# Формат отметок updated_at (CURRENT_TIMESTAMP SQLite)
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Порядок столбцов снимка
+SNAPSHOT_COLUMNS = ("id", "expense_date", "amount", "cat_id", "category",
+                    "category_path", "comment", "updated_at")
+
+
+class SnapshotResult(NamedTuple):
+    """
+    Итог создания снимка
+    Attributes:
+    -----------
+    part: Optional[str]
+        Записанный файл (None - новых расходов нет)
+    rows: int
+        Количество записанных расходов
+    watermark: str
+        Отметка снимка: в него вошли расходы с updated_at раньше этой
+        секунды (формат SQLite datetime)
+    """
+    part: Optional[str]
+    rows: int
+    watermark: str
+
+
+def _pyarrow() -> Any:
+    """
+    Модуль pyarrow. ImportError с подсказкой, если пакет не установлен
+    """
+    try:
+        pyarrow = importlib.import_module("pyarrow")
+        importlib.import_module("pyarrow.parquet")
+    except ImportError as error:
+        raise ImportError("Parquet snapshots need pyarrow: "
+                          "pip install 'pybookkeeper[parquet]'") from error
+    return pyarrow
+
+
+def _schema(pa: Any) -> Any:
+    """
+    Схема снимка: типизированные дата, сумма и категория
+    """
+    return pa.schema([
+        ("id", pa.int64()),
+        ("expense_date", pa.timestamp("us")),
+        ("amount", pa.float64()),
+        ("cat_id", pa.int64()),
+        ("category", pa.dictionary(pa.int32(), pa.string())),
+        ("category_path", pa.string()),
+        ("comment", pa.string()),
+        ("updated_at", pa.timestamp("us")),
+    ])
+
+
+def _timestamp(text: str) -> str:
+    """
+    Отметка в формате updated_at (CURRENT_TIMESTAMP). ValueError, если text
+    не дата ISO 8601
+    """
+    return datetime.fromisoformat(text).strftime(TIMESTAMP_FORMAT)
+
+
+def snapshot_query(until: str, since: Optional[str] = None) -> Select[Any]:
+    """
+    Запрос строк снимка: расходы с since <= updated_at < until в порядке дат.
+    Путь категории ("food / meat") строится рекурсивным CTE
+    по CategoryTable.parent. Отметки приводятся к формату CURRENT_TIMESTAMP
+    (YYYY-MM-DD HH:MM:SS, с точностью до секунды) и сравниваются со строками
+    столбца без datetime(): инкрементальный снимок читает расходы
+    по индексу ix_expense_updated_at
+    Attributes:
+    -----------
+    until: str
+        Отметка этого снимка
+    since: Optional[str]
+        Отметка предыдущего снимка (None - все расходы)
+
+    Returns:
+    --------
+        Select[Any] - строки со столбцами SNAPSHOT_COLUMNS
+    """
+    paths = select(CategoryTable.id, CategoryTable.name.cast(String).label("path")) \
+        .where(CategoryTable.parent.is_(None)) \
+        .cte("category_paths", recursive=True)
+    paths = paths.union_all(
+        select(CategoryTable.id,
+               paths.c.path.concat(literal(PATH_SEPARATOR)).concat(CategoryTable.name))
+        .join(paths, CategoryTable.parent == paths.c.id)
+    )
+    query = (select(ExpenseTable.id, ExpenseTable.expense_date, ExpenseTable.amount,
+                    ExpenseTable.cat_id, CategoryTable.name.label("category"),
+                    paths.c.path.label("category_path"), ExpenseTable.comment,
+                    ExpenseTable.updated_at)
+             .outerjoin(CategoryTable, CategoryTable.id == ExpenseTable.cat_id)
+             .outerjoin(paths, paths.c.id == ExpenseTable.cat_id)
+             .where(ExpenseTable.updated_at < _timestamp(until)))
+    if since is None:
+        return query.order_by(ExpenseTable.expense_date, ExpenseTable.id)
+    # Унарный плюс: SQLite не выбирает ix_expense_date ради порядка строк,
+    # а ищет изменённые расходы по ix_expense_updated_at и сортирует только их
+    by_date = UnaryExpression(ExpenseTable.expense_date.expression,
+                              operator=custom_op("+"),
+                              type_=ExpenseTable.expense_date.type)
+    return query.where(ExpenseTable.updated_at >= _timestamp(since)) \
+        .order_by(by_date, ExpenseTable.id)
+
+
+def read_manifest(directory: str) -> Optional[dict[str, Any]]:
+    """
+    Манифест снимка в каталоге directory (None - снимка нет)
+    """
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as file:
+        manifest: dict[str, Any] = json.load(file)
+    return manifest
+
+
+def _replace_json(path: str, data: dict[str, Any]) -> None:
+    """
+    Атомарно записать JSON-файл
+    """
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=4)
+    os.replace(path + ".tmp", path)
+
+
+def write_snapshot(directory: str, session_factory: sessionmaker[Session],
+                   incremental: bool = False,
+                   row_group_size: int = BULK_CHUNK_SIZE,
+                   until: Optional[str] = None) -> SnapshotResult:
+    """
+    Записать снимок расходов в каталог directory.
+    В снимок входят расходы, изменённые раньше текущей секунды: изменённые
+    в текущую секунду попадут в следующий инкрементальный снимок.
+    Расход, записанный транзакцией, которая зафиксирована уже после чтения
+    снимка, но с более ранним updated_at, инкрементальный снимок пропустит
+    Attributes:
+    -----------
+    directory: str
+        Каталог снимка (создаётся при необходимости)
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+    incremental: bool
+        Дописать только расходы, изменённые после предыдущего снимка.
+        Без предыдущего снимка записывается полный
+    row_group_size: int
+        Количество строк в группе строк Parquet (и в порции чтения из БД)
+    until: Optional[str]
+        Отметка снимка (YYYY-MM-DD HH:MM:SS), по умолчанию текущая секунда БД
+
+    Returns:
+    --------
+        SnapshotResult
+    """
+    pa = _pyarrow()
+    schema = _schema(pa)
+    os.makedirs(directory, exist_ok=True)
+    previous = read_manifest(directory)
+    since = None
+    parts: list[str] = []
+    rows_before = 0
+    if incremental and previous is not None:
+        since = previous["watermark"]
+        parts = previous["parts"]
+        rows_before = previous["rows"]
+    part = f"part-{len(parts):05d}.parquet"
+    path = os.path.join(directory, part)
+
+    rows = 0
+    with unit_of_work(session_factory) as session:
+        until = session.execute(select(func.datetime("now"))).scalar_one() \
+            if until is None else _timestamp(until)
+        result = session.execute(snapshot_query(until, since)
+                                 .execution_options(yield_per=row_group_size))
+        with pa.parquet.ParquetWriter(path + ".tmp", schema) as writer:
+            for batch in result.partitions():
+                table = pa.table(dict(zip(SNAPSHOT_COLUMNS, zip(*batch))), schema=schema)
+                writer.write_table(table, row_group_size)
+                rows += len(batch)
+
+    written: Optional[str] = part
+    if since is not None and not rows:
+        os.remove(path + ".tmp")
+        written = None
+    else:
+        os.replace(path + ".tmp", path)
+        if since is None and previous is not None:
+            for old in set(previous["parts"]) - {part}:
+                os.remove(os.path.join(directory, old))
+        parts = parts + [part]
+    _replace_json(os.path.join(directory, MANIFEST),
+                  {"parts": parts, "rows": rows_before + rows, "watermark": until})
+    return SnapshotResult(written, rows, until)
@@ -0,0 +1,375 @@
+"""
+Синхронизация кэшей с изменениями расходов, в том числе сделанными другим
+процессом (CLI, импорт) в тот же файл БД.
+
+Триггеры на expense_table записывают каждое изменение расхода в журнал
+expense_changes (см. ExpenseChange): номер изменения, id расхода, признак
+удаления (надгробие) и прежнюю дату. Номер последнего прочитанного
+изменения - отметка (watermark). get_expense_changes возвращает расходы,
+изменённые после отметки: текущие строки, id удалённых и прежние даты.
+Журнал читается по первичному ключу, поэтому стоимость зависит от числа
+изменений, а не от числа расходов.
+
+Отметкой служит номер изменения, а не updated_at: время записи хранится
+с точностью до секунды, порядок отметок времени не совпадает с порядком
+фиксации транзакций, запись в обход SQLAlchemy не обновляет updated_at,
+а удалённый расход не оставляет строки с отметкой.
+
+sync_expenses дочитывает изменения после отметки фабрики сессий, передаёт
+их кэшу агрегатов и обработчикам watch_sync (индекс сумм по дням,
+аналитика) и публикует событие изменения. Изменения, записанные функциями
+my_orm в этом процессе, кэши уже получили через watch_expenses: номера
+их записей в журнале запоминаются по событиям записи и не читаются.
+
+Журнал хранит последние CHANGE_LOG_SIZE изменений (prune_change_log).
+Если часть изменений после отметки удалена из журнала или изменений
+больше MAX_CHANGES, дельта требует полной перезагрузки (ExpenseDelta.reload).
+"""
+from __future__ import annotations
+import weakref
+from bisect import bisect_right
+from datetime import date, datetime
+from typing import Any, Callable, NamedTuple, Optional, cast
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import CursorResult, delete, func, or_, select
+from sqlalchemy.engine.row import Row
+from sqlalchemy.orm import sessionmaker, Session
+
+from bookkeeper.config import BULK_CHUNK_SIZE, CHANGE_LOG_SIZE
+from bookkeeper.models.sqlalchemy_models import ExpenseChange, ExpenseTable
+from bookkeeper.repository.aggregate_cache import get_aggregate_cache
+from bookkeeper.repository.events import ChangeEvent, UPDATE, ROLLBACK, publish, \
+    subscribe
+from bookkeeper.repository.my_orm import unit_of_work
+from bookkeeper.repository.paging import get_expense_rows
+
+# Больше изменений после отметки - кэши загружаются заново целиком
+MAX_CHANGES = BULK_CHUNK_SIZE
+
+
+class ExpenseDelta(NamedTuple):
+    """
+    Изменения расходов после отметки
+    Attributes:
+    -----------
+    watermark: int
+        Номер последнего изменения, вошедшего в дельту
+    rows: tuple[Row[Any], ...]
+        Текущие строки (id, expense_date, amount, name, comment) изменённых
+        и вставленных расходов в порядке (expense_date, id)
+    ids: frozenset[int]
+        id всех изменённых, вставленных и удалённых расходов
+    deleted: frozenset[int]
+        id удалённых расходов
+    old_keys: frozenset[tuple[datetime, int]]
+        Прежние ключи (expense_date, id) изменённых и удалённых расходов
+    reload: bool
+        Изменения неизвестны (удалены из журнала) или их слишком много:
+        данные нужно загрузить заново целиком
+    """
+    watermark: int
+    rows: tuple[Row[Any], ...] = ()
+    ids: frozenset[int] = frozenset()
+    deleted: frozenset[int] = frozenset()
+    old_keys: frozenset[tuple[datetime, int]] = frozenset()
+    reload: bool = False
+
+    def dates(self) -> list[datetime]:
+        """
+        Прежние и текущие даты изменённых расходов
+        """
+        return [old_date for old_date, _ in self.old_keys] + \
+            [row.expense_date for row in self.rows]
+
+    def days(self) -> frozenset[date]:
+        """
+        Дни, суммы расходов за которые могли измениться
+        """
+        return frozenset(value.date() for value in self.dates())
+
+
+# Интервалы номеров изменений (после first, до last включительно)
+SeqRange = tuple[int, int]
+
+
+def _last_seq(session: Session) -> int:
+    """
+    Номер последнего изменения в журнале (0 - изменений не было).
+    Читается из sqlite_sequence: номер сохраняется и после очистки журнала
+    """
+    seq: Optional[int] = session.connection().exec_driver_sql(
+        "SELECT seq FROM sqlite_sequence WHERE name = 'expense_changes'").scalar()
+    return seq or 0
+
+
+def _horizon(session: Session, last: int) -> int:
+    """
+    Наименьшая отметка, изменения после которой ещё есть в журнале
+    """
+    first: Optional[int] = session.execute(select(func.min(ExpenseChange.seq))).scalar()
+    return last if first is None else first - 1
+
+
+def _gaps(since: int, last: int, skip: list[SeqRange]) -> list[SeqRange]:
+    """
+    Интервалы номеров (since, last] без упорядоченных интервалов skip
+    """
+    gaps = []
+    for first, end in skip:
+        if first > since:
+            gaps.append((since, min(first, last)))
+        since = max(since, end)
+    if since < last:
+        gaps.append((since, last))
+    return [(first, end) for first, end in gaps if first < end]
+
+
+def get_change_watermark(session_factory: sessionmaker[Session]) -> int:
+    """
+    Получить отметку текущего состояния расходов (номер последнего изменения)
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        int
+    """
+    with unit_of_work(session_factory) as session:
+        return _last_seq(session)
+
+
+def get_expense_changes(since: int, session_factory: sessionmaker[Session],
+                        skip: Optional[list[SeqRange]] = None) -> ExpenseDelta:
+    """
+    Получить расходы, изменённые после отметки since.
+    Журнал и строки читаются в одной транзакции
+    Attributes:
+    -----------
+    since: int
+        Отметка (см. get_change_watermark, ExpenseDelta.watermark)
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+    skip: Optional[list[SeqRange]]
+        Упорядоченные интервалы номеров изменений, которые не нужно читать
+
+    Returns:
+    --------
+        ExpenseDelta
+    """
+    with unit_of_work(session_factory) as session:
+        last = _last_seq(session)
+        gaps = _gaps(since, last, skip or [])
+        # Отметка из будущего - БД заменили другим файлом
+        if since > last or since < _horizon(session, last) \
+                or sum(end - first for first, end in gaps) > MAX_CHANGES:
+            return ExpenseDelta(last, reload=True)
+        if not gaps:
+            return ExpenseDelta(last)
+        entries = session.execute(
+            select(ExpenseChange.expense_id, ExpenseChange.deleted,
+                   ExpenseChange.old_date)
+            .where(or_(*(ExpenseChange.seq.between(first + 1, end)
+                         for first, end in gaps)))
+            .order_by(ExpenseChange.seq)).all()
+        # Последнее изменение расхода решает, удалён ли он
+        deleted: dict[int, bool] = {}
+        old_keys = set()
+        for expense_id, is_deleted, old_date in entries:
+            deleted[expense_id] = is_deleted
+            if old_date is not None:
+                old_keys.add((old_date, expense_id))
+        rows = get_expense_rows([pk for pk, gone in deleted.items() if not gone],
+                                session_factory)
+    return ExpenseDelta(last, tuple(rows), frozenset(deleted),
+                        frozenset(pk for pk, gone in deleted.items() if gone),
+                        frozenset(old_keys))
+
+
+def prune_change_log(session_factory: sessionmaker[Session],
+                     keep: int = CHANGE_LOG_SIZE) -> int:
+    """
+    Удалить из журнала изменений всё, кроме последних keep изменений.
+    Отметки старше оставшихся изменений потребуют полной перезагрузки
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+    keep: int
+        Количество сохраняемых изменений
+
+    Returns:
+    --------
+        int - количество удалённых записей журнала
+    """
+    with unit_of_work(session_factory) as session:
+        last = _last_seq(session)
+        # Без лишнего DELETE: БД может быть открыта только для чтения
+        if _horizon(session, last) >= last - keep:
+            return 0
+        result = cast(CursorResult[Any], session.execute(
+            delete(ExpenseChange).where(ExpenseChange.seq <= last - keep)))
+    return result.rowcount
+
+
+class ChangeTracker:
+    """
+    Отметка синхронизации фабрики сессий и номера изменений,
+    записанных функциями my_orm этого процесса
+    Attributes:
+    -----------
+    watermark: int
+        Отметка, до которой кэши соответствуют БД
+    syncs: int
+        Количество синхронизаций, получивших изменения
+    reloads: int
+        Количество синхронизаций, потребовавших полной перезагрузки
+    """
+
+    def __init__(self, watermark: int) -> None:
+        self.watermark = watermark
+        self.syncs = 0
+        self.reloads = 0
+        self._own: list[SeqRange] = []
+
+    @property
+    def own(self) -> list[SeqRange]:
+        """
+        Упорядоченные интервалы номеров собственных изменений после отметки
+        """
+        return self._own
+
+    def written(self, session: Session, event: ChangeEvent) -> None:
+        """
+        Обработчик события записи: запомнить номера изменений журнала,
+        которые только что записала сессия session
+        """
+        if event.kind == ROLLBACK:
+            # Номера отменённых изменений достанутся следующим записям
+            self._own.clear()
+        elif event.table == ExpenseTable.__tablename__ and event.rowcount:
+            last = _last_seq(session)
+            self._add(last - event.rowcount, last)
+
+    def _add(self, first: int, last: int) -> None:
+        """
+        Добавить интервал (first, last], объединяя его с соседними
+        """
+        position = bisect_right(self._own, (first, last))
+        if position and self._own[position - 1][1] >= first:
+            position -= 1
+            first = self._own[position][0]
+            del self._own[position]
+        while position < len(self._own) and self._own[position][0] <= last:
+            last = max(last, self._own.pop(position)[1])
+        self._own.insert(position, (first, last))
+
+    def advance(self, watermark: int) -> None:
+        """
+        Передвинуть отметку, забыв прочитанные интервалы
+        """
+        self.watermark = watermark
+        self._own = [(max(first, watermark), last) for first, last in self._own
+                     if last > watermark]
+
+
+# Обработчик изменений, прочитанных из журнала: получает сессию чтения и дельту
+SyncWatcher = Callable[[Session, ExpenseDelta], None]
+_trackers: WeakKeyDictionary[sessionmaker[Session], ChangeTracker] = \
+    WeakKeyDictionary()
+_sync_watchers: WeakKeyDictionary[sessionmaker[Session], list[SyncWatcher]] = \
+    WeakKeyDictionary()
+
+
+def get_change_tracker(session_factory: sessionmaker[Session]) -> ChangeTracker:
+    """
+    Отметка синхронизации БД, с которой работает фабрика сессий
+    session_factory. Первый вызов ставит отметку на текущее состояние БД:
+    его нужно сделать до первого чтения расходов в кэши
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        ChangeTracker
+    """
+    tracker = _trackers.get(session_factory)
+    if tracker is None:
+        tracker = _trackers[session_factory] = \
+            ChangeTracker(get_change_watermark(session_factory))
+        _track_writes(session_factory, tracker)
+    return tracker
+
+
+def _track_writes(session_factory: sessionmaker[Session],
+                  tracker: ChangeTracker) -> None:
+    """
+    Передавать трекеру события записи фабрики сессий session_factory
+    """
+    # Обработчик не держит фабрику сессий: она - ключ слабого словаря
+    factory = weakref.ref(session_factory)
+
+    def written(event: ChangeEvent) -> None:
+        current = factory()
+        if current is not None:
+            with unit_of_work(current) as session:
+                tracker.written(session, event)
+
+    subscribe(session_factory, written)
+
+
+def watch_sync(session_factory: sessionmaker[Session], watcher: SyncWatcher) -> None:
+    """
+    Вызывать watcher для изменений расходов, прочитанных sync_expenses
+    Attributes:
+    -----------
+    session_factory: sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+    watcher: SyncWatcher
+        Обработчик
+
+    Returns:
+    --------
+        None
+    """
+    _sync_watchers.setdefault(session_factory, []).append(watcher)
+
+
+def sync_expenses(session_factory: sessionmaker[Session]) -> ExpenseDelta:
+    """
+    Дочитать изменения расходов после отметки, сделанные в обход my_orm
+    этого процесса (например, другим процессом), и передать их кэшам
+    репозитория и подписчикам событий
+    Attributes:
+    -----------
+    session_factory:  sessionmaker[Session]
+        Фабрика генерирующая сессию для подключения к БД через sqlalchemy
+
+    Returns:
+    --------
+        ExpenseDelta - прочитанные изменения
+    """
+    tracker = get_change_tracker(session_factory)
+    with unit_of_work(session_factory) as session:
+        delta = get_expense_changes(tracker.watermark, session_factory, tracker.own)
+        tracker.advance(delta.watermark)
+        if not (delta.reload or delta.ids):
+            return delta
+        tracker.syncs += 1
+        cache = get_aggregate_cache(session_factory)
+        if delta.reload:
+            tracker.reloads += 1
+            cache.invalidate()
+        else:
+            cache.dates_changed(delta.dates())
+        for watcher in _sync_watchers.get(session_factory, ()):
+            watcher(session, delta)
+        publish(session_factory, ChangeEvent(
+            ExpenseTable.__tablename__, UPDATE,
+            None if delta.reload else tuple(sorted(delta.ids)),
+            days=None if delta.reload else delta.days()))
+    return delta
@@ -0,0 +1,44 @@
+"""
+Модуль замера времени запуска приложения.
+Этапы отмечаются в миллисекундах от начала запуска и пишутся в лог.
+"""
+import logging
+from time import perf_counter
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupMetrics:
+    """
+    Отметки времени этапов запуска
+    Основные метрики:
+        first_paint - окно впервые отрисовано (time-to-first-paint)
+        interactive - данные всех вкладок загружены (time-to-interactive)
+    Attributes:
+    -----------
+    started: float
+        Начало запуска, значение perf_counter()
+    marks: dict[str, float]
+        Этап -> время от начала запуска, мс
+    """
+
+    def __init__(self, started: Optional[float] = None) -> None:
+        self.started = perf_counter() if started is None else started
+        self.marks: dict[str, float] = {}
+
+    def mark(self, stage: str) -> None:
+        """
+        Отметить окончание этапа stage. Повторные отметки этапа не учитываются
+        """
+        if stage in self.marks:
+            return
+        self.marks[stage] = (perf_counter() - self.started) * 1000
+        logger.info("startup: %s at %.1f ms", stage, self.marks[stage])
+
+    def report(self) -> str:
+        """
+        Все отметки одной строкой в порядке времени
+        """
+        return ", ".join(f"{stage} {elapsed:.1f} ms" for stage, elapsed
+                         in sorted(self.marks.items(), key=lambda item: item[1]))
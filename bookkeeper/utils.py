@@ -1,10 +1,16 @@
 """
 Вспомогательные функции
 """
+from __future__ import annotations
 
-from typing import Iterable, Iterator, List
+from typing import Iterable, Iterator, Sequence, Union, Any, TYPE_CHECKING
 
-from bookkeeper.models.sqlalchemy_models import BudgetTable
+from bookkeeper.config import NOT_STATED_NAME
+
+if TYPE_CHECKING:
+    from sqlalchemy import Row
+    from bookkeeper.models.sqlalchemy_models import BudgetTable, CategoryTable
+    from bookkeeper.repository.daily_index import BudgetSummary
 
 
 def _get_indent(line: str) -> int:
@@ -65,14 +71,15 @@ def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
     return result
 
 
-def budget_data_transform(budget_data: List[BudgetTable]
-                          ) -> list[list[float]]:
+def budget_data_transform(
+        budget_data: Sequence[Union[BudgetTable, Row[Any], BudgetSummary]]
+) -> list[list[float]]:
     """
     Преобразует строку бюджета в список для вывода в приложение
     Attributes:
     -----------
-    budget_data: list[BudgetData]
-        строка из таблицы бюджета
+    budget_data: Sequence[Union[BudgetTable, Row[Any], BudgetSummary]]
+        строки бюджета с полями budget и amount (см. get_budget_summary)
 
     Returns:
     --------
@@ -88,3 +95,44 @@ def budget_data_transform(budget_data: List[BudgetTable]
             delta = row.budget - row.amount
         data.append([row.budget, row.amount, delta])
     return data
+
+
+def get_subcategories(cat: CategoryTable, category_data: list[CategoryTable]
+                      ) -> list[CategoryTable]:
+    """
+    Получить список подкатегорий
+    """
+    sub_cat_pk = [data.id for data in category_data if cat.id == data.parent]
+    sub_cat = [x for x in category_data if x.id in sub_cat_pk]
+    return sub_cat
+
+
+def print_sub_cat(sub_cat: CategoryTable,
+                  space_num: int,
+                  category_data: list[CategoryTable]) -> str:
+    """
+    формирует строку в виде дерева из подкатегорий
+    """
+    cat_string = space_num * '\t' + f'{sub_cat.name} \n'
+    sub_sub_cat = get_subcategories(sub_cat, category_data)
+    for sub in sub_sub_cat:
+        cat_string += print_sub_cat(sub, space_num + 1, category_data)
+    return cat_string
+
+
+def read_categories(category_data: list[CategoryTable]) -> str:
+    """
+    Формирует строку в виде дерева из списка категорий
+    """
+    cat_string = ''
+    for cat in category_data:
+        if cat.name == NOT_STATED_NAME:
+            continue
+        if cat.parent is None:
+            cat_string += f'{cat.name} \n'
+            space_num = 1
+            for sub_cat in get_subcategories(cat, category_data):
+                cat_string += print_sub_cat(sub_cat, space_num, category_data)
+        else:
+            continue
+    return cat_string
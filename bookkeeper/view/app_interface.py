@@ -1,20 +1,38 @@
 """
 Модуль GUI
 """
+from __future__ import annotations
 # pylint: disable = no-name-in-module
 # # pylint: disable=c-extension-no-member
 # pylint: disable=too-few-public-methods
 # pylint: disable=too-many-instance-attributes
-from typing import Any, Union, List, Sequence
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from functools import partial
+from typing import Any, Union, List, Sequence, Callable, Optional, Iterable, \
+    cast, TYPE_CHECKING
 from PySide6.QtCore import QAbstractTableModel, Qt, QSize
 from PySide6.QtCore import QModelIndex, QPersistentModelIndex
 from PySide6.QtWidgets import QMainWindow, QTableView, QPushButton
 from PySide6.QtWidgets import QVBoxLayout, QWidget, QLineEdit
 from PySide6.QtWidgets import QHBoxLayout, QLabel, QFrame
 from PySide6.QtWidgets import QTabWidget, QHeaderView, QTextEdit, QComboBox
-from sqlalchemy import Row
 
-from bookkeeper.models.sqlalchemy_models import CategoryTable
+if TYPE_CHECKING:
+    # Только для аннотаций: модуль GUI не загружает sqlalchemy
+    from sqlalchemy import Row
+    from bookkeeper.models.sqlalchemy_models import CategoryTable
+
+
+# Ключ строки таблицы расходов: (expense_date, id)
+ExpenseKey = tuple[datetime, int]
+# Строки (id, expense_date, amount, name, comment), см. paging.get_expenses_page
+ExpenseRows = Sequence[Sequence[Any]]
+# Функция запроса страницы: (after, until, limit, deliver). Прочитанные строки
+# передаются в deliver сразу или позже в потоке GUI (см. DbWorker)
+PageFetcher = Callable[[Optional[ExpenseKey], Optional[ExpenseKey], Optional[int],
+                        Callable[[ExpenseRows], None]], None]
 
 
 class ExpenseTableModel(QAbstractTableModel):
@@ -28,12 +46,404 @@ class ExpenseTableModel(QAbstractTableModel):
         setData
     Взято из:
     https://www.pythonguis.com/faq/editing-pyqt-tableview/
+
+    Строки читаются из БД страницами по page_size в порядке (expense_date, id):
+    первая страница при создании модели, следующие - когда таблица
+    прокручивается до конца (canFetchMore/fetchMore). Страница i содержит
+    строки с ключом из (bounds[i], bounds[i + 1]]. В памяти хранится не больше
+    max_pages страниц, вытесненная страница перечитывается по своим границам
+    при следующем обращении. Отредактированные, но ещё не сохранённые ячейки
+    хранятся отдельно от страниц и не теряются при вытеснении.
+    Изменения БД передаются в модель точечно (insert_row, remove_rows,
+    update_row, apply_changes), без перечитывания таблицы.
+    Страницы запрашиваются через fetch_page и могут приходить позже:
+    пока страница не получена, её строки пустые. fetch_page должен выполнять
+    запросы в порядке поступления вместе с записями в БД
     """
 
-    def __init__(self, repo: list[list[str]]) -> None:
+    def __init__(self, fetch_page: PageFetcher, page_size: int = 200,
+                 max_pages: int = 20, example: Optional[list[str]] = None) -> None:
+        """
+        Attributes:
+        -----------
+        fetch_page: PageFetcher
+            Функция запроса страницы из БД
+        page_size: int
+            Количество строк в странице
+        max_pages: int
+            Максимальное количество страниц в памяти
+        example: Optional[list[str]]
+            Строка-пример, которая показывается, пока в БД нет расходов
+        """
         super().__init__()
-        self._data = repo
         self.columns = ["pk", "expense_date", "amount", "category", "comment"]
+        self._fetch_page = fetch_page
+        self._page_size = page_size
+        self._max_pages = max(max_pages, 1)
+        self._example = example
+        self._bounds: list[Optional[ExpenseKey]] = [None]
+        self._sizes: list[int] = []
+        self._offsets: list[int] = []
+        self._pages: OrderedDict[int, list[Sequence[Any]]] = OrderedDict()
+        self._edits: dict[int, dict[int, str]] = {}
+        self._exhausted = False
+        self._fetching = False
+        self._loading: set[int] = set()
+        self._requesting = False
+        # Номер загрузки: страницы, запрошенные до reload, отбрасываются
+        self._generation = 0
+        self._request_next()
+
+    def _request_next(self) -> None:
+        """
+        Запросить страницу после последней загруженной
+        """
+        if self._fetching or self._exhausted:
+            return
+        self._fetching = True
+        generation = self._generation
+        self._fetch_page(self._bounds[-1], None, self._page_size,
+                         lambda rows: self._next_loaded(rows)
+                         if generation == self._generation else None)
+
+    def _next_loaded(self, rows: ExpenseRows) -> None:
+        """
+        Добавить в конец модели страницу, запрошенную _request_next
+        """
+        self._fetching = False
+        rows = list(rows)
+        if len(rows) < self._page_size:
+            self._exhausted = True
+        # Первая страница заменяет пустую таблицу или строку-пример
+        if not self._sizes:
+            self.beginResetModel()
+            self._add_page(rows)
+            self.endResetModel()
+        elif rows:
+            first = self.loaded_rows()
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._add_page(rows)
+            self.endInsertRows()
+
+    def _add_page(self, rows: list[Sequence[Any]]) -> None:
+        """
+        Добавить прочитанную страницу в конец модели
+        """
+        if not rows:
+            return
+        page = len(self._sizes)
+        self._offsets.append(self.loaded_rows())
+        self._sizes.append(len(rows))
+        self._bounds.append((rows[-1][1], rows[-1][0]))
+        self._store(page, rows)
+
+    def _store(self, page: int, rows: list[Sequence[Any]]) -> None:
+        """
+        Положить страницу в память, вытеснив самые давно использованные
+        """
+        self._pages[page] = rows
+        self._pages.move_to_end(page)
+        while len(self._pages) > self._max_pages:
+            self._pages.popitem(last=False)
+
+    def _request_page(self, page: int) -> None:
+        """
+        Запросить вытесненную страницу по её границам
+        """
+        if page in self._loading:
+            return
+        self._loading.add(page)
+        self._requesting = True
+        generation = self._generation
+        try:
+            self._fetch_page(self._bounds[page], self._bounds[page + 1], None,
+                             lambda rows: self._page_loaded(page, rows)
+                             if generation == self._generation else None)
+        finally:
+            self._requesting = False
+
+    def _page_loaded(self, page: int, rows: ExpenseRows) -> None:
+        """
+        Положить в память страницу, запрошенную _request_page
+        """
+        self._loading.discard(page)
+        self._store(page, list(rows))
+        # Если страница получена не сразу, таблицу нужно перерисовать
+        if not self._requesting and self._sizes[page]:
+            first = self._offsets[page]
+            self.dataChanged.emit(
+                self.index(first, 0),
+                self.index(first + self._sizes[page] - 1, self.columnCount() - 1)
+            )
+
+    def _locate(self, row: int) -> tuple[int, int]:
+        """
+        Номер страницы и позиция в ней для строки таблицы row
+        """
+        page = bisect_right(self._offsets, row) - 1
+        return page, row - self._offsets[page]
+
+    def _row(self, row: int) -> Optional[Sequence[Any]]:
+        """
+        Строка БД (id, expense_date, amount, name, comment) по номеру строки таблицы.
+        None, если страница строки ещё не получена
+        """
+        page, position = self._locate(row)
+        rows = self._pages.get(page)
+        if rows is None:
+            self._request_page(page)
+            rows = self._pages.get(page)
+            if rows is None:
+                return None
+        else:
+            self._pages.move_to_end(page)
+        # Если БД изменили в обход модели, страница может оказаться короче
+        return rows[position] if position < len(rows) else None
+
+    def _resize_page(self, page: int, delta: int) -> None:
+        """
+        Изменить размер страницы и сдвинуть начала следующих страниц
+        """
+        self._sizes[page] += delta
+        for i in range(page + 1, len(self._offsets)):
+            self._offsets[i] += delta
+
+    def insert_row(self, values: Sequence[Any]) -> None:
+        """
+        Вставить строку (id, expense_date, amount, name, comment),
+        добавленную в БД, на её место в порядке (expense_date, id).
+        Строка после последней загруженной не вставляется, если в БД
+        ещё есть непрочитанные строки: она будет прочитана fetchMore
+        """
+        key: ExpenseKey = (values[1], values[0])
+        if not self._sizes:
+            if not self._exhausted:
+                return
+            self.beginResetModel()
+            self._bounds = [None, key]
+            self._sizes = [1]
+            self._offsets = [0]
+            self._store(0, [values])
+            self.endResetModel()
+            return
+        # bounds[0] (None) в поиск не попадает, остальные границы - ключи
+        bound = bisect_left(cast(list[ExpenseKey], self._bounds), key, lo=1)
+        if bound == len(self._bounds):
+            if not self._exhausted:
+                return
+            bound -= 1
+            self._bounds[bound] = key
+        page = bound - 1
+        rows = self._pages.get(page)
+        # Вытесненная страница будет перечитана уже вместе с новой строкой,
+        # до тех пор строка вставляется в её начало
+        position = 0 if rows is None else \
+            bisect_left(rows, key, key=lambda item: (item[1], item[0]))
+        first = self._offsets[page] + position
+        self.beginInsertRows(QModelIndex(), first, first)
+        if rows is not None:
+            rows.insert(position, values)
+        self._resize_page(page, 1)
+        self.endInsertRows()
+
+    def remove_rows(self, rows: Sequence[int]) -> None:
+        """
+        Убрать из таблицы строки, удалённые из БД
+        """
+        if not self._sizes:
+            return
+        for row in sorted(set(rows), reverse=True):
+            if not 0 <= row < self.loaded_rows():
+                continue
+            page, position = self._locate(row)
+            self.beginRemoveRows(QModelIndex(), row, row)
+            # Вытесненная страница будет перечитана уже без удалённой строки
+            page_rows = self._pages.get(page)
+            if page_rows is not None and position < len(page_rows):
+                self._edits.pop(page_rows.pop(position)[0], None)
+            self._resize_page(page, -1)
+            self.endRemoveRows()
+
+    def update_row(self, row: int, values: Optional[Sequence[Any]]) -> None:
+        """
+        Заменить строку row строкой values, перечитанной из БД после изменения.
+        Несохранённые правки строки сбрасываются. Если изменилась дата,
+        строка переносится на новое место, если values is None - удаляется.
+        Если страница строки вытеснена, она просто перечитывается: перенос
+        строки в другую страницу в этом случае не отслеживается
+        """
+        if not 0 <= row < self.loaded_rows():
+            return
+        page, position = self._locate(row)
+        rows = self._pages.get(page)
+        if rows is None or position >= len(rows):
+            if values is not None:
+                self._edits.pop(values[0], None)
+            self._request_page(page)
+            return
+        old = rows[position]
+        self._edits.pop(old[0], None)
+        if values is None or (values[1], values[0]) != (old[1], old[0]):
+            self.remove_rows([row])
+            if values is not None:
+                self.insert_row(values)
+            return
+        rows[position] = values
+        self.dataChanged.emit(self.index(row, 0),
+                              self.index(row, self.columnCount() - 1))
+
+    def _find(self, key: ExpenseKey) -> Optional[int]:
+        """
+        Номер строки таблицы с ключом key. None, если такой строки нет
+        в загруженных страницах в памяти
+        """
+        page = self._page_of(key)
+        rows = None if page is None else self._pages.get(page)
+        if page is None or rows is None:
+            return None
+        position = bisect_left(rows, key, key=lambda item: (item[1], item[0]))
+        if position < len(rows) and (rows[position][1], rows[position][0]) == key:
+            return self._offsets[page] + position
+        return None
+
+    def _page_of(self, key: ExpenseKey) -> Optional[int]:
+        """
+        Номер страницы, в границы которой попадает ключ key
+        (None - ключ после последней загруженной строки)
+        """
+        bound = bisect_left(cast(list[ExpenseKey], self._bounds), key, lo=1)
+        return bound - 1 if bound < len(self._bounds) else None
+
+    def apply_changes(self, rows: ExpenseRows, keys: Iterable[ExpenseKey]) -> None:
+        """
+        Применить изменения БД, сделанные в обход модели (например, другим
+        процессом): убрать строки с прежними ключами keys изменённых
+        и удалённых расходов, затем вставить текущие строки rows
+        (id, expense_date, amount, name, comment) на их места.
+        Повторное применение тех же изменений ничего не меняет.
+        Вытесненные страницы не меняются: они перечитываются из БД
+        при следующем обращении
+        """
+        keys = {*keys, *((values[1], values[0]) for values in rows)}
+        self.remove_rows([row for row in map(self._find, keys) if row is not None])
+        for values in rows:
+            page = self._page_of((values[1], values[0]))
+            if page is None or page in self._pages:
+                self.insert_row(values)
+
+    def reload(self) -> None:
+        """
+        Перечитать таблицу с первой страницы, например, если изменений
+        слишком много для apply_changes. Несохранённые правки сбрасываются
+        """
+        self._generation += 1
+        self.beginResetModel()
+        self._bounds = [None]
+        self._sizes = []
+        self._offsets = []
+        self._pages.clear()
+        self._edits.clear()
+        self._loading.clear()
+        self._exhausted = False
+        self._fetching = False
+        self.endResetModel()
+        self._request_next()
+
+    def invalidate_pages(self) -> None:
+        """
+        Забыть загруженные страницы, не меняя количества строк.
+        Видимые строки будут перечитаны из БД при следующей отрисовке,
+        например, после переименования категорий
+        """
+        self._pages.clear()
+        if self._sizes:
+            self.dataChanged.emit(self.index(0, 0),
+                                  self.index(self.rowCount() - 1,
+                                             self.columnCount() - 1))
+
+    def loaded_rows(self) -> int:
+        """
+        Количество строк БД, прочитанных в модель
+        """
+        return sum(self._sizes)
+
+    def cached_pages(self) -> int:
+        """
+        Количество страниц в памяти
+        """
+        return len(self._pages)
+
+    def fetch_rows(self, rows: Iterable[int],
+                   deliver: Callable[[dict[int, Sequence[Any]]], None]) -> None:
+        """
+        Строки БД (id, expense_date, amount, name, comment) для строк таблицы
+        rows: {номер строки: строка БД}. Вытесненные и ещё не полученные
+        страницы запрашиваются через fetch_page, deliver вызывается, когда
+        получены все (сразу, если все страницы в памяти). Строки, которых
+        уже нет в БД, и строка-пример пропускаются. Если до ответа модель
+        перечитана (reload), deliver не вызывается
+        """
+        wanted: dict[int, list[tuple[int, int]]] = {}
+        for row in rows:
+            if 0 <= row < self.loaded_rows():
+                page, position = self._locate(row)
+                wanted.setdefault(page, []).append((row, position))
+        found: dict[int, Sequence[Any]] = {}
+        pending = set(wanted)
+        if not pending:
+            deliver(found)
+
+        def collect(page: int, page_rows: Sequence[Sequence[Any]]) -> None:
+            for row, position in wanted[page]:
+                if position < len(page_rows):
+                    found[row] = page_rows[position]
+            pending.discard(page)
+            if not pending:
+                deliver(found)
+
+        for page in wanted:
+            page_rows = self._pages.get(page)
+            if page_rows is not None:
+                collect(page, page_rows)
+            else:
+                self._fetch_page(self._bounds[page], self._bounds[page + 1], None,
+                                 partial(self._rows_fetched, self._generation, page,
+                                         collect))
+
+    def _rows_fetched(self, generation: int, page: int,
+                      collect: Callable[[int, Sequence[Sequence[Any]]], None],
+                      rows: ExpenseRows) -> None:
+        """
+        Страница, запрошенная fetch_rows: положить в память и передать в collect
+        """
+        if generation != self._generation:
+            return
+        rows = list(rows)
+        self._page_loaded(page, rows)
+        collect(page, rows)
+
+    def display_values(self, values: Sequence[Any]) -> list[str]:
+        """
+        Строка БД в том виде, в котором она показывается в таблице,
+        с учётом отредактированных ячеек
+        """
+        result = [str(values[0]), values[1].strftime("%d-%m-%Y %H:%M"),
+                  str(values[2]), str(values[3]), str(values[4])]
+        for col, value in self._edits.get(values[0], {}).items():
+            result[col] = value
+        return result
+
+    def row_values(self, row: int) -> list[str]:
+        """
+        Значения строки таблицы в том виде, в котором они показываются,
+        с учётом отредактированных ячеек
+        """
+        if not self._sizes:
+            return list(self._example or [])
+        values = self._row(row)
+        if values is None:
+            return [''] * len(self.columns)
+        return self.display_values(values)
 
     def data(self, index: Union[QModelIndex, QPersistentModelIndex],
              role: int = Qt.ItemDataRole.DisplayRole) -> str | None:
@@ -43,8 +453,7 @@ class ExpenseTableModel(QAbstractTableModel):
         """
         if index.isValid():
             if role in [Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole]:
-                value = self._data[index.row()][index.column()]
-                return str(value)
+                return self.row_values(index.row())[index.column()]
         return None
 
     def rowCount(self, parent: Any = QModelIndex) -> int:
@@ -52,14 +461,31 @@ class ExpenseTableModel(QAbstractTableModel):
         Кол-во строк
         Родительский метод, который необходимо реализовать
         """
-        return len(self._data)
+        if not self._sizes:
+            return 1 if self._exhausted and self._example else 0
+        return self.loaded_rows()
 
     def columnCount(self, parent: Any = QModelIndex) -> int:
         """
         Кол-во колонок
         Родительский метод, который необходимо реализовать
         """
-        return len(self._data[0])
+        return len(self.columns)
+
+    def canFetchMore(self, parent: Union[QModelIndex, QPersistentModelIndex]
+                     ) -> bool:
+        """
+        Есть ли в БД ещё не прочитанные строки
+        Родительский метод
+        """
+        return not self._exhausted
+
+    def fetchMore(self, parent: Union[QModelIndex, QPersistentModelIndex]) -> None:
+        """
+        Запросить следующую страницу.
+        Родительский метод, вызывается таблицей при прокрутке до конца
+        """
+        self._request_next()
 
     def setData(self,
                 index: Union[QModelIndex, QPersistentModelIndex],
@@ -71,8 +497,15 @@ class ExpenseTableModel(QAbstractTableModel):
         Родительский метод, который необходимо реализовать
         """
         if role == Qt.ItemDataRole.EditRole:
-            self._data[index.row()][index.column()] = value
-
+            if not self._sizes:
+                if self._example is None:
+                    return False
+                self._example[index.column()] = value
+                return True
+            values = self._row(index.row())
+            if values is None:
+                return False
+            self._edits.setdefault(values[0], {})[index.column()] = value
             return True
         return False
 
@@ -165,7 +598,7 @@ class BudgetModel(QAbstractTableModel):
         setData
     """
 
-    def __init__(self, repo: list[list[float]]) -> None:
+    def __init__(self, repo: Sequence[Sequence[Union[float, str]]]) -> None:
         super().__init__()
         self._data = repo
         self.columns = ["Budget", "Expenses", "Delta"]
@@ -186,7 +619,7 @@ class BudgetModel(QAbstractTableModel):
         return len(self._data[0])
 
     def data(self, index: Union[QModelIndex, QPersistentModelIndex],
-             role: int = Qt.ItemDataRole.DisplayRole) -> float | None:
+             role: int = Qt.ItemDataRole.DisplayRole) -> Union[float, str] | None:
         """
         Родительский метод, который необходимо реализовать
         """
@@ -357,25 +790,26 @@ class MainWindow(QMainWindow):
     """
     Интерфейс приложения
     Входные параметры:
-        repo_expense - данные для таблицы Expenses
-        repo_budget - данные для таблицы Budget
+        expense_model - модель таблицы Expenses
+        repo_budget - данные для таблицы Budget. Если не заданы,
+                      таблица показывается пустой до загрузки данных
     Атрибуты:
         expense - вкладка Expense
         budget - вкладка Budget
         category - вкладка Category
     """
 
-    def __init__(self, repo_expense: list[list[str]], repo_budget: list[list[float]],
+    def __init__(self, expense_model: QAbstractTableModel,
+                 repo_budget: Optional[list[list[float]]] = None,
                  ) -> None:
         super().__init__()
 
-        if repo_budget is None:
-            repo_budget = ['', '', '']
+        budget_model = BudgetModel(repo_budget) if repo_budget is not None \
+            else BudgetModel([[''] * 3 for _ in range(3)])
         self.setWindowTitle("bookkeeper App")
         self.setFixedSize(QSize(500, 600))
 
         self.expense = ExpenseWidget()
-        expense_model = ExpenseTableModel(repo_expense)
         self.expense.expense_table.setModel(expense_model)
 
         page_expense = QFrame()
@@ -395,7 +829,6 @@ class MainWindow(QMainWindow):
         self.expense.expense_table.verticalHeader().setVisible(False)
 
         self.budget = BudgetWidget()
-        budget_model = BudgetModel(repo_budget)
         self.budget.table_budget.setModel(budget_model)
 
         page_budget = QFrame()
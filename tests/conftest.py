@@ -0,0 +1,22 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from bookkeeper.repository.my_orm import create_tables
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    create_tables(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(conn))
+    factory = sessionmaker(engine)
+    factory.commits = commits
+    return factory
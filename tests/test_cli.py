@@ -0,0 +1,136 @@
+import io
+import os
+from datetime import datetime
+
+import pytest
+
+from bookkeeper.cli import main, set_budget, add_expense, parse_date, \
+    column_cache_path
+from bookkeeper.models.sqlalchemy_models import ExpenseTable
+from bookkeeper.repository.category_tree import commit_category_tree
+from bookkeeper.repository.csv_import import import_csv
+from bookkeeper.repository.export import export_expenses
+from bookkeeper.repository.migrations import prepare_database
+from bookkeeper.repository.my_orm import get_all
+from bookkeeper.repository.periods import get_budget_summary
+
+CSV = """expense_date,amount,category,comment
+2024-01-01 10:00:00,10.5,food,lunch
+01-01-2024 12:00,3,car,
+"""
+
+
+@pytest.fixture
+def db(engine, session_factory):
+    prepare_database(engine, session_factory)
+    commit_category_tree([("food", None), ("car", None)], session_factory)
+    return session_factory
+
+
+def test_parse_date():
+    assert parse_date("01-02-2024 10:30") == datetime(2024, 2, 1, 10, 30)
+    assert parse_date("2024-02-01T10:30") == datetime(2024, 2, 1, 10, 30)
+    with pytest.raises(ValueError):
+        parse_date("yesterday")
+
+
+def test_import_export_round_trip(db):
+    assert import_csv(io.StringIO(CSV), db, chunk_size=1).imported == 2
+    out = io.StringIO()
+    assert export_expenses(out, db, batch_size=1) == 2
+    assert out.getvalue().splitlines() == [
+        "expense_date,amount,category,comment",
+        "2024-01-01 10:00:00,10.5,food,lunch",
+        "2024-01-01 12:00:00,3.0,car,",
+    ]
+
+
+def test_strict_import_is_one_transaction(tmp_path, capsys):
+    dsn = f"sqlite:///{tmp_path / 'cli.db'}"
+    tree = tmp_path / "tree.txt"
+    tree.write_text("food\ncar\n")
+    expenses = tmp_path / "expenses.csv"
+    expenses.write_text(CSV + "2024-01-02 10:00:00,1,unknown,\n")
+
+    assert main(["--dsn", dsn, "categories", str(tree)]) == 0
+    assert main(["--dsn", dsn, "import", "--strict", "--chunk-size", "1",
+                 str(expenses)]) == 1
+    assert "line 4" in capsys.readouterr().err
+    assert main(["--dsn", dsn, "export"]) == 0
+    assert capsys.readouterr().out.splitlines() == [
+        "expense_date,amount,category,comment"
+    ]
+
+    rejects = tmp_path / "rejects.csv"
+    assert main(["--dsn", dsn, "import", "--rejects", str(rejects),
+                 str(expenses)]) == 0
+    assert "imported 2 rows, rejected 1" in capsys.readouterr().out
+    assert rejects.read_text().splitlines() == [
+        "line,error", "4,Unknown category unknown"
+    ]
+
+
+def test_add_and_budget(db):
+    pk = add_expense(datetime(2024, 1, 1), 5, "food", "", db)
+    assert [row.id for row in get_all(ExpenseTable, db)] == [pk]
+    set_budget({"day": 100, "month": 3000}, db)
+    assert [(row.period, row.budget) for row in get_budget_summary(db)] == [
+        ("day", 100), ("week", 0), ("month", 3000)
+    ]
+
+
+def test_main(tmp_path, capsys):
+    dsn = f"sqlite:///{tmp_path / 'cli.db'}"
+    tree = tmp_path / "tree.txt"
+    tree.write_text("food\n    meat\ncar\n")
+    expenses = tmp_path / "expenses.csv"
+    expenses.write_text(CSV.replace("car", "meat"))
+
+    assert main(["--dsn", dsn, "categories", str(tree)]) == 0
+    assert main(["--dsn", dsn, "--storage-profile", "bulk-load", "import",
+                 str(expenses)]) == 0
+    assert main(["--dsn", dsn, "add", "1", "car", "--date", "2024-01-03"]) == 0
+    assert main(["--dsn", dsn, "add", "1", "car", "--date",
+                 "2024-01-03T10:00:00Z"]) == 0
+    assert main(["--dsn", dsn, "add", "1", "bus"]) == 1
+    assert "Unknown category bus" in capsys.readouterr().err
+    with pytest.raises(SystemExit):
+        main(["--dsn", dsn, "add", "1e20", "car"])
+    assert "invalid parse_amount value: '1e20'" in capsys.readouterr().err
+
+    assert main(["--dsn", dsn, "categories"]) == 0
+    assert capsys.readouterr().out.split() == ["food", "meat", "car"]
+    assert main(["--dsn", dsn, "--storage-profile", "read-only analytics", "by-cat",
+                 "--start", "2024-01-01", "--end", "2024-01-31"]) == 0
+    assert capsys.readouterr().out.split() == ["food", "10.50", "meat", "3.00",
+                                               "car", "2.00"]
+
+    tree.write_text("food\n    beef\ntransport\n")
+    assert main(["--dsn", dsn, "categories", str(tree), "--rename", "meat=beef"]) == 0
+    assert capsys.readouterr().out == "1 added, 1 renamed, 0 moved, 1 deleted\n"
+
+
+def test_stats(engine, db, capsys):
+    pytest.importorskip("numpy")
+    add_expense(datetime(2023, 12, 31), 100, "food", "", db)
+    add_expense(datetime(2024, 1, 1, 10), 10.5, "food", "", db)
+    add_expense(datetime(2024, 1, 20), 3, "car", "", db)
+    add_expense(datetime(2024, 3, 3), 2, "food", "", db)
+    dsn = str(engine.url)
+    assert main(["--dsn", dsn, "stats", "--start", "2024-01-01"]) == 0
+    assert capsys.readouterr().out.split() == [
+        "total", "15.50", "food", "12.50", "car", "3.00",
+        "2024-01", "13.50", "2024-02", "0.00", "2024-03", "2.00"]
+    cache = column_cache_path(dsn)
+    assert cache == f"{engine.url.database}.columns" and os.path.exists(cache)
+
+    # Следующий запуск отображает кэш и дочитывает новый расход
+    add_expense(datetime(2024, 2, 1), 4, "car", "", db)
+    for options in ([], ["--no-column-cache"]):
+        assert main(["--dsn", dsn, "stats", "--start", "2024-02-01",
+                     "--freq", "week", *options]) == 0
+        assert capsys.readouterr().out.split() == [
+            "total", "6.00", "car", "4.00", "food", "2.00",
+            "2024-01-29", "4.00", "2024-02-05", "0.00", "2024-02-12", "0.00",
+            "2024-02-19", "0.00", "2024-02-26", "2.00"]
+    assert column_cache_path("sqlite://") is None
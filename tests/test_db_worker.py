@@ -0,0 +1,102 @@
+from threading import Event, get_ident
+
+import pytest
+
+from bookkeeper.repository.my_orm import insert_values, get_all
+from bookkeeper.models.sqlalchemy_models import CategoryTable
+
+QtCore = pytest.importorskip("PySide6.QtCore")
+from bookkeeper.db_worker import DbWorker  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def app():
+    """
+    Цикл событий потока GUI: результаты доставляются очередными сигналами
+    """
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+@pytest.fixture
+def worker(app, session_factory):
+    worker = DbWorker(session_factory)
+    yield worker
+    worker.stop()
+
+
+def add_category(session_factory, name):
+    return lambda: insert_values(CategoryTable, {"name": name}, session_factory)
+
+
+def category_names(session_factory):
+    return lambda: [cat.name for cat in get_all(CategoryTable, session_factory)]
+
+
+def test_jobs_run_in_order(session_factory, worker):
+    results = []
+    worker.submit(add_category(session_factory, "cat1"))
+    worker.submit(category_names(session_factory), results.append)
+    worker.submit(add_category(session_factory, "cat2"))
+    worker.submit(category_names(session_factory), results.append)
+    worker.wait()
+    assert results == [["cat1"], ["cat1", "cat2"]]
+    assert worker.pending() == 0
+
+
+def test_job_runs_off_calling_thread(worker):
+    threads = []
+    worker.submit(get_ident, threads.append)
+    worker.wait()
+    assert threads and threads[0] != get_ident()
+
+
+def test_one_transaction_per_job(session_factory, worker):
+    def job():
+        add_category(session_factory, "cat1")()
+        add_category(session_factory, "cat2")()
+
+    worker.submit(job)
+    worker.wait()
+    assert len(session_factory.commits) == 1
+
+
+def test_cancel_stale_request(session_factory, worker):
+    started, release = Event(), Event()
+    worker.submit(lambda: (started.set(), release.wait(5)))
+    started.wait(5)
+
+    executed, delivered = [], []
+    worker.submit(lambda: executed.append("day"), lambda _: delivered.append("day"),
+                  key="cat_expenses")
+    worker.submit(lambda: executed.append("month"),
+                  lambda _: delivered.append("month"), key="cat_expenses")
+    release.set()
+    worker.wait()
+    assert executed == ["month"]
+    assert delivered == ["month"]
+
+
+def test_error_rolls_back(session_factory, worker):
+    errors = []
+
+    def job():
+        add_category(session_factory, "cat1")()
+        raise ValueError("broken")
+
+    worker.submit(job, on_error=errors.append)
+    worker.submit(job)
+    failed = []
+    worker.failed.connect(failed.append)
+    worker.wait()
+    assert [str(error) for error in errors] == ["broken"]
+    assert [str(error) for error in failed] == ["broken"]
+    assert get_all(CategoryTable, session_factory) == []
+
+
+def test_results_delivered_by_event_loop(app, session_factory, worker):
+    results = []
+    worker.submit(category_names(session_factory),
+                  lambda names: (results.append(names), app.quit()))
+    QtCore.QTimer.singleShot(5000, app.quit)
+    app.exec()
+    assert results == [[]] and worker.pending() == 0
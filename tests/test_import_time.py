@@ -0,0 +1,50 @@
+import pytest
+
+from benchmarks.bench_import_time import MARKER, ImportProfile, parse_importtime, \
+    profile_import, check
+
+OUTPUT = f"""import time: self [us] | cumulative | imported package
+import time:       100 |        100 | encodings
+{MARKER}
+import time:      2000 |       2000 |   sqlalchemy.sql
+import time:      1500 |       3500 | sqlalchemy
+import time:       500 |       4000 | bookkeeper.utils
+"""
+
+
+def test_parse_importtime_skips_interpreter_startup():
+    assert parse_importtime(OUTPUT) == {
+        "sqlalchemy.sql": 2.0, "sqlalchemy": 1.5, "bookkeeper.utils": 0.5,
+    }
+
+
+def test_check_reports_regression():
+    profile = ImportProfile(140.0, 10.0, {"bookkeeper.utils": 10.0})
+    assert check("bookkeeper.utils", profile, False, 120.0, 0.25) == []
+    assert len(check("bookkeeper.utils", profile, False, 100.0, 0.25)) == 1
+    assert check("bookkeeper.utils", profile, False, None, 0.25) == []
+
+
+def test_check_reports_gui_import():
+    profile = ImportProfile(10.0, 1.0, {"PySide6.QtCore": 5.0})
+    assert check("bookkeeper.presenter", profile, True, None, 0.25) == []
+    assert len(check("bookkeeper.utils", profile, False, None, 0.25)) == 1
+
+
+@pytest.mark.parametrize("module", [
+    "bookkeeper.cli",
+    "bookkeeper.utils",
+    "bookkeeper.startup",
+    "bookkeeper.repository.rollup",
+    "bookkeeper.repository.migrations",
+    "bookkeeper.repository.category_tree",
+])
+def test_non_gui_modules_do_not_import_pyside(module):
+    modules = profile_import(module).modules
+    assert module in modules
+    assert not [name for name in modules if name.startswith(("PySide6", "shiboken6"))]
+
+
+def test_view_does_not_import_sqlalchemy():
+    modules = profile_import("bookkeeper.view.app_interface").modules
+    assert not [name for name in modules if name.startswith("sqlalchemy")]
@@ -0,0 +1,173 @@
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from bookkeeper.repository.aggregate_cache import AggregateCache, MISSING, \
+    expiry_for_windows, get_aggregate_cache
+from bookkeeper.repository.my_orm import bulk_insert_values, update_by_pk, delete_by_pk, \
+    insert_values, unit_of_work
+from bookkeeper.repository.periods import get_day_expenses, get_month_expenses, \
+    get_day_expenses_by_cat, get_month_expenses_by_cat, get_budget_summary, \
+    get_period_expenses_by_cat, period_window
+from bookkeeper.repository.daily_index import get_indexed_budget_summary
+from bookkeeper.models.sqlalchemy_models import BudgetTable, CategoryTable, \
+    ExpenseTable
+
+COLUMNS = ("expense_date", "amount", "cat_id", "comment")
+TODAY = datetime.combine(date.today(), time.min)
+
+
+@pytest.fixture
+def statements(engine):
+    captured = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: captured.append(statement))
+    return captured
+
+
+@pytest.fixture
+def expenses(session_factory):
+    bulk_insert_values(CategoryTable, [{"name": "food"}, {"name": "car"}],
+                       session_factory)
+    bulk_insert_values(BudgetTable, [{"period": "day", "budget": 100, "amount": 0},
+                                     {"period": "week", "budget": 700, "amount": 0},
+                                     {"period": "month", "budget": 3000, "amount": 0}],
+                       session_factory)
+    bulk_insert_values(ExpenseTable, [(TODAY, 10.0, 1, ""),
+                                      (TODAY, 5.0, 2, ""),
+                                      (TODAY - timedelta(days=20), 100.0, 1, ""),
+                                      (TODAY - timedelta(days=90), 1000.0, 2, "")],
+                       session_factory, columns=COLUMNS)
+    return session_factory
+
+
+def by_cat(session_factory, period):
+    return sorted(tuple(row) for row in
+                  get_period_expenses_by_cat(*period_window(period), session_factory))
+
+
+def test_repeated_reads_hit(expenses, statements):
+    day = get_day_expenses_by_cat(expenses)
+    month = get_month_expenses_by_cat(expenses)
+    statements.clear()
+    assert get_day_expenses_by_cat(expenses) is day
+    assert get_month_expenses_by_cat(expenses) is month
+    assert get_day_expenses_by_cat(expenses) is day
+    assert statements == []
+
+    stats = get_aggregate_cache(expenses).stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (3, 2, 2)
+    assert stats["hit_ratio"] == pytest.approx(0.6)
+    assert stats["bytes"] > 0
+
+
+def test_write_invalidates_covering_windows(expenses):
+    assert get_day_expenses(expenses) == 15
+    assert get_month_expenses(expenses) == 115
+    assert sorted(tuple(row) for row in get_month_expenses_by_cat(expenses)) == \
+        [("car", 5.0), ("food", 110.0)]
+
+    # Расход вне окон: кэш не сбрасывается
+    update_by_pk(ExpenseTable, 4, {"amount": 2000.0}, expenses)
+    cache = get_aggregate_cache(expenses)
+    misses = cache.misses
+    get_day_expenses(expenses)
+    get_month_expenses(expenses)
+    assert cache.misses == misses
+
+    # Расход 20 дней назад: сбрасывается только окно месяца
+    update_by_pk(ExpenseTable, 3, {"amount": 50.0}, expenses)
+    assert get_day_expenses(expenses) == 15
+    assert cache.misses == misses
+    assert get_month_expenses(expenses) == 65
+    assert cache.misses == misses + 1
+
+    # Перенос расхода в окно и удаление из окна
+    update_by_pk(ExpenseTable, 4, {"expense_date": TODAY}, expenses)
+    assert get_day_expenses(expenses) == 2015
+    delete_by_pk(ExpenseTable, 1, expenses)
+    assert get_day_expenses(expenses) == 2005
+    insert_values(ExpenseTable, {"expense_date": TODAY, "amount": 1.0, "cat_id": 1,
+                                 "comment": ""}, expenses)
+    assert get_day_expenses(expenses) == 2006
+    assert sorted(tuple(row) for row in get_day_expenses_by_cat(expenses)) == \
+        by_cat(expenses, "day")
+    assert sorted(tuple(row) for row in get_month_expenses_by_cat(expenses)) == \
+        by_cat(expenses, "month")
+
+
+def test_category_and_budget_writes(expenses):
+    total = get_day_expenses(expenses)
+    get_day_expenses_by_cat(expenses)
+    summary = get_budget_summary(expenses)
+    indexed = get_indexed_budget_summary(expenses)
+    cache = get_aggregate_cache(expenses)
+
+    update_by_pk(CategoryTable, 2, {"name": "auto"}, expenses)
+    assert get_day_expenses(expenses) is total
+    assert get_budget_summary(expenses) is summary
+    assert sorted(tuple(row) for row in get_day_expenses_by_cat(expenses)) == \
+        [("auto", 5.0), ("food", 10.0)]
+
+    misses = cache.misses
+    update_by_pk(BudgetTable, 1, {"budget": 200}, expenses)
+    assert get_budget_summary(expenses)[0].budget == 200
+    assert get_indexed_budget_summary(expenses)[0].budget == 200
+    assert get_day_expenses(expenses) is total
+    assert cache.misses == misses + 2
+    expected = [(1, "day", 200, 15.0), (2, "week", 700, 15.0),
+                (3, "month", 3000, 115.0)]
+    assert [tuple(row) for row in get_budget_summary(expenses)] == expected
+    assert [tuple(row) for row in get_indexed_budget_summary(expenses)] == expected
+    assert get_indexed_budget_summary(expenses) is not indexed
+
+
+def test_rollback_invalidates(expenses):
+    with pytest.raises(RuntimeError):
+        with unit_of_work(expenses):
+            insert_values(ExpenseTable, {"expense_date": TODAY, "amount": 1.0,
+                                         "cat_id": 1, "comment": ""}, expenses)
+            assert get_day_expenses(expenses) == 16
+            raise RuntimeError
+    assert get_day_expenses(expenses) == 15
+
+
+def test_lru_eviction():
+    cache = AggregateCache(maxsize=2)
+    now = datetime(2024, 5, 10, 12)
+    for key in "abc":
+        cache.put(key, [key], now - timedelta(days=1), now)
+        cache.get("a", now)
+    assert cache.get("b", now) is MISSING
+    assert cache.get("a", now) == ["a"]
+    assert cache.get("c", now) == ["c"]
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+
+
+def test_midnight_rollover_and_expiry():
+    cache = AggregateCache()
+    now = datetime(2024, 5, 10, 12)
+    cache.put("day", 1, datetime(2024, 5, 10), now)
+    cache.put("month", 2, now - timedelta(days=30), now,
+              expires=now + timedelta(hours=1))
+    assert cache.get("day", now + timedelta(hours=11)) == 1
+    assert cache.get("month", now + timedelta(minutes=59)) == 2
+    assert cache.get("month", now + timedelta(hours=1)) is MISSING
+    assert cache.get("day", datetime(2024, 5, 11, 0, 0, 1)) is MISSING
+    assert len(cache) == 0
+
+
+def test_expiry_for_windows(session_factory):
+    bulk_insert_values(CategoryTable, [{"name": "food"}], session_factory)
+    now = datetime(2024, 5, 10, 12)
+    bulk_insert_values(ExpenseTable, [(now - timedelta(days=29), 1.0, 1, ""),
+                                      (now + timedelta(hours=50), 1.0, 1, "")],
+                       session_factory, columns=COLUMNS)
+    week, month = period_window("week", now), period_window("month", now)
+    with unit_of_work(session_factory) as session:
+        assert expiry_for_windows(session, [week], now) == now + timedelta(hours=50)
+        assert expiry_for_windows(session, [week, month], now) == \
+            now + timedelta(days=1)
+        assert expiry_for_windows(session, [period_window("day", now)], now) is None
@@ -0,0 +1,141 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from bookkeeper.repository.analytics import get_analytics, ExpenseAnalytics  # noqa: E402
+from bookkeeper.repository.my_orm import (  # noqa: E402
+    insert_values, update_by_pk, delete_by_pk, delete_by_pks, bulk_insert_values,
+    remap_expense_categories, unit_of_work)
+from bookkeeper.repository.periods import (  # noqa: E402
+    get_period_expenses, get_period_expenses_by_cat)
+from bookkeeper.models.sqlalchemy_models import CategoryTable, ExpenseTable  # noqa: E402
+
+COLUMNS = ("expense_date", "amount", "cat_id", "comment")
+START = datetime(2023, 1, 30)
+
+
+@pytest.fixture
+def expenses(session_factory):
+    bulk_insert_values(CategoryTable, [{"name": "food"}, {"name": "car"},
+                                       {"name": "home"}], session_factory)
+    rnd = random.Random(1)
+    rows = [(START + timedelta(minutes=rnd.randrange(60 * 24 * 90)),
+             float(rnd.randrange(1, 1000)), rnd.randrange(1, 4), "")
+            for _ in range(2000)]
+    bulk_insert_values(ExpenseTable, rows, session_factory, columns=COLUMNS)
+    return session_factory
+
+
+def reloaded(session_factory):
+    analytics = ExpenseAnalytics()
+    with unit_of_work(session_factory) as session:
+        analytics.refresh(session)
+    return analytics
+
+
+def assert_same(analytics, expected):
+    assert sorted(analytics.ids.tolist()) == sorted(expected.ids.tolist())
+    assert np.all(np.diff(analytics.minutes) >= 0)
+    assert analytics.total() == pytest.approx(expected.total())
+    assert analytics.by_category() == pytest.approx(expected.by_category())
+
+
+def test_matches_sql(expenses):
+    analytics = get_analytics(expenses)
+    names = {1: "food", 2: "car", 3: "home"}
+    rnd = random.Random(2)
+    for _ in range(20):
+        start = START + timedelta(minutes=rnd.randrange(60 * 24 * 100))
+        end = start + timedelta(minutes=rnd.randrange(60 * 24 * 40))
+        assert analytics.total(start, end) == \
+            pytest.approx(get_period_expenses(start, end, expenses))
+        by_name = {names[pk]: total
+                   for pk, total in analytics.by_category(start, end).items()}
+        assert by_name == pytest.approx(
+            dict(tuple(row) for row in get_period_expenses_by_cat(start, end, expenses)))
+    assert analytics.total() == pytest.approx(
+        get_period_expenses(datetime.min, datetime.max, expenses))
+    assert analytics.loads == 1
+
+
+def test_histograms_and_pivot(session_factory):
+    bulk_insert_values(CategoryTable, [{"name": "food"}, {"name": "car"}],
+                       session_factory)
+    rows = [(datetime(2023, 1, 31, 23, 59), 1.0, 1, ""),
+            (datetime(2023, 2, 1, 0, 0), 10.0, 2, ""),
+            (datetime(2023, 2, 5, 12, 0), 100.0, 1, ""),
+            (datetime(2023, 2, 6, 8, 0), 1000.0, 1, "")]
+    bulk_insert_values(ExpenseTable, rows, session_factory, columns=COLUMNS)
+    analytics = get_analytics(session_factory)
+
+    days = analytics.histogram(datetime(2023, 1, 31), datetime(2023, 2, 2))
+    assert days.periods == [datetime(2023, 1, 31), datetime(2023, 2, 1),
+                            datetime(2023, 2, 2)]
+    assert days.totals.tolist() == [1.0, 10.0, 0.0]
+
+    weeks = analytics.histogram(freq="week")
+    assert weeks.periods == [datetime(2023, 1, 30), datetime(2023, 2, 6)]
+    assert weeks.totals.tolist() == [111.0, 1000.0]
+
+    months = analytics.histogram(freq="month")
+    assert months.periods == [datetime(2023, 1, 1), datetime(2023, 2, 1)]
+    assert months.totals.tolist() == [1.0, 1110.0]
+
+    pivot = analytics.pivot(end=datetime(2023, 3, 31))
+    assert pivot.cat_ids.tolist() == [1, 2]
+    assert pivot.periods == [datetime(2023, 1, 1), datetime(2023, 2, 1),
+                             datetime(2023, 3, 1)]
+    assert pivot.totals.tolist() == [[1.0, 1100.0, 0.0], [0.0, 10.0, 0.0]]
+
+    with pytest.raises(ValueError):
+        analytics.histogram(freq="year")
+
+
+def test_empty(session_factory):
+    analytics = get_analytics(session_factory)
+    assert analytics.total() == 0
+    assert analytics.by_category() == {}
+    assert analytics.histogram(freq="month").periods == []
+    assert analytics.pivot().totals.shape == (0, 0)
+
+
+def test_incremental_updates(expenses):
+    analytics = get_analytics(expenses)
+    insert_values(ExpenseTable, {"expense_date": START, "amount": 5.0, "cat_id": 2,
+                                 "comment": ""}, expenses)
+    update_by_pk(ExpenseTable, 10, {"amount": 123.0,
+                                    "expense_date": START + timedelta(days=200)},
+                 expenses)
+    delete_by_pk(ExpenseTable, 11, expenses)
+    delete_by_pks(ExpenseTable, [12, 13, 14], expenses)
+    assert not analytics.fresh
+
+    analytics = get_analytics(expenses)
+    assert (analytics.loads, analytics.updates) == (1, 1)
+    assert_same(analytics, reloaded(expenses))
+    assert analytics.total(START + timedelta(days=200)) == 123.0
+
+    bulk_insert_values(ExpenseTable, [(START, 1.0, 3, "")] * 50, expenses,
+                       columns=COLUMNS, returning=False)
+    analytics = get_analytics(expenses)
+    assert (analytics.loads, analytics.updates) == (1, 2)
+    assert_same(analytics, reloaded(expenses))
+
+
+def test_reload_on_unknown_changes(expenses):
+    analytics = get_analytics(expenses)
+    remap_expense_categories({1: 2}, expenses)
+    assert get_analytics(expenses).loads == 2
+    assert 1 not in analytics.by_category()
+
+    with pytest.raises(RuntimeError):
+        with unit_of_work(expenses):
+            delete_by_pk(ExpenseTable, 1, expenses)
+            assert 1 not in get_analytics(expenses).ids
+            raise RuntimeError
+    assert 1 in get_analytics(expenses).ids
+    assert analytics.loads == 3
+    assert_same(analytics, reloaded(expenses))
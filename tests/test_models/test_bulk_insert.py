@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+from bookkeeper.repository.my_orm import bulk_insert_values, get_all, unit_of_work
+from bookkeeper.models.sqlalchemy_models import ExpenseTable, CategoryTable
+
+
+def test_bulk_insert_dicts(session_factory):
+    pks = bulk_insert_values(CategoryTable,
+                             [{"name": "cat1"}, {"name": "cat2"}, {"name": "cat3"}],
+                             session_factory)
+    assert pks == [1, 2, 3]
+    assert [cat.name for cat in get_all(CategoryTable, session_factory)] == \
+        ["cat1", "cat2", "cat3"]
+
+
+def test_bulk_insert_tuples_in_chunks(session_factory):
+    bulk_insert_values(CategoryTable, [{"name": "cat1"}], session_factory)
+    rows = ((datetime(2024, 1, 1, 10, i), 1, i, f"comment{i}") for i in range(25))
+    pks = bulk_insert_values(ExpenseTable, rows, session_factory,
+                             columns=["expense_date", "cat_id", "amount", "comment"],
+                             chunk_size=10)
+    assert pks == list(range(1, 26))
+    assert len(session_factory.commits) == 2
+    expenses = get_all(ExpenseTable, session_factory)
+    assert [row.amount for row in expenses] == list(range(25))
+    assert expenses[3].comment == "comment3"
+
+
+def test_bulk_insert_tuples_need_columns(session_factory):
+    with pytest.raises(ValueError):
+        bulk_insert_values(CategoryTable, [("cat1", None)], session_factory)
+
+
+def test_bulk_insert_joins_unit_of_work(session_factory):
+    with pytest.raises(RuntimeError):
+        with unit_of_work(session_factory):
+            bulk_insert_values(CategoryTable, [{"name": "cat1"}], session_factory)
+            raise RuntimeError
+    assert get_all(CategoryTable, session_factory) == []
+
+
+def test_bulk_insert_uses_executemany(engine, session_factory):
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, params, context, many:
+                 statements.append((statement.split()[0], many)))
+    pks = bulk_insert_values(CategoryTable, ({"name": f"cat{i}"} for i in range(25)),
+                             session_factory, chunk_size=10)
+    assert pks == list(range(1, 26))
+    assert [many for statement, many in statements if statement == "INSERT"] == \
+        [True] * 3
+    assert all("RETURNING" not in statement for statement, many in statements)
+
+
+def test_bulk_insert_explicit_ids(session_factory):
+    bulk_insert_values(CategoryTable, [{"name": "cat1"}], session_factory)
+    pks = bulk_insert_values(CategoryTable, [{"id": 10, "name": "cat10"},
+                                             {"id": 5, "name": "cat5"},
+                                             {"name": "cat11"},
+                                             {"name": "cat12"}], session_factory,
+                             chunk_size=2)
+    assert pks == [10, 5, 11, 12]
+    assert bulk_insert_values(CategoryTable, [{"name": "cat13"}], session_factory,
+                              returning=False) == []
+    assert [cat.id for cat in get_all(CategoryTable, session_factory)] == \
+        [1, 5, 10, 11, 12, 13]
@@ -0,0 +1,67 @@
+import pytest
+from sqlalchemy import event
+
+from bookkeeper.repository.my_orm import insert_values, update_by_pk, \
+    bulk_insert_values, delete_by_pk, get_category_pk_by_name, get_categories, \
+    unit_of_work
+from bookkeeper.repository.category_cache import get_category_cache
+from bookkeeper.models.sqlalchemy_models import CategoryTable
+
+
+@pytest.fixture
+def statements(engine):
+    captured = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: captured.append(statement))
+    return captured
+
+
+@pytest.fixture
+def categories(session_factory):
+    bulk_insert_values(CategoryTable, [{"name": "food"}, {"name": "car"}],
+                       session_factory)
+    insert_values(CategoryTable, {"name": "meat", "parent": 1}, session_factory)
+    return session_factory
+
+
+def test_lookup_without_queries(categories, statements):
+    assert get_category_pk_by_name("meat", categories) == 3
+    statements.clear()
+    for _ in range(10):
+        assert get_category_pk_by_name("car", categories) == 2
+    assert [cat.name for cat in get_categories(categories)] == ["food", "car", "meat"]
+    assert statements == []
+
+    cache = get_category_cache(categories)
+    assert cache.stats() == {"hits": 11, "misses": 1, "size": 3}
+    assert [cat.name for cat in cache.children(1)] == ["meat"]
+    assert cache.get(3).parent == 1
+
+
+def test_unknown_name(categories):
+    with pytest.raises(KeyError):
+        get_category_pk_by_name("unknown", categories)
+
+
+def test_invalidate_on_write(categories):
+    assert get_category_pk_by_name("car", categories) == 2
+    update_by_pk(CategoryTable, 2, {"name": "auto"}, categories)
+    assert get_category_pk_by_name("auto", categories) == 2
+
+    insert_values(CategoryTable, {"name": "bus"}, categories)
+    assert get_category_pk_by_name("bus", categories) == 4
+
+    delete_by_pk(CategoryTable, 4, categories)
+    with pytest.raises(KeyError):
+        get_category_pk_by_name("bus", categories)
+    assert get_category_cache(categories).misses == 4
+
+
+def test_invalidate_on_rollback(categories):
+    with pytest.raises(RuntimeError):
+        with unit_of_work(categories):
+            insert_values(CategoryTable, {"name": "bus"}, categories)
+            assert get_category_pk_by_name("bus", categories) == 4
+            raise RuntimeError
+    with pytest.raises(KeyError):
+        get_category_pk_by_name("bus", categories)
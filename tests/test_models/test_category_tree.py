@@ -0,0 +1,133 @@
+from datetime import datetime
+from textwrap import dedent
+
+import pytest
+
+from bookkeeper.config import NOT_STATED_NAME
+from bookkeeper.models.sqlalchemy_models import CategoryTable, ExpenseTable
+from bookkeeper.repository.category_tree import diff_category_tree, \
+    commit_category_tree
+from bookkeeper.repository.my_orm import get_all, get_categories, insert_values
+from bookkeeper.utils import read_tree
+
+
+def cat(pk, name, parent=None):
+    return CategoryTable(id=pk, name=name, parent=parent)
+
+
+def tree(text):
+    return read_tree(dedent(text).splitlines())
+
+
+STORED = [
+    cat(1, NOT_STATED_NAME),
+    cat(2, "food"),
+    cat(3, "meat", 2),
+    cat(4, "fruit", 2),
+    cat(5, "transport"),
+]
+
+
+def test_no_changes():
+    diff = diff_category_tree(STORED, tree('''
+        food
+            meat
+            fruit
+        transport
+    '''))
+    assert diff.is_empty()
+
+
+def test_rename_leaf():
+    beef = tree('''
+        food
+            beef
+            fruit
+        transport
+    ''')
+    diff = diff_category_tree(STORED, beef, {"meat": "beef"})
+    assert diff.renames == {3: "beef"}
+    assert diff.inserts == [] and diff.reparents == {} and diff.deletes == []
+    # Новая категория на месте удалённой - не переименование
+    diff = diff_category_tree(STORED, beef)
+    assert diff.inserts == [("beef", 2)] and diff.deletes == [3]
+    assert diff.renames == {}
+
+
+def test_rename_needs_missing_old_name():
+    diff = diff_category_tree(STORED, tree('''
+        food
+            meat
+            beef
+        transport
+    '''), {"meat": "beef", "fruit": "transport", NOT_STATED_NAME: "other"})
+    assert diff.renames == {}
+    assert diff.inserts == [("beef", 2)] and diff.deletes == [4]
+
+
+def test_insert_reparent_delete():
+    diff = diff_category_tree(STORED, tree('''
+        food
+            fruit
+                apples
+        transport
+            meat
+        books
+    '''))
+    assert diff.inserts == [("apples", 4), ("books", None)]
+    assert diff.reparents == {3: 5}
+    assert diff.renames == {}
+    assert diff.deletes == []
+
+    diff = diff_category_tree(STORED, tree('''
+        food
+        transport
+            bus
+                tickets
+    '''))
+    assert diff.inserts == [("bus", 5), ("tickets", "bus")]
+    assert diff.deletes == [3, 4]
+
+
+@pytest.fixture
+def ledger(session_factory):
+    commit_category_tree(tree('''
+        food
+            meat
+            fruit
+        transport
+    '''), session_factory)
+    for cat_id in (2, 3, 4, 5):
+        insert_values(ExpenseTable, {
+            "expense_date": datetime(2024, 1, cat_id), "cat_id": cat_id,
+            "amount": 100, "comment": ""
+        }, session_factory)
+    return session_factory
+
+
+def test_commit_keeps_ids(ledger):
+    assert [(c.id, c.name, c.parent) for c in get_categories(ledger)] == [
+        (1, NOT_STATED_NAME, None), (2, "food", None), (3, "transport", None),
+        (4, "meat", 2), (5, "fruit", 2),
+    ]
+    updated_at = {row.id: row.updated_at for row in get_all(ExpenseTable, ledger)}
+
+    diff = commit_category_tree(tree('''
+        food
+            beef
+            books
+        transport
+            bus
+                tickets
+    '''), ledger, {"meat": "beef"})
+    assert diff.renames == {4: "beef"}
+    assert diff.deletes == [5]
+    assert [(c.id, c.name, c.parent) for c in get_categories(ledger)] == [
+        (1, NOT_STATED_NAME, None), (2, "food", None), (3, "transport", None),
+        (4, "beef", 2), (6, "books", 2), (7, "bus", 3), (8, "tickets", 7),
+    ]
+    # Расходы удалённой fruit - в NOT_STATED_NAME, а не в books на её месте
+    expenses = get_all(ExpenseTable, ledger)
+    assert [row.cat_id for row in expenses] == [2, 3, 4, 1]
+    assert [row.updated_at for row in expenses[:3]] == \
+        [updated_at[pk] for pk in (1, 2, 3)]
@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from bookkeeper.repository.analytics import (  # noqa: E402
+    get_analytics, save_analytics, ExpenseAnalytics)
+from bookkeeper.repository.column_cache import (  # noqa: E402
+    ColumnCache, HEADER, read_column_cache, write_column_cache)
+from bookkeeper.repository.my_orm import (  # noqa: E402
+    bulk_insert_values, insert_values, update_by_pk, delete_by_pk, unit_of_work)
+from bookkeeper.models.sqlalchemy_models import CategoryTable, ExpenseTable  # noqa: E402
+
+START = datetime(2023, 1, 1)
+
+
+@pytest.fixture
+def expenses(session_factory):
+    bulk_insert_values(CategoryTable, [{"name": "food"}, {"name": "car"}],
+                       session_factory)
+    bulk_insert_values(ExpenseTable,
+                       [(START + timedelta(hours=i), float(i), i % 2 + 1, "")
+                        for i in range(100)],
+                       session_factory,
+                       columns=("expense_date", "amount", "cat_id", "comment"))
+    return session_factory
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "test.db.columns")
+
+
+def restart(engine):
+    """
+    Новая фабрика сессий - как при следующем запуске приложения
+    """
+    return sessionmaker(engine)
+
+
+def reloaded(session_factory):
+    analytics = ExpenseAnalytics()
+    with unit_of_work(session_factory) as session:
+        analytics.refresh(session)
+    return analytics
+
+
+def assert_same(analytics, expected):
+    order = np.argsort(analytics.ids)
+    expected_order = np.argsort(expected.ids)
+    for name in ("ids", "minutes", "cat_ids", "amounts"):
+        assert getattr(analytics, name)[order].tolist() == \
+            getattr(expected, name)[expected_order].tolist()
+    assert np.all(np.diff(analytics.minutes) >= 0)
+
+
+def test_round_trip(path):
+    cache = ColumnCache(np.array([3, 1, 2]), np.array([10, 20, 30]),
+                        np.array([1, 2, 1], dtype=np.int32), np.array([1.5, 2.5, 3.5]),
+                        3, "2023-01-01 00:00:00")
+    write_column_cache(path, cache, 7)
+    loaded = read_column_cache(path, 7)
+    assert loaded.max_id == 3 and loaded.watermark == "2023-01-01 00:00:00"
+    for name in ("ids", "minutes", "cat_ids", "amounts"):
+        column = getattr(loaded, name)
+        assert column.tolist() == getattr(cache, name).tolist()
+        assert not column.flags.owndata and not column.flags.writeable
+    assert read_column_cache(path, 8) is None
+    assert read_column_cache(path + ".missing", 7) is None
+
+
+@pytest.mark.parametrize("damage", ["flip", "truncate", "header"])
+def test_corrupt(path, damage):
+    cache = ColumnCache(np.arange(5), np.arange(5), np.ones(5, dtype=np.int32),
+                        np.ones(5), 5, "2023-01-01 00:00:00")
+    write_column_cache(path, cache, 1)
+    with open(path, "r+b") as file:
+        if damage == "flip":
+            file.seek(HEADER.size + 3)
+            file.write(b"\xff")
+        elif damage == "truncate":
+            file.truncate(HEADER.size + 8)
+        else:
+            file.truncate(HEADER.size // 2)
+    assert read_column_cache(path, 1) is None
+
+
+def test_cold_start_from_cache(engine, expenses, path):
+    analytics = get_analytics(expenses, path)
+    assert analytics.loads == 1
+    assert read_column_cache(path, 0).max_id == 100
+
+    restarted = get_analytics(restart(engine), path)
+    assert restarted.loads == 0 and restarted.mapped
+    assert restarted.total() == analytics.total()
+    assert not save_analytics(restart(engine), path)
+
+
+def test_catch_up_delta(engine, expenses, path):
+    get_analytics(expenses, path)
+    # Записи без отслеживания, как из другого процесса
+    other = restart(engine)
+    insert_values(ExpenseTable, {"expense_date": START, "amount": 1000.0,
+                                 "cat_id": 2, "comment": ""}, other)
+    update_by_pk(ExpenseTable, 5, {"amount": 500.0}, other)
+
+    session_factory = restart(engine)
+    analytics = get_analytics(session_factory, path)
+    assert (analytics.loads, analytics.updates) == (0, 1)
+    assert not analytics.mapped
+    assert_same(analytics, reloaded(session_factory))
+    assert analytics.max_id == 101
+
+    insert_values(ExpenseTable, {"expense_date": START, "amount": 1.0,
+                                 "cat_id": 1, "comment": ""}, session_factory)
+    assert save_analytics(session_factory, path)
+    assert read_column_cache(path, 0).max_id == 102
+    restarted = get_analytics(restart(engine), path)
+    assert restarted.loads == 0
+    assert_same(restarted, reloaded(session_factory))
+
+
+def test_rebuild_after_delete(engine, expenses, path):
+    get_analytics(expenses, path)
+    delete_by_pk(ExpenseTable, 7, restart(engine))
+
+    session_factory = restart(engine)
+    analytics = get_analytics(session_factory, path)
+    assert analytics.loads == 1
+    assert_same(analytics, reloaded(session_factory))
+    assert get_analytics(restart(engine), path).mapped
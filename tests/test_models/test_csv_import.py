@@ -0,0 +1,95 @@
+import io
+from datetime import datetime
+
+import pytest
+
+from bookkeeper.models.sqlalchemy_models import ExpenseTable
+from bookkeeper.repository.category_tree import commit_category_tree
+from bookkeeper.repository.csv_import import import_csv, parse_date, parse_amount, \
+    ImportReject
+from bookkeeper.repository.my_orm import get_all, unit_of_work
+
+CSV = """comment,category,amount,expense_date
+lunch,food,10.5,2024-01-01 10:00:00
+,car,abc,01-01-2024 12:00
+fuel,car,30,01-01-2024 12:00
+short,food
+x,food,1,32-01-2024 10:00
+x,bus,1,2024-01-03
+x,food,-1,2024-01-03
+
+x,food,nan,2024-01-03
+x,food,2,2024-01-04
+x,food,1e20,2024-01-04
+"""
+
+
+@pytest.fixture
+def db(session_factory):
+    commit_category_tree([("food", None), ("car", None)], session_factory)
+    return session_factory
+
+
+def test_parse_date():
+    assert parse_date("01-02-2024 10:30") == datetime(2024, 2, 1, 10, 30)
+    assert parse_date("2024-02-01 10:30:15") == datetime(2024, 2, 1, 10, 30, 15)
+    assert parse_date("2024-02-01T10:30Z") == datetime(2024, 2, 1, 10, 30)
+    assert parse_date("2024-02-01T01:30+03:00") == datetime(2024, 1, 31, 22, 30)
+    for text in ["1-02-2024 10:30", "31-02-2024 10:30", "aa-bb-cccc dd:ee", ""]:
+        with pytest.raises(ValueError, match="incorrect"):
+            parse_date(text)
+
+
+def test_parse_amount():
+    assert parse_amount("1.5") == 1.5
+    for text in ["-1", "inf", "abc", "1e20"]:
+        with pytest.raises(ValueError):
+            parse_amount(text)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 100])
+def test_import_reports_rejects(db, chunk_size):
+    result = import_csv(io.StringIO(CSV), db, chunk_size=chunk_size)
+    assert result.imported == 3
+    assert [reject.line for reject in result.rejects] == [3, 5, 6, 7, 8, 10, 12]
+    assert result.rejects[0] == ImportReject(3, "Amount abc should be a number")
+    assert result.rejects[3] == ImportReject(7, "Unknown category bus")
+    expenses = get_all(ExpenseTable, db)
+    assert [(row.amount, row.comment) for row in expenses] == [
+        (10.5, "lunch"), (30, "fuel"), (2, "x")
+    ]
+
+
+def test_import_dates_with_offset(db):
+    result = import_csv(io.StringIO("expense_date,amount,category\n"
+                                    "2024-01-01T10:00:00Z,1,food\n"
+                                    "2024-01-01T13:00:00+03:00,2,car\n"), db)
+    assert result == (2, [])
+    assert [(row.expense_date, row.amount) for row in get_all(ExpenseTable, db)] == [
+        (datetime(2024, 1, 1, 10), 1), (datetime(2024, 1, 1, 10), 2)
+    ]
+
+
+def test_import_commits_each_chunk(db):
+    before = len(db.commits)
+    import_csv(io.StringIO(CSV), db, chunk_size=2)
+    # 5 порций, в порции строк 7-8 все строки отклонены
+    assert len(db.commits) - before == 4
+
+
+def test_import_in_outer_transaction(db):
+    with pytest.raises(ValueError, match="line 3"):
+        with unit_of_work(db):
+            import_csv(io.StringIO(CSV), db, chunk_size=1, strict=True)
+    assert get_all(ExpenseTable, db) == []
+
+
+def test_import_with_process_pool(db):
+    result = import_csv(io.StringIO(CSV), db, chunk_size=2, workers=2)
+    assert result.imported == 3
+    assert [reject.line for reject in result.rejects] == [3, 5, 6, 7, 8, 10, 12]
+
+
+def test_missing_columns(db):
+    with pytest.raises(ValueError, match="amount"):
+        import_csv(io.StringIO("expense_date,category\n"), db)
@@ -0,0 +1,160 @@
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from bookkeeper.repository.daily_index import FenwickTree, DailyTotalsIndex, \
+    get_daily_index, get_period_total, get_period_totals_by_cat, \
+    get_indexed_budget_summary
+from bookkeeper.repository.my_orm import insert_values, update_by_pk, delete_by_pk, \
+    delete_by_pks, bulk_insert_values, remap_expense_categories, unit_of_work
+from bookkeeper.repository.periods import get_period_expenses, get_budget_summary
+from bookkeeper.models.sqlalchemy_models import BudgetTable, CategoryTable, \
+    ExpenseTable
+
+COLUMNS = ("expense_date", "amount", "cat_id", "comment")
+NOW = datetime.now()
+
+
+@pytest.fixture
+def expenses(session_factory):
+    bulk_insert_values(CategoryTable, [{"name": "food"}, {"name": "car"},
+                                       {"name": "home"}], session_factory)
+    rnd = random.Random(1)
+    rows = [(NOW - timedelta(minutes=rnd.randrange(60 * 24 * 60)),
+             rnd.randrange(1, 100000) / 100, rnd.randrange(1, 4), "")
+            for _ in range(1000)]
+    bulk_insert_values(ExpenseTable, rows, session_factory, columns=COLUMNS)
+    return session_factory
+
+
+def raw_total(session_factory, first, last, cat_id=None):
+    with unit_of_work(session_factory) as session:
+        return sum(expense.amount for expense in session.query(ExpenseTable)
+                   if first <= expense.expense_date.date() <= last
+                   and cat_id in (None, expense.cat_id))
+
+
+def assert_matches_sql(session_factory, seed=2):
+    index = get_daily_index(session_factory)
+    rnd = random.Random(seed)
+    for _ in range(10):
+        first = NOW.date() - timedelta(days=rnd.randrange(70))
+        last = first + timedelta(days=rnd.randrange(40))
+        for cat_id in (None, 1, 2, 3):
+            assert index.total(first, last, cat_id) == \
+                pytest.approx(raw_total(session_factory, first, last, cat_id))
+
+
+def test_fenwick_tree():
+    rnd = random.Random(0)
+    values = [rnd.randrange(100) for _ in range(37)]
+    tree = FenwickTree(values)
+    for _ in range(50):
+        position = rnd.randrange(len(values))
+        delta = rnd.randrange(-50, 50)
+        values[position] += delta
+        tree.add(position, delta)
+        value = rnd.randrange(100)
+        values.append(value)
+        tree.append(value)
+    assert len(tree) == len(values)
+    assert tree.values() == values
+    for first in range(len(values)):
+        for last in range(first, len(values), 7):
+            assert tree.range_sum(first, last) == sum(values[first:last + 1])
+    assert tree.range_sum(-5, 2) == sum(values[:3])
+    assert tree.range_sum(len(values) - 1, len(values) + 10) == values[-1]
+    assert tree.range_sum(3, 2) == 0
+    assert FenwickTree().range_sum(0, 10) == 0
+
+
+def test_index_add_outside_range():
+    index = DailyTotalsIndex()
+    index.add(date(2023, 3, 10), 1, 500)
+    index.add(date(2023, 3, 1), 2, 710)
+    index.add(date(2023, 4, 1), 1, 1)
+    assert index.origin == date(2023, 3, 1)
+    assert index.total_cents(date(2023, 1, 1), date(2023, 12, 31)) == 1211
+    assert index.total(date(2023, 1, 1), date(2023, 12, 31)) == 12.11
+    assert index.total(date(2023, 3, 2), date(2023, 3, 31), 1) == 5.0
+    assert index.by_category(date(2023, 3, 1), date(2023, 3, 1)) == {1: 0.0, 2: 7.1}
+    assert index.total(date(2023, 1, 1), date(2023, 12, 31), 3) == 0
+
+
+def test_matches_rollup(expenses):
+    assert_matches_sql(expenses)
+    assert get_daily_index(expenses).loads == 1
+
+
+def test_point_updates(expenses):
+    index = get_daily_index(expenses)
+    insert_values(ExpenseTable, {"expense_date": NOW - timedelta(days=100),
+                                 "amount": 5.0, "cat_id": 2, "comment": ""}, expenses)
+    update_by_pk(ExpenseTable, 10, {"amount": 123.0, "cat_id": 3,
+                                    "expense_date": NOW - timedelta(days=3)}, expenses)
+    # Изменение только что вставленного, ещё не учтённого расхода
+    update_by_pk(ExpenseTable, 1001, {"amount": 6.0}, expenses)
+    delete_by_pk(ExpenseTable, 11, expenses)
+    delete_by_pks(ExpenseTable, [12, 13, 14], expenses)
+    bulk_insert_values(ExpenseTable, [(NOW + timedelta(days=2), 1.0, 1, "")] * 20,
+                       expenses, columns=COLUMNS, returning=False)
+    assert not index.fresh
+
+    assert get_daily_index(expenses) is index
+    assert index.loads == 1
+    assert_matches_sql(expenses, seed=3)
+    assert index.total(NOW.date() - timedelta(days=100),
+                       NOW.date() - timedelta(days=100)) == 6.0
+    assert index.total(NOW.date() + timedelta(days=2),
+                       NOW.date() + timedelta(days=2), 1) == 20.0
+
+
+def test_reload_on_unknown_changes(expenses):
+    index = get_daily_index(expenses)
+    remap_expense_categories({1: 2}, expenses)
+    assert get_daily_index(expenses).loads == 2
+    assert 1 not in index.by_category(NOW.date() - timedelta(days=70), NOW.date())
+
+    with pytest.raises(RuntimeError):
+        with unit_of_work(expenses):
+            delete_by_pk(ExpenseTable, 1, expenses)
+            raise RuntimeError
+    assert index.loads == 2 and not index.fresh
+    assert_matches_sql(expenses)
+    assert index.loads == 3
+
+
+def test_period_totals(expenses):
+    rnd = random.Random(4)
+    for _ in range(10):
+        start = NOW - timedelta(minutes=rnd.randrange(60 * 24 * 70))
+        end = start + timedelta(minutes=rnd.randrange(60 * 24 * 40))
+        assert get_period_total(start, end, expenses) == \
+            get_period_expenses(start, end, expenses)
+        by_cat = get_period_totals_by_cat(start, end, expenses)
+        assert sum(by_cat.values()) == pytest.approx(get_period_total(start, end,
+                                                                      expenses))
+        assert by_cat[2] == pytest.approx(get_period_total(start, end, expenses, 2))
+
+
+def test_budget_summary(expenses):
+    bulk_insert_values(BudgetTable, [
+        {"period": "day", "budget": 100.0, "amount": 0.0},
+        {"period": "week", "budget": 1000.0, "amount": 0.0},
+        {"period": "month", "budget": 5000.0, "amount": 0.0}], expenses)
+    expected = [tuple(row) for row in get_budget_summary(expenses)]
+    # Суммы в копейках точны: индекс совпадает с SQL без погрешности
+    assert [tuple(row) for row in get_indexed_budget_summary(expenses)] == expected
+
+
+def test_cents_sum_exact(session_factory):
+    bulk_insert_values(CategoryTable, [{"name": "food"}], session_factory)
+    bulk_insert_values(ExpenseTable, [(NOW - timedelta(days=day), 0.1, 1, "")
+                                      for day in range(1000)],
+                       session_factory, columns=COLUMNS)
+    index = get_daily_index(session_factory)
+    first, last = NOW.date() - timedelta(days=999), NOW.date()
+    assert index.total_cents(first, last) == 10000
+    assert index.total(first, last) == 100.0
+    assert index.by_category(first, last) == {1: 100.0}
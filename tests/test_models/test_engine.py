@@ -0,0 +1,66 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from bookkeeper.repository.engine import PROFILES, PROFILE_ENV, \
+    create_bookkeeper_engine, storage_profile
+
+PRAGMAS = ("journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store",
+           "busy_timeout", "query_only")
+# Значения, которые SQLite возвращает при чтении PRAGMA
+SYNCHRONOUS = {"OFF": 0, "NORMAL": 1, "FULL": 2}
+TEMP_STORE = {"DEFAULT": 0, "FILE": 1, "MEMORY": 2}
+
+
+@pytest.fixture
+def dsn(tmp_path):
+    return f"sqlite:///{tmp_path / 'test.db'}"
+
+
+def read_pragmas(engine):
+    with engine.connect() as connection:
+        return {name: connection.execute(text(f"PRAGMA {name}")).scalar()
+                for name in PRAGMAS}
+
+
+@pytest.mark.parametrize("name", ["interactive", "bulk-load"])
+def test_profile_applied_to_every_connection(dsn, name):
+    profile = PROFILES[name]
+    engine = create_bookkeeper_engine(dsn, name)
+    expected = {
+        "journal_mode": profile.journal_mode.lower(),
+        "synchronous": SYNCHRONOUS[profile.synchronous],
+        "cache_size": profile.cache_size,
+        "mmap_size": profile.mmap_size,
+        "temp_store": TEMP_STORE[profile.temp_store],
+        "busy_timeout": profile.busy_timeout,
+        "query_only": 0,
+    }
+    assert read_pragmas(engine) == expected
+    engine.dispose()
+    assert read_pragmas(engine) == expected
+    engine.dispose()
+
+
+def test_read_only_profile(dsn):
+    writer = create_bookkeeper_engine(dsn, "interactive")
+    with writer.begin() as connection:
+        connection.execute(text("CREATE TABLE t (x INTEGER)"))
+    reader = create_bookkeeper_engine(dsn, "read-only analytics")
+    with reader.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM t")).scalar() == 0
+        with pytest.raises(OperationalError):
+            connection.execute(text("INSERT INTO t VALUES (1)"))
+    writer.dispose()
+    reader.dispose()
+
+
+def test_profile_selection(monkeypatch):
+    monkeypatch.delenv(PROFILE_ENV, raising=False)
+    assert storage_profile() == PROFILES["interactive"]
+    monkeypatch.setenv(PROFILE_ENV, "bulk-load")
+    assert storage_profile() == PROFILES["bulk-load"]
+    assert storage_profile("read-only analytics") == PROFILES["read-only analytics"]
+    monkeypatch.setenv(PROFILE_ENV, "fast")
+    with pytest.raises(ValueError):
+        storage_profile()
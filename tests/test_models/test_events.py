@@ -0,0 +1,97 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from bookkeeper.repository.events import ChangeEvent, INSERT, UPDATE, DELETE, \
+    ROLLBACK, subscribe
+from bookkeeper.repository.aggregate_cache import get_aggregate_cache
+from bookkeeper.repository.my_orm import bulk_insert_values, insert_values, \
+    update_by_pk, delete_by_pk, delete_by_pks, remap_expense_categories, unit_of_work
+from bookkeeper.repository.periods import get_day_expenses
+from bookkeeper.models.sqlalchemy_models import BudgetTable, CategoryTable, \
+    ExpenseTable
+
+COLUMNS = ("expense_date", "amount", "cat_id", "comment")
+DAY = datetime(2024, 5, 10, 12)
+
+
+@pytest.fixture
+def events(session_factory):
+    bulk_insert_values(CategoryTable, [{"name": "food"}, {"name": "car"}],
+                       session_factory)
+    bulk_insert_values(ExpenseTable, [(DAY, 10.0, 1, ""),
+                                      (DAY + timedelta(days=1), 5.0, 2, "")],
+                       session_factory, columns=COLUMNS)
+    captured = []
+    unsubscribe = subscribe(session_factory, captured.append)
+    yield captured
+    unsubscribe()
+
+
+def test_expense_events(session_factory, events):
+    update_by_pk(ExpenseTable, 1, {"cat_id": 2, "expense_date": DAY - timedelta(days=3)},
+                 session_factory)
+    update_by_pk(ExpenseTable, 2, {"comment": "taxi"}, session_factory)
+    insert_values(ExpenseTable, {"expense_date": DAY, "amount": 1.0, "cat_id": 1,
+                                 "comment": ""}, session_factory)
+    bulk_insert_values(ExpenseTable, [(DAY, 2.0, 2, "")], session_factory,
+                       columns=COLUMNS, returning=False)
+    delete_by_pks(ExpenseTable, [2, 3], session_factory)
+
+    assert events == [
+        ChangeEvent("expense_table", UPDATE, (1,),
+                    frozenset({"cat_id", "expense_date"}), frozenset({1}),
+                    frozenset({2}), frozenset({date(2024, 5, 10), date(2024, 5, 7)}), 1),
+        ChangeEvent("expense_table", UPDATE, (2,), frozenset({"comment"}),
+                    frozenset({2}), frozenset({2}), frozenset({date(2024, 5, 11)}), 1),
+        ChangeEvent("expense_table", INSERT, (3,), None, frozenset(),
+                    frozenset({1}), frozenset({date(2024, 5, 10)}), 1),
+        ChangeEvent("expense_table", INSERT, (4,), None, frozenset(),
+                    frozenset({2}), frozenset({date(2024, 5, 10)}), 1),
+        ChangeEvent("expense_table", DELETE, (2, 3), None, frozenset({1, 2}),
+                    frozenset(), frozenset({date(2024, 5, 10), date(2024, 5, 11)}), 2),
+    ]
+    assert not events[1].affects("expense_table", ("amount", "cat_id"))
+    assert events[1].affects("expense_table", ("comment",))
+    assert not events[0].affects("budget")
+    assert events[0].affects_days(date(2024, 5, 1), date(2024, 5, 7))
+    assert not events[0].affects_days(date(2024, 5, 8), date(2024, 5, 9))
+
+
+def test_unknown_rows_and_other_tables(session_factory, events):
+    remap_expense_categories({1: 2}, session_factory)
+    update_by_pk(CategoryTable, 1, {"name": "meal"}, session_factory)
+    delete_by_pk(CategoryTable, 1, session_factory)
+    update_by_pk(BudgetTable, 1, {"budget": 10}, session_factory)
+
+    assert events == [
+        ChangeEvent("expense_table", UPDATE, None, frozenset({"cat_id"}),
+                    frozenset({1}), frozenset({2}), None, 1),
+        ChangeEvent("category_table", UPDATE, (1,), frozenset({"name"}),
+                    days=frozenset(), rowcount=1),
+        ChangeEvent("category_table", DELETE, (1,), days=frozenset(), rowcount=1),
+        ChangeEvent("budget", UPDATE, (1,), frozenset({"budget"}), days=frozenset(),
+                    rowcount=0),
+    ]
+    assert events[0].affects_days(date.min, date.min)
+
+
+def test_rollback_event(session_factory, events):
+    with pytest.raises(RuntimeError):
+        with unit_of_work(session_factory):
+            delete_by_pk(ExpenseTable, 1, session_factory)
+            raise RuntimeError
+    assert [event.kind for event in events] == [DELETE, ROLLBACK]
+    assert events[1].affects("budget") and events[1].affects_days(date.min, date.min)
+
+
+def test_comment_edit_keeps_aggregates(session_factory):
+    bulk_insert_values(CategoryTable, [{"name": "food"}], session_factory)
+    insert_values(ExpenseTable, {"expense_date": datetime.now(), "amount": 1.0,
+                                 "cat_id": 1, "comment": ""}, session_factory)
+    total = get_day_expenses(session_factory)
+    update_by_pk(ExpenseTable, 1, {"comment": "lunch"}, session_factory)
+    assert get_day_expenses(session_factory) is total
+    update_by_pk(ExpenseTable, 1, {"amount": 2.0}, session_factory)
+    assert get_day_expenses(session_factory) == 2
+    assert get_aggregate_cache(session_factory).stats()["misses"] == 2
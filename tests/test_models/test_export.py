@@ -0,0 +1,139 @@
+import contextvars
+import io
+import json
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from bookkeeper.models.sqlalchemy_models import ExpenseTable
+from bookkeeper.repository.category_tree import commit_category_tree
+from bookkeeper.repository.engine import create_bookkeeper_engine
+from bookkeeper.repository.export import export_expenses, category_subtree, \
+    stream_expenses
+from bookkeeper.repository.my_orm import bulk_insert_values, get_category_pk_by_name, \
+    create_tables, insert_values, unit_of_work
+
+START = datetime(2024, 1, 1)
+
+
+class Sink:
+    """
+    Файл, который только считает записанные символы
+    """
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, text):
+        self.size += len(text)
+        return len(text)
+
+
+@pytest.fixture
+def db(session_factory):
+    commit_category_tree([("food", None), ("meat", "food"), ("fish", "food"),
+                          ("car", None)], session_factory)
+    cats = [get_category_pk_by_name(name, session_factory)
+            for name in ("food", "meat", "fish", "car")]
+    bulk_insert_values(ExpenseTable, (
+        (START + timedelta(days=i), i, cats[i % 4], f"c{i}") for i in range(8)
+    ), session_factory, columns=("expense_date", "amount", "cat_id", "comment"))
+    return session_factory
+
+
+def test_category_subtree(db):
+    pks = {name: get_category_pk_by_name(name, db) for name in ("food", "meat", "fish")}
+    assert sorted(category_subtree("food", db)) == sorted(pks.values())
+    assert category_subtree(pks["meat"], db) == [pks["meat"]]
+    with pytest.raises(ValueError):
+        category_subtree("bus", db)
+
+
+def test_export_csv_filters(db):
+    out = io.StringIO()
+    count = export_expenses(out, db, columns=("expense_date", "category", "amount"),
+                            start=START + timedelta(days=1),
+                            end=START + timedelta(days=5), category="food",
+                            batch_size=2)
+    assert count == 4
+    assert out.getvalue().splitlines() == [
+        "expense_date,category,amount",
+        "2024-01-02 00:00:00,meat,1.0",
+        "2024-01-03 00:00:00,fish,2.0",
+        "2024-01-05 00:00:00,food,4.0",
+        "2024-01-06 00:00:00,meat,5.0",
+    ]
+
+
+def test_export_jsonl(db):
+    out = io.StringIO()
+    assert export_expenses(out, db, "jsonl", ("id", "expense_date", "comment"),
+                           category="car") == 2
+    assert [json.loads(line) for line in out.getvalue().splitlines()] == [
+        {"id": 4, "expense_date": "2024-01-04T00:00:00", "comment": "c3"},
+        {"id": 8, "expense_date": "2024-01-08T00:00:00", "comment": "c7"},
+    ]
+
+
+def test_export_rejects_unknown_column(db):
+    with pytest.raises(ValueError, match="password"):
+        export_expenses(io.StringIO(), db, columns=("amount", "password"))
+    with pytest.raises(ValueError, match="xml"):
+        export_expenses(io.StringIO(), db, "xml")
+
+
+def test_export_memory_is_flat(session_factory):
+    commit_category_tree([("food", None)], session_factory)
+    cat_id = get_category_pk_by_name("food", session_factory)
+    rows = 20000
+    bulk_insert_values(ExpenseTable, (
+        (START + timedelta(minutes=i), i, cat_id, "x" * 50) for i in range(rows)
+    ), session_factory, columns=("expense_date", "amount", "cat_id", "comment"),
+        returning=False)
+
+    def peak(end):
+        tracemalloc.start()
+        try:
+            sink = Sink()
+            count = export_expenses(sink, session_factory, "jsonl", end=end,
+                                    batch_size=500)
+            return count, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    small_count, small_peak = peak(START + timedelta(minutes=rows // 8 - 1))
+    count, full_peak = peak(None)
+    assert (small_count, count) == (rows // 8, rows)
+    # В 8 раз больше строк, память почти та же
+    assert full_peak < small_peak * 1.5
+
+
+def test_stream_does_not_join_unit_of_work(tmp_path):
+    # WAL: запись не ждёт, пока выгрузка держит транзакцию чтения
+    engine = create_bookkeeper_engine(f"sqlite:///{tmp_path / 'wal.db'}", "interactive")
+    create_tables(engine)
+    factory = sessionmaker(engine)
+    commit_category_tree([("food", None)], factory)
+    cat_id = get_category_pk_by_name("food", factory)
+    columns = ("expense_date", "amount", "cat_id", "comment")
+    bulk_insert_values(ExpenseTable, [(START, 1.0, cat_id, "")] * 4, factory,
+                       columns=columns)
+
+    rows = stream_expenses(factory, batch_size=2)
+    assert next(rows).amount == 1.0
+    # Запись во время выгрузки фиксируется сразу, а не с транзакцией выгрузки
+    insert_values(ExpenseTable, dict(zip(columns, (START, 2.0, cat_id, ""))), factory)
+    with unit_of_work(factory) as session:
+        assert session.scalar(select(func.count()).select_from(ExpenseTable)) == 5
+    with factory() as session:
+        assert session.scalar(select(func.count()).select_from(ExpenseTable)) == 5
+    # Выгрузка видит снимок на момент начала чтения
+    assert len(list(rows)) == 3
+
+    rows = stream_expenses(factory)
+    next(rows)
+    contextvars.copy_context().run(rows.close)
+    engine.dispose()
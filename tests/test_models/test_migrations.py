@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import sessionmaker
+
+from bookkeeper.repository.engine import create_bookkeeper_engine
+from bookkeeper.repository.migrations import migrate, get_schema_version, \
+    prepare_database, MIGRATIONS, SCHEMA_VERSION
+from bookkeeper.repository.rollup import check_daily_totals
+from bookkeeper.repository.my_orm import get_all, insert_values
+from bookkeeper.models.sqlalchemy_models import ExpenseTable
+
+
+def index_names(engine, table):
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+
+def test_migrate_new_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    migrate(engine)
+    with engine.connect() as connection:
+        assert get_schema_version(connection) == SCHEMA_VERSION
+    assert "ix_expense_date_cat_amount" in index_names(engine, "expense_table")
+
+
+def test_aware_dates_are_stored_in_utc(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    session_factory = sessionmaker(engine)
+    prepare_database(engine, session_factory)
+    moscow = timezone(timedelta(hours=3))
+    for expense_date in (datetime(2024, 1, 1, 13, tzinfo=moscow),
+                         datetime(2024, 1, 1, 10, tzinfo=timezone.utc),
+                         datetime(2024, 1, 1, 10)):
+        insert_values(ExpenseTable, {"expense_date": expense_date, "amount": 1,
+                                     "cat_id": 1, "comment": ""}, session_factory)
+    assert {row.expense_date for row in get_all(ExpenseTable, session_factory)} == \
+        {datetime(2024, 1, 1, 10)}
+
+
+# Схема версии 0: даты текстом, суммы - float
+OLD_SCHEMA = (
+    "CREATE TABLE category_table (id INTEGER NOT NULL PRIMARY KEY, "
+    "name VARCHAR(50) NOT NULL, parent INTEGER)",
+    "CREATE TABLE expense_table (id INTEGER NOT NULL PRIMARY KEY, "
+    "expense_date DATETIME NOT NULL, "
+    "cat_id INTEGER NOT NULL REFERENCES category_table (id) ON DELETE CASCADE, "
+    "amount FLOAT NOT NULL, comment VARCHAR(200) NOT NULL, "
+    "added_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL, "
+    "updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL)",
+    "CREATE TABLE budget (id INTEGER NOT NULL PRIMARY KEY, period VARCHAR(50) NOT NULL, "
+    "budget FLOAT NOT NULL, amount FLOAT NOT NULL)",
+)
+
+
+def create_old_database(engine, version=0):
+    with engine.begin() as connection:
+        for statement in OLD_SCHEMA:
+            connection.exec_driver_sql(statement)
+        connection.exec_driver_sql(
+            "INSERT INTO category_table (id, name) VALUES (1, 'cat1')"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO expense_table (expense_date, cat_id, amount, comment) "
+            "VALUES ('2024-03-06 19:54:00.000000', 1, 100, ''), "
+            "('2024-03-06 20:00:30.500000', 1, 0.29, 'cents')"
+        )
+        for step in MIGRATIONS[:version]:
+            step(connection)
+        connection.exec_driver_sql(f"PRAGMA user_version = {version}")
+
+
+def test_migrate_old_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    create_old_database(engine)
+    assert index_names(engine, "expense_table") == set()
+
+    migrate(engine)
+    assert index_names(engine, "expense_table") == {
+        "ix_expense_date_cat_amount", "ix_expense_cat_date", "ix_expense_date",
+        "ix_expense_updated_at"
+    }
+    assert index_names(engine, "category_table") == {"ix_category_table_name"}
+    with engine.connect() as connection:
+        assert get_schema_version(connection) == SCHEMA_VERSION
+        assert connection.exec_driver_sql(
+            "SELECT name FROM category_table"
+        ).scalar_one() == "cat1"
+        assert connection.exec_driver_sql(
+            "SELECT expense_date, amount FROM expense_table ORDER BY id"
+        ).all() == [(1709754840, 10000), (1709755230, 29)]
+        assert connection.exec_driver_sql(
+            "SELECT day, total FROM daily_category_totals"
+        ).one() == ("2024-03-06", 10029)
+    session_factory = sessionmaker(engine)
+    assert [(row.expense_date, row.amount, row.comment)
+            for row in get_all(ExpenseTable, session_factory)] == [
+        (datetime(2024, 3, 6, 19, 54), 100.0, ""),
+        (datetime(2024, 3, 6, 20, 0, 30), 0.29, "cents")]
+    insert_values(ExpenseTable, {"expense_date": datetime(2024, 3, 7), "amount": 0.1,
+                                 "cat_id": 1, "comment": ""}, session_factory)
+    assert check_daily_totals(session_factory) == []
+    # Журнал изменений ведётся с версии 6, прежние расходы в него не попадают
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql(
+            "SELECT expense_id, deleted, old_date FROM expense_changes"
+        ).all() == [(3, 0, None)]
+
+    migrate(engine)
+    with engine.connect() as connection:
+        assert get_schema_version(connection) == SCHEMA_VERSION
+        assert connection.exec_driver_sql(
+            "SELECT count(*) FROM expense_table"
+        ).scalar_one() == 3
+
+
+@pytest.mark.parametrize("statement", ["CREATE TABLE expense_table",
+                                       "INSERT INTO expense_table",
+                                       "DROP TABLE expense_table_v4"])
+@pytest.mark.parametrize("transactional", [True, False])
+def test_interrupted_migration(tmp_path, statement, transactional):
+    dsn = f"sqlite:///{tmp_path / 'old.db'}"
+    engine = create_bookkeeper_engine(dsn) if transactional else create_engine(dsn)
+    create_old_database(engine, version=4)
+
+    def fail(connection, cursor, sql, *args):
+        if sql.lstrip().startswith(statement):
+            raise RuntimeError(statement)
+
+    event.listen(engine, "before_cursor_execute", fail)
+    with pytest.raises(RuntimeError):
+        migrate(engine)
+    event.remove(engine, "before_cursor_execute", fail)
+    tables = set(inspect(engine).get_table_names())
+    if transactional:
+        # Откатились и переименование, и пересоздание таблиц
+        assert "expense_table_v4" not in tables
+        with engine.connect() as connection:
+            assert get_schema_version(connection) == 4
+            assert connection.exec_driver_sql(
+                "SELECT amount FROM expense_table ORDER BY id"
+            ).scalars().all() == [100, 0.29]
+    else:
+        assert "expense_table_v4" in tables
+
+    migrate(engine)
+    assert "expense_table_v4" not in inspect(engine).get_table_names()
+    with engine.connect() as connection:
+        assert get_schema_version(connection) == SCHEMA_VERSION
+        assert connection.exec_driver_sql(
+            "SELECT expense_date, amount FROM expense_table ORDER BY id"
+        ).all() == [(1709754840, 10000), (1709755230, 29)]
+    assert check_daily_totals(sessionmaker(engine)) == []
+    engine.dispose()
+
+
+def test_prepare_database_seeds_budget_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    session_factory = sessionmaker(engine)
+    prepare_database(engine, session_factory)
+    prepare_database(engine, session_factory)
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql(
+            "SELECT id, period FROM budget ORDER BY id"
+        ).all() == [(1, "day"), (2, "week"), (3, "month")]
@@ -6,9 +6,11 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
 
 from bookkeeper.repository.my_orm import create_tables, drop_tables, insert_values, \
-    get_all, get_by_pk, delete_by_pk, delete_all, update_by_pk, get_day_expenses, \
-    get_week_expenses, get_month_expenses, get_day_expenses_by_cat, \
-    get_month_expenses_by_cat, get_category_pk_by_name
+    get_all, get_by_pk, delete_by_pk, delete_all, update_by_pk, get_category_pk_by_name, \
+    remap_expense_categories
+from bookkeeper.repository.periods import get_day_expenses, get_week_expenses, \
+    get_month_expenses, get_day_expenses_by_cat, get_month_expenses_by_cat, \
+    get_budget_summary
 from bookkeeper.models.sqlalchemy_models import ExpenseTable, CategoryTable, BudgetTable
 
 engine = create_engine(DSN_TEST, echo=False)
@@ -171,6 +173,16 @@ def test_get_month_expenses():
     assert res == 13000
 
 
+def test_get_budget_summary():
+    res = get_budget_summary(session_factory)
+    assert [row.period for row in res] == ["day", "week"]
+
+    assert res[0].budget == 3000
+    assert res[0].amount == 6000
+    assert res[1].budget == 7000
+    assert res[1].amount == 9000
+
+
 def test_get_day_expenses_by_cat():
     res = get_day_expenses_by_cat(session_factory)
     assert type(res) == list
@@ -200,6 +212,17 @@ def test_get_category_pk_by_name():
     assert res == 1
 
 
+def test_remap_expense_categories():
+    assert remap_expense_categories({2: 3, 3: 2, 1: 1}, session_factory) == 4
+    res = get_all(ExpenseTable, session_factory)
+    assert [row.cat_id for row in res] == [1, 3, 3, 2, 2]
+    assert remap_expense_categories({}, session_factory) == 0
+
+    assert remap_expense_categories({3: 2, 2: 3}, session_factory) == 4
+    res = get_all(ExpenseTable, session_factory)
+    assert [row.cat_id for row in res] == [1, 2, 2, 3, 3]
+
+
 def test_delete_by_pk():
     delete_by_pk(ExpenseTable, 1, session_factory)
     res = get_by_pk(ExpenseTable, 1, session_factory)
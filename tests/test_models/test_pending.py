@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from sqlalchemy import or_, select
+
+from bookkeeper.repository.my_orm import bulk_insert_values, unit_of_work
+from bookkeeper.repository.pending import PendingExpenses
+from bookkeeper.models.sqlalchemy_models import CategoryTable, ExpenseTable
+
+
+def test_pending_ids_and_ranges():
+    pending = PendingExpenses(limit=5)
+    pending.add([1, 2])
+    assert pending.stale and len(pending) == 0
+    pending.stale = False
+    pending.add([1, 2])
+    pending.add(range(10, 12))
+    assert len(pending) == 4 and pending
+    pending.add([3, 4])
+    assert pending.stale and not pending
+
+    pending.stale = False
+    pending.add(range(3))
+    pending.add(None)
+    assert pending.stale and not pending
+
+
+def test_pending_conditions(session_factory):
+    bulk_insert_values(CategoryTable, [{"name": "cat"}], session_factory)
+    bulk_insert_values(ExpenseTable, [(datetime(2024, 1, 1), 1, 1.0, "")] * 10,
+                       session_factory,
+                       columns=("expense_date", "cat_id", "amount", "comment"))
+    pending = PendingExpenses()
+    pending.stale = False
+    assert pending.conditions() == []
+    pending.add(range(2, 4))
+    pending.add(range(0))
+    pending.add([9, 7])
+    with unit_of_work(session_factory) as session:
+        assert session.execute(select(ExpenseTable.id)
+                               .where(or_(*pending.conditions()))
+                               .order_by(ExpenseTable.id)).scalars().all() == \
+            [2, 3, 7, 9]
@@ -0,0 +1,150 @@
+"""
+Регрессионные тесты планов запросов: ни один запрос репозитория не должен
+сканировать таблицу целиком (кроме запросов, читающих её целиком по смыслу)
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from bookkeeper.repository import my_orm, paging, periods
+from bookkeeper.models.sqlalchemy_models import ExpenseTable, CategoryTable, \
+    BudgetTable, Base
+
+PERIOD = (datetime.now() - timedelta(days=3, hours=5), datetime.now())
+QUERIES = {
+    "get_by_pk": lambda sf: my_orm.get_by_pk(ExpenseTable, 3, sf),
+    "update_by_pk": lambda sf: my_orm.update_by_pk(ExpenseTable, 3, {"amount": 1}, sf),
+    "delete_by_pk": lambda sf: my_orm.delete_by_pk(ExpenseTable, 3, sf),
+    "delete_by_pks": lambda sf: my_orm.delete_by_pks(ExpenseTable, [3, 5, 700], sf),
+    "get_day_expenses": periods.get_day_expenses,
+    "get_week_expenses": periods.get_week_expenses,
+    "get_month_expenses": periods.get_month_expenses,
+    "get_period_expenses": lambda sf: periods.get_period_expenses(*PERIOD, sf),
+    "get_day_expenses_by_cat": periods.get_day_expenses_by_cat,
+    "get_month_expenses_by_cat": periods.get_month_expenses_by_cat,
+    "get_period_expenses_by_cat":
+        lambda sf: periods.get_period_expenses_by_cat(*PERIOD, sf),
+    "get_budget_summary": periods.get_budget_summary,
+    "remap_expense_categories":
+        lambda sf: my_orm.remap_expense_categories({1: 2, 3: 4}, sf),
+    "get_expenses_page": lambda sf: paging.get_expenses_page(
+        sf, after=(datetime.now() - timedelta(days=30), 1), limit=200
+    ),
+    "get_expense_row": lambda sf: paging.get_expense_row(3, sf),
+    "get_expense_rows": lambda sf: paging.get_expense_rows([3, 5, 700], sf),
+}
+
+# Индексы, по которым запросы QUERIES ищут строки: (таблица, индекс)
+ROWID = "INTEGER PRIMARY KEY"
+ROLLUP = ("daily_category_totals", "PRIMARY KEY")
+COVERING = ("expense_table", "ix_expense_date_cat_amount")
+CATEGORY = ("category_table", ROWID)
+INDEXES = {
+    "get_by_pk": [("expense_table", ROWID)],
+    "update_by_pk": [("expense_table", ROWID)],
+    "delete_by_pk": [("expense_table", ROWID)],
+    "delete_by_pks": [("expense_table", ROWID)],
+    "get_day_expenses": [ROLLUP],
+    "get_week_expenses": [COVERING, ROLLUP],
+    "get_month_expenses": [COVERING, ROLLUP],
+    "get_period_expenses": [COVERING, ROLLUP],
+    "get_day_expenses_by_cat": [ROLLUP, CATEGORY],
+    "get_month_expenses_by_cat": [COVERING, ROLLUP, CATEGORY],
+    "get_period_expenses_by_cat": [COVERING, ROLLUP, CATEGORY],
+    "get_budget_summary": [COVERING, ROLLUP],
+    "remap_expense_categories": [("expense_table", "ix_expense_cat_date")],
+    "get_expenses_page": [("expense_table", "ix_expense_date"), CATEGORY],
+    "get_expense_row": [("expense_table", ROWID), CATEGORY],
+    "get_expense_rows": [("expense_table", ROWID), CATEGORY],
+}
+
+# Таблицы, которые нельзя сканировать. budget (три строки) читается целиком
+CHECKED_TABLES = set(Base.metadata.tables) - {"budget"}
+
+# Запросы, которые по смыслу читают всю таблицу
+FULL_READS = {
+    "get_all": lambda sf: my_orm.get_all(ExpenseTable, sf),
+    "get_expenses_data": paging.get_expenses_data,
+    "get_categories": my_orm.get_categories,
+}
+
+
+@pytest.fixture
+def filled_factory(session_factory):
+    my_orm.bulk_insert_values(CategoryTable,
+                              [{"name": f"cat{i}"} for i in range(10)],
+                              session_factory)
+    now = datetime.now()
+    my_orm.bulk_insert_values(ExpenseTable, (
+        {
+            "expense_date": now - timedelta(hours=i),
+            "cat_id": i % 10 + 1,
+            "amount": i,
+            "comment": "",
+        } for i in range(2000)
+    ), session_factory)
+    my_orm.insert_values(BudgetTable, {"period": "day", "amount": 0, "budget": 0},
+                         session_factory)
+    return session_factory
+
+
+def query_plans(session_factory, query):
+    engine = session_factory.kw["bind"]
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        query(session_factory)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    plans = []
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            plan = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement,
+                                              parameters).all()
+            plans.append((statement, [row[3] for row in plan]))
+    assert plans
+    return plans
+
+
+@pytest.mark.parametrize("name", QUERIES)
+def test_no_table_scan(filled_factory, name):
+    for statement, plan in query_plans(filled_factory, QUERIES[name]):
+        scans = [line for line in plan if line.startswith("SCAN")
+                 and line.split()[1] in CHECKED_TABLES]
+        assert not scans, f"{name}: {statement}\n{plan}"
+
+
+def test_indexes_cover_queries():
+    assert set(INDEXES) == set(QUERIES)
+
+
+@pytest.mark.parametrize("name", QUERIES)
+def test_expected_indexes(filled_factory, name):
+    lines = [line for _, plan in query_plans(filled_factory, QUERIES[name])
+             for line in plan if line.startswith("SEARCH")]
+    for table, index in INDEXES[name]:
+        assert any(line.split()[1] == table
+                   and (f"USING {index} " in line or f"INDEX {index} " in line)
+                   for line in lines), f"{name}: {table} {index}\n{lines}"
+
+
+@pytest.mark.parametrize("name", FULL_READS)
+def test_full_reads_single_scan(filled_factory, name):
+    for statement, plan in query_plans(filled_factory, FULL_READS[name]):
+        scans = [line for line in plan if line.startswith("SCAN")]
+        assert len(scans) <= 1, f"{name}: {statement}\n{plan}"
+        assert not any("TEMP B-TREE" in line for line in plan), plan
+
+
+@pytest.mark.parametrize("after", [None, (datetime.now() - timedelta(days=30), 1)])
+def test_expenses_page_without_sort(filled_factory, after):
+    # Страница читается по индексу в нужном порядке, без сортировки всей таблицы
+    query = lambda sf: paging.get_expenses_page(sf, after=after, limit=200)  # noqa: E731
+    for statement, plan in query_plans(filled_factory, query):
+        assert not any("TEMP B-TREE" in line for line in plan), plan
+        assert any("ix_expense_date" in line.split() for line in plan), plan
@@ -0,0 +1,97 @@
+import random
+from datetime import datetime, timedelta, date
+
+from sqlalchemy import select, func, update
+
+from bookkeeper.repository.my_orm import bulk_insert_values, update_by_pk, delete_by_pk, \
+    unit_of_work
+from bookkeeper.repository.periods import get_period_expenses, \
+    get_period_expenses_by_cat
+from bookkeeper.repository.rollup import check_daily_totals, rebuild_daily_totals, \
+    main
+from bookkeeper.models.sqlalchemy_models import ExpenseTable, CategoryTable, \
+    DailyCategoryTotals
+
+
+def fill(session_factory, size=300):
+    rng = random.Random(1)
+    bulk_insert_values(CategoryTable, [{"name": f"cat{i}"} for i in range(5)],
+                       session_factory)
+    now = datetime.now()
+    bulk_insert_values(ExpenseTable, (
+        {
+            "expense_date": now - timedelta(minutes=rng.randrange(60 * 24 * 40)),
+            "cat_id": rng.randrange(1, 6),
+            "amount": rng.randrange(1, 1000),
+            "comment": "",
+        } for _ in range(size)
+    ), session_factory)
+    return rng
+
+
+def raw_sum(session_factory, start, end):
+    with unit_of_work(session_factory) as session:
+        res = session.execute(
+            select(func.sum(ExpenseTable.amount))
+            .where(ExpenseTable.expense_date.between(start, end))
+        ).scalar()
+    return res or 0
+
+
+def test_triggers_keep_rollup_consistent(session_factory):
+    rng = fill(session_factory)
+    assert check_daily_totals(session_factory) == []
+
+    for pk in rng.sample(range(1, 301), 50):
+        update_by_pk(ExpenseTable, pk, {
+            "amount": rng.randrange(1, 1000),
+            "cat_id": rng.randrange(1, 6),
+            "expense_date": datetime.now() - timedelta(days=rng.randrange(40)),
+        }, session_factory)
+    for pk in rng.sample(range(1, 301), 50):
+        delete_by_pk(ExpenseTable, pk, session_factory)
+    assert check_daily_totals(session_factory) == []
+
+
+def test_period_sums_match_raw_table(session_factory):
+    rng = fill(session_factory)
+    now = datetime.now()
+    for _ in range(30):
+        start = now - timedelta(minutes=rng.randrange(60 * 24 * 45))
+        end = start + timedelta(minutes=rng.randrange(60 * 24 * 20))
+        assert get_period_expenses(start, end, session_factory) == \
+            raw_sum(session_factory, start, end)
+
+    start = datetime.combine(now - timedelta(days=10), datetime.min.time())
+    total = sum(amount for _, amount in
+                get_period_expenses_by_cat(start, now, session_factory))
+    assert total == raw_sum(session_factory, start, now)
+
+
+def test_check_and_rebuild(session_factory):
+    fill(session_factory, size=50)
+    with unit_of_work(session_factory) as session:
+        row = session.execute(select(DailyCategoryTotals)).scalars().first()
+        session.execute(update(DailyCategoryTotals)
+                        .where(DailyCategoryTotals.day == row.day,
+                               DailyCategoryTotals.cat_id == row.cat_id)
+                        .values(total=row.total + 1))
+        session.add(DailyCategoryTotals(day=date(1999, 1, 1), cat_id=1,
+                                        total=10, count=1))
+
+    mismatches = check_daily_totals(session_factory)
+    assert len(mismatches) == 2
+    assert mismatches[0].day == date(1999, 1, 1)
+    assert mismatches[0].expense_total is None
+    assert mismatches[1].rollup_total == mismatches[1].expense_total + 1
+
+    rebuild_daily_totals(session_factory)
+    assert check_daily_totals(session_factory) == []
+
+
+def test_command_line(engine, session_factory, capsys):
+    fill(session_factory, size=20)
+    dsn = str(engine.url)
+    assert main(["check", "--dsn", dsn]) == 0
+    assert main(["rebuild", "--dsn", dsn]) == 0
+    assert "0 mismatches" in capsys.readouterr().out
@@ -0,0 +1,136 @@
+import sys
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+from bookkeeper.models.sqlalchemy_models import ExpenseTable
+from bookkeeper.repository.category_tree import commit_category_tree
+from bookkeeper.repository.my_orm import bulk_insert_values, get_category_pk_by_name, \
+    update_by_pk, unit_of_work
+from bookkeeper.repository.snapshot import write_snapshot, read_manifest, \
+    snapshot_query
+
+COLUMNS = ("expense_date", "amount", "cat_id", "comment")
+
+
+def backdate(engine, seconds=10):
+    # Расходы изменены раньше текущей секунды и войдут в снимок
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            f"UPDATE expense_table SET updated_at = datetime('now', '-{seconds} seconds')"
+        )
+
+
+@pytest.fixture
+def pa():
+    return pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def pq(pa):
+    return pytest.importorskip("pyarrow.parquet")
+
+
+@pytest.fixture
+def db(engine, session_factory):
+    commit_category_tree([("food", None), ("meat", "food"), ("beef", "meat"),
+                          ("car", None)], session_factory)
+    cats = {name: get_category_pk_by_name(name, session_factory)
+            for name in ("food", "beef", "car")}
+    bulk_insert_values(ExpenseTable, [
+        (datetime(2024, 1, 2), 10.5, cats["beef"], "steak"),
+        (datetime(2024, 1, 1), 3, cats["car"], "fuel"),
+        (datetime(2024, 1, 3), 7, cats["food"], ""),
+    ], session_factory, columns=COLUMNS)
+    backdate(engine)
+    return session_factory
+
+
+def test_full_snapshot(tmp_path, db, pa, pq):
+    out = tmp_path / "snapshot"
+    result = write_snapshot(str(out), db, row_group_size=2)
+    assert (result.part, result.rows) == ("part-00000.parquet", 3)
+    file = pq.ParquetFile(out / "part-00000.parquet")
+    assert file.metadata.num_row_groups == 2
+    table = file.read()
+    assert table.schema.field("expense_date").type == pa.timestamp("us")
+    assert table.schema.field("amount").type == pa.float64()
+    assert pa.types.is_dictionary(table.schema.field("category").type)
+    assert table.column("category_path").to_pylist() == [
+        "car", "food / meat / beef", "food"
+    ]
+    assert table.column("amount").to_pylist() == [3, 10.5, 7]
+    assert read_manifest(str(out))["parts"] == ["part-00000.parquet"]
+
+
+def set_updated_at(engine, value, ids):
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            f"UPDATE expense_table SET updated_at = '{value}' "
+            f"WHERE id IN ({', '.join(map(str, ids))})"
+        )
+
+
+def test_incremental_snapshot(tmp_path, engine, db, pq):
+    out = tmp_path / "snapshot"
+    set_updated_at(engine, "2024-02-01 00:00:00", [1, 2, 3])
+    assert write_snapshot(str(out), db, incremental=True,
+                          until="2024-03-01 00:00:00").rows == 3
+    # Ничего не изменилось: новая часть не пишется
+    assert write_snapshot(str(out), db, incremental=True,
+                          until="2024-03-01 00:00:00").part is None
+
+    update_by_pk(ExpenseTable, 2, {"amount": 4}, db)
+    bulk_insert_values(ExpenseTable, [(datetime(2024, 1, 4), 1, 1, "new")], db,
+                       columns=COLUMNS)
+    update_by_pk(ExpenseTable, 3, {"amount": 8}, db)
+    set_updated_at(engine, "2024-03-01 00:00:00", [2, 4])
+    # Изменения в секунду отметки входят в следующий снимок
+    set_updated_at(engine, "2024-03-02 00:00:00", [3])
+    result = write_snapshot(str(out), db, incremental=True,
+                            until="2024-03-02 00:00:00")
+    assert (result.part, result.rows) == ("part-00001.parquet", 2)
+    table = pq.read_table(out / "part-00001.parquet")
+    assert table.column("id").to_pylist() == [2, 4]
+    assert table.column("amount").to_pylist() == [4, 1]
+
+    result = write_snapshot(str(out), db, incremental=True)
+    assert (result.part, result.rows) == ("part-00002.parquet", 1)
+    assert read_manifest(str(out))["rows"] == 6
+
+    full = write_snapshot(str(out), db)
+    assert (full.part, full.rows) == ("part-00000.parquet", 4)
+    assert sorted(path.name for path in out.iterdir()) == [
+        "_manifest.json", "part-00000.parquet"
+    ]
+
+
+def test_snapshot_without_pyarrow(tmp_path, db, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    with pytest.raises(ImportError, match="pyarrow"):
+        write_snapshot(str(tmp_path / "snapshot"), db)
+
+
+@pytest.mark.parametrize("since", [None, "2024-01-01T00:00:00"])
+def test_query_compares_raw_updated_at(engine, db, since):
+    # Без datetime() над столбцом инкрементальный снимок читает по индексу
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    until = datetime.now().isoformat("T", "seconds")
+    event.listen(engine, "before_cursor_execute", capture)
+    with unit_of_work(db) as session:
+        assert len(session.execute(snapshot_query(until, since)).all()) == 3
+    event.remove(engine, "before_cursor_execute", capture)
+    statement, parameters = statements[-1]
+    assert "datetime(" not in statement
+    assert until.replace("T", " ") in parameters
+    if since is not None:
+        assert "2024-01-01 00:00:00" in parameters
+        with engine.connect() as connection:
+            plan = [row[3] for row in connection.exec_driver_sql(
+                "EXPLAIN QUERY PLAN " + statement, parameters)]
+        assert any("ix_expense_updated_at" in line.split() for line in plan), plan
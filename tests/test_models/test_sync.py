@@ -0,0 +1,180 @@
+import sqlite3
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from bookkeeper.repository import sync
+from bookkeeper.repository.sync import ExpenseDelta, get_change_tracker, \
+    get_change_watermark, get_expense_changes, prune_change_log, sync_expenses, \
+    _gaps
+from bookkeeper.repository.events import subscribe
+from bookkeeper.repository.aggregate_cache import get_aggregate_cache
+from bookkeeper.repository.analytics import get_analytics
+from bookkeeper.repository.daily_index import get_daily_index, get_period_total
+from bookkeeper.repository.my_orm import bulk_insert_values, insert_values, \
+    update_by_pk, delete_by_pk, unit_of_work
+from bookkeeper.repository.periods import get_day_expenses, get_month_expenses, \
+    get_period_expenses
+from bookkeeper.models.sqlalchemy_models import CategoryTable, ExpenseTable
+
+COLUMNS = ("expense_date", "amount", "cat_id", "comment")
+TODAY = datetime.combine(date.today(), time.min)
+
+
+@pytest.fixture
+def ledger(session_factory):
+    bulk_insert_values(CategoryTable, [{"name": "food"}, {"name": "car"}],
+                       session_factory)
+    bulk_insert_values(ExpenseTable, [(TODAY + timedelta(hours=1), 10.0, 1, ""),
+                                      (TODAY + timedelta(hours=2), 5.0, 2, ""),
+                                      (TODAY - timedelta(days=10), 100.0, 1, "")],
+                       session_factory, columns=COLUMNS)
+    get_change_tracker(session_factory)
+    return session_factory
+
+
+@pytest.fixture
+def other(engine):
+    """
+    Другой процесс: своё подключение к тому же файлу БД и свои кэши
+    """
+    other_engine = create_engine(engine.url)
+    yield sessionmaker(other_engine)
+    other_engine.dispose()
+
+
+def raw_execute(engine, statement):
+    """
+    Запись в обход SQLAlchemy, как у стороннего скрипта
+    """
+    connection = sqlite3.connect(engine.url.database)
+    with connection:
+        connection.execute(statement)
+    connection.close()
+
+
+def test_delta_from_other_process(ledger, other, engine):
+    assert sync_expenses(ledger) == ExpenseDelta(get_change_watermark(ledger))
+
+    insert_values(ExpenseTable, {"expense_date": TODAY, "amount": 1.0, "cat_id": 2,
+                                 "comment": "cli"}, other)
+    update_by_pk(ExpenseTable, 2, {"expense_date": TODAY - timedelta(days=3)}, other)
+    delete_by_pk(ExpenseTable, 3, other)
+    raw_execute(engine, "UPDATE expense_table SET amount = 2000 WHERE id = 1")
+
+    delta = sync_expenses(ledger)
+    assert not delta.reload
+    assert delta.ids == {1, 2, 3, 4}
+    assert delta.deleted == {3}
+    assert [(row.id, row.amount, row.name) for row in delta.rows] == \
+        [(2, 5.0, "car"), (4, 1.0, "car"), (1, 20.0, "food")]
+    assert delta.old_keys == {(TODAY + timedelta(hours=1), 1),
+                              (TODAY + timedelta(hours=2), 2),
+                              (TODAY - timedelta(days=10), 3)}
+    assert delta.days() == {TODAY.date(), TODAY.date() - timedelta(days=3),
+                            TODAY.date() - timedelta(days=10)}
+    assert sync_expenses(ledger) == ExpenseDelta(delta.watermark)
+
+
+def test_own_writes_are_skipped(ledger, other):
+    events = []
+    subscribe(ledger, events.append)
+    insert_values(ExpenseTable, {"expense_date": TODAY, "amount": 1.0, "cat_id": 1,
+                                 "comment": ""}, ledger)
+    update_by_pk(ExpenseTable, 1, {"amount": 3.0}, other)
+    bulk_insert_values(ExpenseTable, [(TODAY, 2.0, 1, "")] * 3, ledger,
+                       columns=COLUMNS, returning=False)
+    delete_by_pk(ExpenseTable, 2, ledger)
+    assert get_change_tracker(ledger).own == [(3, 4), (5, 9)]
+
+    delta = sync_expenses(ledger)
+    assert delta.ids == {1}
+    assert get_change_tracker(ledger).own == []
+    assert events[-1].pks == (1,) and events[-1].rowcount is None
+
+
+def test_rolled_back_numbers_are_reused(ledger, other):
+    with pytest.raises(RuntimeError):
+        with unit_of_work(ledger):
+            update_by_pk(ExpenseTable, 1, {"amount": 3.0}, ledger)
+            raise RuntimeError
+    # Другой процесс получает номер отменённого изменения
+    update_by_pk(ExpenseTable, 2, {"amount": 7.0}, other)
+    assert sync_expenses(ledger).ids == {2}
+
+
+def test_caches_catch_up(ledger, other, engine):
+    cache = get_aggregate_cache(ledger)
+    index = get_daily_index(ledger)
+    analytics = get_analytics(ledger)
+    assert get_day_expenses(ledger) == 15
+    assert get_month_expenses(ledger) == 115
+
+    bulk_insert_values(ExpenseTable, [(TODAY, 1.0, 2, ""),
+                                      (TODAY - timedelta(days=40), 50.0, 1, "")],
+                       other, columns=COLUMNS)
+    delete_by_pk(ExpenseTable, 3, other)
+    raw_execute(engine, "UPDATE expense_table SET cat_id = 2 WHERE id = 1")
+    # Собственная запись до синхронизации ожидает в кэшах
+    insert_values(ExpenseTable, {"expense_date": TODAY, "amount": 0.5, "cat_id": 1,
+                                 "comment": ""}, ledger)
+    sync_expenses(ledger)
+
+    loads, misses = index.loads, cache.misses
+    assert get_day_expenses(ledger) == 16.5
+    assert get_month_expenses(ledger) == 16.5
+    assert cache.misses == misses + 2
+    start, end = TODAY - timedelta(days=60), TODAY + timedelta(days=1)
+    for cat_id, expected in ((None, 66.5), (1, 50.5), (2, 16.0)):
+        assert get_period_total(start, end, ledger, cat_id) == pytest.approx(expected)
+    assert index.loads == loads
+    assert get_analytics(ledger).total() == \
+        pytest.approx(get_period_expenses(start, end, ledger))
+    assert analytics.loads == 1
+
+
+def test_pruned_log_requires_reload(ledger, other):
+    get_day_expenses(ledger)
+    for amount in (1.0, 2.0, 3.0):
+        update_by_pk(ExpenseTable, 1, {"amount": amount}, other)
+    assert prune_change_log(other, keep=2) == 4
+    assert prune_change_log(other, keep=2) == 0
+
+    delta = sync_expenses(ledger)
+    assert delta.reload and delta.watermark == get_change_watermark(other)
+    assert len(get_aggregate_cache(ledger)) == 0
+    assert get_change_tracker(ledger).reloads == 1
+    assert get_day_expenses(ledger) == 8
+    # Отметка передвинута: следующие изменения читаются из журнала
+    update_by_pk(ExpenseTable, 2, {"amount": 1.0}, other)
+    assert sync_expenses(ledger).ids == {2}
+
+
+def test_too_many_changes(ledger, other, monkeypatch):
+    monkeypatch.setattr(sync, "MAX_CHANGES", 2)
+    bulk_insert_values(ExpenseTable, [(TODAY, 1.0, 1, "")] * 3, other,
+                       columns=COLUMNS)
+    assert sync_expenses(ledger).reload
+    # Собственные записи не считаются
+    bulk_insert_values(ExpenseTable, [(TODAY, 1.0, 1, "")] * 3, ledger,
+                       columns=COLUMNS)
+    assert sync_expenses(ledger) == ExpenseDelta(get_change_watermark(ledger))
+
+
+def test_get_expense_changes_is_stateless(ledger, other):
+    since = get_change_watermark(ledger)
+    update_by_pk(ExpenseTable, 1, {"comment": "x"}, other)
+    delete_by_pk(ExpenseTable, 1, other)
+    delta = get_expense_changes(since, ledger)
+    assert (delta.ids, delta.deleted, delta.rows) == ({1}, {1}, ())
+    assert get_expense_changes(since, ledger) == delta
+    assert get_expense_changes(delta.watermark + 1, ledger).reload
+
+
+def test_gaps():
+    assert _gaps(0, 10, []) == [(0, 10)]
+    assert _gaps(2, 10, [(0, 3), (5, 6), (9, 12)]) == [(3, 5), (6, 9)]
+    assert _gaps(2, 10, [(2, 10)]) == []
+    assert _gaps(5, 5, []) == []
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import pytest
+
+from bookkeeper.repository.my_orm import insert_values, get_all, get_by_pk, \
+    update_by_pk, unit_of_work
+from bookkeeper.repository.periods import get_day_expenses
+from bookkeeper.models.sqlalchemy_models import ExpenseTable, CategoryTable
+
+
+def expense(amount):
+    return {
+        "expense_date": datetime.now(),
+        "cat_id": 1,
+        "amount": amount,
+        "comment": ""
+    }
+
+
+def test_single_commit(session_factory):
+    with unit_of_work(session_factory):
+        insert_values(CategoryTable, {"name": "cat1"}, session_factory)
+        insert_values(ExpenseTable, expense(100), session_factory)
+        insert_values(ExpenseTable, expense(200), session_factory)
+        update_by_pk(ExpenseTable, 1, {"amount": 150}, session_factory)
+        assert get_day_expenses(session_factory) == 350
+        assert session_factory.commits == []
+    assert len(session_factory.commits) == 1
+    assert get_by_pk(ExpenseTable, 1, session_factory).amount == 150
+
+
+def test_rollback_on_error(session_factory):
+    with pytest.raises(ValueError):
+        with unit_of_work(session_factory):
+            insert_values(CategoryTable, {"name": "cat1"}, session_factory)
+            raise ValueError
+    assert get_all(CategoryTable, session_factory) == []
+
+
+def test_out_of_range_amount(session_factory):
+    insert_values(CategoryTable, {"name": "cat1"}, session_factory)
+    insert_values(ExpenseTable, expense(100), session_factory)
+    with pytest.raises(ValueError, match="out of range"):
+        with unit_of_work(session_factory):
+            update_by_pk(ExpenseTable, 1, {"amount": 150}, session_factory)
+            insert_values(ExpenseTable, expense(1e20), session_factory)
+    with pytest.raises(ValueError, match="out of range"):
+        update_by_pk(ExpenseTable, 1, {"amount": float("inf")}, session_factory)
+    assert [row.amount for row in get_all(ExpenseTable, session_factory)] == [100]
+
+
+def test_nested_joins_outer(session_factory):
+    with unit_of_work(session_factory) as outer:
+        with unit_of_work(session_factory) as inner:
+            assert inner is outer
+            insert_values(CategoryTable, {"name": "cat1"}, session_factory)
+        assert session_factory.commits == []
+    assert len(session_factory.commits) == 1
+
+
+def test_per_call_api(session_factory):
+    insert_values(CategoryTable, {"name": "cat1"}, session_factory)
+    insert_values(CategoryTable, {"name": "cat2"}, session_factory)
+    assert len(session_factory.commits) == 2
+    assert [cat.name for cat in get_all(CategoryTable, session_factory)] == \
+        ["cat1", "cat2"]
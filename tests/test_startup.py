@@ -0,0 +1,23 @@
+from time import perf_counter
+
+from bookkeeper.startup import StartupMetrics
+
+
+def test_marks_are_relative_to_start():
+    metrics = StartupMetrics(perf_counter() - 1)
+    metrics.mark("first_paint")
+    assert 1000 <= metrics.marks["first_paint"] < 2000
+
+
+def test_repeated_mark_ignored():
+    metrics = StartupMetrics()
+    metrics.mark("interactive")
+    first = metrics.marks["interactive"]
+    metrics.mark("interactive")
+    assert metrics.marks["interactive"] == first
+
+
+def test_report_in_time_order():
+    metrics = StartupMetrics()
+    metrics.marks = {"interactive": 20.0, "first_paint": 5.0}
+    assert metrics.report() == "first_paint 5.0 ms, interactive 20.0 ms"
@@ -0,0 +1,269 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from bookkeeper.repository.my_orm import bulk_insert_values, insert_values, \
+    update_by_pk, delete_by_pks
+from bookkeeper.repository.paging import get_expenses_page, get_expense_row
+from bookkeeper.repository.sync import get_change_watermark, get_expense_changes
+from bookkeeper.models.sqlalchemy_models import ExpenseTable, CategoryTable
+
+QtCore = pytest.importorskip("PySide6.QtCore")
+from bookkeeper.view.app_interface import ExpenseTableModel  # noqa: E402
+
+START = datetime(2024, 3, 1, 12, 0)
+
+
+@pytest.fixture
+def fetches(session_factory):
+    calls = []
+
+    def fetch(after, until, limit, deliver):
+        calls.append((after, until, limit))
+        deliver(get_expenses_page(session_factory, after, until, limit))
+
+    fetch.calls = calls
+    return fetch
+
+
+def fill(session_factory, count):
+    insert_values(CategoryTable, {"name": "cat1"}, session_factory)
+    # Одинаковые даты у соседних строк: порядок задаёт id
+    bulk_insert_values(ExpenseTable, (
+        {"expense_date": START + timedelta(minutes=i // 2), "cat_id": 1,
+         "amount": i, "comment": f"c{i}"} for i in range(count)
+    ), session_factory)
+
+
+def test_get_expenses_page(session_factory):
+    fill(session_factory, 7)
+    first = get_expenses_page(session_factory, limit=3)
+    assert [row.id for row in first] == [1, 2, 3]
+    key = (first[-1].expense_date, first[-1].id)
+    assert [row.id for row in get_expenses_page(session_factory, after=key)] == \
+        [4, 5, 6, 7]
+    assert [row.id for row in get_expenses_page(
+        session_factory, after=(first[0].expense_date, first[0].id), until=key
+    )] == [2, 3]
+
+
+def test_fetch_more(session_factory, fetches):
+    fill(session_factory, 25)
+    model = ExpenseTableModel(fetches, page_size=10)
+    assert model.rowCount() == 10
+    assert model.canFetchMore(QtCore.QModelIndex())
+    model.fetchMore(QtCore.QModelIndex())
+    model.fetchMore(QtCore.QModelIndex())
+    assert model.rowCount() == 25
+    assert not model.canFetchMore(QtCore.QModelIndex())
+    assert model.row_values(24) == ["25", "01-03-2024 12:12", "24.0", "cat1", "c24"]
+
+
+def test_bounded_window(session_factory, fetches):
+    fill(session_factory, 50)
+    model = ExpenseTableModel(fetches, page_size=10, max_pages=2)
+    while model.canFetchMore(QtCore.QModelIndex()):
+        model.fetchMore(QtCore.QModelIndex())
+    assert model.rowCount() == 50
+    assert model.cached_pages() == 2
+
+    fetches.calls.clear()
+    assert model.row_values(15)[0] == "16"
+    assert len(fetches.calls) == 1
+    after, until, limit = fetches.calls[0]
+    assert (after[1], until[1], limit) == (10, 20, None)
+    assert model.cached_pages() == 2
+
+
+def test_edits_survive_eviction(session_factory, fetches):
+    fill(session_factory, 30)
+    model = ExpenseTableModel(fetches, page_size=10, max_pages=1)
+    model.fetchMore(QtCore.QModelIndex())
+    model.fetchMore(QtCore.QModelIndex())
+    model.setData(model.index(3, 2), "999", QtCore.Qt.ItemDataRole.EditRole)
+    model.row_values(25)
+    assert model.row_values(3)[2] == "999"
+
+
+def test_example_row(session_factory, fetches):
+    model = ExpenseTableModel(fetches, example=["0", "", "1500", "food", "Example!!"])
+    assert model.rowCount() == 1
+    assert model.row_values(0)[0] == "0"
+    assert not model.canFetchMore(QtCore.QModelIndex())
+
+
+def ids(model):
+    return [int(model.row_values(row)[0]) for row in range(model.rowCount())]
+
+
+def add(session_factory, minutes):
+    pk = bulk_insert_values(ExpenseTable, [{
+        "expense_date": START + timedelta(minutes=minutes), "cat_id": 1,
+        "amount": 1, "comment": ""
+    }], session_factory)[0]
+    return get_expense_row(pk, session_factory)
+
+
+def test_insert_row(session_factory, fetches):
+    fill(session_factory, 20)
+    model = ExpenseTableModel(fetches, page_size=10)
+    fetches.calls.clear()
+    model.insert_row(add(session_factory, 2))
+    assert fetches.calls == []
+    assert ids(model)[:8] == [1, 2, 3, 4, 5, 6, 21, 7]
+    # После последней загруженной строки: строка будет прочитана fetchMore
+    model.insert_row(add(session_factory, 100))
+    assert model.rowCount() == 11
+    while model.canFetchMore(QtCore.QModelIndex()):
+        model.fetchMore(QtCore.QModelIndex())
+    assert ids(model)[-3:] == [19, 20, 22]
+    assert model.rowCount() == 22
+
+
+def test_insert_into_empty(session_factory, fetches):
+    insert_values(CategoryTable, {"name": "cat1"}, session_factory)
+    model = ExpenseTableModel(fetches, example=["0", "", "1500", "food", "Example!!"])
+    model.insert_row(add(session_factory, 0))
+    assert ids(model) == [1]
+
+
+def test_insert_into_evicted_page(session_factory, fetches):
+    fill(session_factory, 30)
+    model = ExpenseTableModel(fetches, page_size=10, max_pages=1)
+    model.fetchMore(QtCore.QModelIndex())
+    model.fetchMore(QtCore.QModelIndex())
+    model.insert_row(add(session_factory, 1))
+    assert model.rowCount() == 31
+    assert ids(model)[:5] == [1, 2, 3, 4, 31]
+
+
+def test_remove_rows(session_factory, fetches):
+    fill(session_factory, 20)
+    model = ExpenseTableModel(fetches, page_size=10, max_pages=1)
+    model.fetchMore(QtCore.QModelIndex())
+    delete_by_pks(ExpenseTable, [2, 15], session_factory)
+    model.remove_rows([1, 14])
+    assert model.rowCount() == 18
+    assert ids(model) == [pk for pk in range(1, 21) if pk not in (2, 15)]
+
+
+def test_update_row(session_factory, fetches):
+    fill(session_factory, 20)
+    model = ExpenseTableModel(fetches, page_size=10)
+    model.fetchMore(QtCore.QModelIndex())
+    changed = []
+    model.dataChanged.connect(lambda first, last: changed.append(first.row()))
+    model.setData(model.index(3, 4), "edited", QtCore.Qt.ItemDataRole.EditRole)
+    update_by_pk(ExpenseTable, 4, {"comment": "saved"}, session_factory)
+    model.update_row(3, get_expense_row(4, session_factory))
+    assert changed == [3]
+    assert model.row_values(3)[4] == "saved"
+
+    # Изменение даты переносит строку
+    update_by_pk(ExpenseTable, 4, {"expense_date": START + timedelta(minutes=6)},
+                 session_factory)
+    model.update_row(3, get_expense_row(4, session_factory))
+    assert ids(model)[:15] == [1, 2, 3, 5, 6, 7, 8, 9, 10, 11, 12, 4, 13, 14, 15]
+
+
+class DeferredFetcher:
+    """Страницы приходят только по команде, как из потока БД"""
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self.requests = []
+
+    def __call__(self, after, until, limit, deliver):
+        rows = get_expenses_page(self.session_factory, after, until, limit)
+        self.requests.append(lambda: deliver(rows))
+
+    def deliver_all(self):
+        while self.requests:
+            self.requests.pop(0)()
+
+
+def test_deferred_pages(session_factory):
+    fill(session_factory, 30)
+    fetcher = DeferredFetcher(session_factory)
+    model = ExpenseTableModel(fetcher, page_size=10, max_pages=1)
+    assert model.rowCount() == 0
+    fetcher.deliver_all()
+    assert model.rowCount() == 10
+
+    # Повторный fetchMore до ответа не запрашивает страницу второй раз
+    model.fetchMore(QtCore.QModelIndex())
+    model.fetchMore(QtCore.QModelIndex())
+    assert len(fetcher.requests) == 1
+    fetcher.deliver_all()
+    assert model.rowCount() == 20
+
+    changed = []
+    model.dataChanged.connect(lambda first, last: changed.append((first.row(),
+                                                                  last.row())))
+    assert model.row_values(2) == [""] * 5
+    fetcher.deliver_all()
+    assert changed == [(0, 9)]
+    assert model.row_values(2)[0] == "3"
+
+
+def test_apply_changes(session_factory, fetches):
+    fill(session_factory, 20)
+    model = ExpenseTableModel(fetches, page_size=10)
+    since = get_change_watermark(session_factory)
+    update_by_pk(ExpenseTable, 3, {"expense_date": START + timedelta(minutes=7)},
+                 session_factory)
+    update_by_pk(ExpenseTable, 5, {"comment": "changed"}, session_factory)
+    delete_by_pks(ExpenseTable, [1, 18], session_factory)
+    add(session_factory, 0)
+    delta = get_expense_changes(since, session_factory)
+
+    fetches.calls.clear()
+    for _ in range(2):
+        model.apply_changes(delta.rows, delta.old_keys)
+        assert ids(model) == [2, 21, 4, 5, 6, 7, 8, 9, 10]
+    assert model.row_values(3)[4] == "changed"
+    assert fetches.calls == []
+    while model.canFetchMore(QtCore.QModelIndex()):
+        model.fetchMore(QtCore.QModelIndex())
+    assert ids(model) == [row.id for row in get_expenses_page(session_factory)]
+
+
+def test_reload_drops_stale_pages(session_factory):
+    fill(session_factory, 30)
+    fetcher = DeferredFetcher(session_factory)
+    model = ExpenseTableModel(fetcher, page_size=10)
+    fetcher.deliver_all()
+    model.fetchMore(QtCore.QModelIndex())
+    delete_by_pks(ExpenseTable, range(1, 6), session_factory)
+    model.reload()
+    fetcher.deliver_all()
+    assert ids(model) == list(range(6, 16))
+
+
+def test_fetch_rows_of_evicted_pages(session_factory):
+    fill(session_factory, 30)
+    fetcher = DeferredFetcher(session_factory)
+    model = ExpenseTableModel(fetcher, page_size=10, max_pages=1)
+    fetcher.deliver_all()
+    model.fetchMore(QtCore.QModelIndex())
+    fetcher.deliver_all()
+    model.fetchMore(QtCore.QModelIndex())
+    fetcher.deliver_all()
+    assert model.cached_pages() == 1
+
+    delivered = []
+    model.fetch_rows([29], delivered.append)
+    assert [{row: values[0] for row, values in found.items()}
+            for found in delivered] == [{29: 30}]
+    model.fetch_rows([0, 5, 15, 29, 30], delivered.append)
+    assert len(delivered) == 1 and len(fetcher.requests) == 2
+    fetcher.deliver_all()
+    assert {row: values[0] for row, values in delivered[1].items()} == \
+        {0: 1, 5: 6, 15: 16, 29: 30}
+
+    model.fetch_rows([0], delivered.append)
+    model.reload()
+    fetcher.deliver_all()
+    assert len(delivered) == 2
+    assert model.fetch_rows([], delivered.append) is None
+    assert delivered[2] == {}
@@ -0,0 +1,42 @@
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.repository.events import ChangeEvent, INSERT, UPDATE, DELETE, \
+    ROLLBACK
+
+pytest.importorskip("PySide6.QtWidgets")
+from bookkeeper.presenter import Refresh, plan_refresh  # noqa: E402
+
+NOW = datetime(2024, 5, 10, 12)
+
+
+def expense_update(columns, *days):
+    return ChangeEvent("expense_table", UPDATE, (1,), frozenset(columns),
+                       frozenset({1}), frozenset({1}), frozenset(days))
+
+
+@pytest.mark.parametrize("events, period, expected", [
+    ([], "day", Refresh()),
+    ([expense_update({"comment"}, date(2024, 5, 10))], "day", Refresh()),
+    ([expense_update({"cat_id"}, date(2024, 5, 10))], "day",
+     Refresh(cat_expenses=True)),
+    ([expense_update({"amount"}, date(2024, 5, 10))], "day",
+     Refresh(budget=True, cat_expenses=True)),
+    ([expense_update({"amount"}, date(2024, 5, 1))], "day", Refresh(budget=True)),
+    ([expense_update({"amount"}, date(2024, 5, 1))], "month",
+     Refresh(budget=True, cat_expenses=True)),
+    ([expense_update({"amount"}, date(2024, 1, 1))], "month", Refresh()),
+    ([ChangeEvent("expense_table", INSERT, (5,), None, frozenset(),
+                  frozenset({1}), frozenset({date(2024, 5, 11)}))], "day", Refresh()),
+    ([ChangeEvent("expense_table", DELETE, None)], "day", Refresh(True, True, True)),
+    ([ChangeEvent("budget", UPDATE, (1,), frozenset({"budget"}), days=frozenset())],
+     "day", Refresh(budget=True)),
+    ([ChangeEvent("category_table", UPDATE, (1,), frozenset({"parent"}),
+                  days=frozenset())], "day", Refresh()),
+    ([ChangeEvent("category_table", UPDATE, (1,), frozenset({"name"}),
+                  days=frozenset())], "day", Refresh(cat_expenses=True, rows=True)),
+    ([ChangeEvent(None, ROLLBACK)], "day", Refresh(True, True, True)),
+])
+def test_plan_refresh(events, period, expected):
+    assert plan_refresh(events, period, NOW) == expected